@@ -11,6 +11,13 @@
 #define ADDY 0x69
 Adafruit_ICM20948 icm;
 Adafruit_Mahony filter;
+#define FILTER_HZ 100        // Must match filter.begin(): the filter assumes this update rate
+// 1: print every sample as "RAW,<ms>,ax,ay,az,gx,gy,gz,mx,my,mz" (m/s^2, rad/s, uT)
+// for replaying and gain tuning with interface/imu_fusion.py
+#define LOG_RAW 0
+#define PRINT_INTERVAL_MS 1000
+unsigned long nextUpdateUs = 0;
+unsigned long lastPrintMs = 0;
 uint16_t measurement_delay_us = 65535; // Delay between measurements for testing
 // For SPI mode, we need a CS pin
 #define ICM_CS 10
@@ -21,7 +28,7 @@ uint16_t measurement_delay_us = 65535; // Delay between measurements for testing
 
 void setup(void) {
   Serial.begin(115200);
-  filter.begin(100);
+  filter.begin(FILTER_HZ);
   Wire.begin(SDA_PIN, SPI_PIN);
   while (!Serial)
     delay(10); // will pause Zero, Leonardo, etc until serial console opens
@@ -119,35 +126,20 @@ void setup(void) {
 }
 
 void loop() {
+  // Update at FILTER_HZ: the filter integrates the gyro over 1/FILTER_HZ per call
+  unsigned long nowUs = micros();
+  if ((long)(nowUs - nextUpdateUs) < 0) return;
+  nextUpdateUs += 1000000UL / FILTER_HZ;
+  if ((long)(nowUs - nextUpdateUs) > 0) nextUpdateUs = nowUs;  // Fell behind: don't try to catch up
 
-  //  /* Get a new normalized sensor event */
+  /* Get a new normalized sensor event */
   sensors_event_t accel;
   sensors_event_t gyro;
   sensors_event_t mag;
   sensors_event_t temp;
   icm.getEvent(&accel, &gyro, &temp, &mag);
 
-//  Serial.print("\t\tTemperature ");
-//  Serial.print(temp.temperature);
-//  Serial.println(" deg C");
-
-  /* Display the results (acceleration is measured in m/s^2) */
-//  Serial.print("\t\tAccel X: ");
-//  Serial.print(accel.acceleration.x);
-//  Serial.print(" \tY: ");
-//  Serial.print(accel.acceleration.y);
-//  Serial.print(" \tZ: ");
-//  Serial.print(accel.acceleration.z);
-//  Serial.println(" m/s^2 ");
-//
-//  Serial.print("\t\tMag X: ");
-//  Serial.print(mag.magnetic.x);
-//  Serial.print(" \tY: ");
-//  Serial.print(mag.magnetic.y);
-//  Serial.print(" \tZ: ");
-//  Serial.print(mag.magnetic.z);
-//  Serial.println(" uT");
-// Convert gyro readings from rad/s to deg/s
+  // Convert gyro readings from rad/s to deg/s
   float gx = gyro.gyro.x * RAD_TO_DEG;
   float gy = gyro.gyro.y * RAD_TO_DEG;
   float gz = gyro.gyro.z * RAD_TO_DEG;
@@ -164,44 +156,19 @@ void loop() {
   // Update orientation filter
   filter.update(gx, gy, gz, ax, ay, az, mx, my, mz);
 
+#if LOG_RAW
+  Serial.printf("RAW,%lu,%.3f,%.3f,%.3f,%.5f,%.5f,%.5f,%.2f,%.2f,%.2f\n", millis(),
+                ax, ay, az, gyro.gyro.x, gyro.gyro.y, gyro.gyro.z, mx, my, mz);
+#endif
+
   // Print orientation
-  float yaw = filter.getYaw();
-  float pitch = filter.getPitch();
-  float roll = filter.getRoll();
-
-  Serial.print("Yaw");
-  Serial.print(yaw);
-  /* Display the results (acceleration is measured in m/s^2) */
-//  Serial.print("\t\tGyro X: ");
-//  Serial.print(gyro.gyro.x);
-//  Serial.print(" \tY: ");
-//  Serial.print(gyro.gyro.y);
-////  Serial.print(" \tZ: ");
-////  Serial.print(gyro.gyro.z);
-//  Serial.println(" radians/s ");
-//  Serial.println();
-
-  delay(1000);
-
-  //  Serial.print(temp.temperature);
-  //
-  //  Serial.print(",");
-  //
-  //  Serial.print(accel.acceleration.x);
-  //  Serial.print(","); Serial.print(accel.acceleration.y);
-  //  Serial.print(","); Serial.print(accel.acceleration.z);
-  //
-  //  Serial.print(",");
-  //  Serial.print(gyro.gyro.x);
-  //  Serial.print(","); Serial.print(gyro.gyro.y);
-  //  Serial.print(","); Serial.print(gyro.gyro.z);
-  //
-  //  Serial.print(",");
-  //  Serial.print(mag.magnetic.x);
-  //  Serial.print(","); Serial.print(mag.magnetic.y);
-  //  Serial.print(","); Serial.print(mag.magnetic.z);
-
-  //  Serial.println();
-  //
-  //  delayMicroseconds(measurement_delay_us);
-}
\ No newline at end of file
+  if (millis() - lastPrintMs >= PRINT_INTERVAL_MS) {
+    lastPrintMs = millis();
+    Serial.print("Yaw ");
+    Serial.print(filter.getYaw());
+    Serial.print(" Pitch ");
+    Serial.print(filter.getPitch());
+    Serial.print(" Roll ");
+    Serial.println(filter.getRoll());
+  }
+}
@@ -1,9 +1,11 @@
 #include <WiFi.h>
 #include <esp_wifi.h>
 #include <esp_now.h>
+#include <esp_timer.h>
 #include <math.h>
 #include <mbedtls/md.h>
 #include <HardwareSerial.h>
+#include "nmea_parse.h"
 
 // Shared HMAC key for message authentication (must match hub.ino)
 static const uint8_t HMAC_KEY[32] = {
@@ -18,6 +20,44 @@ static const uint8_t HMAC_KEY[32] = {
 static uint32_t lastSeqNum = 0;
 static bool seqInitialized = false;      // false until first valid message received
 static const uint32_t SEQ_WINDOW = 100;  // Accept packets within this window ahead
+static uint32_t lastVerifiedSeq = 0;     // seq of the message currently being handled
+
+// Acks, heartbeats and position reports back to the hub
+// ("ACK:row;col:seq", "HB:row;col:fix", "POS:row;col:lat,lon|heading|fix")
+uint8_t broadcastAddress[] = { 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF };
+#define ACK_QUEUE 16
+static uint32_t ackQueue[ACK_QUEUE];     // filled by OnDataRecv, sent from loop()
+static volatile uint8_t ackHead = 0;
+static volatile uint8_t ackTail = 0;
+static unsigned long lastHeartbeat = 0;
+#define HEARTBEAT_INTERVAL 1000
+static unsigned long lastPosReport = 0;
+#define POS_REPORT_INTERVAL 250  // laptop evaluates the whole block from these
+
+// Clock sync to the hub's "TS:<hub_us>" beacons: least-squares fit of hub time vs. local
+// time over the last SYNC_WINDOW beacons (same model as interface/clock_sync.py)
+#define SYNC_WINDOW 16
+static int64_t syncLocal[SYNC_WINDOW];
+static int64_t syncHub[SYNC_WINDOW];
+static uint8_t syncCount = 0;
+static uint8_t syncNext = 0;
+static int64_t syncRefLocal = 0;         // fit passes through (syncRefLocal, syncRefHub)
+static int64_t syncRefHub = 0;
+static double  syncSkew = 1.0;           // hub us per local us
+static bool    clockSynced = false;
+static portMUX_TYPE syncMux = portMUX_INITIALIZER_UNLOCKED;
+
+// Pin commands stamped "row;pin:state@<hub_us>" wait here until their local fire time
+#define SCHEDULE_QUEUE 16
+#define SCHEDULE_MAX_AHEAD_US 2000000    // stamps further out than this are treated as bogus
+struct ScheduledCmd {
+  int64_t at;
+  uint8_t pin;
+  uint8_t state;
+  bool used;
+};
+static ScheduledCmd scheduled[SCHEDULE_QUEUE];
+static portMUX_TYPE scheduleMux = portMUX_INITIALIZER_UNLOCKED;
 
 // RTCM handling
 #define RTCM_ESPNOW_PREFIX 0xD3  // Standard RTCM3 preamble byte
@@ -82,6 +122,7 @@ static unsigned long lastGpsPrint = 0;
 static unsigned long gpsRxByteCount = 0;   // total bytes received from GPS UART
 static unsigned long gpsDollarCount = 0;   // '$' characters seen (start of NMEA)
 static unsigned long gpsNmeaParsed = 0;    // complete sentences parsed
+static unsigned long gpsNmeaBadChecksum = 0;  // sentences dropped for a bad "*hh"
 static bool gpsDiagDone = false;           // only dump raw bytes once
 
 // Tolerance for GPS comparison (~1 foot at this latitude)
@@ -153,61 +194,7 @@ long detectGPSBaud() {
 }
 
 // ─────────────── NMEA parsing ───────────────────────────────
-// Get the Nth comma-delimited field from an NMEA sentence (0-indexed)
-String nmeaField(const char* sentence, int fieldNum) {
-  int current = 0;
-  const char* start = sentence;
-
-  for (const char* p = sentence; *p; p++) {
-    if (*p == ',' || *p == '*') {
-      if (current == fieldNum) {
-        return String(sentence).substring(start - sentence, p - sentence);
-      }
-      current++;
-      start = p + 1;
-    }
-  }
-  // Last field (no trailing comma)
-  if (current == fieldNum) {
-    return String(start);
-  }
-  return "";
-}
-
-// Convert NMEA lat/lon (DDMM.MMMMM) to decimal degrees
-double nmeaToDecimal(const char* raw, int rawLen, const String& dir) {
-  if (rawLen == 0) return 0.0;
-
-  // Find the decimal point to split degrees from minutes
-  int dotPos = -1;
-  for (int i = 0; i < rawLen; i++) {
-    if (raw[i] == '.') { dotPos = i; break; }
-  }
-  if (dotPos < 0) return 0.0;
-
-  // Degrees are everything before the last 2 digits before the dot
-  int degLen = dotPos - 2;
-  if (degLen < 1) return 0.0;
-
-  // Use strtod for full double precision (toFloat truncates to 32-bit)
-  char tmp[24];
-  int cpLen = (rawLen < 23) ? rawLen : 23;
-  memcpy(tmp, raw, cpLen);
-  tmp[cpLen] = '\0';
-
-  char degBuf[8];
-  memcpy(degBuf, tmp, degLen);
-  degBuf[degLen] = '\0';
-
-  double degrees = strtod(degBuf, NULL);
-  double minutes = strtod(tmp + degLen, NULL);
-  double decimal = degrees + (minutes / 60.0);
-
-  if (dir == "S" || dir == "W") {
-    decimal = -decimal;
-  }
-  return decimal;
-}
+// Tokenizer and checksum: nmea_parse.h (nmeaParse, NmeaFix)
 
 const char* fixQualityStr(uint8_t q) {
   switch (q) {
@@ -224,53 +211,38 @@ const char* fixQualityStr(uint8_t q) {
 void parseNMEA(const char* sentence) {
   // We care about GGA (position + fix quality) and RMC (position + course)
   // Accept any talker ID (GP, GN, GL, etc.)
-  if (strlen(sentence) < 7) return;  // safety: need at least $XXYYY,
-  const char* type = sentence + 3;   // skip $XX
-
-  if (strncmp(type, "GGA,", 4) == 0) {
-    // $xxGGA,time,lat,N/S,lon,E/W,quality,numSV,HDOP,alt,M,sep,M,age,stn*cs
-    //         0    1   2   3   4     5      6     7    8  9 10 11  12  13
-    String lat_raw = nmeaField(sentence, 2);
-    String lat_dir = nmeaField(sentence, 3);
-    String lon_raw = nmeaField(sentence, 4);
-    String lon_dir = nmeaField(sentence, 5);
-    String quality = nmeaField(sentence, 6);
-
-    uint8_t q = quality.toInt();
-    gps_fix_quality = q;
-
-    if (q > 0 && lat_raw.length() > 0 && lon_raw.length() > 0) {
-      cur_LAT = nmeaToDecimal(lat_raw.c_str(), lat_raw.length(), lat_dir);
-      cur_LON = nmeaToDecimal(lon_raw.c_str(), lon_raw.length(), lon_dir);
+  NmeaFix fix;
+  int rc = nmeaParse(sentence, &fix);
+  if (rc == NMEA_ERR_CHECKSUM) {
+    gpsNmeaBadChecksum++;
+    return;
+  }
+  if (rc != NMEA_OK) return;
+
+  if (fix.type == NMEA_GGA) {
+    gps_fix_quality = fix.quality;
+    if (fix.hasPosition) {
+      cur_LAT = fix.lat;
+      cur_LON = fix.lon;
       gps_valid = true;
       lastGpsTime = millis();
-      Serial.printf("GGA: %.6f, %.6f | Fix: %s (%d)\n", cur_LAT, cur_LON, fixQualityStr(q), q);
+      Serial.printf("GGA: %.6f, %.6f | Fix: %s (%d)\n", cur_LAT, cur_LON, fixQualityStr(fix.quality), fix.quality);
     }
 
-  } else if (strncmp(type, "RMC,", 4) == 0) {
-    // $xxRMC,time,status,lat,N/S,lon,E/W,speed,course,date,...
-    //         0     1     2   3   4   5    6      7      8
-    String status = nmeaField(sentence, 2);
-
-    if (status == "A") {  // A = valid
-      String lat_raw = nmeaField(sentence, 3);
-      String lat_dir = nmeaField(sentence, 4);
-      String lon_raw = nmeaField(sentence, 5);
-      String lon_dir = nmeaField(sentence, 6);
-      String course  = nmeaField(sentence, 8);
-
-      if (lat_raw.length() > 0 && lon_raw.length() > 0) {
-        cur_LAT = nmeaToDecimal(lat_raw.c_str(), lat_raw.length(), lat_dir);
-        cur_LON = nmeaToDecimal(lon_raw.c_str(), lon_raw.length(), lon_dir);
-        gps_valid = true;
-        lastGpsTime = millis();
-      }
+  } else if (fix.type == NMEA_RMC) {
+    if (fix.hasPosition) {
+      cur_LAT = fix.lat;
+      cur_LON = fix.lon;
+      gps_valid = true;
+      lastGpsTime = millis();
+    }
 
-      // Course over ground (heading) — only valid when moving
-      if (course.length() > 0) {
-        cur_IMU = (int)course.toFloat();
-      }
+    // Course over ground (heading) — only valid when moving
+    if (fix.hasCourse) {
+      cur_IMU = (int)fix.course;
+    }
 
+    if (fix.hasPosition || fix.hasCourse) {
       Serial.printf("RMC: %.6f, %.6f | Heading: %d°\n",
                     cur_LAT, cur_LON, cur_IMU);
     }
@@ -507,15 +479,134 @@ String verifyAndExtract(const String& authMsg) {
     lastSeqNum = seq;
     seqInitialized = true;
   }
+  lastVerifiedSeq = seq;
 
   Serial.printf("Auth OK: seq=%lu\n", seq);
   return payload;
 }
 
+// ─────────────── Clock sync / scheduled execution ──────────────
+// Add a beacon (local receive time, hub send time) and refit. Called from the receive callback.
+void addSyncSample(int64_t local, int64_t hub) {
+  // Hub rebooted (clock went backwards): start over
+  if (syncCount > 0 && hub <= syncHub[(syncNext + SYNC_WINDOW - 1) % SYNC_WINDOW]) {
+    syncCount = 0;
+    syncNext = 0;
+  }
+  syncLocal[syncNext] = local;
+  syncHub[syncNext] = hub;
+  syncNext = (syncNext + 1) % SYNC_WINDOW;
+  if (syncCount < SYNC_WINDOW) syncCount++;
+
+  // Work relative to the newest sample so doubles keep sub-us precision
+  double ml = 0, mh = 0;
+  for (int i = 0; i < syncCount; i++) {
+    ml += (double)(syncLocal[i] - local);
+    mh += (double)(syncHub[i] - hub);
+  }
+  ml /= syncCount;
+  mh /= syncCount;
+  double sxx = 0, sxy = 0;
+  for (int i = 0; i < syncCount; i++) {
+    double dl = (double)(syncLocal[i] - local) - ml;
+    double dh = (double)(syncHub[i] - hub) - mh;
+    sxx += dl * dl;
+    sxy += dl * dh;
+  }
+  double skew = (syncCount >= 2 && sxx > 0) ? sxy / sxx : 1.0;
+
+  portENTER_CRITICAL(&syncMux);
+  syncRefLocal = local + (int64_t)ml;
+  syncRefHub = hub + (int64_t)mh;
+  syncSkew = skew;
+  clockSynced = syncCount >= 2;
+  portEXIT_CRITICAL(&syncMux);
+}
+
+// Local esp_timer time (us) at which the hub clock reads hubUs
+int64_t hubToLocal(int64_t hubUs) {
+  portENTER_CRITICAL(&syncMux);
+  int64_t refLocal = syncRefLocal;
+  int64_t refHub = syncRefHub;
+  double skew = syncSkew;
+  portEXIT_CRITICAL(&syncMux);
+  return refLocal + (int64_t)((double)(hubUs - refHub) / skew);
+}
+
+// Queue a pin change for local time `at`. Returns false if the queue is full.
+bool schedulePin(int64_t at, int pin, int state) {
+  bool queued = false;
+  portENTER_CRITICAL(&scheduleMux);
+  for (int i = 0; i < SCHEDULE_QUEUE; i++) {
+    if (!scheduled[i].used) {
+      scheduled[i].at = at;
+      scheduled[i].pin = pin;
+      scheduled[i].state = state;
+      scheduled[i].used = true;
+      queued = true;
+      break;
+    }
+  }
+  portEXIT_CRITICAL(&scheduleMux);
+  return queued;
+}
+
+// Set a pin now and drop its queued changes. Unstamped commands (E-stop, cancel)
+// must win over stamped ones the laptop sent SCHEDULE_LEAD early.
+void overridePin(int pin, int state) {
+  portENTER_CRITICAL(&scheduleMux);
+  for (int i = 0; i < SCHEDULE_QUEUE; i++) {
+    if (scheduled[i].used && scheduled[i].pin == pin) scheduled[i].used = false;
+  }
+  buzz(pin, state);  // Inside the lock, so runScheduled() can't fire a dropped change after it
+  portEXIT_CRITICAL(&scheduleMux);
+}
+
+// Fire scheduled pin changes that are due, earliest first (after a stall an
+// on/off pair for one pin must not apply backwards). Called from loop().
+void runScheduled() {
+  int64_t now = esp_timer_get_time();
+  while (true) {
+    int next = -1;
+    portENTER_CRITICAL(&scheduleMux);
+    for (int i = 0; i < SCHEDULE_QUEUE; i++) {
+      if (scheduled[i].used && scheduled[i].at <= now &&
+          (next < 0 || scheduled[i].at < scheduled[next].at)) {
+        next = i;
+      }
+    }
+    if (next >= 0) {
+      scheduled[next].used = false;
+      digitalWrite(scheduled[next].pin, scheduled[next].state ? HIGH : LOW);
+    }
+    portEXIT_CRITICAL(&scheduleMux);
+    if (next < 0) return;
+  }
+}
+
+// Queue an ack for the message being handled; loop() sends it
+void queueAck(uint32_t seq) {
+  uint8_t next = (ackHead + 1) % ACK_QUEUE;
+  if (next == ackTail) return;  // full - laptop will retransmit
+  ackQueue[ackHead] = seq;
+  ackHead = next;
+}
+
+void sendUplink(const String& line) {
+  esp_now_send(broadcastAddress, (const uint8_t*)line.c_str(), line.length());
+}
+
 // callback -----------------------------------------------
 void OnDataRecv(const esp_now_recv_info *info, const uint8_t *data, int len)
 {
   if (len <= 0) return;                 // safety
+  int64_t rxLocal = esp_timer_get_time(); // beacon receive time, before any parsing
+
+  /* ----- ignore other headbands' acks/heartbeats/positions -------- */
+  if ((len >= 4 && (memcmp(data, "ACK:", 4) == 0 || memcmp(data, "POS:", 4) == 0)) ||
+      (len >= 3 && memcmp(data, "HB:", 3) == 0)) {
+    return;
+  }
 
   /* ----- Check for RTCM correction data (starts with 0xD3) ------- */
   if (data[0] == RTCM_ESPNOW_PREFIX) {
@@ -536,6 +627,12 @@ void OnDataRecv(const esp_now_recv_info *info, const uint8_t *data, int len)
     return;  // Authentication failed - ignore message
   }
 
+  /* ----- time beacon from the hub ------------------------------- */
+  if (msg.startsWith("TS:")) {
+    addSyncSample(rxLocal, strtoll(msg.c_str() + 3, NULL, 10));
+    return;
+  }
+
   /* ----- determine packet type ----------------------------------- */
   bool hasBar = msg.indexOf('|') != -1; // GPS|IMU if true
 
@@ -555,10 +652,18 @@ void OnDataRecv(const esp_now_recv_info *info, const uint8_t *data, int len)
   /* ────────────── GPS | IMU confirmation branch ────────────────── */
   if (hasBar) {
     if (col != COL_NUM) return;         // not our column
+    queueAck(lastVerifiedSeq);
 
     int bar   = msg.indexOf('|');
+    int at    = msg.indexOf('@', bar);      // optional time of validity (hub clock)
     String gps = msg.substring(colon + 1, bar); gps.trim();
-    String imu = msg.substring(bar + 1);        imu.trim();
+    String imu = at < 0 ? msg.substring(bar + 1) : msg.substring(bar + 1, at); imu.trim();
+
+    if (at >= 0 && clockSynced) {
+      // >0: target arrived after the time it was extrapolated to
+      int64_t late = esp_timer_get_time() - hubToLocal(strtoll(msg.c_str() + at + 1, NULL, 10));
+      Serial.printf("Target valid-at offset: %lld us\n", (long long)late);
+    }
 
     // Parse received GPS coordinates
     int comma = gps.indexOf(',');
@@ -630,11 +735,27 @@ void OnDataRecv(const esp_now_recv_info *info, const uint8_t *data, int len)
 
   /* ─────────────── manual single-pin command branch ─────────────── */
   int pin   = col.toInt();                    // 5/18/19/23
-  int state = msg.substring(colon + 1).toInt(); // 0 or 1
+  int at    = msg.indexOf('@');             // optional execute-at time (hub clock)
+  int state = (at < 0 ? msg.substring(colon + 1) : msg.substring(colon + 1, at)).toInt(); // 0 or 1
+  queueAck(lastVerifiedSeq);
 
   if (pin == MOTOR_PIN_5 || pin == MOTOR_PIN_18 ||
       pin == MOTOR_PIN_19 || pin == MOTOR_PIN_23) {
-    buzz(pin, state);
+    if (at >= 0 && clockSynced) {
+      int64_t fireAt = hubToLocal(strtoll(msg.c_str() + at + 1, NULL, 10));
+      int64_t ahead = fireAt - esp_timer_get_time();
+      // Past-due stamps (late retransmits) and bogus far-future ones run now
+      if (ahead > 0 && ahead < SCHEDULE_MAX_AHEAD_US && schedulePin(fireAt, pin, state)) {
+        Serial.printf("Manual: pin %d → %s in %lld us\n",
+                      pin, state ? "HIGH" : "LOW", (long long)ahead);
+        return;
+      }
+    }
+    if (at < 0) {
+      overridePin(pin, state);
+    } else {
+      buzz(pin, state);
+    }
     Serial.printf("Manual: pin %d → %s\n",
                   pin, state ? "HIGH" : "LOW");
   } else {
@@ -705,9 +826,20 @@ void setup() {
 
   // Register the receive callback using the updated function signature
   esp_now_register_recv_cb(OnDataRecv);
+
+  // Broadcast peer for acks/heartbeats to the hub
+  esp_now_peer_info_t peerInfo = {};
+  memcpy(peerInfo.peer_addr, broadcastAddress, 6);
+  peerInfo.channel = WIFI_CHANNEL;
+  peerInfo.encrypt = false;
+  if (esp_now_add_peer(&peerInfo) != ESP_OK) {
+    Serial.println("Failed to add ESP-NOW broadcast peer");
+  }
 }
 
 void loop() {
+  runScheduled();
+
   // Write deferred RTCM data to GPS module (from ESP-NOW callback)
   if (rtcmWriteLen > 0) {
     size_t toWrite = rtcmWriteLen;
@@ -716,11 +848,28 @@ void loop() {
     Serial.printf("RTCM: sent %zu/%zu bytes to GPS\n", written, toWrite);
   }
 
+  // Send queued acks, then a heartbeat if due
+  while (ackTail != ackHead) {
+    sendUplink("ACK:" + ROW_NUM + ";" + COL_NUM + ":" + String(ackQueue[ackTail]));
+    ackTail = (ackTail + 1) % ACK_QUEUE;
+  }
+
   // Read NMEA sentences from RTK GPS module
   readGPS();
 
   // Print GPS status periodically
   unsigned long now = millis();
+  if (now - lastHeartbeat >= HEARTBEAT_INTERVAL) {
+    lastHeartbeat = now;
+    sendUplink("HB:" + ROW_NUM + ";" + COL_NUM + ":" + String(gps_fix_quality));
+  }
+  if (gps_valid && now - lastPosReport >= POS_REPORT_INTERVAL) {
+    lastPosReport = now;
+    char pos[48];
+    snprintf(pos, sizeof(pos), "POS:%s;%s:%.7f,%.7f|%d|%d", ROW_NUM.c_str(), COL_NUM.c_str(),
+             cur_LAT, cur_LON, cur_IMU, gps_fix_quality);
+    sendUplink(pos);
+  }
   if (now - lastGpsPrint >= GPS_PRINT_INTERVAL) {
     lastGpsPrint = now;
 
@@ -730,10 +879,11 @@ void loop() {
                     cur_LAT, cur_LON, cur_IMU, fixQualityStr(gps_fix_quality),
                     gps_fix_quality, age);
     } else {
-      Serial.printf("GPS: Waiting for fix... | UART RX: %lu bytes, %lu '$', %lu sentences | Baud: %ld\n",
-                    gpsRxByteCount, gpsDollarCount, gpsNmeaParsed, gpsActiveBaud);
+      Serial.printf("GPS: Waiting for fix... | UART RX: %lu bytes, %lu '$', %lu sentences, %lu bad checksum | Baud: %ld\n",
+                    gpsRxByteCount, gpsDollarCount, gpsNmeaParsed, gpsNmeaBadChecksum, gpsActiveBaud);
     }
   }
 
+  runScheduled();
   delay(1);
 }
@@ -1,5 +1,14 @@
 #include <WiFi.h>
 #include <esp_now.h>
+#include <esp_timer.h>
+#include <mbedtls/md.h>
+#include <HardwareSerial.h>
+#include <Wire.h>
+#include <Adafruit_ICM20X.h>
+#include <Adafruit_ICM20948.h>
+#include <Adafruit_Sensor.h>
+#include <Adafruit_AHRS_Mahony.h>
+#include "nmea_parse.h"
 
 // Wi-Fi AP credentials
 #define WIFI_SSID "PWMB Hub"
@@ -12,26 +21,280 @@
 const String ROW_NUM = "0";
 const String COL_NUM = "3";
 
-// GPS and IMU data (HARDCODED TEMPORARILY)
-const String GPS_DATA = "35.303276,-120.664299";
-const String IMU_DATA = "194";
+// RTK receiver on UART2 (same wiring as rtk.ino)
+HardwareSerial GPSSerial(2);
+#define GPS_RX_PIN 25
+#define GPS_TX_PIN 26
+#define GPS_BAUD 460800
+#define NMEA_BUF_SIZE 256
+static char nmeaBuf[NMEA_BUF_SIZE];
+static uint16_t nmeaIdx = 0;
+
+// ICM20948 + Mahony heading (same setup as IMU/SensorFusion.ino)
+#define IMU_SDA_PIN 21
+#define IMU_SCL_PIN 22
+#define IMU_ADDR 0x69
+#define IMU_RATE_HZ 100
+Adafruit_ICM20948 icm;
+Adafruit_Mahony imuFilter;
+static bool imuOk = false;
+static int64_t nextImuUs = 0;
+
+// Hub pose: position/fix from GGA/RMC, heading from the IMU (GPS course without one)
+static double hubLat = 0.0;
+static double hubLon = 0.0;
+static uint8_t hubFix = 0;
+static float hubHeading = 0.0f;
+static bool hubHasPosition = false;
+static int64_t hubFixUs = 0;  // Hub clock when the position arrived
+
+// Pose stream to the laptop: "$HBP,seq,hub_us,lat,lon,heading,fix,fix_us*hh" (XOR of
+// the characters between '$' and '*', like NMEA), at streamHz once there is a position.
+// hub_us is when the frame (and its heading) was taken, fix_us when its position
+// arrived: at 20 Hz most frames repeat the receiver's last fix, and the laptop must
+// fuse each fix once. The laptop picks the rate with "RATE:<hz>" (must match
+// interface/telemetry.py).
+#define STREAM_MIN_HZ 5.0f
+#define STREAM_MAX_HZ 20.0f
+static float streamHz = 10.0f;
+static int64_t nextFrameUs = 0;
+static uint32_t poseSeq = 0;
 
 WiFiServer tcpServer(TCP_PORT);
-unsigned long lastDataSentTime = 0;
-const unsigned long DATA_SEND_INTERVAL = 5000; // 5 seconds
 
 // Broadcast MAC address for ESP-NOW (to send to all peers)
 uint8_t broadcastAddress[] = { 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF };
 
+// Shared HMAC key for message authentication (must match headband.ino)
+static const uint8_t HMAC_KEY[32] = {
+  0x7A, 0x4E, 0x2B, 0x91, 0xF3, 0x8C, 0x5D, 0xE7,
+  0x1F, 0x6A, 0xC4, 0x83, 0x9B, 0x2E, 0xD5, 0x70,
+  0xA8, 0x3F, 0x6C, 0x19, 0xE2, 0x7D, 0x4B, 0x95,
+  0x0C, 0x68, 0xB1, 0xF9, 0x3A, 0x57, 0xDE, 0x84
+};
+
+// Time beacons: headbands fit their clocks to ours from these ("TS:<hub_us>", signed).
+// The laptop reads the same clock with "TIME" and stamps commands "...@<hub_us>".
+#define SYNC_BEACON_INTERVAL 250  // ms
+static unsigned long lastBeaconTime = 0;
+
+// Sequence number of the last relayed frame (reported to the laptop as "OK:<seq>")
+static uint32_t relaySeq = 0;
+
+// Headbands learned from their ACK/HB frames: "row;col" -> MAC (for unicast retransmits)
+#define MAX_MEMBERS 64
+struct Member {
+  char id[8];
+  uint8_t mac[6];
+  bool used;
+  bool peerAdded;
+};
+static Member members[MAX_MEMBERS];
+
+// ACK/HB lines from headbands, queued by the ESP-NOW callback and sent to the laptop from loop()
+#define UPLINK_QUEUE 32
+#define UPLINK_LEN 48
+static char uplink[UPLINK_QUEUE][UPLINK_LEN];
+static volatile uint8_t uplinkHead = 0;
+static volatile uint8_t uplinkTail = 0;
+
 void OnDataSent(const wifi_tx_info_t *info, esp_now_send_status_t status) {
   Serial.print("ESP-NOW broadcast status: ");
   Serial.println((status == ESP_NOW_SEND_SUCCESS) ? "Success" : "Failure");
 }
 
+// Generate HMAC-SHA256 and return first 8 bytes as hex string (same as headband.ino)
+String generateHMAC(uint32_t seq, const String& payload) {
+  String message = String(seq) + ":" + payload;
+
+  uint8_t hmacResult[32];
+  mbedtls_md_context_t ctx;
+  mbedtls_md_init(&ctx);
+  mbedtls_md_setup(&ctx, mbedtls_md_info_from_type(MBEDTLS_MD_SHA256), 1);
+  mbedtls_md_hmac_starts(&ctx, HMAC_KEY, sizeof(HMAC_KEY));
+  mbedtls_md_hmac_update(&ctx, (const unsigned char*)message.c_str(), message.length());
+  mbedtls_md_hmac_finish(&ctx, hmacResult);
+  mbedtls_md_free(&ctx);
+
+  char hexStr[17];
+  for (int i = 0; i < 8; i++) {
+    sprintf(&hexStr[i * 2], "%02x", hmacResult[i]);
+  }
+  hexStr[16] = '\0';
+  return String(hexStr);
+}
+
+// Sign and send a payload as "seq:payload:hmac". Returns the sequence number used.
+uint32_t sendSigned(const uint8_t* addr, const String& payload) {
+  uint32_t seq = ++relaySeq;
+  String framed = String(seq) + ":" + payload + ":" + generateHMAC(seq, payload);
+  esp_now_send(addr, (const uint8_t*)framed.c_str(), framed.length());
+  return seq;
+}
+
+// Broadcast a time beacon if one is due. The stamp is taken just before signing, so
+// signing/air time is a common delay for every headband and cancels between them.
+void serviceBeacon() {
+  unsigned long now = millis();
+  if (now - lastBeaconTime < SYNC_BEACON_INTERVAL) return;
+  lastBeaconTime = now;
+  char beacon[32];
+  snprintf(beacon, sizeof(beacon), "TS:%llu", (unsigned long long)esp_timer_get_time());
+  sendSigned(broadcastAddress, String(beacon));
+}
+
+// Remember which MAC a headband ("row;col") sends from. Called from the receive callback.
+void rememberMember(const char* id, const uint8_t* mac) {
+  int freeSlot = -1;
+  for (int i = 0; i < MAX_MEMBERS; i++) {
+    if (members[i].used && strcmp(members[i].id, id) == 0) {
+      if (memcmp(members[i].mac, mac, 6) != 0) {
+        memcpy(members[i].mac, mac, 6);
+        members[i].peerAdded = false;
+      }
+      return;
+    }
+    if (!members[i].used && freeSlot < 0) freeSlot = i;
+  }
+  if (freeSlot < 0) return;  // table full
+  strncpy(members[freeSlot].id, id, sizeof(members[freeSlot].id) - 1);
+  members[freeSlot].id[sizeof(members[freeSlot].id) - 1] = '\0';
+  memcpy(members[freeSlot].mac, mac, 6);
+  members[freeSlot].peerAdded = false;
+  members[freeSlot].used = true;
+}
+
+Member* findMember(const String& id) {
+  for (int i = 0; i < MAX_MEMBERS; i++) {
+    if (members[i].used && id.equals(members[i].id)) return &members[i];
+  }
+  return NULL;
+}
+
+// Frames from headbands: "ACK:row;col:seq", "HB:row;col:fix" or "POS:row;col:lat,lon|hdg|fix"
+void OnDataRecv(const esp_now_recv_info *info, const uint8_t *data, int len) {
+  if (len < 4 || len >= UPLINK_LEN) return;
+  if (memcmp(data, "ACK:", 4) != 0 && memcmp(data, "HB:", 3) != 0 && memcmp(data, "POS:", 4) != 0) return;
+
+  uint8_t next = (uplinkHead + 1) % UPLINK_QUEUE;
+  if (next == uplinkTail) return;  // queue full - drop, laptop will see a missed ack
+
+  char* line = uplink[uplinkHead];
+  memcpy(line, data, len);
+  line[len] = '\0';
+
+  // Member id is between the first and second ':'
+  const char* idStart = strchr(line, ':') + 1;
+  const char* idEnd = strchr(idStart, ':');
+  if (idEnd && idEnd - idStart < 8) {
+    char id[8];
+    memcpy(id, idStart, idEnd - idStart);
+    id[idEnd - idStart] = '\0';
+    rememberMember(id, info->src_addr);
+  }
+
+  uplinkHead = next;
+}
+
+// Unicast "TO:row;col|payload" to a single headband. Returns seq, or 0 if the member is unknown.
+uint32_t sendToMember(const String& cmd) {
+  int bar = cmd.indexOf('|');
+  if (bar < 0) return 0;
+  String id = cmd.substring(3, bar);
+  Member* m = findMember(id);
+  if (!m) return 0;
+
+  if (!m->peerAdded) {
+    esp_now_peer_info_t peerInfo = {};
+    memcpy(peerInfo.peer_addr, m->mac, 6);
+    peerInfo.channel = AP_CHANNEL;
+    peerInfo.encrypt = false;
+    if (!esp_now_is_peer_exist(m->mac) && esp_now_add_peer(&peerInfo) != ESP_OK) return 0;
+    m->peerAdded = true;
+  }
+  return sendSigned(m->mac, cmd.substring(bar + 1));
+}
+
+// ----------------------- Pose source -----------------------
+void parseNMEA(const char* sentence) {
+  NmeaFix fix;
+  if (nmeaParse(sentence, &fix) != NMEA_OK) return;
+  if (fix.type == NMEA_GGA) hubFix = fix.quality;
+  if (fix.hasPosition) {
+    hubLat = fix.lat;
+    hubLon = fix.lon;
+    hubFixUs = esp_timer_get_time();
+    hubHasPosition = true;
+  }
+  if (!imuOk && fix.hasCourse) hubHeading = fix.course;
+}
+
+// Frame NMEA sentences from the receiver the same way headband.ino's readGPS() does
+void readGPS() {
+  while (GPSSerial.available()) {
+    char c = GPSSerial.read();
+    if (c == '$') {
+      nmeaIdx = 0;
+      nmeaBuf[nmeaIdx++] = c;
+    } else if (c == '\n' || c == '\r') {
+      if (nmeaIdx > 5) {
+        nmeaBuf[nmeaIdx] = '\0';
+        parseNMEA(nmeaBuf);
+      }
+      nmeaIdx = 0;
+    } else if (nmeaIdx < NMEA_BUF_SIZE - 1) {
+      nmeaBuf[nmeaIdx++] = c;
+    }
+  }
+}
+
+// Step the Mahony filter at IMU_RATE_HZ; heading is its yaw in [0, 360)
+void serviceIMU() {
+  if (!imuOk) return;
+  int64_t now = esp_timer_get_time();
+  if (now < nextImuUs) return;
+  nextImuUs = now + 1000000 / IMU_RATE_HZ;
+
+  sensors_event_t accel, gyro, mag, temp;
+  icm.getEvent(&accel, &gyro, &temp, &mag);
+  imuFilter.update(gyro.gyro.x * RAD_TO_DEG, gyro.gyro.y * RAD_TO_DEG, gyro.gyro.z * RAD_TO_DEG,
+                   accel.acceleration.x, accel.acceleration.y, accel.acceleration.z,
+                   mag.magnetic.x, mag.magnetic.y, mag.magnetic.z);
+  hubHeading = fmodf(imuFilter.getYaw() + 360.0f, 360.0f);
+}
+
+// Send the next pose frame if one is due
+void serviceStream(WiFiClient& client) {
+  if (!hubHasPosition) return;
+  int64_t now = esp_timer_get_time();
+  if (now < nextFrameUs) return;
+  int64_t period = (int64_t)(1000000.0f / streamHz);
+  nextFrameUs = (now - nextFrameUs > period) ? now + period : nextFrameUs + period;
+
+  char frame[112];
+  int len = snprintf(frame, sizeof(frame), "$HBP,%lu,%llu,%.7f,%.7f,%.1f,%u,%llu",
+                     (unsigned long)++poseSeq, (unsigned long long)now, hubLat, hubLon,
+                     hubHeading, hubFix, (unsigned long long)hubFixUs);
+  uint8_t sum = 0;
+  for (int i = 1; i < len; i++) sum ^= (uint8_t)frame[i];
+  snprintf(frame + len, sizeof(frame) - len, "*%02X", sum);
+  client.println(frame);
+}
+
 void setup() {
   Serial.begin(115200);
   Serial.println("ESP32 ESP-NOW Relay Starting...");
 
+  GPSSerial.setRxBufferSize(2048);
+  GPSSerial.begin(GPS_BAUD, SERIAL_8N1, GPS_RX_PIN, GPS_TX_PIN);
+  Wire.begin(IMU_SDA_PIN, IMU_SCL_PIN);
+  imuOk = icm.begin_I2C(IMU_ADDR, &Wire, 0);
+  if (imuOk) {
+    imuFilter.begin(IMU_RATE_HZ);
+  } else {
+    Serial.println("No ICM20948 found: heading follows GPS course");
+  }
+
   // Set Wi-Fi mode to AP+STA for proper ESP-NOW operation with a soft AP.
   WiFi.mode(WIFI_AP_STA);
   WiFi.softAP(WIFI_SSID, WIFI_PASS, AP_CHANNEL);
@@ -48,8 +311,9 @@ void setup() {
   }
   Serial.println("ESP-NOW initialized.");
 
-  // Register the send callback
+  // Register the send and receive callbacks
   esp_now_register_send_cb(OnDataSent);
+  esp_now_register_recv_cb(OnDataRecv);
 
   // Configure the broadcast peer
   esp_now_peer_info_t peerInfo = {};
@@ -66,42 +330,78 @@ void setup() {
 }
 
 void loop() {
-  unsigned long currentMillis = millis();
   WiFiClient client = tcpServer.available();
   
   if (client) {
     Serial.println("Client connected");
 
     while (client.connected()) {
-      // Send GPS and IMU data every 5 seconds
-      if (currentMillis - lastDataSentTime >= DATA_SEND_INTERVAL) {
-        // Format: "GPS:35.303176,-120.664059|IMU:194"
-        String dataToSend = "GPS:" + GPS_DATA + "|IMU:" + IMU_DATA;
-        client.println(dataToSend);
-        Serial.println("Sent to client: " + dataToSend);
-        lastDataSentTime = currentMillis;
-      }
-      
+      readGPS();
+      serviceIMU();
+      serviceStream(client);
+
       if (client.available()) {
         String received = client.readStringUntil('\n');
         received.trim();
         Serial.println("Received from client: " + received);
 
-        // Relay via ESP‑NOW
-        esp_now_send(broadcastAddress,
-          (uint8_t*)received.c_str(),
-          received.length());
+        // Optional "#<id>" request tag from the laptop: stripped here and echoed on the
+        // reply, so the laptop matches replies by id (interface/shards.py REQUEST_TAG)
+        String tag = "";
+        int hash = received.lastIndexOf('#');
+        if (hash >= 0 && hash + 1 < (int)received.length()) {
+          bool digits = true;
+          for (unsigned int i = hash + 1; i < received.length(); i++) digits = digits && isDigit(received[i]);
+          if (digits) {
+            tag = received.substring(hash);
+            received = received.substring(0, hash);
+          }
+        }
 
-        client.println("OK");
+        if (received == "TIME") {
+          // Clock read for the laptop's sync master (not relayed)
+          char reply[32];
+          snprintf(reply, sizeof(reply), "TIME:%llu", (unsigned long long)esp_timer_get_time());
+          client.println(String(reply) + tag);
+        } else if (received.startsWith("RATE:")) {
+          // Telemetry rate from the laptop's relay rate controller (not relayed)
+          float hz = received.substring(5).toFloat();
+          if (hz > 0) {
+            streamHz = constrain(hz, STREAM_MIN_HZ, STREAM_MAX_HZ);
+            client.println("OK" + tag);
+          } else {
+            client.println("ERR:bad rate" + tag);
+          }
+        } else if (received.startsWith("TO:")) {
+          // Selective retransmit to one headband
+          uint32_t seq = sendToMember(received);
+          client.println((seq ? "OK:" + String(seq) : String("ERR:unknown member")) + tag);
+        } else {
+          // Relay via ESP‑NOW (signed, see headband.ino verifyAndExtract)
+          uint32_t seq = sendSigned(broadcastAddress, received);
+          client.println("OK:" + String(seq) + tag);
+        }
       }
-      
-      currentMillis = millis();
-      delay(10);
+
+      // Forward queued headband ACK/HB frames to the laptop
+      while (uplinkTail != uplinkHead) {
+        client.println(uplink[uplinkTail]);
+        uplinkTail = (uplinkTail + 1) % UPLINK_QUEUE;
+      }
+
+      serviceBeacon();
+
+      delay(1);  // The pose stream and the 100 Hz IMU filter run off this loop
     }
 
     client.stop();
     Serial.println("Client disconnected");
   }
-  
-  delay(10);
+
+  // Keep headband clocks in sync and the pose current even with no laptop connected
+  serviceBeacon();
+  readGPS();
+  serviceIMU();
+
+  delay(1);
 }
@@ -0,0 +1,158 @@
+// Single-pass NMEA tokenizer for the headband's GPS UART.
+//
+// nmeaParse() walks a sentence once: it XORs the characters between '$' and
+// '*' into the checksum and records where each comma-separated field starts,
+// without copying or allocating anything. A sentence whose "*hh" does not
+// match is rejected before any field is decoded. GGA and RMC are decoded into
+// an NmeaFix; everything else is reported as NMEA_IGNORED.
+//
+// interface/nmea.py is the reference implementation of the same rules, and
+// other+testing/nmea_diff_test.py compiles this header on the host and checks
+// the two agree on every sentence of the shared corpus.
+#ifndef NMEA_PARSE_H
+#define NMEA_PARSE_H
+
+#include <stdbool.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define NMEA_MAX_FIELDS 24  // GSV has 20; GGA 15, RMC 13
+
+// nmeaParse() results
+#define NMEA_OK            0   // GGA or RMC, decoded into the fix
+#define NMEA_IGNORED       1   // Valid checksum, a sentence type we don't decode
+#define NMEA_ERR_FRAME    -1   // No '$', no "*hh", or junk after the checksum
+#define NMEA_ERR_CHECKSUM -2   // "*hh" does not match the sentence
+
+#define NMEA_GGA 1
+#define NMEA_RMC 2
+
+typedef struct {
+  uint8_t type;          // NMEA_GGA or NMEA_RMC
+  bool hasPosition;      // lat/lon below are valid
+  double lat;            // Decimal degrees, negative south
+  double lon;            // Decimal degrees, negative west
+  bool hasQuality;       // GGA only
+  uint8_t quality;       // 0=none, 1=GPS, 2=DGPS, 4=RTK fixed, 5=RTK float
+  bool hasCourse;        // RMC only, and only while moving
+  double course;         // Course over ground, degrees
+} NmeaFix;
+
+typedef struct {
+  const char* p;
+  uint16_t len;
+} NmeaSpan;
+
+static inline int nmeaHexDigit(char c) {
+  if (c >= '0' && c <= '9') return c - '0';
+  if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+  if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+  return -1;
+}
+
+// Digits with at most one '.', at least one digit before it: "123", "12.5", "12."
+static inline bool nmeaIsDecimal(NmeaSpan f) {
+  int dots = 0;
+  if (f.len == 0 || f.p[0] == '.') return false;
+  for (uint16_t i = 0; i < f.len; i++) {
+    if (f.p[i] == '.') {
+      if (++dots > 1) return false;
+    } else if (f.p[i] < '0' || f.p[i] > '9') {
+      return false;
+    }
+  }
+  return true;
+}
+
+static inline bool nmeaIs(NmeaSpan f, char c) {
+  return f.len == 1 && f.p[0] == c;
+}
+
+// "DDMM.MMMM" / "DDDMM.MMMM" to decimal degrees; false if malformed or out of range
+static inline bool nmeaCoord(NmeaSpan f, NmeaSpan dir, char pos, char neg, int maxDeg, double* out) {
+  if (!nmeaIsDecimal(f)) return false;
+  if (!nmeaIs(dir, pos) && !nmeaIs(dir, neg)) return false;
+  const char* dot = (const char*)memchr(f.p, '.', f.len);
+  if (dot == NULL) return false;
+  int degLen = (int)(dot - f.p) - 2;   // Degrees are everything before the last 2 digits before the dot
+  if (degLen < 1 || degLen > 3) return false;
+
+  int degrees = 0;
+  for (int i = 0; i < degLen; i++) degrees = degrees * 10 + (f.p[i] - '0');
+  // strtod stops at the ',' or '*' that ends the field
+  double minutes = strtod(f.p + degLen, NULL);
+  if (degrees > maxDeg || minutes >= 60.0) return false;
+
+  double decimal = degrees + minutes / 60.0;
+  if (decimal > maxDeg) return false;
+  *out = nmeaIs(dir, neg) ? -decimal : decimal;
+  return true;
+}
+
+// Parse one sentence (NUL-terminated, CR/LF already stripped) into `fix`
+static int nmeaParse(const char* s, NmeaFix* fix) {
+  NmeaSpan field[NMEA_MAX_FIELDS];
+  uint16_t n = 0;
+  uint8_t sum = 0;
+
+  memset(fix, 0, sizeof(*fix));
+  if (s[0] != '$') return NMEA_ERR_FRAME;
+
+  const char* start = s + 1;
+  const char* p = start;
+  for (; *p && *p != '*'; p++) {
+    sum ^= (uint8_t)*p;
+    if (*p == ',') {
+      if (n < NMEA_MAX_FIELDS) { field[n].p = start; field[n].len = (uint16_t)(p - start); }
+      n++;
+      start = p + 1;
+    }
+  }
+  if (*p != '*') return NMEA_ERR_FRAME;
+  if (n < NMEA_MAX_FIELDS) { field[n].p = start; field[n].len = (uint16_t)(p - start); }
+  n++;
+
+  int hi = nmeaHexDigit(p[1]);
+  int lo = hi < 0 ? -1 : nmeaHexDigit(p[2]);
+  if (hi < 0 || lo < 0 || p[3] != '\0') return NMEA_ERR_FRAME;
+  if (((hi << 4) | lo) != sum) return NMEA_ERR_CHECKSUM;
+
+  // Address field: talker (GP, GN, GL, ...) then the sentence type
+  if (n > NMEA_MAX_FIELDS || field[0].len != 5) return NMEA_IGNORED;
+  const char* type = field[0].p + 2;
+
+  if (memcmp(type, "GGA", 3) == 0 && n >= 7) {
+    // $xxGGA,time,lat,N/S,lon,E/W,quality,numSV,HDOP,alt,M,sep,M,age,stn*cs
+    //   0     1    2   3   4   5     6
+    fix->type = NMEA_GGA;
+    fix->hasQuality = true;
+    NmeaSpan q = field[6];
+    if (q.len >= 1 && q.len <= 2 && nmeaIsDecimal(q) && memchr(q.p, '.', q.len) == NULL) {
+      fix->quality = (uint8_t)atoi(q.p);
+    }
+    fix->hasPosition = fix->quality > 0
+                       && nmeaCoord(field[2], field[3], 'N', 'S', 90, &fix->lat)
+                       && nmeaCoord(field[4], field[5], 'E', 'W', 180, &fix->lon);
+    return NMEA_OK;
+  }
+  if (memcmp(type, "RMC", 3) == 0 && n >= 9) {
+    // $xxRMC,time,status,lat,N/S,lon,E/W,speed,course,date,...
+    //   0     1     2     3   4   5   6    7      8
+    fix->type = NMEA_RMC;
+    if (!nmeaIs(field[2], 'A')) return NMEA_OK;   // V = receiver warning, nothing usable
+    fix->hasPosition = nmeaCoord(field[3], field[4], 'N', 'S', 90, &fix->lat)
+                       && nmeaCoord(field[5], field[6], 'E', 'W', 180, &fix->lon);
+    if (nmeaIsDecimal(field[8])) {
+      double course = strtod(field[8].p, NULL);
+      if (course <= 360.0) {
+        fix->hasCourse = true;
+        fix->course = course;
+      }
+    }
+    return NMEA_OK;
+  }
+  return NMEA_IGNORED;
+}
+
+#endif
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Formation quality analytics over recorded sessions.
+
+Works on the columnar archive (archive.py) the app records next to each
+session log; older sessions with only a text log (.hbs) are converted once.
+It uses these rows:
+
+    HUB     hub telemetry               lat, lon, heading, fix
+    POS     a headband's own position   member, lat, lon, heading, fix
+    TARGET  a target relayed to a member (what its firmware compared against)
+    SET     operator "Next Set" mark    member = set number, heading = column spacing (ft)
+
+The analysis memory-maps the archive and walks it in time order, in batches of
+about a million rows, with NumPy, carrying only a little state (last hub pose, current set, per-member
+correction state) from one chunk to the next, so archives far larger than RAM
+stream through. Each member's reported position is compared with its slot in
+the formation (formation.column_targets, the vectorized
+calculate_column_positions) using headband.ino's tiers (block_eval.classify):
+
+    alignment error     distance to slot (ft), mean and p95, per member and per set
+    time to correct     how long a member stays off target before getting back on
+    buzzes              what the firmware did with each relayed target:
+                        confirmation (on target), soft or hard rotation
+
+Several sessions are compared side by side, oldest rehearsal first.
+
+Usage:
+    python analytics.py SESSION.hbs [...] [--members] [--sets] [--spacing 3.0]
+"""
+import os
+import time
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+from archive import ARCHIVE_SUFFIX, DEFAULT_SPACING, HUB, POS, SET, TARGET, Archive, Chunk, convert, member_name
+from block_eval import HARD, ON_TARGET, SOFT, classify
+from formation import column_targets
+
+CHUNK_RECORDS = 1 << 20
+
+# Alignment error histogram (streaming percentiles)
+ERROR_BIN_FT = 0.05
+ERROR_BINS = 2000           # up to 100 ft; beyond lands in the last bin
+
+
+def ingest(session_path: str, force: bool = False) -> str:
+    """The archive for a session: the one recorded live next to it, or a fresh conversion."""
+    path = os.path.splitext(session_path)[0] + ARCHIVE_SUFFIX
+    if force or not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(session_path):
+        convert(session_path, path)
+    return path
+
+
+# ----------------------- Analysis -----------------------
+def _last_index(mask: np.ndarray) -> np.ndarray:
+    """Index of the last i <= j with mask[i], for every j (-1 if none)."""
+    idx = np.where(mask, np.arange(len(mask)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    return idx
+
+
+def _take(values: np.ndarray, at: np.ndarray, carry) -> np.ndarray:
+    """values[at] as float64, with `carry` where at is -1."""
+    out = values[np.maximum(at, 0)].astype(np.float64)
+    out[at < 0] = carry
+    return out
+
+
+def _ffill_groups(mask: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """
+    Index of the last i <= j with mask[i] in the same group as j (-1 if none);
+    groups are contiguous runs starting where `first` is True.
+    """
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), -1)
+    np.maximum.accumulate(idx, out=idx)
+    start = np.where(first, np.arange(n), 0)
+    np.maximum.accumulate(start, out=start)
+    idx[idx < start] = -1
+    return idx
+
+
+def _percentile(hist: np.ndarray, q: float) -> float:
+    total = hist.sum()
+    if not total:
+        return float("nan")
+    return (int(np.searchsorted(np.cumsum(hist), q * total)) + 1) * ERROR_BIN_FT
+
+
+class Group:
+    """Accumulated stats for one member or one set."""
+
+    __slots__ = ("samples", "on_target", "error_sum", "hist", "corrections", "correct_time", "buzzes")
+
+    def __init__(self):
+        self.samples = 0
+        self.on_target = 0
+        self.error_sum = 0.0
+        self.hist = np.zeros(ERROR_BINS, dtype=np.int64)
+        self.corrections = 0        # off-target episodes that ended on target
+        self.correct_time = 0.0
+        self.buzzes = {ON_TARGET: 0, SOFT: 0, HARD: 0}
+
+    def summary(self) -> dict:
+        n = self.samples
+        return {
+            "samples": n,
+            "mean_ft": self.error_sum / n if n else float("nan"),
+            "p95_ft": _percentile(self.hist, 0.95),
+            "on_target": self.on_target / n if n else float("nan"),
+            "corrections": self.corrections,
+            "time_to_correct": self.correct_time / self.corrections if self.corrections else float("nan"),
+            "buzz_confirm": self.buzzes[ON_TARGET],
+            "buzz_soft": self.buzzes[SOFT],
+            "buzz_hard": self.buzzes[HARD],
+        }
+
+
+class SessionAnalysis:
+    """Streams one record file through the alignment/correction/buzz analysis."""
+
+    def __init__(self, spacing: float = DEFAULT_SPACING):
+        self.spacing = spacing
+        self.members: Dict[int, Group] = {}
+        self.sets: Dict[int, Group] = {}
+        self.duration = 0.0
+        self.records = 0
+        self.start_time = None
+        # Carried across chunks
+        self._hub = (np.nan, np.nan, np.nan)
+        self._set = 0
+        self._last_pos: Dict[int, tuple] = {}   # member -> (lat, lon, heading)
+        self._off_since: Dict[int, float] = {}  # member -> time it went off target
+
+    def _group(self, table: Dict[int, Group], key: int) -> Group:
+        group = table.get(key)
+        if group is None:
+            group = table[key] = Group()
+        return group
+
+    def run(self, archive: Archive, chunk: int = CHUNK_RECORDS):
+        for rows in archive.scan(chunk):
+            self.feed(rows)
+        return self
+
+    def feed(self, rec: Chunk):
+        """Process one time-ordered chunk of records."""
+        if not len(rec):
+            return
+        self.records += len(rec)
+        self.duration = max(self.duration, float(rec["t"][-1]))
+        kind = rec["kind"]
+        t = rec["t"]
+
+        # Latest hub sample and set mark at every record
+        hub_at = _last_index(kind == HUB)
+        set_at = _last_index(kind == SET)
+
+        # Member samples and relayed targets, grouped by member (time order kept within each)
+        valid_pos = (kind == POS) & (rec["fix"] > 0)
+        if np.isnan(self._hub[0]):
+            valid_pos &= hub_at >= 0
+        idx = np.flatnonzero(valid_pos | (kind == TARGET))
+        member = rec["member"][idx]
+        order = np.argsort(member, kind="stable")  # radix sort on uint16
+        idx, member = idx[order], member[order].astype(np.int64)
+        ids, starts, slot = np.unique(member, return_index=True, return_inverse=True)
+        is_pos = kind[idx] == POS
+        first = np.zeros(len(idx), dtype=bool)
+        first[starts] = True
+
+        set_no = _take(rec["member"], set_at[idx], self._set).astype(np.int64)
+        spacing = _take(rec["heading"], set_at[idx], self.spacing)
+
+        # Every sample against its formation slot
+        p = np.flatnonzero(is_pos)
+        pr = idx[p]
+        hub = hub_at[pr]
+        slot_heading = np.round(_take(rec["heading"], hub, self._hub[2])) % 360
+        slot_lat, slot_lon = column_targets(_take(rec["lat"], hub, self._hub[0]), _take(rec["lon"], hub, self._hub[1]),
+                                           slot_heading, np.clip(member[p] & 0xFF, 1, 5), spacing[p])
+        errors, _, tiers = classify(rec["lat"][pr], rec["lon"][pr], rec["heading"][pr],
+                                    slot_lat, slot_lon, slot_heading)
+        self._add_samples(self.members, ids, slot[p], errors, tiers)
+        sets, set_slot = np.unique(set_no[p], return_inverse=True)
+        self._add_samples(self.sets, sets, set_slot, errors, tiers)
+
+        self._corrections(p, first, t[pr], tiers, set_no[p], member)
+        latest = _ffill_groups(is_pos, first)
+        self._buzzes(rec, idx, member, ids, slot, is_pos, latest, set_no)
+
+        # Latest position of each member, for targets in the next chunk
+        ends = np.append(starts[1:], len(idx)) - 1
+        for m, j in zip(ids.tolist(), latest[ends].tolist()):
+            if j >= 0:
+                r = idx[j]
+                self._last_pos[m] = (rec["lat"][r], rec["lon"][r], float(rec["heading"][r]))
+
+        # Carry the hub pose and set into the next chunk
+        if hub_at[-1] >= 0:
+            h = hub_at[-1]
+            self._hub = (rec["lat"][h], rec["lon"][h], float(rec["heading"][h]))
+        if set_at[-1] >= 0:
+            s = set_at[-1]
+            self._set, self.spacing = int(rec["member"][s]), float(rec["heading"][s])
+
+    def _add_samples(self, table: Dict[int, Group], keys: np.ndarray, slot: np.ndarray,
+                     errors: np.ndarray, tiers: np.ndarray):
+        """Accumulate samples into table[keys[slot[i]]] for every sample i."""
+        k = len(keys)
+        counts = np.bincount(slot, minlength=k)
+        on_target = np.bincount(slot, weights=tiers == ON_TARGET, minlength=k)
+        error_sum = np.bincount(slot, weights=errors, minlength=k)
+        bins = np.minimum((errors / ERROR_BIN_FT).astype(np.int64), ERROR_BINS - 1)
+        hist = np.bincount(slot * ERROR_BINS + bins, minlength=k * ERROR_BINS).reshape(k, ERROR_BINS)
+        for i, key in enumerate(keys.tolist()):
+            if counts[i]:
+                group = self._group(table, key)
+                group.samples += int(counts[i])
+                group.on_target += int(on_target[i])
+                group.error_sum += float(error_sum[i])
+                group.hist += hist[i]
+
+    def _corrections(self, p, first, t, tiers, set_no, member):
+        """Off-target -> on-target transitions, per member, carried across chunks."""
+        on = tiers == ON_TARGET
+        m = member[p]
+        group_first = first[p] | np.append(True, m[1:] != m[:-1])
+        # Before each member's first sample in this chunk: on target unless carried off
+        carried_on = np.array([mm not in self._off_since for mm in m[group_first].tolist()], dtype=bool)
+        prev = np.empty_like(on)
+        prev[1:] = on[:-1]
+        prev[group_first] = carried_on
+        change = np.flatnonzero(on != prev)
+        if not len(change):
+            return
+
+        # Transitions alternate within a member: each "back on" closes the "off" before it
+        cm = m[change]
+        back_on = on[change]
+        prev_same = np.append(False, cm[1:] == cm[:-1])
+        off_time = np.empty(len(change))
+        off_time[1:] = t[change[:-1]]
+        for i in np.flatnonzero(back_on & ~prev_same).tolist():
+            off_time[i] = self._off_since.get(int(cm[i]), np.nan)
+        done = np.flatnonzero(back_on & ~np.isnan(off_time))
+        took = t[change[done]] - off_time[done]
+        for table, keys in ((self.members, cm[done]), (self.sets, set_no[change[done]])):
+            uniq, slot = np.unique(keys, return_inverse=True)
+            counts = np.bincount(slot, minlength=len(uniq))
+            total = np.bincount(slot, weights=took, minlength=len(uniq))
+            for key, n, dt in zip(uniq.tolist(), counts.tolist(), total.tolist()):
+                group = self._group(table, key)
+                group.corrections += n
+                group.correct_time += dt
+
+        # Carry each member's open episode into the next chunk
+        last = np.append(cm[1:] != cm[:-1], True)
+        for mm, is_on, i in zip(cm[last].tolist(), back_on[last].tolist(), change[last].tolist()):
+            if is_on:
+                self._off_since.pop(mm, None)
+            else:
+                self._off_since[mm] = float(t[i])
+
+    def _buzzes(self, rec, idx, member, ids, slot, is_pos, src, set_no):
+        """Classify each relayed target the way its member's firmware did, from the latest position."""
+        tgt = np.flatnonzero(~is_pos)
+        if not len(tgt):
+            return
+        known = src[tgt] >= 0
+        r = idx[np.where(known, src[tgt], 0)]
+        lat = np.where(known, rec["lat"][r], np.nan)
+        lon = np.where(known, rec["lon"][r], np.nan)
+        heading = np.where(known, rec["heading"][r], np.nan)
+        for i in np.flatnonzero(~known).tolist():  # before the member's first sample in this chunk
+            carry = self._last_pos.get(int(member[tgt[i]]))
+            if carry is not None:
+                lat[i], lon[i], heading[i] = carry
+
+        tr = idx[tgt]
+        _, _, tiers = classify(lat, lon, heading, rec["lat"][tr], rec["lon"][tr], rec["heading"][tr],
+                               ~np.isnan(lat))
+        sets, set_slot = np.unique(set_no[tgt], return_inverse=True)
+        for tier in (ON_TARGET, SOFT, HARD):
+            hit = tiers == tier
+            for keys, keyslot, table in ((ids, slot[tgt], self.members), (sets, set_slot, self.sets)):
+                counts = np.bincount(keyslot[hit], minlength=len(keys))
+                for key, n in zip(keys.tolist(), counts.tolist()):
+                    if n:
+                        self._group(table, key).buzzes[tier] += n
+
+    def totals(self) -> dict:
+        """Whole-session summary (all members pooled)."""
+        pooled = Group()
+        for g in self.members.values():
+            pooled.samples += g.samples
+            pooled.on_target += g.on_target
+            pooled.error_sum += g.error_sum
+            pooled.hist += g.hist
+            pooled.corrections += g.corrections
+            pooled.correct_time += g.correct_time
+            for tier, n in g.buzzes.items():
+                pooled.buzzes[tier] += n
+        return pooled.summary()
+
+
+def analyze(session_path: str, spacing: float = DEFAULT_SPACING, chunk: int = CHUNK_RECORDS) -> SessionAnalysis:
+    """Analyze one archive, or a session log (archived first if needed)."""
+    path = session_path if session_path.endswith(ARCHIVE_SUFFIX) else ingest(session_path)
+    archive = Archive(path)
+    analysis = SessionAnalysis(spacing).run(archive, chunk)
+    analysis.start_time = archive.start_time
+    return analysis
+
+
+# ----------------------- Reports -----------------------
+COLUMNS = ("samples", "mean_ft", "p95_ft", "on_target", "time_to_correct", "buzz_confirm", "buzz_soft", "buzz_hard")
+HEADER = f"{'samples':>9} {'mean ft':>8} {'p95 ft':>7} {'on tgt':>7} {'fix s':>6} {'confirm':>8} {'soft':>6} {'hard':>6}"
+
+
+def format_row(s: dict) -> str:
+    return (f"{s['samples']:>9} {s['mean_ft']:>8.2f} {s['p95_ft']:>7.2f} {s['on_target'] * 100:>6.1f}% "
+            f"{s['time_to_correct']:>6.2f} {s['buzz_confirm']:>8} {s['buzz_soft']:>6} {s['buzz_hard']:>6}")
+
+
+def report(paths: List[str], spacing: float, show_members: bool, show_sets: bool) -> Iterator[str]:
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        analysis = analyze(path, spacing)
+        results.append((analysis.start_time, path, analysis, time.perf_counter() - start))
+    results.sort(key=lambda r: r[0])
+
+    yield f"{'rehearsal':<32} {HEADER}"
+    previous = None
+    for started, path, analysis, _ in results:
+        totals = analysis.totals()
+        label = time.strftime("%Y-%m-%d %H:%M", time.localtime(started))
+        trend = ""
+        if previous is not None and previous["samples"] and totals["samples"]:
+            trend = f"  ({totals['mean_ft'] - previous['mean_ft']:+.2f} ft vs previous)"
+        yield f"{label + ' ' + os.path.basename(path)[:15]:<32} {format_row(totals)}{trend}"
+        previous = totals
+
+    for _, path, analysis, elapsed in results:
+        if not (show_members or show_sets):
+            break
+        yield ""
+        yield (f"{os.path.basename(path)}: {analysis.records} records, {analysis.duration:.0f} s, "
+               f"analyzed in {elapsed:.2f} s")
+        if show_sets:
+            yield f"  {'set':<8} {HEADER}"
+            for s, group in sorted(analysis.sets.items()):
+                yield f"  {s:<8} {format_row(group.summary())}"
+        if show_members:
+            yield f"  {'member':<8} {HEADER}"
+            for m, group in sorted(analysis.members.items()):
+                yield f"  {member_name(m):<8} {format_row(group.summary())}"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Formation quality analytics over recorded sessions")
+    parser.add_argument("sessions", nargs="+", help="Session logs (.hbs) or archives (.hba)")
+    parser.add_argument("--spacing", type=float, default=DEFAULT_SPACING,
+                        help="Column spacing (ft) until the session's first set mark")
+    parser.add_argument("--members", action="store_true", help="Per-member breakdown")
+    parser.add_argument("--sets", action="store_true", help="Per-set breakdown")
+    args = parser.parse_args()
+
+    for line in report(args.sessions, args.spacing, args.members, args.sets):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Local API of the haptiband daemon (haptiband.py).
+
+JSON lines over a Unix socket or localhost TCP. Every request carries an id
+and gets exactly one response with the same id:
+
+    {"id": 1, "op": "cue", "name": "forward", "rows": [1, 2], "policy": "enqueue"}
+    {"id": 1, "ok": true, "result": true}
+    {"id": 2, "ok": false, "error": "Not connected"}
+
+Clients may pipeline: write any number of requests without waiting for
+replies. Requests on one connection run in order, and their responses come
+back in order; separate connections run concurrently. After "subscribe" a
+connection also receives controller events:
+
+    {"event": "pose", "data": {"lat": ..., "lon": ..., ...}}
+
+Events are queued per connection and dropped (and counted) when a client falls
+behind, so a slow or stalled frontend never holds up the controller.
+
+ApiClient is the pipelined client; RemoteController wraps it in the same
+methods and events as controller.Controller, so a frontend can drive either.
+"""
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+
+from constants import CONNECTION, EVENTS, HOST_DEFAULT, LOG, PORT_DEFAULT, SELECTION, SETTINGS
+from metrics import REGISTRY
+from sequencer import REJECTED
+
+if TYPE_CHECKING:
+    from controller import Controller  # Only the daemon side holds one; clients stay NumPy-free
+
+API_HOST = "127.0.0.1"
+API_PORT = 9110
+API_SOCKET = os.path.join(tempfile.gettempdir(), "haptiband.sock")
+
+MAX_QUEUED_EVENTS = 1000   # Per connection; further events are dropped until it catches up
+REQUEST_TIMEOUT = 5.0
+
+
+class ApiError(Exception):
+    """Error response from the daemon."""
+
+
+def default_address() -> str:
+    return API_SOCKET if hasattr(socket, "AF_UNIX") else f"{API_HOST}:{API_PORT}"
+
+
+def parse_address(address: str):
+    """"host:port" -> TCP, anything else -> Unix socket path. Returns (family, sockaddr)."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or API_HOST, int(port))
+    return socket.AF_UNIX, address
+
+
+def _encode(obj) -> bytes:
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+# ----------------------- Server -----------------------
+def _op_connect(ctl: "Controller", req):
+    ctl.connect(req.get("host", HOST_DEFAULT), int(req.get("port", PORT_DEFAULT)))
+
+
+def _op_send(ctl: "Controller", req):
+    return ctl.send_command(req["msg"], timeout=float(req.get("timeout", 0.5)))
+
+
+def _queued(run) -> bool:
+    """Whether a sequence or cue made it onto the run queue."""
+    return run is not None and run.outcome != REJECTED
+
+
+OPS: Dict[str, Callable[["Controller", dict], object]] = {
+    "ping": lambda ctl, req: "pong",
+    "status": lambda ctl, req: ctl.status(),
+    "connect": _op_connect,
+    "disconnect": lambda ctl, req: ctl.disconnect(),
+    "select": lambda ctl, req: ctl.select_rows(req["rows"]),
+    "auto_relay": lambda ctl, req: ctl.set_auto_relay(req["on"]),
+    "spacing": lambda ctl, req: ctl.set_spacing(req["feet"]),
+    "gps_send": lambda ctl, req: ctl.send_gps_update(),
+    "mark_set": lambda ctl, req: ctl.mark_set(),
+    "send": _op_send,
+    "sequence": lambda ctl, req: _queued(ctl.run_sequence(req["steps"], req.get("policy"))),
+    "cue": lambda ctl, req: _queued(ctl.run_cue(req["name"], req.get("rows"), req.get("policy"))),
+    "estop": lambda ctl, req: ctl.emergency_stop(),
+    "members": lambda ctl, req: ctl.member_health(),
+    "metrics": lambda ctl, req: ctl.metrics_snapshot(),
+    "replay": lambda ctl, req: ctl.replay_session(req["path"], float(req.get("speed", 1.0))),
+}
+
+
+class ApiSession:
+    """One client connection: requests run in order on the reader thread, a writer drains replies/events."""
+
+    def __init__(self, server: "ApiServer", sock: socket.socket, peer: str):
+        self.server = server
+        self.sock = sock
+        self.peer = peer
+        self.events = set()
+        self.queued_events = 0
+        self._queued_lock = threading.Lock()   # queued_events is changed by several threads
+        self._out = queue.Queue()
+        self._closed = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._reader, daemon=True).start()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def close(self):
+        if not self._closed.is_set():
+            self._closed.set()
+            self._out.put(None)
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def push_event(self, event: str, data: dict):
+        """Called from controller threads: never blocks."""
+        if event not in self.events or self._closed.is_set():
+            return
+        with self._queued_lock:
+            full = self.queued_events >= MAX_QUEUED_EVENTS
+            if not full:
+                self.queued_events += 1
+        if full:
+            self.server.m_events_dropped.inc()
+            return
+        self._out.put((True, _encode({"event": event, "data": data})))
+
+    def _reader(self):
+        buf = self.sock.makefile("rb")
+        try:
+            for raw in buf:
+                line = raw.strip()
+                if line:
+                    self._out.put((False, _encode(self.handle(line))))
+        except OSError:
+            pass
+        finally:
+            self.server.drop(self)
+            self.close()
+
+    def _writer(self):
+        try:
+            while True:
+                item = self._out.get()
+                if item is None:
+                    break
+                is_event, data = item
+                if is_event:
+                    with self._queued_lock:
+                        self.queued_events -= 1
+                self.sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def handle(self, line: bytes) -> dict:
+        start = time.perf_counter()
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"Bad request: {e}"}
+        rid = req.get("id")
+        op = req.get("op")
+        self.server.m_requests.inc()
+        try:
+            if op == "subscribe":
+                wanted = req.get("events") or EVENTS
+                self.events.update(e for e in wanted if e in EVENTS)
+                result = sorted(self.events)
+            elif op == "unsubscribe":
+                self.events.difference_update(req.get("events") or EVENTS)
+                result = sorted(self.events)
+            elif op in OPS:
+                result = OPS[op](self.server.controller, req)
+            else:
+                raise ValueError(f"Unknown op '{op}'")
+            reply = {"id": rid, "ok": True, "result": result}
+        except KeyError as e:
+            reply = {"id": rid, "ok": False, "error": f"Missing argument {e}"}
+        except Exception as e:
+            reply = {"id": rid, "ok": False, "error": str(e) or type(e).__name__}
+        self.server.m_request_time.record(time.perf_counter() - start)
+        return reply
+
+
+class ApiServer:
+    """Accepts API clients on one or more addresses and fans controller events out to them."""
+
+    def __init__(self, controller: "Controller", addresses: Iterable[str], registry=REGISTRY):
+        self.controller = controller
+        self.addresses = list(addresses)
+        self.sessions: List[ApiSession] = []
+        self._lock = threading.Lock()
+        self._listeners: List[socket.socket] = []
+        self.m_requests = registry.counter("api_requests_total", "API requests handled")
+        self.m_request_time = registry.histogram("api_request_seconds", "Time to handle one API request")
+        self.m_events_dropped = registry.counter("api_events_dropped_total",
+                                                 "Events not delivered because a client fell behind")
+        registry.gauge("api_clients", "Connected API clients", fn=lambda: len(self.sessions))
+        controller.subscribe(self._on_event)
+
+    def start(self) -> "ApiServer":
+        for address in self.addresses:
+            family, sockaddr = parse_address(address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            if family == socket.AF_UNIX:
+                if os.path.exists(sockaddr):
+                    os.unlink(sockaddr)  # Stale socket from a previous run
+            else:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(sockaddr)
+            sock.listen(16)
+            self._listeners.append(sock)
+            threading.Thread(target=self._accept, args=(sock, address), daemon=True).start()
+        return self
+
+    def stop(self):
+        for sock in self._listeners:
+            sock.close()
+        for address in self.addresses:
+            family, sockaddr = parse_address(address)
+            if family == socket.AF_UNIX and os.path.exists(sockaddr):
+                os.unlink(sockaddr)
+        with self._lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.close()
+
+    def drop(self, session: ApiSession):
+        with self._lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def _accept(self, listener: socket.socket, address: str):
+        while True:
+            try:
+                sock, peer = listener.accept()
+            except OSError:
+                return
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = ApiSession(self, sock, str(peer or address))
+            with self._lock:
+                self.sessions.append(session)
+            session.start()
+
+    def _on_event(self, event: str, data: dict):
+        for session in list(self.sessions):
+            session.push_event(event, data)
+
+
+# ----------------------- Client -----------------------
+class ApiClient:
+    """Pipelined client: call() writes at once and returns a Future."""
+
+    def __init__(self, address: Optional[str] = None, on_event: Optional[Callable[[str, dict], None]] = None,
+                 on_close: Optional[Callable[[], None]] = None, timeout: float = 3.0):
+        self.address = address or default_address()
+        self.on_event = on_event
+        self.on_close = on_close
+        family, sockaddr = parse_address(self.address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(sockaddr)
+        self.sock.settimeout(None)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._ids = 0
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self.closed = False
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def call(self, op: str, **args) -> Future:
+        future = Future()
+        with self._lock:
+            if self.closed:
+                future.set_exception(ConnectionError("API connection closed"))
+                return future
+            self._ids += 1
+            rid = self._ids
+            self._pending[rid] = future
+            try:
+                self.sock.sendall(_encode({"id": rid, "op": op, **args}))
+            except OSError as e:
+                del self._pending[rid]
+                future.set_exception(ConnectionError(str(e)))
+        return future
+
+    def request(self, op: str, timeout: float = REQUEST_TIMEOUT, **args):
+        """call() and wait for the result; raises ApiError on an error response."""
+        return self.call(op, **args).result(timeout)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _reader(self):
+        try:
+            for raw in self.sock.makefile("rb"):
+                msg = json.loads(raw)
+                if "event" in msg:
+                    if self.on_event:
+                        self.on_event(msg["event"], msg.get("data") or {})
+                    continue
+                with self._lock:
+                    future = self._pending.pop(msg.get("id"), None)
+                if future is None:
+                    continue
+                if msg.get("ok"):
+                    future.set_result(msg.get("result"))
+                else:
+                    future.set_exception(ApiError(msg.get("error")))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self.closed = True
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError("API connection closed"))
+            if self.on_close:
+                self.on_close()
+
+
+class RemoteController:
+    """
+    Controller look-alike backed by a running daemon. Commands are sent
+    without waiting for their replies; failures come back as log events.
+    """
+
+    def __init__(self, address: Optional[str] = None):
+        self._listeners = []
+        self._metrics = []
+        self.client = ApiClient(address, on_event=self._dispatch, on_close=self._on_close)
+        self.address = self.client.address
+
+    # ----------------------- Events -----------------------
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _dispatch(self, event: str, data: dict):
+        for listener in list(self._listeners):
+            listener(event, data)
+
+    def _on_close(self):
+        self._dispatch(LOG, {"text": f"Lost connection to haptiband daemon at {self.address}"})
+        self._dispatch(CONNECTION, {"state": "disconnected", "hubs": 0, "error": "daemon gone"})
+
+    def start(self) -> "RemoteController":
+        """Subscribe to events and replay the daemon's current state as events."""
+        self.client.request("subscribe", events=list(EVENTS))
+        status = self.client.request("status")
+        self._dispatch(SELECTION, {"rows": status["selected_rows"]})
+        self._dispatch(SETTINGS, {"auto_relay": status["auto_relay"], "spacing": status["spacing"]})
+        if status["connected"]:
+            self._dispatch(CONNECTION, {"state": "connected", "hubs": status["hubs"], "error": None,
+                                        "uptime": status["uptime"]})
+        return self
+
+    def close(self):
+        self.client.close()
+
+    def _fire(self, op: str, **args):
+        future = self.client.call(op, **args)
+
+        def done(f):
+            e = f.exception()
+            if e is not None:
+                self._dispatch(LOG, {"text": f"{op} failed: {e}"})
+
+        future.add_done_callback(done)
+        return future
+
+    # ----------------------- Controller methods -----------------------
+    def connect(self, host: str = HOST_DEFAULT, port: int = PORT_DEFAULT):
+        self._fire("connect", host=host, port=port)
+
+    def disconnect(self):
+        self._fire("disconnect")
+
+    def select_rows(self, rows):
+        self._fire("select", rows=sorted(rows))
+
+    def set_auto_relay(self, on: bool):
+        self._fire("auto_relay", on=bool(on))
+
+    def set_spacing(self, feet: float):
+        self._fire("spacing", feet=float(feet))
+
+    def send_gps_update(self):
+        self._fire("gps_send")
+
+    def mark_set(self):
+        self._fire("mark_set")
+
+    def run_sequence(self, sequence, policy: Optional[str] = None, label: str = ""):
+        self._fire("sequence", steps=[list(step) for step in sequence], policy=policy)
+
+    def run_cue(self, name: str, rows=None, policy: Optional[str] = None):
+        self._fire("cue", name=name, rows=None if rows is None else sorted(rows), policy=policy)
+
+    def emergency_stop(self):
+        self._fire("estop")
+
+    def replay_session(self, path: str, speed: float = 1.0):
+        self._fire("replay", path=os.path.abspath(path), speed=speed)
+
+    def status(self) -> dict:
+        return self.client.request("status")
+
+    def metrics_snapshot(self):
+        """Last snapshot received; asks for a fresh one for next time."""
+        future = self.client.call("metrics")
+        future.add_done_callback(lambda f: f.exception() or setattr(self, "_metrics", f.result()))
+        return self._metrics
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Columnar telemetry archive.
+
+Hub telemetry, headband position reports, relayed targets and set marks are
+kept as rows of (t, lat, lon, heading, member, kind, fix), stored column by
+column in chunks of at most CHUNK_ROWS rows. Within a chunk rows are sorted by
+member, then time.
+
+File layout (all little-endian):
+    <name>.hba      header: MAGIC (8 bytes), start wall-clock time (float64),
+                    max rows per chunk (uint32), padding to 24 bytes
+                    chunks: each column back to back, every column 8-byte aligned
+    <name>.hba.idx  one INDEX_DTYPE entry per chunk: offset, rows, and
+                    min/max of time, member, lat and lon, plus a 64-bit member mask
+
+Chunks are written whole and only then indexed, so a crash loses at most the
+rows still buffered in the writer. Readers memory-map the file and hand out
+column views without copying. Time-range and member queries check the index
+first and open only the chunks that can match; inside a chunk a member's rows
+are found with a binary search.
+"""
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from pose_filter import is_telemetry, parse_telemetry
+from session_log import MARK, RX, TX, SessionReader
+
+MAGIC = b"HBARCH2\n"
+MAGIC_V1 = b"HBARCH1\n"    # Member masks hashed by column only: readable, but masks are not used
+HEADER = struct.Struct("<8sdI4x")
+
+COLUMNS = (
+    ("t", np.dtype("<f8")),         # seconds since the archive started
+    ("lat", np.dtype("<f8")),
+    ("lon", np.dtype("<f8")),
+    ("heading", np.dtype("<f4")),
+    ("member", np.dtype("<u2")),    # row << 8 | col (0 for the hub)
+    ("kind", np.dtype("u1")),
+    ("fix", np.dtype("u1")),
+)
+
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"), ("rows", "<u4"), ("member_min", "<u2"), ("member_max", "<u2"),
+    ("t_min", "<f8"), ("t_max", "<f8"),
+    ("lat_min", "<f8"), ("lat_max", "<f8"), ("lon_min", "<f8"), ("lon_max", "<f8"),
+    ("member_mask", "<u8"),         # bit _mask_bit(member) set for every member in the chunk
+])
+
+# Row kinds
+HUB = 0         # Hub telemetry
+POS = 1         # A headband's own position report
+TARGET = 2      # Target relayed to a member
+SET = 3         # Operator set mark: member = set number, heading = column spacing (ft)
+
+ARCHIVE_SUFFIX = ".hba"
+CHUNK_ROWS = 1 << 16
+FLUSH_INTERVAL = 10.0       # Seal a (short) chunk at least this often while recording
+DEFAULT_SPACING = 3.0
+
+
+def member_id(row: int, col: int) -> int:
+    return row << 8 | col
+
+
+def member_name(member: int) -> str:
+    return f"{member >> 8};{member & 0xFF}"
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _layout(rows: int):
+    """(name, dtype, offset) of every column in a chunk of `rows` rows, and the chunk size."""
+    layout = []
+    offset = 0
+    for name, dtype in COLUMNS:
+        layout.append((name, dtype, offset))
+        offset += _align(rows * dtype.itemsize)
+    return layout, offset
+
+
+def _mask_bit(member: np.ndarray) -> np.ndarray:
+    """Mask bit of each member id. Row and col are both hashed: col alone is member % 64."""
+    member = member.astype(np.uint64)
+    return ((member >> np.uint64(8)) * np.uint64(31) + (member & np.uint64(0xFF))) % np.uint64(64)
+
+
+def _mask(member: np.ndarray) -> int:
+    bits = np.unique(_mask_bit(member))
+    return int(np.bitwise_or.reduce(np.left_shift(np.uint64(1), bits))) if len(bits) else 0
+
+
+def parse_record(kind: int, text: str) -> Optional[tuple]:
+    """
+    One session-log line as (lat, lon, heading, member, kind, fix), or None if
+    it is not archived. `kind` is the session_log record kind.
+    """
+    if kind == RX:
+        if text.startswith("POS:"):
+            member, _, rest = text[4:].partition(":")
+            row, col = (int(x) for x in member.split(";"))
+            fields = rest.split("|")
+            lat, lon = (float(x) for x in fields[0].split(","))
+            fix = int(fields[2]) if len(fields) > 2 else 0
+            return lat, lon, float(fields[1]), member_id(row, col), POS, fix
+        if is_telemetry(text):
+            s = parse_telemetry(text)
+            return s.lat, s.lon, s.heading, 0, HUB, s.fix or 0
+    elif kind == TX:
+        if text.startswith("TO:"):
+            text = text.partition("|")[2]       # retransmit to one member: same target again
+        head, sep, body = text.partition(":")
+        if not sep or "," not in body or "|" not in body:
+            return None                         # pin command, TIME, RATE, ...
+        row, col = (int(x) for x in head.split(";"))
+        position, _, heading = body.partition("@")[0].partition("|")
+        lat, lon = (float(x) for x in position.split(","))
+        return lat, lon, float(heading), member_id(row, col), TARGET, 0
+    elif kind == MARK and text.startswith("SET:"):
+        fields = dict(part.partition(":")[::2] for part in text.split("|"))
+        spacing = float(fields.get("SPACING", DEFAULT_SPACING))
+        return 0.0, 0.0, spacing, int(fields["SET"]), SET, 0
+    return None
+
+
+class Chunk:
+    """A set of rows as named column arrays (views into the archive where possible)."""
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["t"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def take(self, index) -> "Chunk":
+        return Chunk({name: values[index] for name, values in self.columns.items()})
+
+    @staticmethod
+    def concat(chunks: List["Chunk"]) -> "Chunk":
+        if len(chunks) == 1:
+            return chunks[0]
+        return Chunk({name: np.concatenate([c[name] for c in chunks]) for name, _ in COLUMNS})
+
+
+# ----------------------- Writing -----------------------
+class ArchiveWriter:
+    """Append-only writer. append()/record() are thread-safe; rows are sealed into chunks."""
+
+    def __init__(self, path: str, start_time: Optional[float] = None, chunk_rows: int = CHUNK_ROWS,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._file.write(HEADER.pack(MAGIC, time.time() if start_time is None else start_time, chunk_rows))
+        self._offset = HEADER.size
+        self._t0 = time.monotonic()
+        self._rows: List[tuple] = []
+        self._last_seal = self._t0
+        self.rows = 0
+        self.chunks = 0
+
+    def append(self, t: float, lat: float, lon: float, heading: float, member: int, kind: int, fix: int = 0):
+        """One row; `t` in seconds since the archive started."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._rows.append((t, lat, lon, heading, member, kind, fix))
+            if len(self._rows) >= self.chunk_rows or time.monotonic() - self._last_seal >= self.flush_interval:
+                self._seal_rows()
+
+    def record(self, kind: int, text: str, t: Optional[float] = None) -> bool:
+        """Archive a session-log line if it carries a position; `t` is a time.monotonic() value."""
+        try:
+            row = parse_record(kind, text)
+        except (ValueError, KeyError, IndexError):
+            return False
+        if row is None:
+            return False
+        now = time.monotonic() if t is None else t
+        self.append(now - self._t0, *row)
+        return True
+
+    def append_columns(self, **columns: np.ndarray):
+        """Bulk append (offline conversion); rows must continue the archive's time order."""
+        n = len(columns["t"])
+        full = {name: np.broadcast_to(np.asarray(columns.get(name, 0), dtype=dtype), (n,)) for name, dtype in COLUMNS}
+        with self._lock:
+            self._seal_rows()
+            for start in range(0, n, self.chunk_rows):
+                self._write_chunk({name: values[start:start + self.chunk_rows] for name, values in full.items()})
+
+    def _seal_rows(self):
+        self._last_seal = time.monotonic()
+        if not self._rows:
+            return
+        values = list(zip(*self._rows))
+        self._rows = []
+        self._write_chunk({name: np.array(v, dtype=dtype) for (name, dtype), v in zip(COLUMNS, values)})
+
+    def _write_chunk(self, columns: Dict[str, np.ndarray]):
+        rows = len(columns["t"])
+        if not rows:
+            return
+        order = np.lexsort((columns["t"], columns["member"]))
+        columns = {name: np.ascontiguousarray(values[order]) for name, values in columns.items()}
+        layout, size = _layout(rows)
+        for name, dtype, offset in layout:
+            data = columns[name].tobytes()
+            self._file.write(data + b"\0" * (_align(len(data)) - len(data)))
+
+        t, member, lat, lon = columns["t"], columns["member"], columns["lat"], columns["lon"]
+        positioned = columns["kind"] != SET
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry["offset"], entry["rows"] = self._offset, rows
+        entry["t_min"], entry["t_max"] = t.min(), t.max()
+        entry["member_min"], entry["member_max"] = member.min(), member.max()
+        if positioned.any():
+            entry["lat_min"], entry["lat_max"] = lat[positioned].min(), lat[positioned].max()
+            entry["lon_min"], entry["lon_max"] = lon[positioned].min(), lon[positioned].max()
+        entry["member_mask"] = _mask(member)
+        self._file.flush()          # data first, then the index entry that makes it visible
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        self._offset += size
+        self.rows += rows
+        self.chunks += 1
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._seal_rows()
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._seal_rows()
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+
+# ----------------------- Reading -----------------------
+class Archive:
+    """Memory-mapped reader. `chunks_read` counts chunks actually opened by queries."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, self.start_time, self.chunk_rows = HEADER.unpack(f.read(HEADER.size))
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f"{path} is not a HaptiBand archive")
+        index = np.fromfile(path + ".idx", dtype=np.uint8) if os.path.exists(path + ".idx") else np.zeros(0, np.uint8)
+        usable = len(index) - len(index) % INDEX_DTYPE.itemsize
+        self.index = index[:usable].view(INDEX_DTYPE)
+        size = os.path.getsize(path)
+        # Ignore chunks whose data didn't make it to disk
+        ends = self.index["offset"] + [_layout(int(r))[1] for r in self.index["rows"]]
+        self.index = self.index[ends <= size]
+        if magic == MAGIC_V1:
+            self.index["member_mask"] = np.iinfo(np.uint64).max
+        self._map = np.memmap(path, dtype=np.uint8, mode="r") if len(self.index) else None
+        self.chunks_read = 0
+
+    def __len__(self):
+        return int(self.index["rows"].sum())
+
+    @property
+    def duration(self) -> float:
+        return float(self.index["t_max"].max()) if len(self.index) else 0.0
+
+    def chunk(self, i: int) -> Chunk:
+        """Zero-copy column views of chunk `i`."""
+        entry = self.index[i]
+        rows = int(entry["rows"])
+        base = int(entry["offset"])
+        self.chunks_read += 1
+        return Chunk({name: self._map[base + offset:base + offset + rows * dtype.itemsize].view(dtype)
+                      for name, dtype, offset in _layout(rows)[0]})
+
+    def find_chunks(self, start: Optional[float] = None, end: Optional[float] = None,
+                    members: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Indexes of the chunks that may hold rows with start <= t < end for `members`."""
+        idx = self.index
+        keep = np.ones(len(idx), dtype=bool)
+        if start is not None:
+            keep &= idx["t_max"] >= start
+        if end is not None:
+            keep &= idx["t_min"] < end
+        if members is not None:
+            members = np.asarray(sorted(set(members)), dtype=np.int64)
+            mask = _mask(members)
+            # Some wanted member inside the chunk's member range, and its bit in the mask
+            lo = np.searchsorted(members, idx["member_min"], side="left")
+            hi = np.searchsorted(members, idx["member_max"], side="right")
+            keep &= (hi > lo) & ((idx["member_mask"] & np.uint64(mask)) != 0)
+        return np.flatnonzero(keep)
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              members: Optional[Iterable[int]] = None, kinds: Optional[Iterable[int]] = None) -> Iterator[Chunk]:
+        """
+        Rows with start <= t < end (and for `members`/`kinds`, if given), one
+        Chunk per archive chunk. Member queries return views; other filters copy.
+        """
+        members = None if members is None else sorted(set(members))
+        for i in self.find_chunks(start, end, members):
+            chunk = self.chunk(i)
+            if members is not None:
+                # Rows are sorted by member: each member is one contiguous run
+                m = chunk["member"]
+                parts = [chunk.take(slice(a, b)) for a, b in
+                         zip(np.searchsorted(m, members, "left"), np.searchsorted(m, members, "right")) if b > a]
+                if not parts:
+                    continue
+                chunk = Chunk.concat(parts)
+            keep = None
+            if start is not None or end is not None:
+                t = chunk["t"]
+                keep = (t >= (-np.inf if start is None else start)) & (t < (np.inf if end is None else end))
+            if kinds is not None:
+                k = np.isin(chunk["kind"], list(kinds))
+                keep = k if keep is None else keep & k
+            if keep is not None and not keep.all():
+                chunk = chunk.take(keep)
+            if len(chunk):
+                yield chunk
+
+    def scan(self, rows: int = 1 << 20) -> Iterator[Chunk]:
+        """Every row in time order, in batches of about `rows` (for streaming analysis)."""
+        batch, count = [], 0
+        for i in range(len(self.index)):
+            chunk = self.chunk(i)
+            batch.append(chunk)
+            count += len(chunk)
+            if count >= rows:
+                merged = Chunk.concat(batch)
+                yield merged.take(np.argsort(merged["t"], kind="stable"))
+                batch, count = [], 0
+        if batch:
+            merged = Chunk.concat(batch)
+            yield merged.take(np.argsort(merged["t"], kind="stable"))
+
+
+def convert(session_path: str, archive_path: Optional[str] = None) -> str:
+    """Archive the positions in a recorded session log (.hbs)."""
+    archive_path = archive_path or os.path.splitext(session_path)[0] + ARCHIVE_SUFFIX
+    reader = SessionReader(session_path)
+    writer = ArchiveWriter(archive_path + ".tmp", start_time=reader.start_time, flush_interval=float("inf"))
+    for t, kind, text in reader.records():
+        try:
+            row = parse_record(kind, text)
+        except (ValueError, KeyError, IndexError):
+            continue
+        if row is not None:
+            writer.append(t, *row)
+    writer.close()
+    os.replace(archive_path + ".tmp.idx", archive_path + ".idx")
+    os.replace(archive_path + ".tmp", archive_path)
+    return archive_path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or query a HaptiBand telemetry archive")
+    parser.add_argument("path", help="Archive (.hba), or a session log (.hbs) to convert")
+    parser.add_argument("--start", type=float, default=None, help="Start time (s)")
+    parser.add_argument("--end", type=float, default=None, help="End time (s)")
+    parser.add_argument("--member", action="append", default=[], help="Member as row;col (repeatable)")
+    parser.add_argument("--rows", action="store_true", help="Print matching rows")
+    args = parser.parse_args()
+
+    path = args.path
+    if not path.endswith(ARCHIVE_SUFFIX):
+        path = convert(path)
+        print(f"Converted to {path}")
+    archive = Archive(path)
+    members = [member_id(*(int(x) for x in m.split(";"))) for m in args.member] or None
+
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(archive.start_time))
+    print(f"Archive started {started}: {len(archive)} rows in {len(archive.index)} chunks, "
+          f"{archive.duration:.1f}s, {os.path.getsize(path) / 1e6:.1f} MB")
+    if args.start is None and args.end is None and members is None and not args.rows:
+        return
+
+    start = time.perf_counter()
+    matched = 0
+    for chunk in archive.query(args.start, args.end, members):
+        matched += len(chunk)
+        if args.rows:
+            for i in np.argsort(chunk["t"], kind="stable"):
+                print(f"{chunk['t'][i]:10.3f}  {member_name(int(chunk['member'][i])):<6} kind {chunk['kind'][i]}  "
+                      f"{chunk['lat'][i]:.7f},{chunk['lon'][i]:.7f} {chunk['heading'][i]:5.1f} fix {chunk['fix'][i]}")
+    print(f"{matched} rows from {archive.chunks_read}/{len(archive.index)} chunks "
+          f"in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Whole-block on-target evaluation.
+
+headband.ino decides on its own whether it is on target when a GPS target
+arrives (GPS_TOLERANCE, normalizeHeading, IMU_DEADZONE/IMU_SOFT_LIMIT). Once
+headbands report their positions back ("POS:<row>;<col>:<lat>,<lon>|<hdg>|<fix>")
+the laptop can make the same decision for every member at once: positions live
+in preallocated arrays indexed by slot, and evaluate() computes distance to
+target (ft), signed heading error and correction tier for the whole block in a
+handful of NumPy operations. Members found on target still get a target every
+CONFIRM_INTERVAL, so their headbands give the confirmation buzz.
+"""
+import threading
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from formation import FEET_PER_DEGREE_LAT
+from constants import NO_DATA, ON_TARGET, OFF_POSITION, SOFT, HARD  # noqa: F401
+
+# Same thresholds as headband.ino
+GPS_TOLERANCE = 0.000003      # degrees, per axis: a box of about 1 ft, not a circle
+IMU_DEADZONE = 5              # degrees: no correction needed
+IMU_SOFT_LIMIT = 15           # degrees: gentle correction; beyond is urgent
+
+POS_STALE = 1.0               # Reports older than this (s) don't count
+CONFIRM_INTERVAL = 2.0        # On-target members are relayed this often (s)
+
+MemberId = Tuple[int, int]
+
+
+class Evaluation(NamedTuple):
+    """Per-slot results; slot = (row - 1) * cols + (col - 1)."""
+    distance_ft: np.ndarray     # NaN without a fresh report
+    heading_error: np.ndarray   # current - target, [-180, 180); positive = facing too far right
+    tier: np.ndarray            # int8, NO_DATA .. HARD
+    t: float
+
+
+def classify(lat, lon, heading, target_lat, target_lon, target_heading, fresh=True):
+    """
+    headband.ino's on-target decision on arrays: returns (distance_ft,
+    heading_error, tier). Entries where `fresh` is False get NO_DATA.
+    """
+    north = (lat - target_lat) * FEET_PER_DEGREE_LAT
+    east = (lon - target_lon) * FEET_PER_DEGREE_LAT * np.cos(np.radians(target_lat))
+    distance = np.where(fresh, np.hypot(east, north), np.nan)
+    error = (heading - target_heading + 180.0) % 360.0 - 180.0
+    abs_error = np.abs(error)
+    off_position = (np.abs(lat - target_lat) >= GPS_TOLERANCE) | (np.abs(lon - target_lon) >= GPS_TOLERANCE)
+
+    tier = np.select(
+        [~np.asarray(fresh), abs_error > IMU_SOFT_LIMIT, abs_error > IMU_DEADZONE, off_position],
+        [NO_DATA, HARD, SOFT, OFF_POSITION],
+        default=ON_TARGET,
+    ).astype(np.int8)
+    return distance, error, tier
+
+
+class BlockEvaluator:
+    """
+    Latest reported pose per member. Thread-safe: reports arrive on the
+    listener thread, evaluate() runs on the relay loop.
+    """
+
+    def __init__(self, rows: int, cols: int, stale_after: float = POS_STALE):
+        self.rows = rows
+        self.cols = cols
+        self.stale_after = stale_after
+        n = rows * cols
+        self.lat = np.full(n, np.nan)
+        self.lon = np.full(n, np.nan)
+        self.heading = np.zeros(n)
+        self.fix = np.zeros(n, dtype=np.int8)
+        self.t = np.full(n, -np.inf)
+        self.reports = 0
+        self.confirmed = np.full(n, -np.inf)  # When each member was last relayed while on target
+        self._lock = threading.Lock()
+        # Row/col of every slot, for turning results back into member ids
+        self.slot_rows, self.slot_cols = (a.ravel() + 1 for a in np.indices((rows, cols)))
+
+    def slot(self, row: int, col: int) -> int:
+        return (row - 1) * self.cols + (col - 1)
+
+    # ----------------------- Reports -----------------------
+    def report(self, row: int, col: int, lat: float, lon: float, heading: float,
+               fix: int = 0, t: Optional[float] = None):
+        if not (1 <= row <= self.rows and 1 <= col <= self.cols):
+            return
+        i = self.slot(row, col)
+        with self._lock:
+            self.lat[i] = lat
+            self.lon[i] = lon
+            self.heading[i] = heading
+            self.fix[i] = fix
+            self.t[i] = time.monotonic() if t is None else t
+            self.reports += 1
+
+    def handle_line(self, line: str, now: Optional[float] = None) -> bool:
+        """Take a "POS:<row>;<col>:<lat>,<lon>|<hdg>|<fix>" line. Returns False if malformed."""
+        try:
+            member, _, rest = line.strip()[4:].partition(":")
+            row, col = (int(x) for x in member.split(";"))
+            fields = rest.split("|")
+            lat, lon = (float(x) for x in fields[0].split(","))
+            heading = float(fields[1])
+            fix = int(fields[2]) if len(fields) > 2 else 0
+        except (ValueError, IndexError):
+            return False
+        self.report(row, col, lat, lon, heading, fix, now)
+        return True
+
+    # ----------------------- Evaluation -----------------------
+    def evaluate(self, target_lat: np.ndarray, target_lon: np.ndarray, target_heading: np.ndarray,
+                 now: Optional[float] = None) -> Evaluation:
+        """Compare every member with its target (arrays in slot order)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            lat, lon, heading, t = self.lat.copy(), self.lon.copy(), self.heading.copy(), self.t.copy()
+
+        fresh = (now - t) <= self.stale_after
+        distance, error, tier = classify(lat, lon, heading, target_lat, target_lon, target_heading, fresh)
+        return Evaluation(distance, error, tier, now)
+
+    def correction_order(self, evaluation: Evaluation, members: Iterable[MemberId]) -> List[MemberId]:
+        """
+        Which of `members` should get a target, worst first: urgent heading
+        errors, then gentle ones, then position, by distance. Members without a
+        fresh report are kept (the headband decides for itself); members on
+        target are kept once per CONFIRM_INTERVAL, last, for the confirmation buzz.
+        """
+        members = list(members)
+        if not members:
+            return []
+        slots = np.array([self.slot(r, c) for r, c in members])
+        tier = evaluation.tier[slots]
+        confirm = (tier == ON_TARGET) & (evaluation.t - self.confirmed[slots] >= CONFIRM_INTERVAL)
+        self.confirmed[slots[confirm]] = evaluation.t
+        keep = (tier != ON_TARGET) | confirm
+        distance = np.nan_to_num(evaluation.distance_ft[slots], nan=0.0)
+        # lexsort: last key is primary
+        order = np.lexsort((-distance, -tier))
+        return [members[i] for i in order if keep[i]]
+
+    def counts(self, evaluation: Evaluation) -> dict:
+        """Members per tier."""
+        tiers, counts = np.unique(evaluation.tier, return_counts=True)
+        return dict(zip(tiers.tolist(), counts.tolist()))
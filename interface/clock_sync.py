@@ -0,0 +1,161 @@
+"""
+Clock sync between the laptop, the hubs and the headbands.
+
+Each hub is the time master for its channel: it broadcasts signed "TS:<hub_us>"
+beacons over ESP-NOW, and every headband fits its local clock against them
+(offset + skew) with the same windowed least-squares model as SkewEstimator.
+Because all headbands timestamp the *same* broadcast frame, the shared air and
+stack delay cancels out and only per-receiver jitter is left between members.
+
+The laptop syncs to each hub over TCP ("TIME" -> "TIME:<hub_us>") with
+SyncMaster, so commands can carry "@<hub_us>" (execute at T, hub clock) and all
+addressed headbands fire together instead of when their packet arrives.
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Beacons/probes kept for the fit (must match SYNC_WINDOW in headband.ino)
+SYNC_WINDOW = 16
+# Laptop <-> hub probes (longer window: TCP jitter is worse than ESP-NOW broadcast jitter)
+SYNC_INTERVAL = 0.5
+MASTER_WINDOW = 32
+# Probes slower than the best recent RTT by more than this are discarded
+RTT_SLACK = 0.002
+# How far ahead of "execute at" a scheduled command is sent
+SCHEDULE_LEAD = 0.08
+
+
+class SkewEstimator:
+    """
+    Linear fit remote = r0 + skew * (local - l0) over the last `window` samples.
+
+    Times are in seconds. With a single sample only the offset is known (skew 1).
+    """
+
+    def __init__(self, window: int = SYNC_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.l0 = self.r0 = 0.0
+        self.skew = 1.0
+        self.residual = 0.0  # RMS fit error (s)
+
+    @property
+    def synced(self) -> bool:
+        return len(self.samples) >= 2
+
+    def add(self, local: float, remote: float):
+        self.samples.append((local, remote))
+        self._fit()
+
+    def _fit(self):
+        n = len(self.samples)
+        self.l0 = sum(l for l, _ in self.samples) / n
+        self.r0 = sum(r for _, r in self.samples) / n
+        sxx = sum((l - self.l0) ** 2 for l, _ in self.samples)
+        sxy = sum((l - self.l0) * (r - self.r0) for l, r in self.samples)
+        self.skew = sxy / sxx if n >= 2 and sxx > 0 else 1.0
+        err = [r - self.to_remote(l) for l, r in self.samples]
+        self.residual = (sum(e * e for e in err) / n) ** 0.5
+
+    def to_remote(self, local: float) -> float:
+        return self.r0 + self.skew * (local - self.l0)
+
+    def to_local(self, remote: float) -> float:
+        return self.l0 + (remote - self.r0) / self.skew
+
+    @property
+    def offset(self) -> float:
+        """remote - local at the newest sample (s)."""
+        if not self.samples:
+            return 0.0
+        local = self.samples[-1][0]
+        return self.to_remote(local) - local
+
+    @property
+    def skew_ppm(self) -> float:
+        return (self.skew - 1.0) * 1e6
+
+
+def parse_time_reply(reply: Optional[str]) -> Optional[int]:
+    """Hub clock (us) from a "TIME:<us>" reply."""
+    for line in (reply or "").splitlines():
+        line = line.strip()
+        if line.startswith("TIME:") and line[5:].isdigit():
+            return int(line[5:])
+    return None
+
+
+class SyncMaster:
+    """
+    Tracks one hub's clock from the laptop. `request(msg)` sends a line to that
+    hub and returns the reply (e.g. HubLink.request).
+    """
+
+    def __init__(self, request: Callable[[str], Optional[str]], interval: float = SYNC_INTERVAL,
+                 window: int = MASTER_WINDOW, clock: Callable[[], float] = time.perf_counter):
+        self.request = request
+        self.interval = interval
+        self.clock = clock
+        self.estimator = SkewEstimator(window)
+        self.rtts = deque(maxlen=window)
+        self.rtt = None       # Best recent RTT (s)
+        self.probes = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def probe(self) -> bool:
+        """One TIME exchange. Returns True if the sample was used."""
+        t0 = self.clock()
+        reply = self.request("TIME")
+        t3 = self.clock()
+        hub_us = parse_time_reply(reply)
+        self.probes += 1
+        if hub_us is None:
+            return False
+        rtt = t3 - t0
+        self.rtts.append(rtt)
+        self.rtt = min(self.rtts)
+        # Queued behind other traffic: the hub stamp could be anywhere in the round trip
+        if rtt > self.rtt + RTT_SLACK:
+            self.rejected += 1
+            return False
+        self.estimator.add((t0 + t3) / 2, hub_us / 1e6)
+        return True
+
+    @property
+    def synced(self) -> bool:
+        return self.estimator.synced
+
+    def hub_time_us(self, local: Optional[float] = None) -> int:
+        """Hub clock (us) at laptop time `local` (default now)."""
+        local = self.clock() if local is None else local
+        return int(self.estimator.to_remote(local) * 1e6)
+
+    def local_time(self, hub_us: int) -> float:
+        return self.estimator.to_local(hub_us / 1e6)
+
+    def start(self):
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.probe()
+                except (OSError, ConnectionError):
+                    pass
+                self._stop.wait(self.interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+
+def schedule(msg: str, hub_us: int) -> str:
+    """Attach an execute-at time (hub clock, us) to a pin command."""
+    return f"{msg}@{hub_us}"
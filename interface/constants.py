@@ -0,0 +1,52 @@
+"""
+Constants shared by the controller and its frontends.
+
+Kept free of NumPy and the control modules, so the Tk app and the daemon's
+clients can import them without loading the controller.
+"""
+import os
+
+HOST_DEFAULT = "192.168.4.1"
+PORT_DEFAULT = 80
+
+# Motor pin mappings
+PIN_LEFT = 5
+PIN_FRONT = 18
+PIN_RIGHT = 19
+PIN_BACK = 23
+ALL_PINS = [PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK]
+
+# Session recordings (every hub frame in and out)
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+
+# Multi-hub layout (optional). Without it the host may list several hubs:
+# "host[:port][/channel], ..." and rows are split evenly between them
+HUBS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hubs.json")
+
+# Grid dimensions
+GRID_ROWS = 5
+GRID_COLS = 5
+
+# Correction tiers (block_eval)
+NO_DATA = -1
+ON_TARGET = 0
+OFF_POSITION = 1              # Heading within the deadzone, position off
+SOFT = 2
+HARD = 3
+
+# Events (listener(event, data))
+LOG = "log"                  # text
+CONNECTION = "connection"    # state (connected/disconnected/failed), hubs, error
+LISTENER = "listener"        # active
+POSE = "pose"                # lat, lon, heading, sigma, speed, age (of the sample at arrival, s)
+RELAY = "relay"              # achieved, target, ceiling (Hz)
+BLOCK = "block"              # distance, tier: per slot, slot = (row - 1) * cols + (col - 1)
+MEMBERS = "members"          # health {"r;c": state}, summary {state: count}
+MOTOR = "motor"              # pin, on
+SELECTION = "selection"      # rows
+SETTINGS = "settings"        # auto_relay, spacing
+EVENTS = (LOG, CONNECTION, LISTENER, POSE, RELAY, BLOCK, MEMBERS, MOTOR, SELECTION, SETTINGS)
+
+# Keyboard cues (the GUI's Manual tab and cue_runner.py --keys)
+KEY_CUES = {"w": "forward", "a": "left", "s": "back", "d": "right",
+            "z": "rotate_left", "x": "rotate_right", "e": "start_march", "q": "stop_all"}
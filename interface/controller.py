@@ -0,0 +1,938 @@
+"""
+HaptiBand control core, without any UI.
+
+Controller owns the hub connections, clock sync, pose filter, adaptive GPS
+relay, block evaluation, ack tracking, session recording, sequences and the
+E-stop, each on its own thread. Frontends (the Tk app, haptiband.py's API
+clients) drive it through its public methods and follow it through events:
+every listener(event, data) passed to subscribe() is called from control
+threads, so listeners must only queue work and return. The control loop never
+waits on a UI.
+"""
+import math
+import os
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+from session_log import SessionRecorder, SessionReader, Replayer, RX, TX, REPLY, MARK
+from metrics import REGISTRY, RateMeter
+from members import MembershipTable, reply_seq, OK, STALE, LOST
+from shards import HubPool, load_shard_map
+from clock_sync import SyncMaster, SCHEDULE_LEAD, schedule
+from pose_filter import PoseFilter, extrapolate, is_telemetry, parse_telemetry
+from telemetry import MAX_STREAM_HZ, MIN_STREAM_HZ, TelemetryStream
+from latency import LatencyBudget, UPLINK, SEND, DOWNLINK
+from rate_control import RateController
+from block_eval import BlockEvaluator
+from formation import calculate_column_positions, column_targets
+from archive import ARCHIVE_SUFFIX, ArchiveWriter
+from timeline import merge_timelines, rows_timelines, to_sequence
+from sequencer import ENQUEUE, REJECTED, SequenceExecutor, batches
+from motor_state import MotorStateTable, pin_command
+from constants import (HOST_DEFAULT, PORT_DEFAULT, PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK, ALL_PINS,  # noqa: F401
+                       SESSION_DIR, HUBS_CONFIG, GRID_ROWS, GRID_COLS, NO_DATA, ON_TARGET, OFF_POSITION, SOFT, HARD,
+                       LOG, CONNECTION, LISTENER, POSE, RELAY, BLOCK, MEMBERS, MOTOR, SELECTION, SETTINGS, EVENTS,
+                       KEY_CUES)
+
+# ----------------------- Constants -----------------------
+MEMBER_HEALTH_INTERVAL = 0.5
+ACK_CHECK_INTERVAL = 0.05
+
+# Anti-entropy sweep: while no sequence plays, every tick turns off motors on for
+# longer than any cue holds one, and every full sweep re-sends "off" wherever the
+# motor state table is not sure a motor is off
+SWEEP_TICK = 1.0
+FULL_SWEEP_INTERVAL = 10.0
+MAX_ON_SECONDS = 5.0
+NOOP_REPLY = "OK"  # send_command()'s answer for a skipped no-op write
+
+# Adaptive GPS relay: loop tick, and how much the rate must change before the hubs
+# are told to change their telemetry interval
+RELAY_TICK = 0.01
+RATE_CHANGE_THRESHOLD = 0.25
+RELAY_REPORT_INTERVAL = 0.25  # Seconds between RELAY events
+
+# Block evaluation from headband position reports
+EVAL_INTERVAL = 0.05
+TIER_NAMES = {NO_DATA: "no_data", ON_TARGET: "on_target", OFF_POSITION: "off_position", SOFT: "soft", HARD: "hard"}
+
+# Built-in cues: (label, [(pin, state, delay_after), ...]) played on the selected rows
+CUES = {
+    "forward": ("Forward", [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.00)]),
+    "left": ("Left", [(PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.05), (PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.00)]),
+    "right": ("Right", [(PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.05), (PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.00)]),
+    "back": ("Back", [(PIN_BACK, 1, 0.10), (PIN_BACK, 0, 0.05), (PIN_BACK, 1, 0.10), (PIN_BACK, 0, 0.00)]),
+    "stop_all": ("All Stop", [
+        (PIN_LEFT, 1, 0.00), (PIN_FRONT, 1, 0.00), (PIN_RIGHT, 1, 0.00), (PIN_BACK, 1, 0.10),
+        (PIN_LEFT, 0, 0.00), (PIN_FRONT, 0, 0.00), (PIN_RIGHT, 0, 0.00), (PIN_BACK, 0, 0.05),
+        (PIN_LEFT, 1, 0.00), (PIN_FRONT, 1, 0.00), (PIN_RIGHT, 1, 0.00), (PIN_BACK, 1, 0.10),
+        (PIN_LEFT, 0, 0.00), (PIN_FRONT, 0, 0.00), (PIN_RIGHT, 0, 0.00), (PIN_BACK, 0, 0.00),
+    ]),
+    "rotate_left": ("Rotate Left", [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.00)]),
+    "rotate_right": ("Rotate Right", [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.00)]),
+    "start_march": ("Start March", [
+        (PIN_LEFT, 1, 0.00), (PIN_RIGHT, 1, 0.10),
+        (PIN_LEFT, 0, 0.00), (PIN_RIGHT, 0, 0.05),
+        (PIN_LEFT, 1, 0.00), (PIN_RIGHT, 1, 0.10),
+        (PIN_LEFT, 0, 0.00), (PIN_RIGHT, 0, 0.10),
+        (PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.00),
+    ]),
+}
+
+# What a sequence does if another one is playing (sequencer.POLICIES): queued cues
+# play back to back, so three quick presses give three clean cues
+SEQUENCE_POLICY = ENQUEUE
+
+Listener = Callable[[str, dict], None]
+
+
+def member_key(row: int, col: int) -> str:
+    return f"{row};{col}"
+
+
+class Controller:
+    """Hub connection, relay loop and sequencing; thread-safe, UI-free."""
+
+    def __init__(self, rows: int = GRID_ROWS, cols: int = GRID_COLS, registry=REGISTRY,
+                 session_dir: str = SESSION_DIR, hubs_config: str = HUBS_CONFIG):
+        self.rows = rows
+        self.cols = cols
+        self.session_dir = session_dir
+        self.hubs_config = hubs_config
+        self._listeners: List[Listener] = []
+
+        # Metrics (shared registry, served as Prometheus text by whoever runs a MetricsServer)
+        self.metrics = registry
+        self.m_commands = self.metrics.counter("hub_commands_total", "Commands sent to the hub")
+        self.m_ack_timeouts = self.metrics.counter("hub_ack_timeouts_total", "Commands with no hub reply before timeout")
+        self.m_relay_fanout = self.metrics.histogram("relay_fanout_seconds", "Time to relay one GPS update to all targets")
+        self.m_telemetry = self.metrics.counter("telemetry_frames_total", "GPS/IMU frames received from the hub")
+        self.m_listener_errors = self.metrics.counter("event_listener_errors_total", "Exceptions raised by event listeners")
+        self.telemetry_rate = RateMeter()
+        self.sequencer = SequenceExecutor(self._send_steps, on_idle=self._sequences_idle, registry=self.metrics)
+        self.metrics.gauge("telemetry_rate_hz", "Smoothed telemetry frame rate", fn=lambda: self.telemetry_rate.rate)
+        self.metrics.gauge("telemetry_age_seconds", "Time since the last telemetry frame", fn=self.telemetry_rate.age)
+        self.telemetry = {}  # hub name -> TelemetryStream of its pose frames
+        self.metrics.gauge("telemetry_sample_age_seconds", "Age of the newest hub pose sample when it arrived",
+                           fn=self.telemetry_age)
+        self.metrics.gauge("telemetry_lost_frames", "Pose frames missing from the hubs' sequence numbers",
+                           fn=lambda: sum(s.lost for s in list(self.telemetry.values())))
+        self.metrics.gauge("telemetry_stale_frames", "Pose frames dropped as repeats or late",
+                           fn=lambda: sum(s.stale for s in list(self.telemetry.values())))
+        self.metrics.gauge("telemetry_bursts", "Times pose frames arrived bunched up after a link stall",
+                           fn=lambda: sum(s.bursts for s in list(self.telemetry.values())))
+        self.metrics.gauge("telemetry_repeated_fixes", "Pose frames carrying an already fused fix (heading only)",
+                           fn=lambda: sum(s.repeated_fixes for s in list(self.telemetry.values())))
+        self.metrics.gauge("hub_connected", "1 while connected to the hub", fn=lambda: int(self.connected))
+
+        # Per-headband liveness and acks
+        self.membership = MembershipTable(rows, cols)
+        self.membership.on_ack = self._motor_acked
+        self.ack_thread = None
+        self.m_ack_rtt = self.metrics.histogram("member_ack_rtt_seconds", "Command to headband ack round trip")
+        self.m_retransmits = self.metrics.counter("member_retransmits_total", "Selective retransmits to members")
+        self.m_ack_failures = self.metrics.counter("member_ack_failures_total", "Members that never acked a command")
+        self.metrics.gauge("member_pending_commands", "Commands awaiting member acks",
+                           fn=self.membership.pending_count)
+        for state in (OK, STALE, LOST):
+            self.metrics.gauge("members", "Members by health", labels={"health": state},
+                               fn=lambda s=state: self.membership.summary()[s])
+
+        # What each member's motors are doing, as far as sent commands and acks tell
+        self.motor_state = MotorStateTable(rows, cols, ALL_PINS)
+        self.sweep_thread = None
+        self.m_noop_writes = self.metrics.counter("hub_noop_writes_total", "Pin commands skipped: motor already in that state")
+        self.m_sweep_commands = self.metrics.counter("motor_sweep_commands_total", "Offs re-sent by the anti-entropy sweep")
+        for state in ("on", "unknown"):
+            self.metrics.gauge("motor_cells", "Member motors by believed state", labels={"state": state},
+                               fn=lambda s=state: self.motor_state.counts()[s])
+
+        # State
+        self.hubs = None  # HubPool: one connection per hub, commands routed by row
+        self.clocks = {}  # hub name -> SyncMaster (laptop <-> hub clock)
+        self.selected_rows = {1}  # Default to row 1
+        self.connected = False
+        self.connecting = False
+        self.connect_time = None
+        self.recorder = None
+        self.archive = None  # ArchiveWriter: positions of the recording, columnar
+        self.replayer = None
+        self.set_number = 0
+        self.auto_relay_on = False
+        self.spacing_feet = 3.0
+
+        # GPS state
+        self.pose_filter = PoseFilter()
+        self.m_pose_rejected = self.metrics.counter("pose_rejected_total", "Hub GPS samples dropped by the pose filter")
+        self.metrics.gauge("pose_sigma_meters", "Hub position uncertainty (1 sigma)",
+                           fn=lambda: self.pose_filter.predict().sigma)
+        self.metrics.gauge("pose_speed_mps", "Filtered hub ground speed",
+                           fn=lambda: self.pose_filter.predict().speed)
+        self.latency = LatencyBudget()
+        for component in (UPLINK, SEND, DOWNLINK):
+            self.metrics.gauge("latency_budget_seconds", "Smoothed delay per stage of a GPS relay",
+                               labels={"component": component},
+                               fn=lambda c=component: self.latency.get(c))
+        self.gps_listener_running = False
+        self.gps_listener_thread = None
+        self.shutdown_event = threading.Event()
+        self.closed = threading.Event()
+        self.monitor_thread = None
+
+        # Adaptive relay rate
+        self.rate_ctl = RateController()
+        self.relay_lock = threading.Lock()
+        self.relay_thread = None
+
+        # Whole-block evaluation of reported headband positions
+        self.block = BlockEvaluator(rows, cols)
+        self.block_eval = None
+        self.block_tiers = {}
+        self.m_block_eval = self.metrics.histogram("block_eval_seconds", "Time to evaluate the whole block")
+        for tier, name in TIER_NAMES.items():
+            self.metrics.gauge("block_members", "Members per correction tier", labels={"tier": name},
+                               fn=lambda t=tier: self.block_tiers.get(t, 0))
+        self.metrics.gauge("relay_rate_hz", "Achieved GPS relay rate", fn=self.rate_ctl.achieved_rate)
+        self.metrics.gauge("relay_target_rate_hz", "Relay rate chosen by the controller", fn=lambda: self.rate_ctl.rate)
+        self.metrics.gauge("relay_rate_ceiling_hz", "AIMD link ceiling for the relay rate",
+                           fn=lambda: self.rate_ctl.ceiling)
+        self.metrics.gauge("relay_queue_depth", "Relayed commands still awaiting acks",
+                           fn=lambda: self.rate_ctl.backlog)
+        self.metrics.gauge("relay_dropped_updates", "Relay slots skipped because the link was busy",
+                           fn=lambda: self.rate_ctl.dropped)
+
+    # ----------------------- Events -----------------------
+    def subscribe(self, listener: Listener):
+        """Call listener(event, data) for every event. It must not block."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener):
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def emit(self, event: str, **data):
+        for listener in list(self._listeners):
+            try:
+                listener(event, data)
+            except Exception:
+                self.m_listener_errors.inc()
+
+    def log(self, msg: str):
+        """Tell every frontend. Safe to call from any thread."""
+        self.emit(LOG, text=msg)
+
+    def start(self) -> "Controller":
+        """Start background housekeeping (member health reports)."""
+        if self.monitor_thread is None:
+            self.monitor_thread = threading.Thread(target=self._monitor, daemon=True)
+            self.monitor_thread.start()
+        return self
+
+    def close(self):
+        self.sequencer.close()
+        self.disconnect()
+        if self.replayer:
+            self.replayer.stop()
+        self.closed.set()
+
+    def _monitor(self):
+        while not self.closed.wait(MEMBER_HEALTH_INTERVAL):
+            self.emit(MEMBERS, **self.member_health())
+
+    # ----------------------- Queries -----------------------
+    def member_health(self) -> dict:
+        now = time.monotonic()
+        health = {member_key(r, c): self.membership.health((r, c), now)
+                  for r in range(1, self.rows + 1) for c in range(1, self.cols + 1)}
+        return {"health": health, "summary": self.membership.summary(now)}
+
+    def status(self) -> dict:
+        pose = self.pose_filter.predict()
+        return {
+            "connected": self.connected,
+            "hubs": len(self.hubs) if self.hubs else 0,
+            "uptime": time.time() - self.connect_time if self.connect_time else None,
+            "selected_rows": sorted(self.selected_rows),
+            "auto_relay": self.auto_relay_on,
+            "spacing": self.spacing_feet,
+            "set": self.set_number,
+            "recording": self.recorder.path if self.recorder else None,
+            "pose": None if pose is None else {"lat": pose.lat, "lon": pose.lon, "heading": pose.heading,
+                                               "sigma": pose.sigma, "speed": pose.speed},
+            "relay_hz": self.rate_ctl.achieved_rate(),
+            "telemetry_age": self.telemetry_age(),
+            "sequence_busy": self.sequencer.busy,
+            "motors": self.motor_state.counts(),
+        }
+
+    def telemetry_age(self) -> float:
+        """Age of the newest pose sample when it arrived, worst over the hubs (NaN before any)."""
+        ages = [s.age for s in list(self.telemetry.values()) if not math.isnan(s.age)]
+        return max(ages) if ages else math.nan
+
+    def metrics_snapshot(self):
+        return self.metrics.snapshot()
+
+    # ----------------------- Settings -----------------------
+    def select_rows(self, rows: Iterable[int]):
+        """Rows that cues and GPS relays go to (at least one, for safety)."""
+        rows = {int(r) for r in rows if 1 <= int(r) <= self.rows}
+        if not rows:
+            raise ValueError("Select at least one row")
+        self.selected_rows = rows
+        self.emit(SELECTION, rows=sorted(rows))
+
+    def set_auto_relay(self, on: bool):
+        self.auto_relay_on = bool(on)
+        self.emit(SETTINGS, auto_relay=self.auto_relay_on, spacing=self.spacing_feet)
+
+    def set_spacing(self, feet: float):
+        self.spacing_feet = float(feet)
+        self.emit(SETTINGS, auto_relay=self.auto_relay_on, spacing=self.spacing_feet)
+
+    # ----------------------- Connection -----------------------
+    def connect(self, host: str = HOST_DEFAULT, port: int = PORT_DEFAULT):
+        """Connect to the hub(s) in a background thread; reports a CONNECTION event."""
+        if self.connected or self.connecting:
+            return
+
+        try:
+            shard_map = load_shard_map(self.hubs_config, host or HOST_DEFAULT, port, range(1, self.rows + 1))
+        except (OSError, ValueError, KeyError) as e:
+            self._connection_failed(f"Bad hub configuration: {e}")
+            return
+
+        for shard in shard_map.shards:
+            rows = ", ".join(map(str, sorted(shard.rows))) or "-"
+            channel = f" ch {shard.channel}" if shard.channel else ""
+            self.log(f"Connecting to {shard.name} at {shard.host}:{shard.port}{channel} (rows {rows})...")
+        self.connecting = True
+
+        def worker():
+            try:
+                if self.hubs:
+                    self.hubs.close_all()
+                pool = HubPool(shard_map, self.metrics)
+                pool.connect_all()
+                self.hubs = pool
+
+                self.connected = True
+                self.connect_time = time.time()
+                self.telemetry = {}
+                self.motor_state.reset()
+                self.start_recording()
+
+                count = len(pool)
+                self.log("Connected successfully" if count == 1 else f"Connected to {count} hubs")
+                self.emit(CONNECTION, state="connected", hubs=count, error=None)
+
+                # Start GPS listener, ack tracking and clock sync
+                self.start_gps_listener()
+                self.start_ack_tracker()
+                self.start_motor_sweep()
+                self.start_clock_sync()
+                self.start_relay_loop()
+
+            except Exception as e:
+                self._connection_failed(str(e))
+            finally:
+                self.connecting = False
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _connection_failed(self, error: str):
+        self.log(f"Connection failed: {error}")
+        self.emit(CONNECTION, state="failed", hubs=0, error=error)
+
+    def disconnect(self):
+        """Disconnect from the hub(s)."""
+        was_connected = self.connected
+        self.sequencer.cancel_all()
+        self.stop_gps_listener()
+        self.stop_clock_sync()
+
+        if self.hubs:
+            self.hubs.close_all()
+
+        self.connected = False
+        self.connect_time = None
+        self.stop_recording()
+        if was_connected:
+            self.log("Disconnected")
+            self.emit(CONNECTION, state="disconnected", hubs=0, error=None)
+
+    # ----------------------- Hub I/O -----------------------
+    def send_command(self, msg: str, timeout=0.5, track=True, force=False):
+        """
+        Send one line to the hub that owns its row and record it. Returns the
+        reply (None on timeout). With `track`, members addressed by the command
+        are expected to ack it. A pin command that would change nothing (every
+        member of the row is known to be in that state) is skipped and answered
+        with NOOP_REPLY, unless `force`.
+        """
+        hubs = self.hubs
+        if not hubs:
+            raise ConnectionError("Not connected")
+        if self._is_noop(msg, force):
+            return NOOP_REPLY
+        link = hubs.link_for(msg)
+        start = time.perf_counter()
+        reply = self.request_hub(link, msg, timeout)
+        return self._command_done(link, msg, reply, time.perf_counter() - start, track)
+
+    def send_frame(self, messages: List[str], timeout=0.5, track=True, force=False) -> list:
+        """
+        send_command() for commands due together: each hub gets its lines in one
+        write and the replies are collected afterwards, so the last row does not
+        wait for the round trips of the rows before it. Returns the replies (or
+        raised exceptions) in input order.
+        """
+        hubs = self.hubs
+        if not hubs:
+            raise ConnectionError("Not connected")
+
+        def send(link, msgs):
+            live = [i for i, msg in enumerate(msgs) if not self._is_noop(msg, force)]
+            for i in live:
+                self.record(TX, msgs[i])
+            results = [NOOP_REPLY] * len(msgs)
+            for i, (reply, elapsed) in zip(live, link.request_many([msgs[i] for i in live], timeout)):
+                self._record_reply(link, reply)
+                results[i] = self._command_done(link, msgs[i], reply, elapsed, track)
+            return results
+
+        return hubs.fan_out_frame(messages, send)
+
+    def _is_noop(self, msg: str, force: bool) -> bool:
+        """Whether a pin command would change nothing (counted as a skipped write)."""
+        motor = pin_command(msg)
+        if motor and not force and self.motor_state.is_noop(*motor):
+            self.m_noop_writes.inc()
+            return True
+        return False
+
+    def _command_done(self, link, msg: str, reply: Optional[str], elapsed: float, track: bool):
+        """Bookkeeping for one command's reply (None on timeout); returns the reply."""
+        motor = pin_command(msg)
+        self.m_commands.inc()
+        if motor:
+            if reply and reply.lstrip().startswith("OK"):
+                self.motor_state.sent(*motor, time.monotonic())
+            else:
+                self.motor_state.lost(motor[0], motor[1])
+        if reply:
+            self.latency.observe(SEND, elapsed)
+        else:
+            self.rate_ctl.on_loss()
+        if not reply:
+            self.m_ack_timeouts.inc()
+            return reply
+
+        seq = reply_seq(reply)
+        if track and seq is not None:
+            self.membership.expect((link.shard.name, seq), msg, self.membership.expected_for(msg))
+        return reply
+
+    def request_hub(self, link, msg: str, timeout=0.5):
+        """Send one line to a specific hub and record the exchange."""
+        self.record(TX, msg)
+        reply = link.request(msg, timeout=timeout)
+        self._record_reply(link, reply)
+        return reply
+
+    def _record_reply(self, link, reply: Optional[str]):
+        """Record a reply; one read before the reader runs may also carry ACK/HB/telemetry lines."""
+        if not reply:
+            return
+        for line in reply.splitlines():
+            line = line.strip()
+            if line.startswith(("OK", "ERR", "TIME:")):
+                self.record(REPLY, line)
+            elif line:
+                self.record(RX, line)
+                self.handle_hub_line(line, link.shard.name)
+
+    def on_hub_line(self, link, line: str):
+        """Reader callback for unsolicited lines from one hub."""
+        self.record(RX, line)
+        self.handle_hub_line(line, link.shard.name)
+
+    def handle_hub_line(self, line: str, hub=None):
+        """Dispatch one line received from a hub (live or replayed)."""
+        if is_telemetry(line):
+            self.m_telemetry.inc()
+            self.telemetry_rate.mark()
+            try:
+                sample = parse_telemetry(line)
+            except ValueError as e:
+                self.log(f"GPS parse error: {e}")
+                return
+            t = time.monotonic()
+            stream = self.telemetry.get(hub)
+            if stream is None:
+                stream = self.telemetry[hub] = TelemetryStream()
+            if not stream.accept(sample.seq, sample.hub_us, t):
+                return
+            # Time of the sample itself: from the synced hub clock, or else from the
+            # hub stamps alone, so frames released in a burst keep their spacing
+            clock = self.clocks.get(hub)
+            if sample.hub_us is not None and clock is not None and clock.synced:
+                uplink = time.perf_counter() - clock.local_time(sample.hub_us)
+                self.latency.observe(UPLINK, uplink)
+                uplink = max(0.0, uplink)
+                stream.observe_age(uplink)
+                t -= uplink
+            elif sample.hub_us is not None:
+                t = stream.sample_time(sample.hub_us, t)
+            # Frames outpace the receiver: a new fix is fused at its own time, the
+            # heading at the frame's; a repeated fix is not fused again
+            if stream.new_fix(sample.fix_us):
+                fix_t = t if sample.fix_us is None else t - max(0, sample.hub_us - sample.fix_us) / 1e6
+                if not self.pose_filter.update(sample.lat, sample.lon, None, sample.fix, t=fix_t):
+                    self.m_pose_rejected.inc()
+            self.pose_filter.update(None, None, sample.heading, t=t)
+            pose = self.pose_filter.predict()
+            if pose is not None:
+                self.emit(POSE, lat=pose.lat, lon=pose.lon, heading=pose.heading,
+                          sigma=pose.sigma, speed=pose.speed, age=stream.age)
+        elif line.startswith("POS:"):
+            self.block.handle_line(line)
+        elif line.startswith("ACK:") or line.startswith("HB:"):
+            rtt = self.membership.handle_line(line, hub=hub)
+            if isinstance(rtt, float):
+                self.m_ack_rtt.record(rtt)
+                self.latency.observe_ack_rtt(rtt)
+                self.rate_ctl.on_ack(rtt)
+
+    # ----------------------- Session Recording -----------------------
+    def start_recording(self):
+        """Record all hub traffic of this connection to a new session file."""
+        path = os.path.join(self.session_dir, time.strftime("session-%Y%m%d-%H%M%S.hbs"))
+        try:
+            self.recorder = SessionRecorder(path)
+            self.archive = ArchiveWriter(os.path.splitext(path)[0] + ARCHIVE_SUFFIX)
+            self.log(f"Recording session to {path}")
+            self.set_number = 0
+            self.record(MARK, f"SET:0|SPACING:{self.spacing_feet:g}")
+        except OSError as e:
+            if self.recorder:
+                self.recorder.close()
+            self.recorder = None
+            self.archive = None
+            self.log(f"Session recording disabled: {e}")
+
+    def mark_set(self):
+        """Start the next drill set in the recording (with the spacing it uses)."""
+        self.set_number += 1
+        self.record(MARK, f"SET:{self.set_number}|SPACING:{self.spacing_feet:g}")
+        self.log(f"Set {self.set_number}")
+
+    def stop_recording(self):
+        """Close the current session file."""
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.close()
+            self.log(f"Session saved ({recorder.records} records)")
+        archive, self.archive = self.archive, None
+        if archive:
+            # Closed after the .hbs, so analytics sees it as up to date
+            archive.close()
+
+    def record(self, kind: int, text: str):
+        """Append a line to the session recording, if one is active."""
+        recorder = self.recorder
+        if recorder:
+            recorder.record(kind, text)
+        archive = self.archive
+        if archive:
+            archive.record(kind, text)
+
+    def replay_session(self, path: str, speed: float = 1.0):
+        """Replay recorded inbound traffic as if it came from the hub."""
+        if self.replayer:
+            self.replayer.stop()
+        try:
+            reader = SessionReader(path)
+        except (OSError, ValueError) as e:
+            self.log(f"Replay failed: {e}")
+            return
+        self.replayer = Replayer(reader, lambda _kind, text: self.handle_hub_line(text), speed=speed)
+        self.replayer.start()
+        self.log(f"Replaying {os.path.basename(path)} at {speed:g}x")
+
+    # ----------------------- GPS Listener -----------------------
+    def start_gps_listener(self):
+        """Start background GPS listener thread."""
+        if self.gps_listener_running:
+            return
+
+        self.shutdown_event.clear()
+        self.gps_listener_running = True
+
+        def listener():
+            # One reader per hub; this thread just waits for them to finish
+            hubs = self.hubs
+            if hubs:
+                hubs.start_readers(self.shutdown_event, self.on_hub_line)
+                hubs.join_readers(timeout=None)
+
+            self.gps_listener_running = False
+            self.emit(LISTENER, active=False)
+
+        self.gps_listener_thread = threading.Thread(target=listener, daemon=True)
+        self.gps_listener_thread.start()
+        self.emit(LISTENER, active=True)
+        self.log("GPS listener started")
+
+    def stop_gps_listener(self):
+        """Stop the GPS listener and ack tracker threads."""
+        self.shutdown_event.set()
+        if self.gps_listener_thread:
+            self.gps_listener_thread.join(timeout=1.0)
+        if self.ack_thread:
+            self.ack_thread.join(timeout=1.0)
+        if self.sweep_thread:
+            self.sweep_thread.join(timeout=1.0)
+        if self.relay_thread:
+            self.relay_thread.join(timeout=1.0)
+        self.gps_listener_running = False
+
+    # ----------------------- Clock Sync -----------------------
+    def start_clock_sync(self):
+        """Track each hub's clock so commands can carry an execute-at time."""
+        self.stop_clock_sync()
+        hubs = self.hubs
+        if not hubs:
+            return
+        for name, link in hubs.links.items():
+            master = SyncMaster(lambda msg, link=link: self.request_hub(link, msg, timeout=0.2))
+            self.clocks[name] = master.start()
+            labels = {"shard": name}
+            self.metrics.gauge("clock_offset_seconds", "Hub clock minus laptop clock", labels,
+                               fn=lambda n=name: self.clocks[n].estimator.offset)
+            self.metrics.gauge("clock_skew_ppm", "Hub clock rate error vs. laptop", labels,
+                               fn=lambda n=name: self.clocks[n].estimator.skew_ppm)
+            self.metrics.gauge("clock_sync_rtt_seconds", "Best recent TIME round trip", labels,
+                               fn=lambda n=name: self.clocks[n].rtt)
+
+    def stop_clock_sync(self):
+        for master in self.clocks.values():
+            master.stop()
+        self.clocks = {}
+
+    def clocks_synced(self) -> bool:
+        hubs = self.hubs
+        return bool(hubs) and all(name in self.clocks and self.clocks[name].synced for name in hubs.links)
+
+    def stamp(self, msg: str, due: float) -> str:
+        """
+        Add a hub-clock time for laptop time `due` (perf_counter): execute-at for
+        pin commands, time of validity for GPS targets.
+        """
+        clock = self.clocks.get(self.hubs.link_for(msg).shard.name)
+        if clock is None or not clock.synced:
+            return msg
+        return schedule(msg, clock.hub_time_us(due))
+
+    # ----------------------- Ack Tracking -----------------------
+    def start_ack_tracker(self):
+        """Retransmit commands to members that did not ack them."""
+        def tracker():
+            while not self.shutdown_event.wait(ACK_CHECK_INTERVAL):
+                retransmit, failed = self.membership.due_retransmits()
+                for cmd, missing in retransmit:
+                    for row, col in sorted(missing):
+                        msg = f"TO:{row};{col}|{cmd.payload}"
+                        try:
+                            reply = self.send_command(msg, timeout=0.3, track=False)
+                        except ConnectionError:
+                            return
+                        except OSError:
+                            continue
+                        seq = reply_seq(reply)
+                        if seq is not None:
+                            self.membership.alias((self.hubs.link_for(msg).shard.name, seq), cmd, (row, col))
+                        self.m_retransmits.inc()
+                        self.rate_ctl.on_loss()
+                for cmd, missing in failed:
+                    motor = pin_command(cmd.payload)
+                    if motor:
+                        for row, col in missing:
+                            self.motor_state.missed(row, col, motor[1])
+                    self.m_ack_failures.inc(len(missing))
+                    self.rate_ctl.on_loss(len(missing))
+                    who = ", ".join(f"{r};{c}" for r, c in sorted(missing))
+                    self.log(f"No ack from {who} for '{cmd.payload}'")
+
+        self.ack_thread = threading.Thread(target=tracker, daemon=True)
+        self.ack_thread.start()
+
+    def _motor_acked(self, payload: str, member):
+        motor = pin_command(payload)
+        if motor:
+            self.motor_state.ack(member[0], member[1], motor[1], motor[2])
+
+    # ----------------------- Motor State Sweep -----------------------
+    def start_motor_sweep(self):
+        """Anti-entropy for the motor state table (see SWEEP_TICK)."""
+        def sweep():
+            next_full = time.monotonic() + FULL_SWEEP_INTERVAL
+            while not self.shutdown_event.wait(SWEEP_TICK):
+                # A playing sequence owns the motors; cancelling one turns its motors off
+                if self.sequencer.busy:
+                    continue
+                now = time.monotonic()
+                targets = set(self.motor_state.stuck_on(now, MAX_ON_SECONDS))
+                if now >= next_full:
+                    next_full = now + FULL_SWEEP_INTERVAL
+                    present = {}
+                    for row, col in list(self.membership.members):
+                        present.setdefault(row, set()).add(col)
+                    targets.update(self.motor_state.unconfirmed_off(present))
+                hubs = self.hubs
+                if not targets or not hubs:
+                    continue
+                messages = [f"{row};{pin}:0" for row, pin in sorted(targets)]
+                results = hubs.fan_out(messages, lambda msg: self.send_command(msg, timeout=0.3, force=True))
+                if any(isinstance(r, ConnectionError) for r in results):
+                    return
+                self.m_sweep_commands.inc(len(messages))
+
+        self.sweep_thread = threading.Thread(target=sweep, daemon=True)
+        self.sweep_thread.start()
+
+    # ----------------------- GPS Relay -----------------------
+    def gps_targets(self, hubs):
+        """
+        Target messages for the selected rows, limited to the members that need a
+        correction (plus periodic confirmations) once headbands report positions. Each one is extrapolated (CTRV) to
+        when it should reach its headband - its place in the hub's send queue plus
+        the downlink delay - and stamped with that time of validity when the
+        hub clock is synced.
+        """
+        now = time.monotonic()
+        now_pc = time.perf_counter()
+        base = self.pose_filter.predict(now)
+        if base is None:
+            return None
+
+        spacing = self.spacing_feet
+        members = [(row, col) for row in sorted(self.selected_rows) for col in range(1, self.cols + 1)]
+        evaluation = self.block_eval
+        if evaluation is not None:
+            # Members that need a correction, worst first, then due confirmations
+            members = self.block.correction_order(evaluation, members)
+
+        queue_pos = {}
+        messages = []
+        for row, col in members:
+            shard = hubs.link_for(f"{row};").shard.name
+            pos = queue_pos.get(shard, 0)
+            queue_pos[shard] = pos + 1
+            lead = self.latency.lead(pos)
+            pose = extrapolate(base, now + lead)
+            positions = calculate_column_positions(pose.lat, pose.lon, round(pose.heading) % 360, spacing)
+            (lat, lon), heading = positions[col - 1]
+            messages.append(self.stamp(f"{row};{col}:{lat},{lon}|{heading}", now_pc + lead))
+        return messages
+
+    def send_gps_update(self):
+        """Send GPS positions to the selected headbands once, in the background."""
+        if not self.pose_filter.ready:
+            self.log("No GPS data available yet")
+            return
+
+        def worker():
+            if not self.relay_lock.acquire(blocking=False):
+                self.log("GPS relay already in progress")
+                return
+            try:
+                sent = self.relay_gps()
+            finally:
+                self.relay_lock.release()
+            if sent is not None:
+                self.log(f"Sent GPS to {sent} targets")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def relay_gps(self) -> Optional[int]:
+        """Send one round of GPS targets; returns how many went out (None if not connected)."""
+        hubs = self.hubs
+        if not hubs:
+            self.log("Not connected")
+            return None
+        messages = self.gps_targets(hubs)
+        # Each hub relays its own rows; hubs work in parallel
+        fanout_start = time.perf_counter()
+        results = hubs.fan_out(messages, lambda msg: self.send_command(msg, timeout=0.5))
+        self.m_relay_fanout.record(time.perf_counter() - fanout_start)
+        self.rate_ctl.on_sent(len(messages))
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        for e in {str(e) for e in errors}:
+            self.log(f"Send error: {e}")
+        return len(results) - len(errors)
+
+    def start_relay_loop(self):
+        """Relay GPS targets at the rate chosen by the rate controller while auto-relay is on."""
+        def loop():
+            hub_hz = None
+            next_eval = 0.0
+            next_report = 0.0
+            while self.gps_listener_running and not self.shutdown_event.wait(RELAY_TICK):
+                pose = self.pose_filter.predict()
+                if pose is not None:
+                    self.rate_ctl.observe_motion(pose.speed, pose.heading_rate)
+                    if self.block.reports and pose.t >= next_eval:
+                        next_eval = pose.t + EVAL_INTERVAL
+                        self.evaluate_block(pose)
+                self.rate_ctl.set_backlog(self.membership.pending_count())
+                rate = self.rate_ctl.control()
+                now = time.monotonic()
+                if now >= next_report:
+                    next_report = now + RELAY_REPORT_INTERVAL
+                    self.emit(RELAY, achieved=self.rate_ctl.achieved_rate(), target=rate,
+                              ceiling=self.rate_ctl.ceiling)
+
+                # Hub telemetry follows the relay rate, within the hub's pose stream range
+                telemetry_hz = min(MAX_STREAM_HZ, max(MIN_STREAM_HZ, rate))
+                if hub_hz is None or abs(telemetry_hz - hub_hz) >= RATE_CHANGE_THRESHOLD * hub_hz:
+                    if not self.set_hub_rate(telemetry_hz) and hub_hz is None:
+                        self.log("Hub did not accept RATE; telemetry stays at its fixed interval")
+                    hub_hz = telemetry_hz
+
+                if not (self.auto_relay_on and pose is not None and self.selected_rows):
+                    continue
+                if not self.rate_ctl.due():
+                    continue
+                if not self.relay_lock.acquire(blocking=False):
+                    # A manual send is still going out
+                    self.rate_ctl.mark_dropped()
+                    continue
+                try:
+                    if self.relay_gps():
+                        self.rate_ctl.mark_sent()
+                finally:
+                    self.relay_lock.release()
+
+        self.relay_thread = threading.Thread(target=loop, daemon=True)
+        self.relay_thread.start()
+
+    def formation_targets(self, pose):
+        """Target lat/lon/heading arrays for every member (slot order) at `pose`."""
+        heading = round(pose.heading) % 360
+        lat, lon = column_targets(pose.lat, pose.lon, heading, self.block.slot_cols, self.spacing_feet)
+        return lat, lon, np.full(lat.shape, float(heading))
+
+    def evaluate_block(self, pose):
+        """Evaluate every reporting member against its target."""
+        start = time.perf_counter()
+        evaluation = self.block.evaluate(*self.formation_targets(pose), now=pose.t)
+        self.m_block_eval.record(time.perf_counter() - start)
+        self.block_eval = evaluation
+        self.block_tiers = self.block.counts(evaluation)
+        distance = np.nan_to_num(evaluation.distance_ft, nan=0.0)
+        self.emit(BLOCK, distance=distance.tolist(), tier=evaluation.tier.tolist())
+
+    def set_hub_rate(self, hz: float) -> bool:
+        """Ask every hub to send telemetry at `hz`."""
+        ok = True
+        for link in list(self.hubs.links.values()):
+            try:
+                reply = self.request_hub(link, f"RATE:{hz:.1f}", timeout=0.3)
+            except OSError:
+                reply = None
+            ok = ok and bool(reply) and reply.strip().startswith("OK")
+        return ok
+
+    # ----------------------- Motor Control -----------------------
+    def run_sequence(self, sequence, policy: Optional[str] = None, label: str = ""):
+        """
+        Queue a sequence of motor commands on the sequence executor.
+        sequence = list of (row, pin, state, delay); `policy` (sequencer.POLICIES)
+        says what to do if another sequence is playing, default SEQUENCE_POLICY.
+        Returns the Run, or None if not connected.
+        """
+        if not self.connected:
+            self.log("Not connected")
+            return None
+
+        # With synced clocks each step is sent SCHEDULE_LEAD early and stamped with
+        # its execute-at time, so every headband fires together regardless of arrival
+        lead = SCHEDULE_LEAD if self.clocks_synced() else 0.0
+        run = self.sequencer.submit(batches(sequence), policy or SEQUENCE_POLICY, label, lead)
+        if run.outcome == REJECTED:
+            self.log(f"{label or 'Sequence'} dropped: another sequence is playing")
+        return run
+
+    def _send_steps(self, steps, due: Optional[float]) -> bool:
+        """Sequence executor callback: send one batch, fanned out across hubs. False if disconnected."""
+        hubs = self.hubs
+        if not hubs:
+            return False
+        messages = [f"{row};{pin}:{state}" for row, pin, state in steps]
+        if due is not None:
+            messages = [self.stamp(msg, due) for msg in messages]
+        # One write per hub for the whole batch: rows due together leave together
+        results = self.send_frame(messages, timeout=0.5)
+        for (_row, pin, state), result in zip(steps, results):
+            if isinstance(result, ConnectionError):
+                return False
+            if isinstance(result, Exception):
+                self.log(f"Send error: {result}")
+            else:
+                self.emit(MOTOR, pin=pin, on=state == 1)
+        return True
+
+    def _sequences_idle(self):
+        for pin in ALL_PINS:
+            self.emit(MOTOR, pin=pin, on=False)
+
+    def build_sequence_for_rows(self, base_sequence, rows=None):
+        """Build sequence for all selected rows (or `rows`), all rows playing together."""
+        rows = self.selected_rows if rows is None else rows
+        return to_sequence(merge_timelines(rows_timelines(base_sequence, rows)))
+
+    def run_cue(self, name: str, rows=None, policy: Optional[str] = None):
+        """Play a built-in cue (CUES) on the selected rows (or `rows`)."""
+        if name not in CUES:
+            raise ValueError(f"Unknown cue '{name}'")
+        label, base = CUES[name]
+        rows = sorted(self.selected_rows if rows is None else rows)
+        if not rows:
+            self.log("No rows selected")
+            return None
+        self.log(f"{label} -> Row(s) {', '.join(map(str, rows))}")
+        return self.run_sequence(self.build_sequence_for_rows(base, rows), policy, label)
+
+    def emergency_stop(self):
+        """
+        Emergency stop - immediately turn off all motors on ALL rows. Only motors
+        that are on or might be (motor state table) get an OFF; the sweep re-checks
+        the rest.
+        """
+        self.log("EMERGENCY STOP - All rows, all motors OFF")
+
+        if not self.connected:
+            return
+
+        self.sequencer.cancel_all()
+
+        def worker():
+            # Let a batch already on its way go out first, so nothing lands after the OFFs
+            self.sequencer.wait_idle(timeout=0.6)
+            # Send OFF to every motor that may be on, every hub at once
+            hubs = self.hubs
+            if not hubs:
+                return
+            messages = [f"{row};{pin}:0" for row, pin in self.motor_state.maybe_on()]
+            hubs.fan_out(messages, lambda msg: self.send_command(msg, timeout=0.3, force=True))
+            for pin in ALL_PINS:
+                self.emit(MOTOR, pin=pin, on=False)
+
+        threading.Thread(target=worker, daemon=True).start()
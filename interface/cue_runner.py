@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Scripted cue runner: plays a show's haptic cues at given times.
+
+A cue file has one cue per line, `#` starts a comment:
+
+    # time    cue               rows
+    0:00.0    start_march       all
+    0:04.5    left              1,2
+    0:04.5    right             4-5
+    12        pattern:Turn Back 3
+
+  - time: seconds, or m:ss(.s), from show start;
+  - cue: a built-in cue (controller.CUES) or `pattern:<name>` from the
+    language builder's library (haptic_patterns.json);
+  - rows: "all" (the default), a list "1,3" and/or ranges "1-3".
+
+Everything is resolved before the show starts: the file is checked (all
+errors reported with line numbers), every cue is expanded into its motor
+commands, commands due at the same moment on the same hub are joined into one
+frame, and each frame's bytes are built up front. During the show the runner
+only waits for each frame's deadline (sleep, then spin for the last couple of
+milliseconds) and writes it to a connection that stays open and never waits
+for replies; replies are matched afterwards. With --sync the hub clocks are
+synced first and frames go out SCHEDULE_LEAD early, stamped with their
+execute-at time; the clocks keep syncing through the show.
+
+After the show (or Ctrl-C, which turns every motor off; with --sync the offs
+are stamped SCHEDULE_LEAD ahead too, so they execute after every frame already
+sent) it reports each cue's lateness: when its frames actually went out against when they were due.
+
+    python cue_runner.py show.cues --countdown 3
+    python cue_runner.py show.cues --dry-run
+    python cue_runner.py --keys --rows 1-5        # WASD control, like laptop.py
+"""
+import csv
+import re
+import sys
+import time
+from concurrent.futures import wait
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from clock_sync import SCHEDULE_LEAD, SyncMaster, schedule
+from controller import ALL_PINS, CUES, GRID_ROWS, HOST_DEFAULT, HUBS_CONFIG, KEY_CUES, PORT_DEFAULT
+from shards import PipelinedLink, load_shard_map
+from timeline import length, merge_timelines, rows_timelines
+
+PATTERN_PREFIX = "pattern:"
+
+# Deadline scheduler: sleep until this close to a deadline, then spin
+SPIN_WINDOW = 0.002
+# Gap between the end of set-up (sync, countdown) and the first cue
+START_MARGIN = 0.2
+SYNC_WAIT = 3.0
+REPLY_WAIT = 2.0
+
+
+class CueFileError(ValueError):
+    """A cue file that cannot be played; `errors` lists every problem found."""
+
+    def __init__(self, path: str, errors: List[str]):
+        super().__init__(f"{path}: " + "; ".join(errors))
+        self.path = path
+        self.errors = errors
+
+
+class Cue(NamedTuple):
+    line: int
+    at: float                                # Seconds from show start
+    name: str
+    rows: Tuple[int, ...]
+    steps: List[Tuple[int, int, float]]      # (pin, state, delay after)
+
+
+class Frame(NamedTuple):
+    """Commands for one hub that are due together."""
+    due: float                               # Seconds from show start
+    hub: str
+    lines: Tuple[str, ...]
+    cues: Tuple[int, ...]                    # Per line: index of its cue in the cue list
+    payload: bytes
+
+
+# ----------------------- Cue Files -----------------------
+def parse_time(text: str) -> float:
+    """Seconds from "12", "12.5", "1:05" or "1:05.25"."""
+    minutes, _, seconds = text.rpartition(":")
+    value = float(seconds) + 60 * (int(minutes) if minutes else 0)
+    if value < 0 or (minutes and float(seconds) >= 60):
+        raise ValueError(text)
+    return value
+
+
+def parse_rows(text: str, rows: int) -> Tuple[int, ...]:
+    """Rows from "all", "1,3", "2-4" or a mix such as "1,3-5"."""
+    if text.lower() == "all":
+        return tuple(range(1, rows + 1))
+    selected = set()
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= rows:
+            raise ValueError(part)
+        selected.update(range(first, last + 1))
+    return tuple(sorted(selected))
+
+
+def pattern_steps(pattern: dict) -> List[Tuple[int, int, float]]:
+    """A library pattern as (pin, state, delay) steps, like CUES."""
+    from patterns import pattern_sequence
+
+    steps = []
+    for msg, delay in pattern_sequence(pattern):
+        pin, state = msg.split(";", 1)[1].split(":")
+        steps.append((int(pin), int(state), delay))
+    return steps
+
+
+def load_cues(path: str, rows: int = GRID_ROWS, patterns_file: Optional[str] = None) -> List[Cue]:
+    """Read and check a cue file. Raises CueFileError listing every bad line."""
+    store = None
+    cues, errors = [], []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            # The cue name may contain spaces ("pattern:Turn Back"); the rows field never does
+            fields = line.split()
+            row_text = "all"
+            if len(fields) > 2 and re.fullmatch(r"(?i)all|[\d,-]+", fields[-1]):
+                row_text = fields.pop()
+            if len(fields) < 2:
+                errors.append(f"line {number}: expected 'time cue [rows]'")
+                continue
+            try:
+                at = parse_time(fields[0])
+            except ValueError:
+                errors.append(f"line {number}: bad time '{fields[0]}'")
+                continue
+            try:
+                cue_rows = parse_rows(row_text, rows)
+            except ValueError:
+                errors.append(f"line {number}: bad rows '{row_text}' (1-{rows})")
+                continue
+
+            name = " ".join(fields[1:])
+            if name.startswith(PATTERN_PREFIX):
+                if store is None:
+                    from patterns import PATTERNS_FILE, PatternStore
+                    store = PatternStore(patterns_file or PATTERNS_FILE)
+                    store.load()
+                pattern = store.get(name[len(PATTERN_PREFIX):])
+                if pattern is None or not pattern["motors"]:
+                    errors.append(f"line {number}: no pattern '{name[len(PATTERN_PREFIX):]}' in the library")
+                    continue
+                steps = pattern_steps(pattern)
+            elif name in CUES:
+                steps = CUES[name][1]
+            else:
+                errors.append(f"line {number}: unknown cue '{name}'")
+                continue
+            cues.append(Cue(number, at, name, cue_rows, steps))
+    if errors:
+        raise CueFileError(path, errors)
+    cues.sort(key=lambda c: (c.at, c.line))
+    return cues
+
+
+def overlaps(cues: List[Cue]) -> List[str]:
+    """Warnings for cues that start before an earlier cue on the same row has finished."""
+    warnings = []
+    busy_until: Dict[int, Tuple[float, Cue]] = {}
+    for cue in cues:
+        for row in cue.rows:
+            end, other = busy_until.get(row, (0.0, None))
+            if other is not None and cue.at < end:
+                warnings.append(f"line {cue.line}: '{cue.name}' starts on row {row} while "
+                                f"'{other.name}' (line {other.line}) is still playing")
+            if cue.at + length(cue.steps) > end:
+                busy_until[row] = (cue.at + length(cue.steps), cue)
+    return warnings
+
+
+# ----------------------- Compile -----------------------
+def compile_plan(cues: List[Cue], shard_map) -> List[Frame]:
+    """
+    Every motor command of the show, as frames sorted by due time. A cue's rows
+    play together; consecutive zero-delay steps share a frame, and so do
+    commands from different cues that fall due at the same moment on one hub.
+    """
+    owners = []
+    timelines = []
+    for index, cue in enumerate(cues):
+        for timeline in rows_timelines(cue.steps, cue.rows, cue.at):
+            owners.append(index)
+            timelines.append(timeline)
+
+    plan = []
+    for merged in merge_timelines(timelines):
+        by_hub: Dict[str, List[Tuple[str, int]]] = {}
+        for (row, pin, state), source in zip(merged.commands, merged.sources):
+            by_hub.setdefault(shard_map.shard_for_row(row).name, []).append((f"{row};{pin}:{state}", owners[source]))
+        for hub, commands in sorted(by_hub.items()):
+            lines, cue_indexes = zip(*commands)
+            plan.append(Frame(merged.at, hub, lines, cue_indexes, "".join(f"{line}\n" for line in lines).encode()))
+    return plan
+
+
+def stamp_plan(plan: List[Frame], start: float, clocks: Dict[str, SyncMaster]) -> List[Frame]:
+    """Frames with every command stamped with its hub-clock execute-at time."""
+    stamped = []
+    for frame in plan:
+        hub_us = clocks[frame.hub].hub_time_us(start + frame.due)
+        lines = tuple(schedule(line, hub_us) for line in frame.lines)
+        stamped.append(frame._replace(lines=lines, payload="".join(f"{line}\n" for line in lines).encode()))
+    return stamped
+
+
+# ----------------------- Show -----------------------
+class ShowResult(NamedTuple):
+    sent: List[Optional[float]]              # Per frame: actual minus planned send time (s), None if not sent
+    replies: List[list]                      # Per frame: Futures of its commands
+    interrupted: bool
+
+
+def run_show(plan: List[Frame], links: Dict[str, PipelinedLink], start: float, lead: float) -> ShowResult:
+    """Send every frame at start + due - lead. Ctrl-C stops the show early."""
+    sent: List[Optional[float]] = [None] * len(plan)
+    replies: List[list] = [[] for _ in plan]
+    try:
+        for i, frame in enumerate(plan):
+            deadline = start + frame.due - lead
+            remaining = deadline - time.perf_counter()
+            if remaining > SPIN_WINDOW:
+                time.sleep(remaining - SPIN_WINDOW)
+            while time.perf_counter() < deadline:
+                pass
+            replies[i] = links[frame.hub].send(frame.payload, len(frame.lines))
+            sent[i] = time.perf_counter() - deadline
+    except KeyboardInterrupt:
+        return ShowResult(sent, replies, True)
+    return ShowResult(sent, replies, False)
+
+
+def all_off(links: Dict[str, PipelinedLink], shard_map, rows: int,
+            clocks: Optional[Dict[str, SyncMaster]] = None, lead: float = 0.0):
+    """
+    Turn every motor off on every row, each hub in one write. With clocks the
+    offs are stamped `lead` from now: stamped frames already sent execute up
+    to `lead` late, and unstamped offs would run before them.
+    """
+    futures = []
+    for hub, link in links.items():
+        hub_rows = [row for row in range(1, rows + 1) if shard_map.shard_for_row(row).name == hub]
+        lines = [f"{row};{pin}:0" for row in hub_rows for pin in ALL_PINS]
+        if clocks:
+            hub_us = clocks[hub].hub_time_us(time.perf_counter() + lead)
+            lines = [schedule(line, hub_us) for line in lines]
+        if lines:
+            try:
+                futures += link.send("".join(f"{line}\n" for line in lines).encode(), len(lines))
+            except OSError:
+                pass
+    wait(futures, timeout=REPLY_WAIT)
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def report(cues: List[Cue], plan: List[Frame], result: ShowResult, csv_path: Optional[str] = None):
+    """Per-cue lateness table plus a summary; optionally the same rows as CSV."""
+    wait([f for futures in result.replies for f in futures], timeout=REPLY_WAIT)
+    per_cue = [{"lateness": [], "ok": 0, "total": 0, "rtt": 0.0} for _ in cues]
+    for frame, late, futures in zip(plan, result.sent, result.replies):
+        if late is not None:
+            for index in sorted(set(frame.cues)):
+                per_cue[index]["lateness"].append(late)
+        for index in frame.cues:
+            per_cue[index]["total"] += 1
+        for index, future in zip(frame.cues, futures):
+            if future.done() and future.exception() is None:
+                reply, rtt = future.result()
+                per_cue[index]["ok"] += reply.startswith("OK")
+                per_cue[index]["rtt"] = max(per_cue[index]["rtt"], rtt)
+
+    rows = []
+    print(f"\n{'line':>5} {'time':>8}  {'cue':<22} {'first ms':>9} {'worst ms':>9} {'replies':>9} {'rtt ms':>7}")
+    for cue, stats in zip(cues, per_cue):
+        late = stats["lateness"]
+        if not late:
+            print(f"{cue.line:>5} {cue.at:>8.2f}  {cue.name:<22} {'not sent':>9}")
+            rows.append([cue.line, cue.at, cue.name, "", "", stats["ok"], stats["total"], ""])
+            continue
+        first, worst = late[0] * 1e3, max(late) * 1e3
+        replies = f"{stats['ok']}/{stats['total']}"
+        print(f"{cue.line:>5} {cue.at:>8.2f}  {cue.name:<22} {first:>9.2f} {worst:>9.2f} {replies:>9} "
+              f"{stats['rtt'] * 1e3:>7.1f}")
+        rows.append([cue.line, cue.at, cue.name, f"{first:.3f}", f"{worst:.3f}", stats["ok"], stats["total"],
+                     f"{stats['rtt'] * 1e3:.3f}"])
+
+    late = [s * 1e3 for s in result.sent if s is not None]
+    if late:
+        print(f"\n{len(late)}/{len(plan)} frames sent; lateness p50 {percentile(late, 50):.2f} ms, "
+              f"p99 {percentile(late, 99):.2f} ms, max {max(late):.2f} ms")
+    if result.interrupted:
+        print("Show stopped early (Ctrl-C); all motors turned off")
+    if csv_path:
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["line", "time_s", "cue", "first_late_ms", "worst_late_ms", "replies_ok",
+                             "commands", "worst_rtt_ms"])
+            writer.writerows(rows)
+        print(f"Report written to {csv_path}")
+
+
+def print_plan(cues: List[Cue], plan: List[Frame]):
+    for frame in plan:
+        names = ", ".join(cues[i].name for i in sorted(set(frame.cues)))
+        print(f"{frame.due:9.3f}  {frame.hub:<16} {len(frame.lines):>3} cmd  {names}: {' '.join(frame.lines)}")
+    print(f"{len(cues)} cues, {len(plan)} frames, {sum(len(f.lines) for f in plan)} commands, "
+          f"{plan[-1].due if plan else 0:.2f} s")
+
+
+# ----------------------- Keyboard Mode -----------------------
+def get_char() -> str:
+    import termios
+    import tty
+
+    fd = sys.stdin.fileno()
+    old = termios.tcgetattr(fd)
+    try:
+        tty.setraw(fd)
+        return sys.stdin.read(1)
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old)
+
+
+def run_keys(links: Dict[str, PipelinedLink], shard_map, rows: Tuple[int, ...]):
+    """WASD cues (controller.KEY_CUES) on `rows` until p is pressed; each key press is a one-cue show."""
+    plans = {key: compile_plan([Cue(0, 0.0, name, rows, CUES[name][1])], shard_map)
+             for key, name in KEY_CUES.items()}
+    keys = ", ".join(f"{key} {CUES[name][0]}" for key, name in KEY_CUES.items())
+    print(f"{keys}; p to quit\r")
+    while True:
+        key = get_char().lower()
+        if key == "p":
+            return
+        if key in plans:
+            result = run_show(plans[key], links, time.perf_counter(), 0.0)
+            sent = [s for s in result.sent if s is not None]
+            if sent:
+                print(f"{CUES[KEY_CUES[key]][0]}: worst lateness {max(sent) * 1e3:.2f} ms\r")
+            if result.interrupted:
+                all_off(links, shard_map, GRID_ROWS)
+                print("Stopped (Ctrl-C); all motors turned off\r")
+                return
+
+
+# ----------------------- Main -----------------------
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play a file of timed haptic cues")
+    parser.add_argument("cues", nargs="?", help="Cue file (see the module docstring)")
+    parser.add_argument("--host", default=HOST_DEFAULT, help="Hub address (or 'host[:port][/ch], ...')")
+    parser.add_argument("--port", type=int, default=PORT_DEFAULT)
+    parser.add_argument("--hubs-config", default=HUBS_CONFIG)
+    parser.add_argument("--rows", default="all", help="Rows for --keys")
+    parser.add_argument("--patterns", help="Pattern library for pattern: cues (default haptic_patterns.json)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the compiled plan and exit")
+    parser.add_argument("--sync", action="store_true", help="Sync hub clocks and send time-stamped commands")
+    parser.add_argument("--countdown", type=int, default=0, help="Seconds of countdown before the show")
+    parser.add_argument("--csv", help="Also write the lateness report here")
+    parser.add_argument("--keys", action="store_true", help="Play KEY_CUES from the keyboard instead of a file")
+    args = parser.parse_args()
+    if not args.cues and not args.keys:
+        parser.error("a cue file or --keys is required")
+
+    shard_map = load_shard_map(args.hubs_config, args.host, args.port, range(1, GRID_ROWS + 1))
+    cues, plan = [], []
+    if args.cues:
+        try:
+            cues = load_cues(args.cues, GRID_ROWS, args.patterns)
+        except CueFileError as e:
+            for error in e.errors:
+                print(f"{e.path}: {error}")
+            sys.exit(1)
+        for warning in overlaps(cues):
+            print(f"warning: {warning}")
+        plan = compile_plan(cues, shard_map)
+        if args.dry_run:
+            print_plan(cues, plan)
+            return
+
+    hubs = {frame.hub for frame in plan} if plan else {shard.name for shard in shard_map.shards}
+    links, clocks = {}, {}
+    try:
+        for shard in shard_map.shards:
+            if shard.name in hubs:
+                link = PipelinedLink(shard)
+                link.connect()
+                links[shard.name] = link
+                print(f"Connected to {shard.name} ({shard.host}:{shard.port})")
+
+        if args.keys:
+            run_keys(links, shard_map, parse_rows(args.rows, GRID_ROWS))
+            return
+
+        lead = 0.0
+        if args.sync:
+            clocks = {name: SyncMaster(link.request).start() for name, link in links.items()}
+            give_up = time.monotonic() + SYNC_WAIT
+            while not all(c.synced for c in clocks.values()) and time.monotonic() < give_up:
+                time.sleep(0.05)
+            if all(c.synced for c in clocks.values()):
+                lead = SCHEDULE_LEAD
+            else:
+                print("Clock sync failed; sending commands unstamped")
+
+        for n in range(args.countdown, 0, -1):
+            print(f"{n}...")
+            time.sleep(1)
+        start = time.perf_counter() + lead + START_MARGIN
+        if lead:
+            plan = stamp_plan(plan, start, clocks)
+        print(f"Show: {len(cues)} cues, {len(plan)} frames")
+        result = run_show(plan, links, start, lead)
+        if result.interrupted:
+            all_off(links, shard_map, GRID_ROWS, clocks if lead else None, lead)
+        report(cues, plan, result, args.csv)
+    finally:
+        for clock in clocks.values():
+            clock.stop()
+        for link in links.values():
+            link.close()
+
+
+if __name__ == "__main__":
+    main()
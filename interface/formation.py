@@ -0,0 +1,56 @@
+"""
+Formation geometry: where each column stands relative to the hub.
+
+calculate_column_positions() is the per-frame version used by the GUI;
+column_targets() is the same math on NumPy arrays, for evaluating many
+members or many samples at once.
+"""
+import math
+
+FEET_PER_DEGREE_LAT = 364567.2
+COLUMN_OFFSETS = [-2.0, -1.0, 0.0, 1.0, 2.0]  # spacing multiples, columns 1-5
+
+
+def feet_to_degrees(feet, latitude):
+    """Convert feet to lat/lon degrees at given latitude."""
+    lat_degrees = feet / FEET_PER_DEGREE_LAT
+    lon_degrees = feet / (FEET_PER_DEGREE_LAT * math.cos(math.radians(latitude)))
+    return lat_degrees, lon_degrees
+
+
+def calculate_column_positions(lat, lon, heading_deg, spacing_feet=3.0):
+    """
+    Calculate GPS positions for all 5 columns based on hub position.
+    Returns list of ((lat, lon), heading) tuples for columns 1-5.
+    """
+    theta = math.radians(heading_deg)
+    offset_multipliers = COLUMN_OFFSETS
+    result = []
+
+    for mult in offset_multipliers:
+        distance_feet = mult * spacing_feet
+        lat_offset, lon_offset = feet_to_degrees(abs(distance_feet), lat)
+
+        if distance_feet >= 0:
+            new_lat = lat - (lat_offset * math.cos(theta))
+            new_lon = lon + (lon_offset * math.sin(theta))
+        else:
+            new_lat = lat + (lat_offset * math.cos(theta))
+            new_lon = lon - (lon_offset * math.sin(theta))
+
+        result.append(((new_lat, new_lon), heading_deg))
+
+    return result
+
+
+def column_targets(lat, lon, heading_deg, col, spacing_feet=3.0):
+    """
+    Vectorized calculate_column_positions: target (lat, lon) of column `col`
+    (1-5) for hub positions/headings. All arguments broadcast.
+    """
+    import numpy as np  # Here, so the GUI can use calculate_column_positions without loading NumPy
+    theta = np.radians(heading_deg)
+    distance_feet = np.take(COLUMN_OFFSETS, np.asarray(col) - 1) * spacing_feet
+    new_lat = lat - distance_feet / FEET_PER_DEGREE_LAT * np.cos(theta)
+    new_lon = lon + distance_feet / (FEET_PER_DEGREE_LAT * np.cos(np.radians(lat))) * np.sin(theta)
+    return new_lat, new_lon
@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Bulk ingest of raw GPS captures (NMEA and UBX) into NumPy arrays.
+
+nmea.read_log() walks a capture byte by byte and sentence by sentence, which
+is fine for a few minutes of data but not for the multi-gigabyte serial dumps
+that readGPS()/rtk.ino produce over a rehearsal. ingest() memory-maps the file
+and works on it in blocks of BLOCK_SIZE bytes, cut at line ends:
+
+  - NMEA: '$', '*', ',' and line ends are found with vectorized searches;
+    sentences are framed exactly like readGPS() (and nmea.frames()), their
+    "*hh" is checked with one XOR reduction over the block, and the GGA/RMC
+    fields are parsed column-wise from fixed-width byte matrices. Sentences
+    are grouped by layout (where their ',' '.' and '*' fall); a receiver
+    repeats a few layouts all day, and each large group is parsed from fixed
+    columns of its rows. Fields too long for the matrices (FIELD_WIDTH) go
+    through nmea.parse() instead, so the result matches the reference parser
+    exactly, down to every double.
+  - UBX: NAV-PVT frames are found by their sync bytes, their Fletcher
+    checksum is checked for all frames at once, and the payload is read
+    through a structured dtype.
+
+Blocks are independent, so they are scanned in a process pool (one worker
+per CPU by default), each worker mapping the file itself.
+
+The result is one FIX_DTYPE array in file order (pandas.DataFrame(fixes)
+takes it as is), which can also be written to a telemetry archive
+(archive.py) as hub or member rows.
+
+Usage: python gps_ingest.py capture.log [--npy fixes.npy] [--archive out.hba] [--member 2;3] [--workers 4]
+"""
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import nmea
+from archive import HUB, POS, ArchiveWriter, member_id
+
+BLOCK_SIZE = 64 << 20
+MIN_BLOCK_SIZE = 1 << 20    # Smallest block ingest() cuts to give every worker one
+SENTENCE_WIDTH = 128        # Bytes per GGA/RMC sentence (a power of 2) in the parse matrices (NMEA's limit is 82)
+FIELD_WIDTH = 16            # Bytes per field; longer sentences and fields go to nmea.parse()
+MAX_DIGITS = 15             # Mantissas up to 10**15 convert to float64 exactly
+TEMPLATE_MIN = 64           # Sentences sharing a layout before they are parsed from fixed columns
+
+# Fix sources
+GGA = 1
+RMC = 2
+PVT = 3
+SOURCE_NAMES = {GGA: "GGA", RMC: "RMC", PVT: "UBX-NAV-PVT"}
+
+FIX_DTYPE = np.dtype([
+    ("offset", "<u8"),          # Byte offset of the sentence/frame in the capture
+    ("source", "u1"),           # GGA, RMC or PVT
+    ("utc", "<f8"),             # UTC seconds of day, NaN if not given
+    ("lat", "<f8"),             # Decimal degrees, NaN without a position
+    ("lon", "<f8"),
+    ("quality", "i1"),          # NMEA fix quality (PVT mapped onto it), -1 if not given
+    ("course", "<f8"),          # Course over ground (degrees), NaN if not given
+])
+
+# UBX NAV-PVT (u-blox M8/F9 interface description)
+UBX_SYNC = (0xB5, 0x62)
+NAV_PVT = (0x01, 0x07)
+NAV_PVT_LEN = 92
+UBX_FRAME_LEN = 6 + NAV_PVT_LEN + 2
+PVT_DTYPE = np.dtype({
+    "names": ["hour", "min", "sec", "valid", "nano", "fix_type", "flags", "lon", "lat", "g_speed", "head_mot"],
+    "formats": ["u1", "u1", "u1", "u1", "<i4", "u1", "u1", "<i4", "<i4", "<i4", "<i4"],
+    "offsets": [8, 9, 10, 11, 16, 20, 21, 24, 28, 60, 64],
+    "itemsize": NAV_PVT_LEN,
+})
+
+_HEX = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    _HEX[_c] = 10 + _i
+
+_DOLLAR, _STAR, _COMMA, _DOT, _CR, _LF = (ord(c) for c in "$*,.\r\n")
+_GGA = np.frombuffer(b"GGA", dtype=np.uint8)
+_RMC = np.frombuffer(b"RMC", dtype=np.uint8)
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+_POW10F = _POW10.astype(np.float64)
+_FIELD_COLS = np.arange(FIELD_WIDTH)
+_SENTENCE_COLS = np.arange(SENTENCE_WIDTH)
+
+
+class Summary(NamedTuple):
+    bytes: int
+    sentences: int          # '$' sentences framed as readGPS() would
+    ok: int                 # GGA/RMC
+    ignored: int            # Valid checksum, other sentence types
+    bad_frame: int
+    bad_checksum: int
+    ubx_frames: int         # NAV-PVT frames with a valid checksum
+    ubx_bad_checksum: int
+    seconds: float
+
+
+# ----------------------- Field readers -----------------------
+# A field reader hands out the GGA/RMC fields of a set of sentences by index:
+# decimal(i) as _decimals() returns it, length(i), and is_char(i, c).
+# _Spans gathers every field from the block by its own span; _Template serves
+# sentences that share one layout (the same ',' '.' and '*' columns, as one
+# receiver's output mostly does) from fixed columns of their rows.
+def _rows(block: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    """block[s:s + width] for every start as one (n, width) matrix, zero past the end of the block."""
+    out = np.zeros((len(starts), width), dtype=np.uint8)
+    whole = starts <= len(block) - width
+    if len(block) >= width:
+        out[whole] = sliding_window_view(block, width)[starts[whole]]   # Row copies, no index matrix
+    for i in np.flatnonzero(~whole):
+        tail = block[starts[i]:]
+        out[i, :len(tail)] = tail
+    return out
+
+
+def _decimals(block: np.ndarray, start: np.ndarray, end: np.ndarray):
+    """
+    Fields block[start:end] read as [0-9]+(.[0-9]*)?, like nmea._is_decimal().
+    Returns (valid, too_long, mantissa, digits, frac, dot) per field, where
+    the value is mantissa / 10**frac and `dot` is the index of the '.' (or the
+    field length). too_long marks fields that need the scalar parser.
+    """
+    length = end - start
+    inside = _FIELD_COLS < length[:, None]
+    code = _rows(block, start, FIELD_WIDTH) - np.uint8(48)     # '0'-'9' -> 0-9, '.' -> 254
+    digit = inside & (code < 10)
+    dots = inside & (code == 254)
+    n_dots = np.count_nonzero(dots, axis=1)
+    digits = np.count_nonzero(digit, axis=1)
+    valid = ((length > 0) & (length <= FIELD_WIDTH) & (n_dots <= 1) & ~dots[:, 0]
+             & (digit | dots | ~inside).all(axis=1))
+    too_long = (length > FIELD_WIDTH) | (valid & (digits > MAX_DIGITS))
+    valid &= ~too_long
+    # Each digit is worth 10 ** (number of digits to its right)
+    rank = np.cumsum(digit[:, ::-1], axis=1, dtype=np.int8)[:, ::-1] - digit
+    mantissa = np.einsum("ij,ij->i", np.where(digit, code, np.uint8(0)).astype(np.int64), _POW10[rank])
+    dot = np.where(n_dots > 0, dots.argmax(axis=1), length)
+    frac = np.where(n_dots > 0, length - dot - 1, 0)
+    return valid, too_long, mantissa, digits, frac, dot
+
+
+class _Spans:
+    """Fields of sentences of any layout, from the commas in their rows of the sentence matrix."""
+
+    def __init__(self, block: np.ndarray, dollars: np.ndarray, star: np.ndarray, comma: np.ndarray):
+        self.block, self.dollars, self.star = block, dollars, star
+        self.col = np.append(np.flatnonzero(comma) & (SENTENCE_WIDTH - 1), 0)   # Row-major: commas in order
+        self.n_commas = np.count_nonzero(comma, axis=1)
+        self.first = np.cumsum(self.n_commas) - self.n_commas
+        self._spans = {}
+
+    def span(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        if i not in self._spans:
+            last = len(self.col) - 1
+            start = self.dollars + self.col[np.minimum(self.first + i - 1, last)] + 1
+            stop = np.where(self.n_commas > i, self.dollars + self.col[np.minimum(self.first + i, last)], self.star)
+            self._spans[i] = start, stop
+        return self._spans[i]
+
+    def decimal(self, i: int):
+        return _decimals(self.block, *self.span(i))
+
+    def length(self, i: int) -> np.ndarray:
+        start, stop = self.span(i)
+        return stop - start
+
+    def is_char(self, i: int, char: str) -> np.ndarray:
+        start, stop = self.span(i)
+        return (stop - start == 1) & (self.block[np.minimum(start, len(self.block) - 1)] == ord(char))
+
+
+class _Template:
+    """Fields of sentences that share one layout, as fixed columns of their sentence rows."""
+
+    def __init__(self, rows: np.ndarray, commas: np.ndarray, star: int):
+        self.rows = rows
+        self.bounds = np.concatenate([[0], commas + 1, [star + 1]])
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return int(self.bounds[i]), int(self.bounds[i + 1]) - 1
+
+    def decimal(self, i: int):
+        start, stop = self.span(i)
+        n = len(self.rows)
+        layout = self.rows[0, start:stop]
+        dots = np.flatnonzero(layout == ord("."))
+        columns = start + np.flatnonzero(layout != ord("."))
+        # The layout fixes the '.', so only the digit columns can differ between rows
+        shape_ok = stop > start and layout[0] != ord(".") and len(dots) <= 1
+        too_long = shape_ok and len(columns) > MAX_DIGITS
+        code = self.rows[:, columns] - np.uint8(48)
+        valid = (code < 10).all(axis=1) & (shape_ok and not too_long)
+        if len(columns) and not too_long:
+            mantissa = (code @ _POW10F[len(columns) - 1::-1]).astype(np.int64)     # Exact below 2**53
+        else:
+            mantissa = np.zeros(n, dtype=np.int64)
+        dot = dots[0] if len(dots) else stop - start
+        frac = stop - start - dot - 1 if len(dots) else 0
+        return (valid, np.full(n, too_long), mantissa, np.full(n, len(columns)),
+                np.full(n, frac), np.full(n, dot))
+
+    def length(self, i: int) -> np.ndarray:
+        start, stop = self.span(i)
+        return np.full(len(self.rows), stop - start)
+
+    def is_char(self, i: int, char: str) -> np.ndarray:
+        start, stop = self.span(i)
+        if stop - start != 1:
+            return np.zeros(len(self.rows), dtype=bool)
+        return self.rows[:, start] == ord(char)
+
+
+def _coords(fields, i: int, pos: str, neg: str, max_deg: int):
+    """(valid, value, too_long) of "DDMM.MMMM" field i with its hemisphere in i + 1, like nmea._coord()."""
+    valid, too_long, mantissa, digits, frac, dot = fields.decimal(i)
+    is_pos, is_neg = fields.is_char(i + 1, pos), fields.is_char(i + 1, neg)
+    deg_len = dot - 2
+    valid &= (is_pos | is_neg) & (dot < fields.length(i)) & (deg_len >= 1) & (deg_len <= 3)
+    scale = _POW10[np.clip(digits - deg_len, 0, MAX_DIGITS)]
+    degrees = mantissa // scale
+    minutes = (mantissa % scale) / _POW10[frac]
+    decimal = degrees + minutes / 60.0
+    valid &= (degrees <= max_deg) & (minutes < 60.0) & (decimal <= max_deg)
+    return valid, np.where(is_neg, -decimal, decimal), too_long
+
+
+def _utc(decimal) -> np.ndarray:
+    """hhmmss[.ss] as seconds of day, NaN if malformed."""
+    valid, _too_long, mantissa, _digits, frac, dot = decimal
+    scale = _POW10[frac]
+    whole = mantissa // scale
+    hh, mm, ss = whole // 10000, whole // 100 % 100, whole % 100
+    seconds = hh * 3600 + mm * 60 + ss + (mantissa % scale) / scale
+    ok = valid & (dot == 6) & (hh < 24) & (mm < 60) & (ss < 61)
+    return np.where(ok, seconds, np.nan)
+
+
+def _decode(source: int, fields, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """GGA or RMC fixes from a field reader, and the offsets of those to redo with nmea.parse()."""
+    out = np.zeros(len(offsets), dtype=FIX_DTYPE)
+    out["offset"] = offsets
+    out["source"] = source
+    out["utc"] = _utc(fields.decimal(1))
+    out["course"] = np.nan
+    out["quality"] = -1
+    if source == GGA:
+        # $xxGGA,time,lat,N/S,lon,E/W,quality
+        q_valid, _q_long, q_mant, _d, _f, q_dot = fields.decimal(6)
+        q_len = fields.length(6)
+        quality = np.where(q_valid & (q_len <= 2) & (q_dot == q_len), q_mant, 0)
+        out["quality"] = quality
+        lat_ok, lat, lat_long = _coords(fields, 2, "N", "S", 90)
+        lon_ok, lon, lon_long = _coords(fields, 4, "E", "W", 180)
+        has = (quality > 0) & lat_ok & lon_ok
+        slow = (quality > 0) & (lat_long | (lat_ok & lon_long))
+    else:
+        # $xxRMC,time,status,lat,N/S,lon,E/W,speed,course
+        active = fields.is_char(2, "A")
+        lat_ok, lat, lat_long = _coords(fields, 3, "N", "S", 90)
+        lon_ok, lon, lon_long = _coords(fields, 5, "E", "W", 180)
+        has = active & lat_ok & lon_ok
+        c_valid, c_long, c_mant, _d, c_frac, _dot = fields.decimal(8)
+        course = c_mant / _POW10[c_frac]
+        out["course"] = np.where(active & c_valid & (course <= 360.0), course, np.nan)
+        slow = active & (lat_long | (lat_ok & lon_long) | c_long)
+    out["lat"] = np.where(has, lat, np.nan)
+    out["lon"] = np.where(has, lon, np.nan)
+    return out[~slow], offsets[slow]
+
+
+# ----------------------- NMEA -----------------------
+def scan_nmea(block: np.ndarray, base: int = 0) -> Tuple[np.ndarray, dict]:
+    """
+    GGA/RMC fixes in a block that ends at a line end (or at the end of the
+    capture), in file order, and counts of every framed '$' sentence by nmea
+    result.
+    """
+    counts = {nmea.OK: 0, nmea.IGNORED: 0, nmea.ERR_FRAME: 0, nmea.ERR_CHECKSUM: 0}
+    empty = np.zeros(0, dtype=FIX_DTYPE)
+    n = len(block)
+    dollars = np.flatnonzero(block == _DOLLAR)
+    controls = np.flatnonzero(block <= _CR)             # Line ends and NULs in one pass
+    kinds = block[controls]
+    eols = controls[(kinds == _LF) | (kinds == _CR)]
+    nuls = np.append(controls[kinds == 0], n)
+    if not len(dollars) or not len(eols):
+        return empty, counts
+
+    # readGPS(): a '$' restarts the buffer, a line end hands it to parseNMEA()
+    k = np.searchsorted(eols, dollars)
+    has_eol = k < len(eols)
+    dollars, k = dollars[has_eol], k[has_eol]
+    eol = eols[k]
+    last = np.append(dollars[1:] > eol[:-1], True)
+    dollars, eol = dollars[last], eol[last]
+    end = np.minimum(eol, dollars + nmea.BUF_SIZE - 1)
+    framed = end - dollars > 5
+    dollars, end = dollars[framed], end[framed]
+    if not len(dollars):
+        return empty, counts
+    # parseNMEA() gets a C string: it ends at the first NUL
+    end = np.minimum(end, nuls[np.searchsorted(nuls, dollars)])
+
+    # "*hh" must close the sentence; the first '*' after the '$' is the one
+    stars = np.append(np.flatnonzero(block == _STAR), n)
+    star = stars[np.searchsorted(stars, dollars)]
+    frame_ok = star == end - 3
+    hi = _HEX[block[np.minimum(star + 1, n - 1)]]
+    lo = _HEX[block[np.minimum(star + 2, n - 1)]]
+    frame_ok &= (hi >= 0) & (lo >= 0)
+    counts[nmea.ERR_FRAME] = int(np.count_nonzero(~frame_ok))
+    dollars, star, hi, lo = dollars[frame_ok], star[frame_ok], hi[frame_ok], lo[frame_ok]
+
+    # XOR of every body: reduce over the [d+1, star) segments; an empty body is 0
+    bounds = np.empty(2 * len(dollars), dtype=np.int64)
+    bounds[0::2], bounds[1::2] = dollars + 1, star
+    xor = np.bitwise_xor.reduceat(block, bounds)[0::2] if len(bounds) else np.zeros(0, dtype=np.uint8)
+    checksum = np.where(star > dollars + 1, xor, 0)
+    sum_ok = checksum == (hi << 4 | lo)
+    counts[nmea.ERR_CHECKSUM] = int(np.count_nonzero(~sum_ok))
+    dollars, star = dollars[sum_ok], star[sum_ok]
+    counts[nmea.IGNORED] = len(dollars)
+
+    # Only GGA and RMC need their fields: "$xxGGA," with no ',' or '*' in the address
+    head = _rows(block, dollars, 7)
+    addressed = (head[:, 6] == _COMMA) & (head[:, 1] != _COMMA) & (head[:, 2] != _COMMA) & (star > dollars + 6)
+    kind = np.where(addressed & (head[:, 3:6] == _GGA).all(axis=1), GGA,
+                    np.where(addressed & (head[:, 3:6] == _RMC).all(axis=1), RMC, 0))
+    wide = (kind > 0) & (star - dollars >= SENTENCE_WIDTH)
+    scalar = [int(d) for d in dollars[wide]]
+    keep = (kind > 0) & ~wide
+    dollars, star, kind = dollars[keep], star[keep], kind[keep]
+
+    # Each sentence as a row of a (sentences, SENTENCE_WIDTH) matrix, and its layout: where the ',' '.' '*' are
+    sentence = _rows(block, dollars, SENTENCE_WIDTH)
+    inside = _SENTENCE_COLS < (star - dollars)[:, None]
+    comma = (sentence == _COMMA) & inside
+    n_fields = np.count_nonzero(comma, axis=1) + 1
+    decoded = (n_fields <= nmea.MAX_FIELDS) & (n_fields >= np.where(kind == GGA, 7, 9))
+    marks = comma | ((sentence == _DOT) & inside)
+    marks[np.arange(len(dollars)), star - dollars] = True
+    layout = np.packbits(marks, axis=1)
+    words = layout.view(np.uint64)
+    key = words[:, 0] * np.uint64(0x9E3779B97F4A7C15) ^ words[:, 1]
+    _keys, group = np.unique(key, return_inverse=True)
+
+    fixes = []
+    for source in (GGA, RMC):
+        rows = np.flatnonzero(decoded & (kind == source))
+        by_layout = rows[np.argsort(group[rows], kind="stable")]
+        general = []
+        for members in np.split(by_layout, np.flatnonzero(np.diff(group[by_layout])) + 1):
+            if len(members) >= TEMPLATE_MIN:
+                same = (layout[members] == layout[members[0]]).all(axis=1)     # Hash collisions
+                general.append(members[~same])
+                members = members[same]
+                first = members[0]
+                template = _Template(sentence[members], np.flatnonzero(comma[first]), star[first] - dollars[first])
+                out, slow = _decode(source, template, dollars[members] + base)
+            else:
+                general.append(members)
+                continue
+            fixes.append(out)
+            scalar.extend(int(x) - base for x in slow)
+        general = np.concatenate(general) if general else rows
+        if len(general):
+            spans = _Spans(block, dollars[general], star[general], comma[general])
+            out, slow = _decode(source, spans, dollars[general] + base)
+            fixes.append(out)
+            scalar.extend(int(x) - base for x in slow)
+
+    for d in scalar:
+        fix = _scalar(block, base, d)
+        if fix is not None:
+            fixes.append(fix)
+    result = np.concatenate(fixes) if fixes else empty
+    counts[nmea.OK] = len(result)
+    counts[nmea.IGNORED] -= len(result)
+    return result[np.argsort(result["offset"], kind="stable")], counts
+
+
+def _scalar(block: np.ndarray, base: int, d: int) -> Optional[np.ndarray]:
+    """
+    One sentence through nmea.parse(), for the few that do not fit the
+    matrices (sentences past SENTENCE_WIDTH, fields past FIELD_WIDTH).
+    """
+    star = d + 1
+    while block[star] != _STAR:
+        star += 1
+    text = block[d:star + 3].tobytes().decode("latin-1")
+    result, fix = nmea.parse(text)
+    if result != nmea.OK:
+        return None
+    fields = text[1:star - d].split(",")
+    out = np.zeros(1, dtype=FIX_DTYPE)
+    out["offset"] = d + base
+    out["source"] = GGA if fix.type == nmea.GGA else RMC
+    time_start = d + 2 + len(fields[0])
+    out["utc"] = _utc(_decimals(block, np.array([time_start]), np.array([time_start + len(fields[1])])))
+    out["lat"] = np.nan if fix.lat is None else fix.lat
+    out["lon"] = np.nan if fix.lon is None else fix.lon
+    out["quality"] = -1 if fix.quality is None else fix.quality
+    out["course"] = np.nan if fix.course is None else fix.course
+    return out
+
+
+# ----------------------- UBX -----------------------
+def scan_ubx(block: np.ndarray, base: int = 0, limit: Optional[int] = None) -> Tuple[np.ndarray, int, int]:
+    """
+    NAV-PVT fixes for frames starting before `limit` (the block may run past it
+    so a frame straddling the cut is still whole), plus the good and bad
+    checksum counts.
+    """
+    limit = len(block) if limit is None else limit
+    sync = np.flatnonzero(block[:limit] == UBX_SYNC[0])
+    sync = sync[sync + UBX_FRAME_LEN <= len(block)]
+    header = block[sync[:, None] + np.arange(1, 6)]
+    sync = sync[(header == np.array([UBX_SYNC[1], *NAV_PVT, NAV_PVT_LEN, 0], dtype=np.uint8)).all(axis=1)]
+    if not len(sync):
+        return np.zeros(0, dtype=FIX_DTYPE), 0, 0
+
+    # Fletcher-8 over class, id, length and payload
+    frames = block[sync[:, None] + np.arange(2, UBX_FRAME_LEN)]
+    covered = frames[:, :-2].astype(np.int64)
+    ck_a = covered.sum(axis=1) % 256
+    ck_b = covered @ np.arange(covered.shape[1], 0, -1) % 256
+    good = (ck_a == frames[:, -2]) & (ck_b == frames[:, -1])
+    sync, frames = sync[good], frames[good]
+
+    pvt = np.ascontiguousarray(frames[:, 4:4 + NAV_PVT_LEN]).view(PVT_DTYPE)[:, 0]
+    out = np.zeros(len(sync), dtype=FIX_DTYPE)
+    out["offset"] = sync + base
+    out["source"] = PVT
+    fix_ok = (pvt["flags"] & 0x01).astype(bool) & np.isin(pvt["fix_type"], (2, 3, 4))
+    carrier = pvt["flags"] >> 6 & 0x03
+    differential = (pvt["flags"] >> 1 & 0x01).astype(bool)
+    out["quality"] = np.where(~fix_ok, 0, np.select([carrier == 2, carrier == 1, differential], [4, 5, 2], 1))
+    out["lat"] = np.where(fix_ok, pvt["lat"] * 1e-7, np.nan)
+    out["lon"] = np.where(fix_ok, pvt["lon"] * 1e-7, np.nan)
+    out["course"] = np.where(fix_ok, pvt["head_mot"] * 1e-5, np.nan)
+    valid_time = (pvt["valid"] & 0x02).astype(bool)
+    seconds = pvt["hour"] * 3600.0 + pvt["min"] * 60.0 + pvt["sec"] + pvt["nano"] * 1e-9
+    out["utc"] = np.where(valid_time, seconds, np.nan)
+    return out, int(np.count_nonzero(good)), int(np.count_nonzero(~good))
+
+
+# ----------------------- Files -----------------------
+def _blocks(path: str, size: int, block_size: int) -> List[Tuple[int, int]]:
+    """(start, stop) of each block, cut after a line end so no sentence straddles two blocks."""
+    blocks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            stop = min(start + block_size, size)
+            if stop < size:
+                cut = max(mm.rfind(b"\n", start, stop), mm.rfind(b"\r", start, stop))
+                stop = cut + 1 if cut >= 0 else stop
+            blocks.append((start, stop))
+            start = stop
+    return blocks
+
+
+def _scan_task(args):
+    """NMEA and UBX results of one block; the file is mapped here, so only offsets cross processes."""
+    path, start, stop = args
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        nmea_fixes, counts = scan_nmea(data[start:stop], start)
+        ubx_fixes, good, bad = scan_ubx(data[start:min(stop + UBX_FRAME_LEN, len(data))], start, stop - start)
+        del data
+    return nmea_fixes, counts, ubx_fixes, good, bad
+
+
+def ingest(path: str, block_size: int = BLOCK_SIZE, workers: Optional[int] = None) -> Tuple[np.ndarray, Summary]:
+    """
+    Every GGA, RMC and NAV-PVT fix in a capture, in file order. Blocks are
+    made small enough that every worker gets one; with workers=1 everything
+    runs in this process.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    if workers > 1:
+        block_size = min(block_size, max(MIN_BLOCK_SIZE, -(-size // workers)))
+    tasks = [(path, start, stop) for start, stop in _blocks(path, size, block_size)] if size else []
+
+    parts = []
+    counts = {nmea.OK: 0, nmea.IGNORED: 0, nmea.ERR_FRAME: 0, nmea.ERR_CHECKSUM: 0}
+    ubx_good = ubx_bad = 0
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks))) if workers > 1 and len(tasks) > 1 else None
+    results = pool.map(_scan_task, tasks) if pool else map(_scan_task, tasks)
+    try:
+        for nmea_fixes, block_counts, ubx_fixes, good, bad in results:
+            parts += [nmea_fixes, ubx_fixes]
+            for result, n in block_counts.items():
+                counts[result] += n
+            ubx_good += good
+            ubx_bad += bad
+    finally:
+        if pool:
+            pool.shutdown()
+    fixes = np.concatenate(parts) if parts else np.zeros(0, dtype=FIX_DTYPE)
+    fixes = fixes[np.argsort(fixes["offset"], kind="stable")]
+    summary = Summary(size, sum(counts.values()), counts[nmea.OK], counts[nmea.IGNORED], counts[nmea.ERR_FRAME],
+                      counts[nmea.ERR_CHECKSUM], ubx_good, ubx_bad, time.perf_counter() - started)
+    return fixes, summary
+
+
+def to_archive(fixes: np.ndarray, path: str, member: int = 0, start_time: Optional[float] = None) -> int:
+    """
+    Write the positions in `fixes` to a telemetry archive as hub (member 0) or
+    member rows. Time is UTC of day, unwrapped past midnight and counted from
+    the first fix; heading and fix quality carry forward from the latest
+    sentence or frame that had them. Returns the number of rows written.
+    """
+    utc = fixes["utc"]
+    timed = ~np.isnan(utc)
+    fixes, utc = fixes[timed], utc[timed]
+    if not len(fixes):
+        ArchiveWriter(path, start_time=start_time, flush_interval=float("inf")).close()
+        return 0
+    utc = utc + 86400.0 * np.cumsum(np.append(0, np.diff(utc) < -43200.0))
+
+    def carried(values, present):
+        last = np.maximum.accumulate(np.where(present, np.arange(len(values)), -1))
+        return np.where(last >= 0, values[np.maximum(last, 0)], 0)
+
+    heading = carried(fixes["course"], ~np.isnan(fixes["course"]))
+    quality = carried(fixes["quality"], fixes["quality"] >= 0)
+    rows = ~np.isnan(fixes["lat"])
+    writer = ArchiveWriter(path, start_time=start_time, flush_interval=float("inf"))
+    writer.append_columns(t=utc[rows] - utc[0], lat=fixes["lat"][rows], lon=fixes["lon"][rows],
+                          heading=heading[rows], member=member, kind=HUB if member == 0 else POS,
+                          fix=quality[rows])
+    writer.close()
+    return int(np.count_nonzero(rows))
+
+
+def main():
+    """Ingest a raw GPS capture; print a summary and optionally save the fixes."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk-ingest a raw NMEA/UBX GPS capture")
+    parser.add_argument("path", help="Raw capture (bytes as read from the receiver)")
+    parser.add_argument("--npy", help="Save the fixes (FIX_DTYPE) to this .npy file")
+    parser.add_argument("--archive", help="Write the positions to this telemetry archive (.hba)")
+    parser.add_argument("--member", default=None, help="Archive as this member (row;col) instead of the hub")
+    parser.add_argument("--block-mb", type=int, default=BLOCK_SIZE >> 20, help="Block size (MB)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    fixes, s = ingest(args.path, args.block_mb << 20, args.workers)
+    rate = s.bytes / s.seconds / 1e6 if s.seconds else 0.0
+    print(f"{s.bytes / 1e6:.1f} MB in {s.seconds:.2f} s ({rate:.0f} MB/s)")
+    print(f"NMEA: {s.sentences} sentences, {s.ok} GGA/RMC, {s.ignored} other, "
+          f"{s.bad_frame} malformed, {s.bad_checksum} bad checksum")
+    print(f"UBX:  {s.ubx_frames} NAV-PVT, {s.ubx_bad_checksum} bad checksum")
+    for source, name in SOURCE_NAMES.items():
+        mine = fixes[fixes["source"] == source]
+        if len(mine):
+            positions = np.count_nonzero(~np.isnan(mine["lat"]))
+            print(f"  {name:<12} {len(mine)} fixes, {positions} with a position")
+
+    if args.npy:
+        np.save(args.npy, fixes)
+        print(f"Saved {len(fixes)} fixes to {args.npy}")
+    if args.archive:
+        member = member_id(*(int(x) for x in args.member.split(";"))) if args.member else 0
+        rows = to_archive(fixes, args.archive, member, os.path.getmtime(args.path))
+        print(f"Wrote {rows} rows to {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
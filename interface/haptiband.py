@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Headless HaptiBand daemon.
+
+Runs the Controller (hub connections, relay loop, sequences, recording)
+without Tk and serves it on the local API (api.py) plus the Prometheus
+metrics endpoint. The GUI attaches with `python main.py --daemon`, scripts
+with api.ApiClient; any of them can come and go while the daemon keeps the
+hub connection and the relay loop running.
+
+    python haptiband.py --connect                 # connect to the hub at startup
+    python haptiband.py --listen 127.0.0.1:9110   # also/instead listen on TCP
+"""
+import logging
+import logging.handlers
+import os
+import signal
+import socket
+import sys
+import threading
+
+from api import API_HOST, API_PORT, API_SOCKET, ApiServer
+from controller import HOST_DEFAULT, LOG, PORT_DEFAULT, Controller
+from metrics import REGISTRY, METRICS_PORT, MetricsServer
+
+DAEMON_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "haptiband-daemon.log")
+DAEMON_LOG_MAX_BYTES = 1_000_000
+DAEMON_LOG_BACKUPS = 5
+
+
+def setup_logging(path: str) -> logging.Logger:
+    """Daemon log to stdout and a rotating file."""
+    log = logging.getLogger("haptiband")
+    log.setLevel(logging.INFO)
+    fmt = logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S")
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            path, maxBytes=DAEMON_LOG_MAX_BYTES, backupCount=DAEMON_LOG_BACKUPS, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(fmt)
+        log.addHandler(handler)
+    return log
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless HaptiBand control daemon")
+    parser.add_argument("--socket", default=API_SOCKET if hasattr(socket, "AF_UNIX") else "",
+                        help="Unix socket for the API ('' to disable)")
+    parser.add_argument("--listen", action="append", default=[],
+                        help=f"Also serve the API on host:port (e.g. {API_HOST}:{API_PORT}); repeatable")
+    parser.add_argument("--host", default=HOST_DEFAULT, help="Hub address (or 'host[:port][/ch], ...')")
+    parser.add_argument("--hub-port", type=int, default=PORT_DEFAULT)
+    parser.add_argument("--connect", action="store_true", help="Connect to the hub at startup")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="0 to disable")
+    parser.add_argument("--log", default=DAEMON_LOG_PATH, help="Log file ('' for stdout only)")
+    args = parser.parse_args()
+
+    log = setup_logging(args.log)
+    addresses = ([args.socket] if args.socket else []) + args.listen
+    if not addresses:
+        addresses = [f"{API_HOST}:{API_PORT}"]
+
+    controller = Controller()
+    controller.subscribe(lambda event, data: log.info(data["text"]) if event == LOG else None)
+    controller.start()
+
+    server = ApiServer(controller, addresses).start()
+    log.info(f"API listening on {', '.join(addresses)}")
+    metrics_server = None
+    if args.metrics_port:
+        try:
+            metrics_server = MetricsServer(REGISTRY, port=args.metrics_port).start()
+            log.info(f"Prometheus metrics: http://127.0.0.1:{metrics_server.port}/metrics")
+        except OSError as e:
+            log.info(f"Metrics endpoint unavailable: {e}")
+
+    if args.connect:
+        controller.connect(args.host, args.hub_port)
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    while not stop.wait(0.5):
+        pass
+
+    log.info("Shutting down")
+    server.stop()
+    controller.close()
+    if metrics_server:
+        metrics_server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the ESP32 hub (current/gps/hub.ino).
+
+Speaks the same line protocol over TCP: every line received is "relayed"
+(recorded) and answered with "OK:<seq>" (plus the request's "#<id>" tag), and telemetry lines can be pushed to
+the connected client - either a pose stream like the hub's (a walk around a
+circle, fixed at SIM_FIX_HZ, as sequence-numbered frames stamped with the
+simulated hub clock, with optional link stalls that release the held frames
+in one burst), or replayed
+from a recorded session. Simulated headbands can ack relays, and HubCluster
+runs several hubs for sharding tests.
+"""
+import collections
+import math
+import socket
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from pose_filter import EARTH_RADIUS_M, format_pose_frame
+from shards import REQUEST_TAG, split_tag
+from telemetry import DEFAULT_STREAM_HZ, MAX_STREAM_HZ, MIN_STREAM_HZ
+
+SIM_HOST = "127.0.0.1"
+SIM_PORT = 8080
+
+# Simulated hub pose: walking clockwise around a circle, RTK fixed
+SIM_ORIGIN = (35.303276, -120.664299)
+SIM_RADIUS_M = 20.0
+SIM_SPEED_MPS = 1.4
+SIM_FIX = 4
+SIM_FIX_HZ = 10.0             # Receiver fix rate; faster streams repeat the last fix, as on the hub
+
+SIM_COLS = 5
+
+
+class HubSimulator:
+    """Single-channel hub stand-in. One instance corresponds to one hub / AP."""
+
+    def __init__(self, host: str = SIM_HOST, port: int = SIM_PORT,
+                 on_command: Optional[Callable[[str], None]] = None,
+                 history: int = 10000, members: Iterable = (), ack_delay: float = 0.0,
+                 clock_offset: float = 0.0, clock_skew_ppm: float = 0.0):
+        self.host = host
+        self.port = port
+        self.on_command = on_command
+        self.received = collections.deque(maxlen=history)  # (monotonic time, line)
+        self.members = set(members)  # (row, col) headbands that ack relays
+        self.ack_delay = ack_delay
+        self.seq = 0
+        # Simulated hub clock: true time * (1 + skew) + offset
+        self.clock_offset = clock_offset
+        self.clock_skew_ppm = clock_skew_ppm
+        # Pose stream rate; the laptop changes it with "RATE:<hz>"
+        self.stream_hz = DEFAULT_STREAM_HZ
+        self.pose_seq = 0
+        self.walk_start = None  # perf_counter when the simulated walk began
+
+        self._server = None
+        self._clients = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._client_connected = threading.Event()
+        self._threads = []
+
+    # ----------------------- Lifecycle -----------------------
+    def start(self):
+        """Start listening. With port=0 an ephemeral port is chosen (see self.port)."""
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((self.host, self.port))
+        self._server.listen()
+        self._server.settimeout(0.2)
+        self.port = self._server.getsockname()[1]
+        self._spawn(self._accept_loop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for c in self._clients:
+                try:
+                    c.close()
+                except OSError:
+                    pass
+            self._clients.clear()
+        if self._server:
+            self._server.close()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    def _spawn(self, target, *args):
+        t = threading.Thread(target=target, args=args, daemon=True)
+        self._threads.append(t)
+        t.start()
+
+    # ----------------------- Traffic -----------------------
+    def push(self, line: str):
+        """Send a line (e.g. telemetry) to every connected client."""
+        data = f"{line}\n".encode()
+        with self._lock:
+            for c in list(self._clients):
+                try:
+                    c.sendall(data)
+                except OSError:
+                    self._clients.remove(c)
+
+    def hub_time_us(self, now: Optional[float] = None) -> int:
+        """The simulated hub's clock (us) at true time `now` (default perf_counter)."""
+        now = time.perf_counter() if now is None else now
+        return int((now * (1 + self.clock_skew_ppm * 1e-6) + self.clock_offset) * 1e6)
+
+    def reply(self, client: socket.socket, line: str, tag: str = ""):
+        """Answer a command (echoing its "#<id>" tag). Override to change what the hub sends back."""
+        if line == "TIME":
+            client.sendall(f"TIME:{self.hub_time_us()}{tag}\n".encode())
+            return
+        if line.startswith("RATE:"):
+            try:
+                hz = float(line[5:])
+            except ValueError:
+                hz = 0.0
+            if hz <= 0:
+                client.sendall(f"ERR:bad rate{tag}\n".encode())
+                return
+            # Same clamp as hub.ino
+            self.stream_hz = min(MAX_STREAM_HZ, max(MIN_STREAM_HZ, hz))
+            client.sendall(f"OK{tag}\n".encode())
+            return
+        self.seq += 1
+        client.sendall(f"OK:{self.seq}{tag}\n".encode())
+
+    def _ack(self, line: str, seq: int):
+        """Have the simulated headbands addressed by `line` ack relay `seq`."""
+        unicast = line.startswith("TO:")
+        head = line[3:].split("|", 1)[0] if unicast else line.split(":", 1)[0]
+        try:
+            row, second = (int(x) for x in head.split(";"))
+        except ValueError:
+            return
+        if unicast or "|" in line:
+            targets = [(row, second)]
+        else:
+            targets = [(row, col) for col in range(1, SIM_COLS + 1)]
+        acks = [f"ACK:{r};{c}:{seq}" for r, c in targets if (r, c) in self.members]
+        if not acks:
+            return
+        if self.ack_delay > 0:
+            timer = threading.Timer(self.ack_delay, lambda: [self.push(a) for a in acks])
+            timer.daemon = True
+            timer.start()
+        else:
+            for a in acks:
+                self.push(a)
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                client, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._clients.append(client)
+            self._client_connected.set()
+            self._spawn(self._client_loop, client)
+
+    def wait_for_client(self, timeout: Optional[float] = None) -> bool:
+        """Block until at least one client has connected."""
+        return self._client_connected.wait(timeout)
+
+    def _client_loop(self, client):
+        buf = b""
+        client.settimeout(0.2)
+        while not self._stop.is_set():
+            try:
+                chunk = client.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if not chunk:
+                break
+            buf += chunk
+            while b"\n" in buf:
+                raw, buf = buf.split(b"\n", 1)
+                line, rid = split_tag(raw.decode(errors="ignore").strip())
+                if not line:
+                    continue
+                tag = "" if rid is None else f"{REQUEST_TAG}{rid}"
+                self.received.append((time.monotonic(), line))
+                if self.on_command:
+                    self.on_command(line)
+                try:
+                    with self._lock:
+                        self.reply(client, line, tag)
+                        seq = self.seq
+                except OSError:
+                    break
+                if self.members and line != "TIME" and not line.startswith("RATE:"):
+                    self._ack(line, seq)
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        client.close()
+
+    # ----------------------- Telemetry sources -----------------------
+    def stream_pose(self, hz: float = DEFAULT_STREAM_HZ, stall_every: float = 0.0, stall: float = 0.0):
+        """
+        Push pose frames at `hz` (like hub.ino; "RATE:<hz>" changes it). With
+        `stall_every`, the last `stall` seconds of every such period are held
+        back and then sent in one write, as a Wi-Fi stall would deliver them.
+        """
+        self.stream_hz = hz
+
+        def loop():
+            start = self.walk_start = time.perf_counter()
+            due = start
+            held = []
+            while not self._stop.wait(max(0.0, due - time.perf_counter())):
+                now = time.perf_counter()
+                due += 1.0 / self.stream_hz
+                self.pose_seq += 1
+                fix_t = start + math.floor((now - start) * SIM_FIX_HZ) / SIM_FIX_HZ
+                lat, lon, _ = sim_pose(fix_t - start)
+                heading = sim_pose(now - start)[2]
+                held.append(format_pose_frame(self.pose_seq, self.hub_time_us(now), lat, lon, heading, SIM_FIX,
+                                              self.hub_time_us(fix_t)))
+                if stall_every > 0 and (now - start) % stall_every >= stall_every - stall:
+                    continue
+                self.push("\n".join(held))
+                held = []
+        self._spawn(loop)
+
+    def replay(self, path: str, speed: float = 1.0):
+        """Push the inbound lines of a recorded session at recorded timing."""
+        from session_log import Replayer, SessionReader
+
+        replayer = Replayer(SessionReader(path), lambda _kind, text: self.push(text), speed=speed)
+        replayer.start()
+        return replayer
+
+
+def sim_pose(t: float):
+    """(lat, lon, heading) of the simulated hub `t` seconds into its walk."""
+    angle = SIM_SPEED_MPS * t / SIM_RADIUS_M
+    east, north = SIM_RADIUS_M * math.sin(angle), SIM_RADIUS_M * math.cos(angle)
+    lat = SIM_ORIGIN[0] + math.degrees(north / EARTH_RADIUS_M)
+    lon = SIM_ORIGIN[1] + math.degrees(east / (EARTH_RADIUS_M * math.cos(math.radians(SIM_ORIGIN[0]))))
+    return lat, lon, (math.degrees(angle) + 90.0) % 360.0
+
+
+class HubCluster:
+    """Several HubSimulators on ephemeral ports, one per shard, with rows split evenly."""
+
+    def __init__(self, count: int, rows: int = 5, host: str = SIM_HOST, ack_delay: float = 0.0, **kw):
+        self.hubs: List[HubSimulator] = []
+        for i in range(count):
+            lo = i * rows // count + 1
+            hi = (i + 1) * rows // count
+            members = [(r, c) for r in range(lo, hi + 1) for c in range(1, SIM_COLS + 1)]
+            self.hubs.append(HubSimulator(host, 0, members=members, ack_delay=ack_delay, **kw))
+
+    def start(self):
+        for hub in self.hubs:
+            hub.start()
+        return self
+
+    def stop(self):
+        for hub in self.hubs:
+            hub.stop()
+
+    def spec(self, channels: bool = True) -> str:
+        """Hub list for the app's IP field / ShardMap.from_spec."""
+        return ", ".join(f"{h.host}:{h.port}" + (f"/{i + 1}" if channels else "")
+                         for i, h in enumerate(self.hubs))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local HaptiBand hub stand-in")
+    parser.add_argument("--host", default=SIM_HOST)
+    parser.add_argument("--port", type=int, default=SIM_PORT)
+    parser.add_argument("--hz", type=float, default=DEFAULT_STREAM_HZ, help="Pose stream rate (Hz)")
+    parser.add_argument("--stall-every", type=float, default=0.0,
+                        help="Simulate a Wi-Fi stall this often (s); held frames arrive as a burst")
+    parser.add_argument("--stall", type=float, default=0.5, help="Length of each stall (s)")
+    parser.add_argument("--replay", help="Replay inbound traffic from a session log instead")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--hubs", type=int, default=1, help="Run this many hubs on ephemeral ports (sharding)")
+    args = parser.parse_args()
+
+    if args.hubs > 1:
+        cluster = HubCluster(args.hubs, host=args.host).start()
+        for hub in cluster.hubs:
+            hub.stream_pose(args.hz, args.stall_every, args.stall)
+        print(f"{args.hubs} hub stand-ins up. Enter in the IP field: {cluster.spec()}")
+        try:
+            while True:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cluster.stop()
+        return
+
+    hub = HubSimulator(args.host, args.port, on_command=lambda line: print(f"relay: {line}")).start()
+    print(f"Hub stand-in listening on {args.host}:{hub.port}")
+
+    replayer = None
+    if args.replay:
+        print("Waiting for a client to connect...")
+        hub.wait_for_client()
+        replayer = hub.replay(args.replay, args.speed)
+        print(f"Replaying {args.replay} at {args.speed}x")
+    else:
+        hub.stream_pose(args.hz, args.stall_every, args.stall)
+
+    try:
+        while replayer is None or not replayer.done():
+            time.sleep(0.5)
+        print("Replay finished")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+IMU sensor-fusion reference model and offline gain tuning.
+
+IMU/SensorFusion.ino (and hub.ino) fuse the ICM20948's gyro, accelerometer and
+magnetometer with Adafruit_Mahony at FILTER_HZ, and the yaw it produces is the
+heading behind every correction tier (block_eval.IMU_DEADZONE/IMU_SOFT_LIMIT).
+Mahony and Madgwick here follow Adafruit_AHRS's update step for step, in
+float32 like the ESP32, but every state variable is an array with one entry per
+gain setting: one pass over a recorded log runs a whole slice of the gain grid.
+sweep() splits the grid and the logs into tasks for a process pool and scores
+each setting by heading error and the time it takes to settle.
+
+Logs are SensorFusion.ino's serial output with LOG_RAW set,
+"RAW,<ms>,ax,ay,az,gx,gy,gz,mx,my,mz" (m/s^2, rad/s, uT); other lines are
+skipped. An optional last field is a reference heading (deg, in getYaw()'s
+convention) to score against; logs without one are scored against a fixed
+heading (a still recording facing a surveyed direction). Like the firmware, the
+filter takes one update per sample and assumes 1/FILTER_HZ between them.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from block_eval import IMU_DEADZONE
+
+FILTER_HZ = 100               # filter.begin() in SensorFusion.ino / hub.ino
+
+# Adafruit_AHRS defaults (twoKpDef = 2 * 0.5, twoKiDef = 2 * 0.0, betaDef = 0.1)
+MAHONY_KP = 0.5
+MAHONY_KI = 0.0
+MADGWICK_BETA = 0.1
+
+MAHONY = "mahony"
+MADGWICK = "madgwick"
+
+# Same float constants as the firmware and the library
+RAD_TO_DEG = 57.2957795       # Arduino.h; SensorFusion.ino converts the gyro with it
+DEG_TO_RAD = 0.0174533        # Adafruit_AHRS, back to rad/s inside update()
+YAW_DEG = 57.29578            # getYaw()
+
+# Scoring: a setting has settled once its heading error stays within
+# CONVERGED_DEG (no correction needed) for SETTLE_S
+CONVERGED_DEG = IMU_DEADZONE
+SETTLE_S = 2.0
+
+RAW_PREFIX = "RAW,"
+
+
+def _inv_sqrt(x):
+    """Adafruit_AHRS's invSqrt() in float32 (fast inverse square root, two Newton steps)."""
+    x = np.asarray(x)
+    if x.dtype != np.float32:
+        return 1.0 / np.sqrt(x)
+    half = 0.5 * x
+    y = (np.int32(0x5F3759DF) - (x.view(np.int32) >> 1)).view(np.float32)
+    y = y * (1.5 - half * y * y)
+    return y * (1.5 - half * y * y)
+
+
+# ----------------------- Filters -----------------------
+class _Filter:
+    """Quaternion state for `size` gain settings, starting level and facing getYaw() == 180."""
+
+    def __init__(self, size: int, rate: float, dtype):
+        self.dtype = np.dtype(dtype)
+        self.size = size
+        self.inv_rate = self.dtype.type(1.0 / rate)
+        self.q0 = np.ones(size, self.dtype)
+        self.q1 = np.zeros(size, self.dtype)
+        self.q2 = np.zeros(size, self.dtype)
+        self.q3 = np.zeros(size, self.dtype)
+
+    def _set(self, q0, q1, q2, q3):
+        r = _inv_sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q0, self.q1, self.q2, self.q3 = q0 * r, q1 * r, q2 * r, q3 * r
+
+
+def yaw_of(q0, q1, q2, q3):
+    """getYaw() (deg, 0..360) for quaternion components of any shape."""
+    return np.arctan2(q1 * q2 + q0 * q3, 0.5 - q2 * q2 - q3 * q3) * YAW_DEG + 180.0
+
+
+class Mahony(_Filter):
+    """Adafruit_Mahony for len(kp) gain settings at once."""
+
+    def __init__(self, kp: Sequence[float], ki: Sequence[float], rate: float = FILTER_HZ, dtype=np.float32):
+        super().__init__(len(kp), rate, dtype)
+        self.two_kp = 2 * np.asarray(kp, self.dtype)
+        self.two_ki = 2 * np.asarray(ki, self.dtype)
+        self.integrating = bool(np.any(self.two_ki > 0))
+        self.ix = np.zeros(self.size, self.dtype)
+        self.iy = np.zeros(self.size, self.dtype)
+        self.iz = np.zeros(self.size, self.dtype)
+
+    def update(self, gx, gy, gz, ax, ay, az, mx, my, mz):
+        """Adafruit_Mahony::update(): gyro in deg/s; accel and mag in any units."""
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        gx, gy, gz = gx * DEG_TO_RAD, gy * DEG_TO_RAD, gz * DEG_TO_RAD
+
+        if not (ax == 0 and ay == 0 and az == 0):
+            r = _inv_sqrt(ax * ax + ay * ay + az * az)
+            ax, ay, az = ax * r, ay * r, az * r
+            halfvx = q1 * q3 - q0 * q2
+            halfvy = q0 * q1 + q2 * q3
+            halfvz = q0 * q0 - 0.5 + q3 * q3
+            halfex = ay * halfvz - az * halfvy
+            halfey = az * halfvx - ax * halfvz
+            halfez = ax * halfvy - ay * halfvx
+
+            if not (mx == 0 and my == 0 and mz == 0):   # Otherwise updateIMU()
+                r = _inv_sqrt(mx * mx + my * my + mz * mz)
+                mx, my, mz = mx * r, my * r, mz * r
+                q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+                q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+                q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+                # Reference direction of Earth's magnetic field
+                hx = 2.0 * (mx * (0.5 - q2q2 - q3q3) + my * (q1q2 - q0q3) + mz * (q1q3 + q0q2))
+                hy = 2.0 * (mx * (q1q2 + q0q3) + my * (0.5 - q1q1 - q3q3) + mz * (q2q3 - q0q1))
+                bx = np.sqrt(hx * hx + hy * hy)
+                bz = 2.0 * (mx * (q1q3 - q0q2) + my * (q2q3 + q0q1) + mz * (0.5 - q1q1 - q2q2))
+                halfwx = bx * (0.5 - q2q2 - q3q3) + bz * (q1q3 - q0q2)
+                halfwy = bx * (q1q2 - q0q3) + bz * (q0q1 + q2q3)
+                halfwz = bx * (q0q2 + q1q3) + bz * (0.5 - q1q1 - q2q2)
+                halfex = halfex + (my * halfwz - mz * halfwy)
+                halfey = halfey + (mz * halfwx - mx * halfwz)
+                halfez = halfez + (mx * halfwy - my * halfwx)
+
+            if self.integrating:
+                # Settings with Ki == 0 keep a zero integral, as the library's else branch does
+                self.ix = self.ix + self.two_ki * halfex * self.inv_rate
+                self.iy = self.iy + self.two_ki * halfey * self.inv_rate
+                self.iz = self.iz + self.two_ki * halfez * self.inv_rate
+                gx, gy, gz = gx + self.ix, gy + self.iy, gz + self.iz
+            gx = gx + self.two_kp * halfex
+            gy = gy + self.two_kp * halfey
+            gz = gz + self.two_kp * halfez
+
+        gx, gy, gz = gx * (0.5 * self.inv_rate), gy * (0.5 * self.inv_rate), gz * (0.5 * self.inv_rate)
+        self._set(q0 + (-q1 * gx - q2 * gy - q3 * gz),
+                  q1 + (q0 * gx + q2 * gz - q3 * gy),
+                  q2 + (q0 * gy - q1 * gz + q3 * gx),
+                  q3 + (q0 * gz + q1 * gy - q2 * gx))
+
+
+class Madgwick(_Filter):
+    """Adafruit_Madgwick for len(beta) gain settings at once."""
+
+    def __init__(self, beta: Sequence[float], rate: float = FILTER_HZ, dtype=np.float32):
+        super().__init__(len(beta), rate, dtype)
+        self.beta = np.asarray(beta, self.dtype)
+
+    def update(self, gx, gy, gz, ax, ay, az, mx, my, mz):
+        """Adafruit_Madgwick::update(): gyro in deg/s; accel and mag in any units."""
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        gx, gy, gz = gx * DEG_TO_RAD, gy * DEG_TO_RAD, gz * DEG_TO_RAD
+
+        # Rate of change of quaternion from gyroscope
+        qdot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qdot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qdot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qdot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        if not (ax == 0 and ay == 0 and az == 0):
+            r = _inv_sqrt(ax * ax + ay * ay + az * az)
+            ax, ay, az = ax * r, ay * r, az * r
+            if not (mx == 0 and my == 0 and mz == 0):
+                s0, s1, s2, s3 = self._marg_step(ax, ay, az, mx, my, mz)
+            else:                                       # updateIMU()
+                s0, s1, s2, s3 = self._imu_step(ax, ay, az)
+            r = _inv_sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            qdot0 = qdot0 - self.beta * (s0 * r)
+            qdot1 = qdot1 - self.beta * (s1 * r)
+            qdot2 = qdot2 - self.beta * (s2 * r)
+            qdot3 = qdot3 - self.beta * (s3 * r)
+
+        self._set(q0 + qdot0 * self.inv_rate, q1 + qdot1 * self.inv_rate,
+                  q2 + qdot2 * self.inv_rate, q3 + qdot3 * self.inv_rate)
+
+    def _marg_step(self, ax, ay, az, mx, my, mz):
+        """Gradient descent corrective step from the accelerometer and magnetometer."""
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        r = _inv_sqrt(mx * mx + my * my + mz * mz)
+        mx, my, mz = mx * r, my * r, mz * r
+        _2q0mx, _2q0my, _2q0mz, _2q1mx = 2.0 * q0 * mx, 2.0 * q0 * my, 2.0 * q0 * mz, 2.0 * q1 * mx
+        _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+        _2q0q2, _2q2q3 = 2.0 * q0 * q2, 2.0 * q2 * q3
+        q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+        q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+        q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+
+        # Reference direction of Earth's magnetic field
+        hx = (mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3
+              - mx * q2q2 - mx * q3q3)
+        hy = (_2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2
+              + _2q2 * mz * q3 - my * q3q3)
+        _2bx = np.sqrt(hx * hx + hy * hy)
+        _2bz = (-_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3
+                - mz * q2q2 + mz * q3q3)
+        _4bx, _4bz = 2.0 * _2bx, 2.0 * _2bz
+
+        # Residuals shared by the gradient terms
+        fax = 2.0 * q1q3 - _2q0q2 - ax
+        fay = 2.0 * q0q1 + _2q2q3 - ay
+        faz = 1 - 2.0 * q1q1 - 2.0 * q2q2 - az
+        fmx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+        fmy = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+        fmz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+        s0 = (-_2q2 * fax + _2q1 * fay - _2bz * q2 * fmx + (-_2bx * q3 + _2bz * q1) * fmy
+              + _2bx * q2 * fmz)
+        s1 = (_2q3 * fax + _2q0 * fay - 4.0 * q1 * faz + _2bz * q3 * fmx + (_2bx * q2 + _2bz * q0) * fmy
+              + (_2bx * q3 - _4bz * q1) * fmz)
+        s2 = (-_2q0 * fax + _2q3 * fay - 4.0 * q2 * faz + (-_4bx * q2 - _2bz * q0) * fmx
+              + (_2bx * q1 + _2bz * q3) * fmy + (_2bx * q0 - _4bz * q2) * fmz)
+        s3 = (_2q1 * fax + _2q2 * fay + (-_4bx * q3 + _2bz * q1) * fmx + (-_2bx * q0 + _2bz * q2) * fmy
+              + _2bx * q1 * fmz)
+        return s0, s1, s2, s3
+
+    def _imu_step(self, ax, ay, az):
+        """Corrective step from the accelerometer alone (no magnetometer reading)."""
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+        _4q0, _4q1, _4q2 = 4.0 * q0, 4.0 * q1, 4.0 * q2
+        _8q1, _8q2 = 8.0 * q1, 8.0 * q2
+        q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+        s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+        s1 = (_4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1
+              + _8q1 * q2q2 + _4q1 * az)
+        s2 = (4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1
+              + _8q2 * q2q2 + _4q2 * az)
+        s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+        return s0, s1, s2, s3
+
+
+# ----------------------- Logs -----------------------
+class ImuLog(NamedTuple):
+    t: np.ndarray                       # s since the first sample
+    accel: np.ndarray                   # (n, 3) m/s^2
+    gyro: np.ndarray                    # (n, 3) rad/s, as the ICM20948 driver reports it
+    mag: np.ndarray                     # (n, 3) uT
+    reference: Optional[np.ndarray]     # (n,) heading to score against (deg, getYaw() convention)
+
+
+def format_raw(ms: int, accel, gyro, mag, reference: Optional[float] = None) -> str:
+    """One LOG_RAW line, as SensorFusion.ino prints it (plus an optional reference heading)."""
+    line = (f"{RAW_PREFIX}{ms},{accel[0]:.3f},{accel[1]:.3f},{accel[2]:.3f},"
+            f"{gyro[0]:.5f},{gyro[1]:.5f},{gyro[2]:.5f},{mag[0]:.2f},{mag[1]:.2f},{mag[2]:.2f}")
+    return line if reference is None else f"{line},{reference:.2f}"
+
+
+def parse_raw(lines: Iterable[str]) -> ImuLog:
+    """ImuLog from serial output; lines that aren't complete RAW samples are skipped."""
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith(RAW_PREFIX):
+            continue
+        try:
+            values = [float(x) for x in line[len(RAW_PREFIX):].split(",")]
+        except ValueError:
+            continue
+        if len(values) in (10, 11):
+            rows.append(values + [math.nan] * (11 - len(values)))
+    data = np.array(rows, dtype=np.float64).reshape(-1, 11)
+    ref = data[:, 10]
+    return ImuLog(t=(data[:, 0] - data[:1, 0]) / 1000.0, accel=data[:, 1:4], gyro=data[:, 4:7],
+                  mag=data[:, 7:10], reference=None if len(ref) == 0 or np.isnan(ref).any() else ref)
+
+
+def load_log(path: str) -> ImuLog:
+    with open(path, errors="ignore") as f:
+        return parse_raw(f)
+
+
+# ----------------------- Replay and scoring -----------------------
+class Setting(NamedTuple):
+    filter: str             # MAHONY or MADGWICK
+    gain: float             # Kp (Mahony) or beta (Madgwick)
+    ki: float = 0.0         # Mahony only
+
+    def __str__(self):
+        if self.filter == MAHONY:
+            return f"mahony kp={self.gain:g} ki={self.ki:g}"
+        return f"madgwick beta={self.gain:g}"
+
+
+FIRMWARE = Setting(MAHONY, MAHONY_KP, MAHONY_KI)     # What SensorFusion.ino runs
+
+
+def make_filter(settings: Sequence[Setting], rate: float = FILTER_HZ, dtype=np.float32):
+    """One vectorized filter for settings that all use the same algorithm."""
+    kinds = {s.filter for s in settings}
+    if kinds == {MAHONY}:
+        return Mahony([s.gain for s in settings], [s.ki for s in settings], rate, dtype)
+    if kinds == {MADGWICK}:
+        return Madgwick([s.gain for s in settings], rate, dtype)
+    raise ValueError(f"settings must share one filter, got {sorted(kinds)}")
+
+
+def replay(log: ImuLog, settings: Sequence[Setting], rate: float = FILTER_HZ, dtype=np.float32) -> np.ndarray:
+    """getYaw() after every sample, for each setting: (samples, settings)."""
+    filt = make_filter(settings, rate, dtype)
+    dtype = filt.dtype
+    # The firmware hands the filter gyro * RAD_TO_DEG, accel and mag as floats
+    rows = np.hstack([log.gyro.astype(dtype) * dtype.type(RAD_TO_DEG), log.accel, log.mag]).astype(dtype)
+    q = np.empty((4, len(rows), filt.size), dtype)
+    for i, row in enumerate(rows):
+        filt.update(*row)
+        q[0, i], q[1, i], q[2, i], q[3, i] = filt.q0, filt.q1, filt.q2, filt.q3
+    return yaw_of(*q)
+
+
+class Score(NamedTuple):
+    setting: Setting
+    rms_deg: float          # Heading error once settled (RMS, averaged over logs)
+    p95_deg: float          # 95th percentile absolute error once settled (worst log)
+    settle_s: float         # Time to settle (worst log); inf if it never settled on some log
+    settled: int            # Logs on which it settled
+
+
+def evaluate(yaw: np.ndarray, reference, t: np.ndarray, tolerance: float = CONVERGED_DEG,
+             settle: float = SETTLE_S, rate: float = FILTER_HZ):
+    """
+    Per-setting (rms, p95, settle time) of a replay(). Settled = the first
+    sample from which the error stays within `tolerance` for `settle` seconds;
+    the error statistics cover the log from there on (all of it if it never settles).
+    """
+    n, size = yaw.shape
+    reference = np.broadcast_to(np.asarray(reference, np.float64), (n,))
+    err = (yaw - reference[:, None] + 180.0) % 360.0 - 180.0
+    hold = max(1, int(round(settle * rate)))
+    settled = np.zeros(size, bool)
+    first = np.zeros(size, np.intp)
+    if n >= hold:
+        bad = np.zeros((n + 1, size), np.int32)
+        np.cumsum(np.abs(err) > tolerance, axis=0, out=bad[1:])
+        calm = bad[hold:] == bad[:-hold]        # No bad sample in [i, i + hold)
+        settled = calm.any(axis=0)
+        first = np.where(settled, calm.argmax(axis=0), 0)
+    after = np.arange(n)[:, None] >= first
+    magnitude = np.where(after, np.abs(err), np.nan)
+    rms = np.sqrt(np.nanmean(magnitude * magnitude, axis=0))
+    p95 = np.nanpercentile(magnitude, 95, axis=0)
+    return rms, p95, np.where(settled, t[first] - t[0], np.inf)
+
+
+@lru_cache(maxsize=4)
+def _cached_log(path: str) -> ImuLog:
+    return load_log(path)
+
+
+def _sweep_task(args):
+    path, settings, reference, rate, tolerance, settle = args
+    log = _cached_log(path)
+    if log.reference is not None:
+        reference = log.reference
+    elif reference is None:
+        raise ValueError(f"{path} has no reference heading column; give a reference heading")
+    return evaluate(replay(log, settings, rate), reference, log.t, tolerance, settle, rate)
+
+
+def grid(kp: Sequence[float] = (), ki: Sequence[float] = (0.0,), beta: Sequence[float] = ()) -> List[Setting]:
+    """Every Mahony (kp, ki) pair and every Madgwick beta."""
+    return [Setting(MAHONY, p, i) for p in kp for i in ki] + [Setting(MADGWICK, b) for b in beta]
+
+
+def sweep(paths: Sequence[str], settings: Sequence[Setting], reference: Optional[float] = None,
+          workers: Optional[int] = None, rate: float = FILTER_HZ, tolerance: float = CONVERGED_DEG,
+          settle: float = SETTLE_S) -> List[Score]:
+    """
+    Replay every log with every setting and score them, best first. Each
+    process-pool task is one log with a slice of one filter's settings; with
+    workers=1 everything runs in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    groups = [[s for s in settings if s.filter == kind] for kind in (MAHONY, MADGWICK)]
+    groups = [g for g in groups if g]
+    # Enough slices per group to keep every worker busy, as few as that allows
+    # (each slice pays the per-sample interpreter overhead once)
+    slices = max(1, -(-workers // max(1, len(paths) * len(groups))))
+    tasks, owners = [], []
+    for group in groups:
+        for k in range(slices):
+            part = group[k::slices]
+            if not part:
+                continue
+            for path in paths:
+                tasks.append((path, part, reference, rate, tolerance, settle))
+                owners.append(part)
+
+    if workers == 1:
+        results = map(_sweep_task, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_sweep_task, tasks)
+    per_setting = {s: [] for s in settings}
+    try:
+        for part, (rms, p95, settle_s) in zip(owners, results):
+            for j, s in enumerate(part):
+                per_setting[s].append((rms[j], p95[j], settle_s[j]))
+    finally:
+        if workers != 1:
+            pool.shutdown()
+
+    scores = []
+    for s, runs in per_setting.items():
+        rms, p95, settle_s = (np.array(x) for x in zip(*runs))
+        scores.append(Score(s, float(rms.mean()), float(p95.max()), float(settle_s.max()),
+                            int(np.isfinite(settle_s).sum())))
+    scores.sort(key=lambda sc: (-sc.settled, sc.rms_deg, sc.settle_s))
+    return scores
+
+
+def _floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Replay raw ICM20948 logs and sweep fusion filter gains")
+    parser.add_argument("logs", nargs="+", help="SensorFusion.ino serial output with LOG_RAW set")
+    parser.add_argument("--kp", type=_floats, default=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0],
+                        help="Mahony Kp values (comma separated; empty for none)")
+    parser.add_argument("--ki", type=_floats, default=[0.0, 0.01, 0.05], help="Mahony Ki values")
+    parser.add_argument("--beta", type=_floats, default=[0.01, 0.033, 0.1, 0.3, 1.0],
+                        help="Madgwick beta values (empty for none)")
+    parser.add_argument("--reference", type=float, default=None,
+                        help="Heading (getYaw() deg) for logs without a reference column")
+    parser.add_argument("--rate", type=float, default=FILTER_HZ, help="filter.begin() rate (Hz)")
+    parser.add_argument("--tolerance", type=float, default=CONVERGED_DEG, help="Settled within (deg)")
+    parser.add_argument("--settle", type=float, default=SETTLE_S, help="...for this long (s)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    parser.add_argument("--top", type=int, default=20, help="Show this many settings")
+    args = parser.parse_args()
+
+    settings = grid(args.kp, args.ki or [0.0], args.beta)
+    if FIRMWARE not in settings:
+        settings.append(FIRMWARE)
+    start = time.perf_counter()
+    scores = sweep(args.logs, settings, args.reference, args.workers, args.rate, args.tolerance, args.settle)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'setting':28} {'rms':>7} {'p95':>7} {'settle':>8}  settled")
+    shown = scores[:args.top] + [sc for sc in scores[args.top:] if sc.setting == FIRMWARE]
+    for sc in shown:
+        mark = "  (firmware default)" if sc.setting == FIRMWARE else ""
+        print(f"{str(sc.setting):28} {sc.rms_deg:6.2f}° {sc.p95_deg:6.2f}° {sc.settle_s:7.2f}s"
+              f"  {sc.settled}/{len(args.logs)}{mark}")
+    print(f"{len(settings)} settings x {len(args.logs)} logs in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
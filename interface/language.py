@@ -2,8 +2,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import socket, threading, time
-import json
-import os
+import itertools
+from log_panel import LogBuffer, LogView
+from patterns import (PatternStore, ADDED, CHANGED, REMOVED, CODE_HEADER, JSON_HEADER,
+                      pattern_code, pattern_sequence, parse_tags, pattern_tags)
 
 HOST_DEFAULT = "192.168.4.1"
 PORT_DEFAULT = 80
@@ -21,6 +23,10 @@ root.geometry("1200x750")
 sock = None
 sock_lock = threading.Lock()
 
+# Log lines kept in the panel
+LOG_MAX_LINES = 2000
+log_buffer = LogBuffer(LOG_MAX_LINES)
+
 # ----------------------- networking -----------------------
 def send_message(msg: str, sock_obj: socket.socket, timeout=1.0) -> None:
     full = f"{msg}\n".encode()
@@ -54,10 +60,8 @@ def connect(ip: str, port: int, retries=3) -> socket.socket:
 
 # ----------------------- UI helpers -----------------------
 def log(msg: str) -> None:
-    output.configure(state="normal")
-    output.insert("end", msg + "\n")
-    output.see("end")
-    output.configure(state="disabled")
+    # Thread-safe: lines are queued and drawn by the log panel
+    log_buffer.write(msg)
 
 def set_controls_enabled(on: bool) -> None:
     test_btn.configure(state=("normal" if on else "disabled"))
@@ -95,6 +99,8 @@ def connect_to_hub():
 
 def disconnect_from_hub():
     global sock
+    if _sequencer:
+        _sequencer.cancel_all()
     with sock_lock:
         if sock:
             try:
@@ -107,27 +113,54 @@ def disconnect_from_hub():
     disconnect_btn.configure(state="disabled")
     set_controls_enabled(False)
 
+_sequencer = None
+
+def get_sequencer():
+    """One worker plays test patterns in turn (sequencer.py), started on first use"""
+    global _sequencer
+    if _sequencer is None:
+        from sequencer import SequenceExecutor
+        _sequencer = SequenceExecutor(send_steps)
+    return _sequencer
+
+def send_steps(steps, _due):
+    with sock_lock:
+        local = sock
+    if not local:
+        return False
+    for row, pin, state in steps:
+        send_message(f"{row};{pin}:{state}", local, timeout=0.5)
+    return True
+
 def run_sequence(sequence):
-    """sequence = list of (msg, delay_after_sec)"""
-    def worker():
-        with sock_lock:
-            if not sock:
-                log("Not connected")
-                return
-            local = sock
-        for msg, d in sequence:
-            send_message(msg, local, timeout=0.5)
-            if d > 0:
-                time.sleep(d)
-    threading.Thread(target=worker, daemon=True).start()
+    """sequence = list of (msg, delay_after_sec); plays after any pattern already playing"""
+    from sequencer import batches
 
-# ----------------------- pattern builder -----------------------
-# Store loaded patterns
-patterns_library = {}
-PATTERNS_FILE = "haptic_patterns.json"
+    with sock_lock:
+        if not sock:
+            log("Not connected")
+            return
+    steps = []
+    for msg, d in sequence:
+        row, command = msg.split(";", 1)
+        pin, state = command.split(":")
+        steps.append((row, pin, state, d))
+    get_sequencer().submit(batches(steps))
 
-def build_sequence_from_settings():
-    """Build a sequence based on current UI settings"""
+# ----------------------- pattern builder -----------------------
+store = PatternStore()
+_index = None
+
+def get_index():
+    """Search/similarity index, built on first use (it pulls in NumPy, which is slow to import)"""
+    global _index
+    if _index is None:
+        from pattern_index import PatternIndex
+        _index = PatternIndex(store)  # Subscribes ahead of the UI, so searches see each change
+    return _index
+
+def selected_motors():
+    """Motor pins ticked in the builder"""
     motors = []
     if motor_left_var.get():
         motors.append(5)
@@ -137,43 +170,27 @@ def build_sequence_from_settings():
         motors.append(19)
     if motor_back_var.get():
         motors.append(23)
+    return motors
 
-    if not motors:
-        return []
-
-    buzz_length = buzz_length_var.get() / 1000.0  # Convert ms to seconds
-    two_buzz = two_buzz_var.get()
-    gap = 0.05  # Fixed 50ms gap for two-buzz patterns
-
-    sequence = []
-
-    # Turn on all selected motors
-    for motor in motors:
-        sequence.append((f"1;{motor}:1", 0.00))
-
-    # First buzz duration
-    sequence[-1] = (sequence[-1][0], buzz_length)
-
-    # Turn off all motors
-    for motor in motors:
-        sequence.append((f"1;{motor}:0", 0.00))
-
-    if two_buzz:
-        # Gap between buzzes
-        sequence[-1] = (sequence[-1][0], gap)
-
-        # Turn on all motors again
-        for motor in motors:
-            sequence.append((f"1;{motor}:1", 0.00))
-
-        # Second buzz duration
-        sequence[-1] = (sequence[-1][0], buzz_length)
-
-        # Turn off all motors
-        for motor in motors:
-            sequence.append((f"1;{motor}:0", 0.00))
+def current_pattern(name=""):
+    """Pattern dict for the current UI settings"""
+    pattern = {
+        "name": name,
+        "motors": selected_motors(),
+        "buzz_length_ms": buzz_length_var.get(),
+        "two_buzz": two_buzz_var.get()
+    }
+    tags = parse_tags(tags_var.get())
+    if tags:
+        pattern["tags"] = tags
+    return pattern
 
-    return sequence
+def build_sequence_from_settings():
+    """Build a sequence based on current UI settings"""
+    pattern = current_pattern()
+    if not pattern["motors"]:
+        return []
+    return pattern_sequence(pattern)
 
 def test_pattern():
     """Test the current pattern"""
@@ -191,53 +208,36 @@ def save_pattern():
         messagebox.showerror("Error", "Please enter a pattern name")
         return
 
-    motors = []
-    if motor_left_var.get():
-        motors.append(5)
-    if motor_front_var.get():
-        motors.append(18)
-    if motor_right_var.get():
-        motors.append(19)
-    if motor_back_var.get():
-        motors.append(23)
-
-    if not motors:
+    pattern = current_pattern(name)
+    if not pattern["motors"]:
         messagebox.showerror("Error", "Please select at least one motor")
         return
 
-    pattern = {
-        "name": name,
-        "motors": motors,
-        "buzz_length_ms": buzz_length_var.get(),
-        "two_buzz": two_buzz_var.get()
-    }
-
-    patterns_library[name] = pattern
-    save_patterns_to_file()
-    update_pattern_list()
-    generate_code_output()
-    log(f"✓ Saved pattern: {name}")
-    messagebox.showinfo("Success", f"Pattern '{name}' saved successfully!")
+    duplicates = get_index().near_duplicates(pattern, exclude=name)
+    if duplicates:
+        other, similarity = duplicates[0]
+        log(f"⚠ '{name}' is {similarity:.0%} similar to '{other}'")
+        if not messagebox.askyesno("Similar Pattern",
+                                   f"'{name}' feels {similarity:.0%} like '{other}'"
+                                   f"{f' (and {len(duplicates) - 1} more)' if len(duplicates) > 1 else ''}.\n"
+                                   "Save anyway?"):
+            return
 
-def save_patterns_to_file():
-    """Save all patterns to JSON file"""
     try:
-        with open(PATTERNS_FILE, 'w') as f:
-            json.dump(patterns_library, f, indent=2)
-    except Exception as e:
+        store.put(pattern)
+    except OSError as e:
         log(f"Error saving patterns: {e}")
+        return
+    log(f"✓ Saved pattern: {name}")
+    messagebox.showinfo("Success", f"Pattern '{name}' saved successfully!")
 
 def load_patterns_from_file():
     """Load patterns from JSON file"""
-    global patterns_library
-    if os.path.exists(PATTERNS_FILE):
-        try:
-            with open(PATTERNS_FILE, 'r') as f:
-                patterns_library = json.load(f)
-            update_pattern_list()
-            log(f"✓ Loaded {len(patterns_library)} patterns")
-        except Exception as e:
-            log(f"Error loading patterns: {e}")
+    try:
+        count = store.load()
+        log(f"✓ Loaded {count} patterns")
+    except (OSError, ValueError) as e:
+        log(f"Error loading patterns: {e}")
 
 def load_selected_pattern():
     """Load the selected pattern from the list"""
@@ -247,11 +247,12 @@ def load_selected_pattern():
         return
 
     name = pattern_listbox.get(selection[0])
-    if name in patterns_library:
-        pattern = patterns_library[name]
+    pattern = store.get(name)
+    if pattern:
         pattern_name_var.set(pattern["name"])
         buzz_length_var.set(pattern["buzz_length_ms"])
         two_buzz_var.set(pattern["two_buzz"])
+        tags_var.set(", ".join(pattern_tags(pattern)))
 
         # Reset all motors first
         motor_left_var.set(False)
@@ -282,81 +283,181 @@ def delete_selected_pattern():
 
     name = pattern_listbox.get(selection[0])
     if messagebox.askyesno("Confirm Delete", f"Delete pattern '{name}'?"):
-        del patterns_library[name]
-        save_patterns_to_file()
-        update_pattern_list()
-        generate_code_output()
+        try:
+            store.delete(name)
+        except OSError as e:
+            log(f"Error saving patterns: {e}")
+            return
         log(f"✓ Deleted pattern: {name}")
 
 def update_pattern_list():
-    """Update the pattern listbox"""
+    """Rebuild the pattern listbox (only patterns matching the search box)"""
+    query = search_var.get()
     pattern_listbox.delete(0, tk.END)
-    for name in sorted(patterns_library.keys()):
-        pattern_listbox.insert(tk.END, name)
+    pattern_listbox.insert(tk.END, *(get_index().search(query) if query.strip() else store.names()))
+    update_library_title()
+
+def update_library_title():
+    if search_var.get().strip():
+        library_frame.configure(text=f"Saved Patterns ({pattern_listbox.size()} of {len(store)})")
+    else:
+        library_frame.configure(text=f"Saved Patterns ({len(store)})")
+
+def show_similar():
+    """Log the patterns closest to the selected one"""
+    selection = pattern_listbox.curselection()
+    if not selection:
+        messagebox.showinfo("Info", "Please select a pattern")
+        return
+    name = pattern_listbox.get(selection[0])
+    nearest = get_index().nearest(store.get(name), k=5, exclude=name)
+    if not nearest:
+        log(f"'{name}' is the only pattern")
+        return
+    log(f"Closest to '{name}': " + ", ".join(f"{other} {sim:.0%}" for other, sim in nearest))
+
+def find_duplicates():
+    """Log every pair of patterns that are hard to tell apart"""
+    pairs = get_index().duplicate_pairs()
+    if not pairs:
+        log("✓ No near-duplicate patterns")
+        return
+    log(f"⚠ {len(pairs)} near-duplicate pairs:")
+    for a, b, sim in pairs[:20]:
+        log(f"   {a} ~ {b} ({sim:.0%})")
+    if len(pairs) > 20:
+        log(f"   … {len(pairs) - 20} more")
+
+def suggest_distinct():
+    """Load the pattern least like anything in the library into the builder"""
+    pattern, similarity, closest = get_index().suggest_distinct()
+    motor_left_var.set(5 in pattern["motors"])
+    motor_front_var.set(18 in pattern["motors"])
+    motor_right_var.set(19 in pattern["motors"])
+    motor_back_var.set(23 in pattern["motors"])
+    buzz_length_var.set(pattern["buzz_length_ms"])
+    two_buzz_var.set(pattern["two_buzz"])
+    update_buzz_length_label()
+    if closest:
+        log(f"Suggested: motors {pattern['motors']}, {pattern['buzz_length_ms']} ms, "
+            f"{'two buzzes' if pattern['two_buzz'] else 'one buzz'} ({similarity:.0%} like '{closest}')")
+
+# The code pane holds one Python block and one JSON entry per pattern, in name
+# order. Each starts at a text mark ("py:<id>" / "js:<id>"), so a change only
+# replaces the text of the pattern that changed.
+code_marks = {}  # name -> mark id
+mark_ids = itertools.count(1)
+code_ready = False  # Nothing is generated until the code tab is first shown
+
+def _mark(section, name):
+    return f"{section}:{code_marks[name]}"
+
+def _next_mark(section, names, i):
+    """Mark where the block after names[i] starts (or the end of the section)"""
+    if i + 1 < len(names):
+        return _mark(section, names[i + 1])
+    return "py_end" if section == "py" else "js_end"
+
+def _json_fragment(name, last):
+    return store.entry(name) + ("\n" if last else ",\n")
+
+def _place(name, names, i):
+    """Insert the blocks of names[i] in front of the next pattern's"""
+    if name not in code_marks:
+        code_marks[name] = next(mark_ids)
+    for section, text in (("py", pattern_code(store.get(name))),
+                          ("js", _json_fragment(name, i == len(names) - 1))):
+        index = code_output.index(_next_mark(section, names, i))
+        code_output.insert(index, text)
+        code_output.mark_set(_mark(section, name), index)
+
+def _remove(name, names, i):
+    """Delete the blocks of a pattern; `names`/`i` describe the list it was in"""
+    for section in ("py", "js"):
+        code_output.delete(_mark(section, name), _next_mark(section, names, i))
+        code_output.mark_unset(_mark(section, name))
 
 def generate_code_output():
-    """Generate Python and JSON code for saved patterns"""
-    if not patterns_library:
-        code_output.configure(state="normal")
-        code_output.delete("1.0", "end")
+    """Generate Python and JSON code for all saved patterns"""
+    global code_ready
+    code_ready = True
+    code_output.configure(state="normal")
+    code_output.delete("1.0", "end")
+    for mark in code_output.mark_names():
+        if mark not in ("insert", "current"):
+            code_output.mark_unset(mark)
+    code_marks.clear()
+
+    names = store.names()
+    if not names:
         code_output.insert("1.0", "# No patterns saved yet")
         code_output.configure(state="disabled")
         return
 
-    # Generate Python code
-    py_code = "# Haptic Pattern Functions\n\n"
-    py_code += "def run_sequence(sequence):\n"
-    py_code += "    \"\"\"sequence = list of (msg, delay_after_sec)\"\"\"\n"
-    py_code += "    # Implementation depends on your setup\n"
-    py_code += "    pass\n\n"
-
-    for name, pattern in sorted(patterns_library.items()):
-        func_name = name.lower().replace(" ", "_").replace("-", "_")
-        py_code += f"def {func_name}():\n"
-        py_code += f"    \"\"\"Pattern: {pattern['name']} - Motors: {pattern['motors']}, "
-        py_code += f"Buzz: {pattern['buzz_length_ms']}ms, Two-buzz: {pattern['two_buzz']}\"\"\"\n"
-
-        motors = pattern['motors']
-        buzz_len = pattern['buzz_length_ms'] / 1000.0
-        two_buzz = pattern['two_buzz']
-
-        py_code += "    run_sequence([\n"
-
-        # First buzz on
-        for i, motor in enumerate(motors):
-            delay = buzz_len if i == len(motors) - 1 else 0.00
-            py_code += f"        (\"1;{motor}:1\", {delay:.2f}),\n"
-
-        # First buzz off
-        for i, motor in enumerate(motors):
-            delay = 0.05 if two_buzz and i == len(motors) - 1 else 0.00
-            if not two_buzz and i == len(motors) - 1:
-                delay = 0.00
-            py_code += f"        (\"1;{motor}:0\", {delay:.2f}),\n"
-
-        if two_buzz:
-            # Second buzz on
-            for i, motor in enumerate(motors):
-                delay = buzz_len if i == len(motors) - 1 else 0.00
-                py_code += f"        (\"1;{motor}:1\", {delay:.2f}),\n"
-
-            # Second buzz off
-            for i, motor in enumerate(motors):
-                delay = 0.00
-                py_code += f"        (\"1;{motor}:0\", {delay:.2f}),\n"
-
-        py_code += "    ])\n\n"
-
-    # Add JSON section
-    py_code += "\n# JSON Format\n"
-    py_code += "# " + "="*60 + "\n"
-    py_code += json.dumps(patterns_library, indent=2)
+    # Marks keep right gravity: text inserted at a block's mark lands before it
+    code_output.insert("end-1c", CODE_HEADER)
+    py_end = code_output.index("end-1c")
+    code_output.insert("end-1c", JSON_HEADER + "{\n")
+    js_end = code_output.index("end-1c")
+    code_output.insert("end-1c", "}")
+    code_output.mark_set("py_end", py_end)
+    code_output.mark_set("js_end", js_end)
+    # Back to front: each block goes in front of the one after it, which is already placed
+    for i in range(len(names) - 1, -1, -1):
+        _place(names[i], names, i)
+    code_output.configure(state="disabled")
+
+def on_patterns_changed(event, name):
+    """Store listener: patch the listbox and code pane for one pattern"""
+    names = store.names()
+    if event not in (ADDED, CHANGED, REMOVED) or not names or (event == ADDED and len(names) == 1):
+        update_pattern_list()
+        if code_ready:
+            generate_code_output()
+        return
 
+    i = store.position(name)
+    if search_var.get().strip():
+        # Filtered view: a change can move the pattern in or out of the results
+        update_pattern_list()
+    elif event == ADDED:
+        pattern_listbox.insert(i, name)
+        update_library_title()
+    elif event == REMOVED:
+        pattern_listbox.delete(i)
+        update_library_title()
+
+    if not code_ready:
+        return
     code_output.configure(state="normal")
-    code_output.delete("1.0", "end")
-    code_output.insert("1.0", py_code)
+    if event == ADDED:
+        _place(name, names, i)
+        if i == len(names) - 1:
+            # The previous last JSON entry now needs a comma
+            _refresh_json(names, i - 1)
+    elif event == CHANGED:
+        _remove(name, names, i)
+        _place(name, names, i)
+    else:
+        was = names[:i] + [name] + names[i:]
+        _remove(name, was, i)
+        del code_marks[name]
+        if i == len(names):
+            _refresh_json(names, i - 1)
     code_output.configure(state="disabled")
 
+def on_right_tab_changed(_event=None):
+    if not code_ready and right_tabs.select() == str(code_frame):
+        generate_code_output()
+
+def _refresh_json(names, i):
+    """Rewrite the JSON entry of names[i] (its trailing comma depends on whether it is last)"""
+    name = names[i]
+    start = code_output.index(_mark("js", name))
+    code_output.delete(start, _next_mark("js", names, i))
+    code_output.insert(start, _json_fragment(name, i == len(names) - 1))
+    code_output.mark_set(_mark("js", name), start)
+
 def update_buzz_length_label():
     """Update the buzz length display"""
     buzz_length_label.config(text=f"{buzz_length_var.get()} ms")
@@ -408,6 +509,13 @@ pattern_name_var = tk.StringVar()
 pattern_name_entry = ttk.Entry(name_frame, textvariable=pattern_name_var, width=30)
 pattern_name_entry.pack(side="left", fill="x", expand=True)
 
+# Tags
+tags_frame = ttk.Frame(builder_frame)
+tags_frame.pack(fill="x", pady=(0, 10))
+ttk.Label(tags_frame, text="Tags:").pack(side="left", padx=(0, 5))
+tags_var = tk.StringVar()
+ttk.Entry(tags_frame, textvariable=tags_var, width=30).pack(side="left", fill="x", expand=True)
+
 # Motor Selection
 motor_frame = ttk.LabelFrame(builder_frame, text="Motor Selection", padding=10)
 motor_frame.pack(fill="x", pady=(0, 10))
@@ -464,6 +572,14 @@ library_frame = ttk.LabelFrame(left_frame, text="Saved Patterns", padding=10)
 library_frame.pack(fill="both", expand=True)
 
 # Listbox with scrollbar
+# Search: name prefixes and #tags
+search_frame = ttk.Frame(library_frame)
+search_frame.pack(fill="x", pady=(0, 5))
+ttk.Label(search_frame, text="Search:").pack(side="left", padx=(0, 5))
+search_var = tk.StringVar()
+ttk.Entry(search_frame, textvariable=search_var).pack(side="left", fill="x", expand=True)
+search_var.trace_add("write", lambda *_: update_pattern_list())
+
 list_frame = ttk.Frame(library_frame)
 list_frame.pack(fill="both", expand=True, pady=(0, 5))
 
@@ -481,13 +597,32 @@ lib_btn_frame.pack(fill="x")
 ttk.Button(lib_btn_frame, text="Load Selected", command=load_selected_pattern).pack(side="left", padx=(0, 5), fill="x", expand=True)
 ttk.Button(lib_btn_frame, text="Delete Selected", command=delete_selected_pattern).pack(side="left", fill="x", expand=True)
 
+lib_tools_frame = ttk.Frame(library_frame)
+lib_tools_frame.pack(fill="x", pady=(5, 0))
+
+ttk.Button(lib_tools_frame, text="Similar", command=show_similar).pack(side="left", padx=(0, 5), fill="x", expand=True)
+ttk.Button(lib_tools_frame, text="Find Duplicates", command=find_duplicates).pack(side="left", padx=(0, 5), fill="x", expand=True)
+ttk.Button(lib_tools_frame, text="Suggest Distinct", command=suggest_distinct).pack(side="left", fill="x", expand=True)
+
 # Right side - Code Output and Log
 right_frame = ttk.Frame(main_content)
 right_frame.pack(side="right", fill="both", expand=True, padx=(5, 0))
 
+# Log and generated code share the right side; the code is generated the first time its tab is opened
+right_tabs = ttk.Notebook(right_frame)
+right_tabs.pack(fill="both", expand=True)
+
+# Log
+log_frame = ttk.Frame(right_tabs, padding=6)
+right_tabs.add(log_frame, text="Log")
+
+output = LogView(log_frame, log_buffer, height=10)
+output.pack(fill="both", expand=True)
+
 # Code Output
-code_frame = ttk.LabelFrame(right_frame, text="Generated Code (Python + JSON)", padding=6)
-code_frame.pack(fill="both", expand=True, pady=(0, 10))
+code_frame = ttk.Frame(right_tabs, padding=6)
+right_tabs.add(code_frame, text="Generated Code (Python + JSON)")
+right_tabs.bind("<<NotebookTabChanged>>", on_right_tab_changed)
 
 code_scroll = ttk.Scrollbar(code_frame)
 code_scroll.pack(side="right", fill="y")
@@ -496,21 +631,16 @@ code_output = tk.Text(code_frame, height=20, state="disabled", yscrollcommand=co
 code_output.pack(fill="both", expand=True)
 code_scroll.config(command=code_output.yview)
 
-# Log
-log_frame = ttk.LabelFrame(right_frame, text="Log", padding=6)
-log_frame.pack(fill="both", expand=True)
+# Initialize
+store.subscribe(on_patterns_changed)
+set_controls_enabled(False)
 
-log_scroll = ttk.Scrollbar(log_frame)
-log_scroll.pack(side="right", fill="y")
 
-output = tk.Text(log_frame, height=10, state="disabled", yscrollcommand=log_scroll.set)
-output.pack(fill="both", expand=True)
-log_scroll.config(command=output.yview)
+def main():
+    # Read the library once the window is up, not as a side effect of importing
+    root.after_idle(load_patterns_from_file)
+    root.mainloop()
 
-# Initialize
-load_patterns_from_file()
-generate_code_output()
-set_controls_enabled(False)
 
 if __name__ == "__main__":
-    root.mainloop()
\ No newline at end of file
+    main()
\ No newline at end of file
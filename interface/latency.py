@@ -0,0 +1,65 @@
+"""
+Live latency budget for relayed GPS targets.
+
+A target computed from the hub pose is stale by the time a headband acts on it:
+the telemetry sample was already old when it reached the laptop (uplink), each
+relay waits for the commands ahead of it on the same hub (send), and the frame
+still has to cross the hub and the air (downlink). LatencyBudget tracks each
+part as a smoothed measurement so targets can be extrapolated to their expected
+arrival time and stamped with it.
+"""
+import threading
+from typing import Dict
+
+BUDGET_ALPHA = 0.1
+
+# Used until the first measurement of each component arrives (s)
+DEFAULT_UPLINK = 0.02
+DEFAULT_SEND = 0.01
+DEFAULT_DOWNLINK = 0.02
+
+UPLINK = "uplink"
+SEND = "send"
+DOWNLINK = "downlink"
+
+
+class LatencyBudget:
+    """Exponentially smoothed uplink, per-command send and downlink delays."""
+
+    def __init__(self, alpha: float = BUDGET_ALPHA):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._values = {UPLINK: DEFAULT_UPLINK, SEND: DEFAULT_SEND, DOWNLINK: DEFAULT_DOWNLINK}
+        self._seen = set()
+
+    def observe(self, component: str, seconds: float):
+        if seconds < 0:
+            return
+        with self._lock:
+            if component not in self._seen:
+                self._seen.add(component)
+                self._values[component] = seconds
+            else:
+                old = self._values[component]
+                self._values[component] = old + self.alpha * (seconds - old)
+
+    def observe_ack_rtt(self, rtt: float):
+        """An ack round trip covers hub -> headband -> hub -> laptop; half is the downlink."""
+        self.observe(DOWNLINK, rtt / 2)
+
+    def get(self, component: str) -> float:
+        return self._values[component]
+
+    def lead(self, position: int = 0) -> float:
+        """
+        Time from now until a target that is `position`-th in its hub's send
+        queue takes effect on the headband.
+        """
+        with self._lock:
+            return self._values[SEND] * (position + 1) + self._values[DOWNLINK]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            values = dict(self._values)
+        values["total"] = values[UPLINK] + values[SEND] + values[DOWNLINK]
+        return values
@@ -0,0 +1,202 @@
+import os
+import queue
+import tkinter as tk
+from tkinter import ttk
+from tkinter import font as tkfont
+
+# Default number of lines kept in memory
+LOG_MAX_LINES = 5000
+
+# Rotating spill file defaults
+SPILL_MAX_BYTES = 1_000_000
+SPILL_BACKUPS = 5
+
+# How often the panel drains queued lines (ms)
+LOG_POLL_MS = 100
+
+
+class RotatingSpill:
+    """Append-only log file that rotates to .1, .2, ... once it reaches max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int = SPILL_MAX_BYTES, backups: int = SPILL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_lines(self, lines):
+        """Write a batch of lines with a single write call."""
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def close(self):
+        self._file.close()
+
+
+class LogBuffer:
+    """
+    Bounded log model.
+
+    write() may be called from any thread; it only enqueues the line. drain()
+    runs on the UI thread, moves queued lines into a fixed-size ring buffer and
+    spills them to a rotating file if one is configured. Once the ring is full
+    the oldest lines are overwritten, so memory stays constant for any session
+    length.
+    """
+
+    def __init__(self, max_lines: int = LOG_MAX_LINES, spill_path: str = None,
+                 spill_max_bytes: int = SPILL_MAX_BYTES, spill_backups: int = SPILL_BACKUPS):
+        self.max_lines = max_lines
+        self._queue = queue.SimpleQueue()
+        self._ring = [None] * max_lines
+        self._start = 0   # index of the oldest line in _ring
+        self._len = 0
+        self.total = 0    # lines ever accepted into the ring
+        self.spill = RotatingSpill(spill_path, spill_max_bytes, spill_backups) if spill_path else None
+
+    def write(self, line: str):
+        """Queue a line. Thread-safe and non-blocking."""
+        self._queue.put(line)
+
+    def drain(self) -> int:
+        """Move queued lines into the ring. Returns the number of new lines."""
+        batch = []
+        try:
+            while True:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if not batch:
+            return 0
+
+        if self.spill:
+            try:
+                self.spill.write_lines(batch)
+            except OSError:
+                self.spill = None  # Disk problem - keep logging to the panel
+
+        for line in batch[-self.max_lines:]:
+            end = (self._start + self._len) % self.max_lines
+            self._ring[end] = line
+            if self._len < self.max_lines:
+                self._len += 1
+            else:
+                self._start = (self._start + 1) % self.max_lines
+        self.total += len(batch)
+        return len(batch)
+
+    def __len__(self):
+        return self._len
+
+    def lines(self, first: int, count: int):
+        """Return up to `count` lines starting at index `first` (0 = oldest kept line)."""
+        first = max(0, first)
+        last = min(self._len, first + count)
+        return [self._ring[(self._start + i) % self.max_lines] for i in range(first, last)]
+
+    def close(self):
+        if self.spill:
+            self.spill.close()
+            self.spill = None
+
+
+class LogView(ttk.Frame):
+    """
+    Text panel showing a window onto a LogBuffer.
+
+    Only the visible lines are ever inserted into the Text widget, and the
+    scrollbar is driven by the buffer rather than the widget. The view follows
+    the newest line until the user scrolls up.
+    """
+
+    def __init__(self, parent, buffer: LogBuffer, height: int = 6, **text_kw):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.visible = height
+        self.top = 0
+        self.follow = True
+        self._shown = None
+
+        self.scrollbar = ttk.Scrollbar(self, command=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.text = tk.Text(self, height=height, state="disabled", **text_kw)
+        self.text.pack(fill="both", expand=True)
+
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", self.on_wheel)
+        self.text.bind("<Button-4>", lambda _: self.scroll_by(-3))
+        self.text.bind("<Button-5>", lambda _: self.scroll_by(3))
+
+        self.after(LOG_POLL_MS, self.poll)
+
+    # ----------------------- Scrolling -----------------------
+    def on_scroll(self, action, value, unit=None):
+        """Scrollbar command handler ("moveto", fraction) or ("scroll", n, units|pages)."""
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self.buffer)))
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll_by(int(value) * step)
+
+    def on_wheel(self, event):
+        self.scroll_by(-1 if event.delta > 0 else 1)
+
+    def scroll_by(self, lines: int):
+        self.scroll_to(self.top + lines)
+
+    def scroll_to(self, top: int):
+        bottom = max(0, len(self.buffer) - self.visible)
+        self.top = max(0, min(top, bottom))
+        self.follow = self.top >= bottom
+        self.render()
+
+    def on_resize(self, _event=None):
+        linespace = max(1, tkfont.Font(font=self.text.cget("font")).metrics("linespace"))
+        self.visible = max(1, self.text.winfo_height() // linespace)
+        self.scroll_to(len(self.buffer) if self.follow else self.top)
+
+    # ----------------------- Rendering -----------------------
+    def poll(self):
+        """Drain new lines and redraw if the visible window changed."""
+        dropped_before = self.buffer.total - len(self.buffer)
+        if self.buffer.drain():
+            if self.follow:
+                self.top = max(0, len(self.buffer) - self.visible)
+            else:
+                # Keep the same lines in view while old ones fall off the ring
+                dropped = self.buffer.total - len(self.buffer) - dropped_before
+                self.top = max(0, self.top - dropped)
+            self.render()
+        self.after(LOG_POLL_MS, self.poll)
+
+    def render(self):
+        window = (self.buffer.total, self.top, self.visible)
+        if window == self._shown:
+            return
+        self._shown = window
+
+        lines = self.buffer.lines(self.top, self.visible)
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("end", "\n".join(lines))
+        self.text.configure(state="disabled")
+
+        n = len(self.buffer)
+        if n:
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + self.visible) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
@@ -1,10 +1,18 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import socket
-import threading
-import time
+from tkinter import ttk, messagebox, filedialog
 import math
-import select
+import time
+import os
+
+from ui_state import UIStateStore
+from log_panel import LogBuffer, LogView
+from metrics import MetricsServer, METRICS_PORT
+from members import OK, STALE, LOST, UNKNOWN
+from formation import calculate_column_positions
+from sequencer import REPLACE
+from constants import (HOST_DEFAULT, PORT_DEFAULT, PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK, SESSION_DIR,
+                       GRID_ROWS, GRID_COLS, NO_DATA, LOG, CONNECTION, LISTENER, POSE, RELAY, BLOCK, MEMBERS,
+                       MOTOR, SELECTION, SETTINGS, KEY_CUES)
 
 # 5 - Left Temple
 # 18 - Forehead
@@ -12,111 +20,79 @@ import select
 # 23 - Back of head
 
 # ----------------------- Constants -----------------------
-HOST_DEFAULT = "192.168.4.1"
-PORT_DEFAULT = 80
-FEET_PER_DEGREE_LAT = 364567.2
+# Activity log: lines kept in the panel, and full history spilled to disk
+LOG_MAX_LINES = 2000
+LOG_SPILL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "haptiband.log")
 
-# Motor pin mappings
-PIN_LEFT = 5
-PIN_FRONT = 18
-PIN_RIGHT = 19
-PIN_BACK = 23
+# Session replay speeds
+REPLAY_SPEEDS = ["1x", "2x", "4x", "10x"]
 
-# Grid dimensions
-GRID_ROWS = 5
-GRID_COLS = 5
+# Stats tab refresh interval (ms)
+STATS_REFRESH_MS = 1000
 
+# Grid colors
+COLOR_SELECTED = "#90EE90"  # Light green
+COLOR_IDLE = "#E0E0E0"      # Gray
+COLOR_FLASH = "#FFFF99"     # Yellow flash on GPS update
+GPS_FLASH_SECONDS = 0.3
 
-# ----------------------- GPS Functions -----------------------
-def feet_to_degrees(feet, latitude):
-    """Convert feet to lat/lon degrees at given latitude."""
-    lat_degrees = feet / FEET_PER_DEGREE_LAT
-    lon_degrees = feet / (FEET_PER_DEGREE_LAT * math.cos(math.radians(latitude)))
-    return lat_degrees, lon_degrees
+# The hub streams its pose at 5-20 Hz: log it at most this often (s)
+HUB_GPS_LOG_INTERVAL = 1.0
+# Telemetry older than this on arrival is shown as lagging (s)
+TELEMETRY_AGE_WARN = 0.5
 
+# Member health indicator colors
+HEALTH_COLORS = {OK: "#2E8B57", STALE: "#FFA500", LOST: "#D32F2F", UNKNOWN: "#BBBBBB"}
 
-def calculate_column_positions(lat, lon, heading_deg, spacing_feet=3.0):
-    """
-    Calculate GPS positions for all 5 columns based on hub position.
-    Returns list of ((lat, lon), heading) tuples for columns 1-5.
-    """
-    theta = math.radians(heading_deg)
-    offset_multipliers = [-2.0, -1.0, 0.0, 1.0, 2.0]  # columns 1-5
-    result = []
-
-    for mult in offset_multipliers:
-        distance_feet = mult * spacing_feet
-        lat_offset, lon_offset = feet_to_degrees(abs(distance_feet), lat)
+# GPS tab heat strip (distance of each member from its target)
+HEAT_MAX_FEET = 6.0           # Distance drawn fully red
 
-        if distance_feet >= 0:
-            new_lat = lat - (lat_offset * math.cos(theta))
-            new_lon = lon + (lon_offset * math.sin(theta))
-        else:
-            new_lat = lat + (lat_offset * math.cos(theta))
-            new_lon = lon - (lon_offset * math.sin(theta))
+# Settings echoed back by the controller are not applied to widgets this soon after a local change,
+# so a slider being dragged does not jump back to values it already passed
+SETTINGS_ECHO_HOLD = 0.5
 
-        result.append(((new_lat, new_lon), heading_deg))
-
-    return result
-
-
-# ----------------------- Networking -----------------------
-def send_message(msg: str, sock_obj: socket.socket, timeout=1.0) -> str:
-    """Send message and return reply."""
-    full = f"{msg}\n".encode()
-    try:
-        sock_obj.sendall(full)
-        sock_obj.settimeout(timeout)
-        try:
-            reply = sock_obj.recv(256).decode(errors="ignore").strip()
-            return reply
-        except socket.timeout:
-            return None
-    except OSError as e:
-        raise e
-
-
-def connect(ip: str, port: int, retries=3) -> socket.socket:
-    """Connect to hub with retries."""
-    last = None
-    for _ in range(1, retries + 1):
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            s.settimeout(3.0)
-            s.connect((ip, port))
-            s.settimeout(None)
-            return s
-        except OSError as e:
-            last = e
-            time.sleep(0.5)
-    raise RuntimeError(f"Unable to reach hub at {ip}:{port} ({last})")
+# ----------------------- GPS Functions -----------------------
+def heat_color(feet):
+    """Green at the target, through yellow, to red at HEAT_MAX_FEET or beyond."""
+    a = min(1.0, max(0.0, feet / HEAT_MAX_FEET))
+    red = int(255 * min(1.0, 2 * a))
+    green = int(200 * min(1.0, 2 * (1 - a)))
+    return f"#{red:02x}{green:02x}00"
 
 
 # ======================= Main Application =======================
 class HaptiBandApp:
-    def __init__(self, root):
+    """
+    Tk frontend. All control runs in a Controller - in this process by default,
+    or in the haptiband.py daemon (api.RemoteController). The app sends it
+    commands and redraws from its events; it never touches the hubs itself.
+    """
+
+    def __init__(self, root, controller=None):
         self.root = root
         self.root.title("HaptiBand Control")
         self.root.geometry("1200x800")
         self.root.minsize(1000, 700)
 
-        # State
-        self.sock = None
-        self.sock_lock = threading.Lock()
+        # Control core: our own, or a daemon's
+        self.owns_controller = controller is None
+        if controller is None:
+            from controller import Controller  # Loads NumPy; the daemon's clients never need it
+            controller = Controller()
+        self.ctl = controller
+        self.metrics_server = None
+
+        # Mirrors of controller state, kept up to date from its events
         self.selected_rows = {1}  # Default to row 1
         self.connected = False
         self.connect_time = None
-
-        # GPS state
-        self.hub_lat = None
-        self.hub_lon = None
-        self.hub_heading = None
-        self.gps_listener_running = False
-        self.gps_listener_thread = None
-        self.shutdown_event = threading.Event()
+        self.pose = None  # Latest filtered hub pose (POSE event data)
+        self.next_gps_log = 0.0
         self.auto_relay = tk.BooleanVar(value=False)
         self.spacing_var = tk.DoubleVar(value=3.0)
+        self.applying_settings = False
+        self.settings_hold_until = 0.0
+        self.auto_relay.trace_add("write", self.on_auto_relay_change)
 
         # Grid cell references (shared between tabs)
         self.grid_cells = {}
@@ -125,13 +101,30 @@ class HaptiBandApp:
         # Control buttons to enable/disable
         self.control_widgets = []
 
+        # UI state store - widgets are redrawn at a fixed frame rate, only when changed
+        self.ui = UIStateStore(self.root)
+        self.gps_flash_until = None
+
         # Build UI
         self.build_ui()
+        self.ui.add_frame_hook(self.check_gps_flash)
+        self.ui.start()
+        if self.owns_controller:
+            # Once the window is up: the endpoint is not needed to start operating
+            self.root.after_idle(self.start_metrics_server)
+        else:
+            self.ui.set("stats_endpoint", f"Attached to haptiband daemon at {self.ctl.address} "
+                                          f"(metrics: http://127.0.0.1:{METRICS_PORT}/metrics)")
+
+        # Follow the controller (events arrive on control threads)
+        self.ctl.subscribe(self.on_controller_event)
+        self.ctl.start()
 
         # Keyboard bindings
         self.root.bind("<Key>", self.on_key)
         self.root.bind("<Escape>", lambda _: self.emergency_stop())
         self.root.bind("<Return>", lambda _: self.connect_to_hub() if not self.connected else None)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Update status periodically
         self.update_status()
@@ -145,15 +138,18 @@ class HaptiBandApp:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=(0, 5))
 
-        # Manual Control Tab
+        # Manual Control Tab (shown first, so built now)
         self.manual_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.manual_frame, text="Manual Control")
         self.build_manual_tab()
 
-        # GPS Mode Tab
+        # GPS Mode and Stats tabs are built the first time they are opened
         self.gps_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.gps_frame, text="GPS Mode")
-        self.build_gps_tab()
+        self.stats_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.stats_frame, text="Stats")
+        self.tab_builders = {str(self.gps_frame): self.build_gps_tab, str(self.stats_frame): self.build_stats_tab}
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
         # Log panel at bottom
         self.build_log_panel()
@@ -161,6 +157,13 @@ class HaptiBandApp:
         # Initially disable controls
         self.set_controls_enabled(False)
 
+    def on_tab_changed(self, _event=None):
+        """Build a tab on its first visit."""
+        builder = self.tab_builders.pop(self.notebook.select(), None)
+        if builder:
+            builder()
+            self.set_controls_enabled(self.connected)
+
     def build_connection_bar(self):
         """Build the connection status bar."""
         conn_frame = ttk.Frame(self.root, padding=10)
@@ -169,7 +172,7 @@ class HaptiBandApp:
         # IP Entry
         ttk.Label(conn_frame, text="IP:").pack(side="left")
         self.ip_var = tk.StringVar(value=HOST_DEFAULT)
-        self.ip_entry = ttk.Entry(conn_frame, textvariable=self.ip_var, width=16)
+        self.ip_entry = ttk.Entry(conn_frame, textvariable=self.ip_var, width=32)
         self.ip_entry.pack(side="left", padx=(0, 10))
 
         # Port Entry
@@ -243,12 +246,17 @@ class HaptiBandApp:
         summary_frame = ttk.Frame(grid_frame)
         summary_frame.pack(fill="x", pady=5)
 
+        member_label = ttk.Label(summary_frame, text="Members: --", foreground="gray")
+        member_label.pack(side="right")
+        self.ui.bind_widget(("members_summary", "gps" if is_gps_tab else "manual"), member_label)
+
         if is_gps_tab:
             self.gps_selection_label = ttk.Label(summary_frame, text="Selected: Row 1", font=("TkDefaultFont", 10, "bold"))
             self.gps_selection_label.pack(side="left")
         else:
             self.selection_label = ttk.Label(summary_frame, text="Selected: Row 1", font=("TkDefaultFont", 10, "bold"))
             self.selection_label.pack(side="left")
+        self.ui.bind("selection_text", self.set_selection_labels, initial="Selected: Row 1")
 
         # Quick select buttons
         quick_frame = ttk.Frame(grid_frame)
@@ -270,6 +278,8 @@ class HaptiBandApp:
         """Draw the formation grid on canvas."""
         canvas.delete("all")
         cells = {}
+        tab = "gps" if is_gps_tab else "manual"
+        self.ui.unbind_prefix(("grid", tab))
 
         cell_width = 55
         cell_height = 55
@@ -296,9 +306,11 @@ class HaptiBandApp:
             elif row == 5:
                 row_label = "Row 5 (Back)"
 
+            label_fill = "blue" if row in self.selected_rows else "black"
             label_id = canvas.create_text(25, y_center, text=f"{row}", font=("TkDefaultFont", 11, "bold"),
-                                         fill="blue" if row in self.selected_rows else "black")
+                                         fill=label_fill)
             canvas.tag_bind(label_id, "<Button-1>", lambda e, r=row: self.on_row_label_click(r, e))
+            self.ui.bind_item(("grid", tab, "label", row), canvas, label_id, initial=label_fill)
 
             # Draw cells for this row
             for col in range(1, GRID_COLS + 1):
@@ -308,12 +320,19 @@ class HaptiBandApp:
                 y2 = y1 + cell_height - 4
 
                 # Color based on row selection
-                if row in self.selected_rows:
-                    fill = "#90EE90"  # Light green
-                else:
-                    fill = "#E0E0E0"  # Gray
+                fill = COLOR_SELECTED if row in self.selected_rows else COLOR_IDLE
 
                 cell = canvas.create_rectangle(x1, y1, x2, y2, fill=fill, outline="black", width=1)
+                self.ui.bind_item(("grid", tab, "cell", row, col), canvas, cell, initial=fill)
+
+                # Member health dot (top-right corner)
+                health = canvas.create_oval(x2 - 12, y1 + 4, x2 - 4, y1 + 12,
+                                            fill=HEALTH_COLORS[UNKNOWN], outline="")
+                self.ui.bind_item(("grid", tab, "health", row, col), canvas, health, initial=HEALTH_COLORS[UNKNOWN])
+                if is_gps_tab:
+                    # Heat strip: distance from target, from the member's own position reports
+                    heat = canvas.create_rectangle(x1 + 4, y2 - 10, x2 - 4, y2 - 4, fill="", outline="")
+                    self.ui.bind_item(("grid", tab, "heat", row, col), canvas, heat, initial="")
                 text_id = canvas.create_text((x1 + x2) / 2, (y1 + y2) / 2,
                                             text=f"{row};{col}", font=("TkDefaultFont", 9))
 
@@ -334,42 +353,63 @@ class HaptiBandApp:
 
         if ctrl_held:
             # Toggle this row
-            if row in self.selected_rows:
-                self.selected_rows.discard(row)
-            else:
-                self.selected_rows.add(row)
+            self.set_selection(self.selected_rows ^ {row}, fallback=row)
         else:
             # Select only this row
-            self.selected_rows = {row}
-
-        # Ensure at least one row is selected for safety
-        if not self.selected_rows:
-            self.selected_rows = {row}
+            self.set_selection({row})
 
+    def set_selection(self, rows, fallback=1):
+        """Select rows here and in the controller (at least one, for safety)."""
+        self.selected_rows = set(rows) or {fallback}
         self.update_all_grids()
+        self.ctl.select_rows(self.selected_rows)
 
     def update_all_grids(self):
-        """Update both grid displays and selection labels."""
+        """Update both grid displays and selection labels (drawn on the next UI frame)."""
+        flashing = self.gps_flash_until is not None
+
         # Update manual tab grid
-        if hasattr(self, 'grid_canvas') and self.grid_cells:
-            self._update_grid(self.grid_canvas, self.grid_cells)
+        if self.grid_cells:
+            self._update_grid("manual", self.grid_cells, flash=False)
 
         # Update GPS tab grid
-        if hasattr(self, 'gps_grid_canvas') and self.gps_grid_cells:
-            self._update_grid(self.gps_grid_canvas, self.gps_grid_cells)
+        if self.gps_grid_cells:
+            self._update_grid("gps", self.gps_grid_cells, flash=flashing)
 
         # Update selection labels
         self._update_selection_labels()
 
-    def _update_grid(self, canvas, cells):
-        """Update a single grid's colors."""
-        for (row, col), (cell, text_id, label_id) in cells.items():
-            if row in self.selected_rows:
-                canvas.itemconfig(cell, fill="#90EE90")
-                canvas.itemconfig(label_id, fill="blue")
-            else:
-                canvas.itemconfig(cell, fill="#E0E0E0")
-                canvas.itemconfig(label_id, fill="black")
+    def _update_grid(self, tab, cells, flash=False):
+        """Record a single grid's colors; only cells that changed get redrawn."""
+        selected_fill = COLOR_FLASH if flash else COLOR_SELECTED
+        for row, col in cells:
+            selected = row in self.selected_rows
+            self.ui.set(("grid", tab, "cell", row, col), selected_fill if selected else COLOR_IDLE)
+            self.ui.set(("grid", tab, "label", row), "blue" if selected else "black")
+
+    def show_member_health(self, health, summary):
+        """Update the health dot of every member from a MEMBERS event."""
+        for key, state in health.items():
+            row, col = map(int, key.split(";"))
+            color = HEALTH_COLORS.get(state, HEALTH_COLORS[UNKNOWN])
+            self.ui.set(("grid", "manual", "health", row, col), color)
+            self.ui.set(("grid", "gps", "health", row, col), color)
+
+        text = f"Members: {summary.get(OK, 0)} ok, {summary.get(STALE, 0)} stale, {summary.get(LOST, 0)} lost"
+        self.ui.set(("members_summary", "manual"), text)
+        self.ui.set(("members_summary", "gps"), text)
+
+    def show_block(self, distance, tier):
+        """Heat strip colors from a BLOCK event (one entry per member, row-major)."""
+        for slot, (feet, t) in enumerate(zip(distance, tier)):
+            row, col = divmod(slot, GRID_COLS)
+            self.ui.set(("grid", "gps", "heat", row + 1, col + 1), "" if t == NO_DATA else heat_color(feet))
+
+    def check_gps_flash(self):
+        """End the GPS update flash once it has been shown long enough (runs every UI frame)."""
+        if self.gps_flash_until is not None and time.monotonic() >= self.gps_flash_until:
+            self.gps_flash_until = None
+            self.update_all_grids()
 
     def _update_selection_labels(self):
         """Update the selection summary labels."""
@@ -384,6 +424,10 @@ class HaptiBandApp:
             rows = sorted(self.selected_rows)
             text = f"Selected: Rows {', '.join(map(str, rows))}"
 
+        self.ui.set("selection_text", text)
+
+    def set_selection_labels(self, text):
+        """Apply selection summary text to both tabs."""
         if hasattr(self, 'selection_label'):
             self.selection_label.config(text=text)
         if hasattr(self, 'gps_selection_label'):
@@ -391,18 +435,15 @@ class HaptiBandApp:
 
     def select_single_row(self, row):
         """Select a single row."""
-        self.selected_rows = {row}
-        self.update_all_grids()
+        self.set_selection({row})
 
     def select_all_rows(self):
         """Select all rows."""
-        self.selected_rows = set(range(1, 6))
-        self.update_all_grids()
+        self.set_selection(range(1, GRID_ROWS + 1))
 
     def clear_selection(self):
         """Clear selection (defaults to row 1 for safety)."""
-        self.selected_rows = {1}
-        self.update_all_grids()
+        self.set_selection({1})
         self.log("Selection cleared, defaulting to Row 1")
 
     def build_headband_diagram(self, parent):
@@ -437,11 +478,15 @@ class HaptiBandApp:
         self.motor_indicators[PIN_BACK] = self.motor_canvas.create_oval(90, 125, 110, 145, fill="gray", outline="black")
         self.motor_canvas.create_text(100, 165, text="Back", font=("TkDefaultFont", 8))
 
+        for pin, item in self.motor_indicators.items():
+            self.ui.bind(("motor", pin),
+                         lambda on, i=item: self.motor_canvas.itemconfig(i, fill="#00FF00" if on else "gray"),
+                         initial=False)
+
     def update_motor_diagram(self, pin, state):
-        """Update motor indicator color."""
+        """Update motor indicator color. Safe to call from any thread."""
         if pin in self.motor_indicators:
-            color = "#00FF00" if state else "gray"
-            self.motor_canvas.itemconfig(self.motor_indicators[pin], fill=color)
+            self.ui.set(("motor", pin), bool(state))
 
     def build_wasd_controls(self, parent):
         """Build WASD-style control buttons."""
@@ -454,7 +499,7 @@ class HaptiBandApp:
         # Top row - Forward (W)
         top_row = ttk.Frame(ctrl_frame)
         top_row.pack(pady=(5, 0))
-        btn_w = ttk.Button(top_row, text="W - Forward", width=14, command=self.forward)
+        btn_w = ttk.Button(top_row, text="W - Forward", width=14, command=lambda: self.cue("forward"))
         btn_w.pack()
         self.control_widgets.append(btn_w)
 
@@ -462,15 +507,15 @@ class HaptiBandApp:
         mid_row = ttk.Frame(ctrl_frame)
         mid_row.pack(pady=5)
 
-        btn_a = ttk.Button(mid_row, text="A - Left", width=10, command=self.left)
+        btn_a = ttk.Button(mid_row, text="A - Left", width=10, command=lambda: self.cue("left"))
         btn_a.pack(side="left", padx=3)
         self.control_widgets.append(btn_a)
 
-        btn_s = ttk.Button(mid_row, text="S - Back", width=10, command=self.back)
+        btn_s = ttk.Button(mid_row, text="S - Back", width=10, command=lambda: self.cue("back"))
         btn_s.pack(side="left", padx=3)
         self.control_widgets.append(btn_s)
 
-        btn_d = ttk.Button(mid_row, text="D - Right", width=10, command=self.right)
+        btn_d = ttk.Button(mid_row, text="D - Right", width=10, command=lambda: self.cue("right"))
         btn_d.pack(side="left", padx=3)
         self.control_widgets.append(btn_d)
 
@@ -484,11 +529,11 @@ class HaptiBandApp:
         rot_row = ttk.Frame(ctrl_frame)
         rot_row.pack(pady=5)
 
-        btn_z = ttk.Button(rot_row, text="Z - Rotate Left", width=14, command=self.rotate_left)
+        btn_z = ttk.Button(rot_row, text="Z - Rotate Left", width=14, command=lambda: self.cue("rotate_left"))
         btn_z.pack(side="left", padx=3)
         self.control_widgets.append(btn_z)
 
-        btn_x = ttk.Button(rot_row, text="X - Rotate Right", width=14, command=self.rotate_right)
+        btn_x = ttk.Button(rot_row, text="X - Rotate Right", width=14, command=lambda: self.cue("rotate_right"))
         btn_x.pack(side="left", padx=3)
         self.control_widgets.append(btn_x)
 
@@ -501,11 +546,11 @@ class HaptiBandApp:
         seq_row = ttk.Frame(ctrl_frame)
         seq_row.pack(pady=5)
 
-        btn_e = ttk.Button(seq_row, text="E - Start March", width=14, command=self.start_seq)
+        btn_e = ttk.Button(seq_row, text="E - Start March", width=14, command=lambda: self.cue("start_march"))
         btn_e.pack(side="left", padx=3)
         self.control_widgets.append(btn_e)
 
-        btn_q = ttk.Button(seq_row, text="Q - All Stop", width=14, command=self.stop_all)
+        btn_q = ttk.Button(seq_row, text="Q - All Stop", width=14, command=lambda: self.cue("stop_all"))
         btn_q.pack(side="left", padx=3)
         self.control_widgets.append(btn_q)
 
@@ -536,21 +581,38 @@ class HaptiBandApp:
                                         orient="horizontal", length=150)
         self.spacing_slider.pack(side="left")
 
-        self.spacing_label = ttk.Label(spacing_frame, text="3.0 ft", width=6)
+        self.spacing_label = ttk.Label(spacing_frame, text=f"{self.spacing_var.get():.1f} ft", width=6)
         self.spacing_label.pack(side="left", padx=(5, 0))
 
         self.spacing_var.trace_add("write", self.on_spacing_change)
 
         # Auto-relay toggle
         auto_check = ttk.Checkbutton(settings_frame, text="Auto-relay to headbands", variable=self.auto_relay)
-        auto_check.pack(anchor="w", pady=10)
+        auto_check.pack(anchor="w", pady=(10, 0))
         self.control_widgets.append(auto_check)
 
+        self.relay_rate_label = ttk.Label(settings_frame, text="Relay: --", foreground="gray")
+        self.relay_rate_label.pack(anchor="w", pady=(0, 10))
+        self.ui.bind_widget("relay_rate", self.relay_rate_label)
+
         # Manual trigger button
-        send_btn = ttk.Button(settings_frame, text="Send GPS Now", command=self.send_gps_update)
+        send_btn = ttk.Button(settings_frame, text="Send GPS Now", command=lambda: self.ctl.send_gps_update())
         send_btn.pack(fill="x", pady=5)
         self.control_widgets.append(send_btn)
 
+        # Set marks split recorded sessions for analytics.py
+        set_btn = ttk.Button(settings_frame, text="Next Set", command=lambda: self.ctl.mark_set())
+        set_btn.pack(fill="x", pady=5)
+
+        # Session replay (works offline, feeds recorded telemetry into the app)
+        replay_frame = ttk.Frame(settings_frame)
+        replay_frame.pack(fill="x", pady=5)
+        self.replay_speed_var = tk.StringVar(value=REPLAY_SPEEDS[0])
+        ttk.Combobox(replay_frame, textvariable=self.replay_speed_var, values=REPLAY_SPEEDS,
+                     width=4, state="readonly").pack(side="left")
+        ttk.Button(replay_frame, text="Replay Session...",
+                   command=self.choose_replay_session).pack(side="left", fill="x", expand=True, padx=(5, 0))
+
         # Hub GPS/IMU Display
         gps_display_frame = ttk.LabelFrame(middle_panel, text="Hub Position (from Hub)", padding=10)
         gps_display_frame.pack(fill="x", pady=(0, 10))
@@ -568,9 +630,17 @@ class HaptiBandApp:
         self.hub_heading_label = ttk.Label(gps_display_frame, text="Heading: --")
         self.hub_heading_label.pack(anchor="w")
 
+        self.ui.bind("gps_status", lambda v: self.gps_status_label.config(text=v[0], foreground=v[1]))
+        self.ui.bind_widget("hub_lat", self.hub_lat_label)
+        self.ui.bind_widget("hub_lon", self.hub_lon_label)
+        self.ui.bind_widget("hub_heading", self.hub_heading_label)
+
         # GPS Listener status
         self.listener_status = ttk.Label(middle_panel, text="GPS Listener: Inactive", foreground="gray")
         self.listener_status.pack(anchor="w")
+        self.ui.bind("listener", lambda active: self.listener_status.config(
+            text=f"GPS Listener: {'Active' if active else 'Inactive'}", foreground="green" if active else "gray"),
+            initial=False)
 
         # Right: Column Positions Preview
         right_panel = ttk.Frame(main_container)
@@ -593,33 +663,89 @@ class HaptiBandApp:
             label = ttk.Label(frame, text="--", font=("TkDefaultFont", 9))
             label.pack(side="left", fill="x", expand=True)
             self.column_labels.append(label)
+            self.ui.bind_widget(("column", i), label, initial="--")
+
+    def build_stats_tab(self):
+        """Build the metrics table."""
+        columns = ("labels", "type", "value", "p50", "p99", "max")
+        self.stats_tree = ttk.Treeview(self.stats_frame, columns=columns, height=16)
+        self.stats_tree.heading("#0", text="Metric")
+        self.stats_tree.column("#0", width=260)
+        for col, title, width in [("labels", "Labels", 140), ("type", "Type", 70), ("value", "Count / Value", 110),
+                                  ("p50", "p50 (ms)", 90), ("p99", "p99 (ms)", 90), ("max", "Max (ms)", 90)]:
+            self.stats_tree.heading(col, text=title)
+            self.stats_tree.column(col, width=width, anchor="e")
+        self.stats_tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        self.stats_endpoint_label = ttk.Label(self.stats_frame, text="", foreground="gray")
+        self.stats_endpoint_label.pack(anchor="w", padx=10, pady=(0, 10))
+        self.ui.bind_widget("stats_endpoint", self.stats_endpoint_label, initial="")
+        self.stats_rows = {}
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        """Refresh the stats table while its tab is visible."""
+        if self.notebook.select() == str(self.stats_frame):
+            for name, labels, kind, value, p50, p99, peak in self.ctl.metrics_snapshot():
+                if isinstance(value, float):
+                    value = f"{value:.2f}"
+                ms = ["" if v is None else f"{v * 1000:.2f}" for v in (p50, p99, peak)]
+                values = (labels, kind, value, *ms)
+                key = (name, labels)
+                if key in self.stats_rows:
+                    self.stats_tree.item(self.stats_rows[key], values=values)
+                else:
+                    self.stats_rows[key] = self.stats_tree.insert("", "end", text=name, values=values)
+        self.root.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def start_metrics_server(self):
+        """Serve metrics as Prometheus text on localhost."""
+        try:
+            self.metrics_server = MetricsServer(self.ctl.metrics, port=METRICS_PORT).start()
+            text = f"Prometheus metrics: http://127.0.0.1:{self.metrics_server.port}/metrics  (trace: /trace)"
+        except OSError as e:
+            text = f"Metrics endpoint unavailable: {e}"
+        self.ui.set("stats_endpoint", text)
 
     def on_spacing_change(self, *_args):
         """Update spacing label when slider changes."""
         val = self.spacing_var.get()
         self.spacing_label.config(text=f"{val:.1f} ft")
+        if not self.applying_settings:
+            self.settings_hold_until = time.monotonic() + SETTINGS_ECHO_HOLD
+            self.ctl.set_spacing(val)
+
+    def on_auto_relay_change(self, *_args):
+        if not self.applying_settings:
+            self.settings_hold_until = time.monotonic() + SETTINGS_ECHO_HOLD
+            self.ctl.set_auto_relay(self.auto_relay.get())
+
+    def apply_settings(self, auto_relay, spacing):
+        """Show settings changed in the controller (possibly by another frontend)."""
+        if time.monotonic() < self.settings_hold_until:
+            return
+        self.applying_settings = True
+        try:
+            if self.auto_relay.get() != auto_relay:
+                self.auto_relay.set(auto_relay)
+            if abs(self.spacing_var.get() - spacing) > 1e-9:
+                self.spacing_var.set(spacing)
+        finally:
+            self.applying_settings = False
 
     def build_log_panel(self):
         """Build the log output panel."""
         log_frame = ttk.LabelFrame(self.root, text="Activity Log", padding=6)
         log_frame.pack(fill="both", expand=False, padx=10, pady=(0, 10))
 
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(log_frame)
-        scrollbar.pack(side="right", fill="y")
-
-        self.log_output = tk.Text(log_frame, height=6, state="disabled",
-                                  yscrollcommand=scrollbar.set, font=("TkFixedFont", 9))
+        self.log_buffer = LogBuffer(LOG_MAX_LINES, spill_path=LOG_SPILL_PATH)
+        self.log_output = LogView(log_frame, self.log_buffer, height=6, font=("TkFixedFont", 9))
         self.log_output.pack(fill="both", expand=True)
-        scrollbar.config(command=self.log_output.yview)
 
     def log(self, msg: str):
-        """Add message to log."""
+        """Add message to log. Safe to call from any thread."""
         timestamp = time.strftime("%H:%M:%S")
-        self.log_output.configure(state="normal")
-        self.log_output.insert("end", f"[{timestamp}] {msg}\n")
-        self.log_output.see("end")
-        self.log_output.configure(state="disabled")
+        self.log_buffer.write(f"[{timestamp}] {msg}")
 
     def set_controls_enabled(self, enabled: bool):
         """Enable or disable all control widgets."""
@@ -632,7 +758,7 @@ class HaptiBandApp:
 
     # ----------------------- Connection Methods -----------------------
     def connect_to_hub(self):
-        """Connect to the hub in background thread."""
+        """Ask the controller to connect (it reports back with a CONNECTION event)."""
         if self.connected:
             return
 
@@ -642,37 +768,14 @@ class HaptiBandApp:
         except ValueError:
             port = PORT_DEFAULT
 
-        self.log(f"Connecting to {ip}:{port}...")
         self.connect_btn.configure(state="disabled")
+        self.ctl.connect(ip, port)
 
-        def worker():
-            try:
-                s = connect(ip, port)
-                with self.sock_lock:
-                    if self.sock:
-                        try:
-                            self.sock.close()
-                        except Exception:
-                            pass
-                    self.sock = s
-
-                self.connected = True
-                self.connect_time = time.time()
-
-                # Update UI on main thread
-                self.root.after(0, self.on_connected)
-
-                # Start GPS listener
-                self.start_gps_listener()
-
-            except Exception as e:
-                self.root.after(0, lambda: self.on_connection_failed(str(e)))
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def on_connected(self):
+    def on_connected(self, uptime=None):
         """Update UI after successful connection."""
-        self.log("Connected successfully")
+        self.connected = True
+        self.connect_time = time.time() - (uptime or 0)
+        self.connect_btn.configure(state="disabled")
         self.disconnect_btn.configure(state="normal")
         self.status_canvas.itemconfig(self.status_indicator, fill="green", outline="darkgreen")
         self.status_label.config(text="Connected")
@@ -680,32 +783,22 @@ class HaptiBandApp:
 
     def on_connection_failed(self, error: str):
         """Handle connection failure."""
-        self.log(f"Connection failed: {error}")
         messagebox.showerror("Connection Error", error)
         self.connect_btn.configure(state="normal")
 
-    def disconnect_from_hub(self):
-        """Disconnect from hub."""
-        self.stop_gps_listener()
-
-        with self.sock_lock:
-            if self.sock:
-                try:
-                    self.sock.close()
-                except Exception:
-                    pass
-                self.sock = None
-
+    def on_disconnected(self):
         self.connected = False
         self.connect_time = None
-        self.log("Disconnected")
-
         self.connect_btn.configure(state="normal")
         self.disconnect_btn.configure(state="disabled")
         self.status_canvas.itemconfig(self.status_indicator, fill="red", outline="darkred")
         self.status_label.config(text="Disconnected")
         self.set_controls_enabled(False)
 
+    def disconnect_from_hub(self):
+        """Disconnect from hub."""
+        self.ctl.disconnect()
+
     def update_status(self):
         """Update status indicator periodically."""
         if self.connected and self.connect_time:
@@ -715,302 +808,146 @@ class HaptiBandApp:
 
         self.root.after(1000, self.update_status)
 
-    # ----------------------- GPS Listener -----------------------
-    def start_gps_listener(self):
-        """Start background GPS listener thread."""
-        if self.gps_listener_running:
-            return
-
-        self.shutdown_event.clear()
-        self.gps_listener_running = True
-
-        def listener():
-            while not self.shutdown_event.is_set():
-                # Get socket reference under lock (quick operation)
-                with self.sock_lock:
-                    if not self.sock:
-                        break
-                    local_sock = self.sock
-
-                try:
-                    # select() is safe to call without lock - it's read-only
-                    ready = select.select([local_sock], [], [], 0.2)
-                    if ready[0]:
-                        # Hold lock during recv to prevent conflicts with send
-                        with self.sock_lock:
-                            if not self.sock:
-                                break
-                            local_sock.settimeout(0.5)
-                            data = local_sock.recv(256).decode(errors="ignore").strip()
-                            local_sock.settimeout(None)
-                        if data and "GPS:" in data and "|IMU:" in data:
-                            self.root.after(0, lambda d=data: self.process_gps_data(d))
-                except socket.timeout:
-                    pass
-                except Exception:
-                    pass
-
-                time.sleep(0.05)
-
-            self.gps_listener_running = False
-            self.root.after(0, lambda: self.listener_status.config(text="GPS Listener: Inactive", foreground="gray"))
-
-        self.gps_listener_thread = threading.Thread(target=listener, daemon=True)
-        self.gps_listener_thread.start()
-        self.listener_status.config(text="GPS Listener: Active", foreground="green")
-        self.log("GPS listener started")
-
-    def stop_gps_listener(self):
-        """Stop the GPS listener thread."""
-        self.shutdown_event.set()
-        if self.gps_listener_thread:
-            self.gps_listener_thread.join(timeout=1.0)
-        self.gps_listener_running = False
-
-    def process_gps_data(self, data):
-        """Process received GPS/IMU data from hub."""
-        try:
-            # Parse GPS:lat,lon|IMU:heading
-            gps_start = data.find("GPS:") + 4
-            gps_end = data.find("|IMU:")
-            gps = data[gps_start:gps_end]
-
-            imu_start = data.find("|IMU:") + 5
-            imu = data[imu_start:]
-
-            lat_str, lon_str = gps.split(",")
-            self.hub_lat = float(lat_str)
-            self.hub_lon = float(lon_str)
-            self.hub_heading = int(imu)
-
-            # Update UI
-            self.gps_status_label.config(text="Receiving data", foreground="green")
-            self.hub_lat_label.config(text=f"Lat: {self.hub_lat:.6f}")
-            self.hub_lon_label.config(text=f"Lon: {self.hub_lon:.6f}")
-            self.hub_heading_label.config(text=f"Heading: {self.hub_heading}\u00b0")
-
-            # Calculate column positions
-            spacing = self.spacing_var.get()
-            positions = calculate_column_positions(self.hub_lat, self.hub_lon, self.hub_heading, spacing)
-
-            for i, ((lat, lon), heading) in enumerate(positions):
-                self.column_labels[i].config(text=f"{lat:.6f}, {lon:.6f}")
-
-            # Flash grid cells yellow briefly
-            for (row, col), (cell, _, _) in self.gps_grid_cells.items():
-                if row in self.selected_rows:
-                    self.gps_grid_canvas.itemconfig(cell, fill="#FFFF99")
-
-            self.root.after(300, self.update_all_grids)
+    def on_close(self):
+        """Close the window. A daemon keeps running; our own controller disconnects."""
+        self.ctl.close()
+        self.root.destroy()
+
+    # ----------------------- Controller Events -----------------------
+    def on_controller_event(self, event, data):
+        """
+        Runs on controller threads (or the API reader): only records values and
+        queues UI work for the next frame, so it never blocks the control loop.
+        """
+        if event == LOG:
+            self.log(data["text"])
+        elif event == CONNECTION:
+            state = data["state"]
+            if state == "connected":
+                self.ui.call("connection", self.on_connected, data.get("uptime"))
+            elif state == "failed":
+                self.ui.call("connection", self.on_connection_failed, data["error"])
+            else:
+                self.ui.call("connection", self.on_disconnected)
+        elif event == LISTENER:
+            self.ui.set("listener", data["active"])
+        elif event == POSE:
+            self.pose = data
+            self.ui.call("gps_data", self.process_gps_data)
+        elif event == RELAY:
+            self.ui.set("relay_rate", f"Relay: {data['achieved']:.1f} Hz "
+                                      f"(target {data['target']:.1f}, link {data['ceiling']:.1f})")
+        elif event == BLOCK:
+            self.show_block(data["distance"], data["tier"])
+        elif event == MEMBERS:
+            self.show_member_health(data["health"], data["summary"])
+        elif event == MOTOR:
+            self.update_motor_diagram(data["pin"], data["on"])
+        elif event == SELECTION:
+            self.ui.call("selection", self.show_selection, set(data["rows"]))
+        elif event == SETTINGS:
+            self.ui.call("settings", self.apply_settings, data["auto_relay"], data["spacing"])
+
+    def show_selection(self, rows):
+        """Selection changed in the controller (possibly by another frontend)."""
+        if rows != self.selected_rows:
+            self.selected_rows = rows
+            self.update_all_grids()
 
-            self.log(f"Hub GPS: {self.hub_lat:.6f}, {self.hub_lon:.6f} @ {self.hub_heading}\u00b0")
+    def process_gps_data(self):
+        """Show the latest filtered hub pose (relaying is paced by the controller)."""
+        pose = self.pose
+        if pose is None:
+            return
+        lat, lon, heading = pose["lat"], pose["lon"], pose["heading"]
 
-            # Auto-relay if enabled
-            if self.auto_relay.get():
-                self.send_gps_update()
+        # Update UI
+        age = pose.get("age")
+        if age is None or math.isnan(age):
+            status = (f"Receiving data (±{pose['sigma']:.2f} m, {pose['speed']:.1f} m/s)", "green")
+        else:
+            status = (f"Receiving data (±{pose['sigma']:.2f} m, {pose['speed']:.1f} m/s, {age * 1000:.0f} ms old)",
+                      "green" if age < TELEMETRY_AGE_WARN else "orange")
+        self.ui.set("gps_status", status)
+        self.ui.set("hub_lat", f"Lat: {lat:.6f}")
+        self.ui.set("hub_lon", f"Lon: {lon:.6f}")
+        self.ui.set("hub_heading", f"Heading: {heading:.1f}°")
+
+        # Calculate column positions
+        spacing = self.spacing_var.get()
+        positions = calculate_column_positions(lat, lon, heading, spacing)
 
-        except Exception as e:
-            self.log(f"GPS parse error: {e}")
+        for i, ((col_lat, col_lon), _heading) in enumerate(positions, start=1):
+            self.ui.set(("column", i), f"{col_lat:.6f}, {col_lon:.6f}")
 
-    def send_gps_update(self):
-        """Send GPS positions to selected headbands."""
-        if self.hub_lat is None or self.hub_lon is None or self.hub_heading is None:
-            self.log("No GPS data available yet")
-            return
+        # Flash grid cells yellow briefly
+        self.gps_flash_until = time.monotonic() + GPS_FLASH_SECONDS
+        self.update_all_grids()
 
-        if not self.selected_rows:
-            self.log("No rows selected")
-            return
+        now = time.monotonic()
+        if now >= self.next_gps_log:
+            self.next_gps_log = now + HUB_GPS_LOG_INTERVAL
+            self.log(f"Hub GPS: {lat:.6f}, {lon:.6f} @ {heading:.1f}°")
 
-        spacing = self.spacing_var.get()
-        positions = calculate_column_positions(self.hub_lat, self.hub_lon, self.hub_heading, spacing)
-
-        def worker():
-            sent_count = 0
-            for row in sorted(self.selected_rows):
-                for col in range(1, 6):
-                    (lat, lon), heading = positions[col - 1]
-                    msg = f"{row};{col}:{lat},{lon}|{heading}"
-                    try:
-                        with self.sock_lock:
-                            if not self.sock:
-                                self.root.after(0, lambda: self.log("Not connected"))
-                                return
-                            send_message(msg, self.sock, timeout=0.5)
-                        sent_count += 1
-                    except Exception as e:
-                        self.root.after(0, lambda err=e: self.log(f"Send error: {err}"))
-
-            self.root.after(0, lambda: self.log(f"Sent GPS to {sent_count} targets"))
-
-        threading.Thread(target=worker, daemon=True).start()
+    # ----------------------- Session Replay -----------------------
+    def choose_replay_session(self):
+        """Pick a recorded session and replay its telemetry into the controller."""
+        path = filedialog.askopenfilename(initialdir=SESSION_DIR, title="Replay Session",
+                                          filetypes=[("HaptiBand sessions", "*.hbs"), ("All files", "*")])
+        if path:
+            speed = float(self.replay_speed_var.get().rstrip("x"))
+            self.ctl.replay_session(path, speed)
 
     # ----------------------- Motor Control Methods -----------------------
-    def run_sequence(self, sequence):
-        """Run a sequence of motor commands. sequence = list of (row, pin, state, delay)"""
-        if not self.connected:
-            self.log("Not connected")
-            return
-
-        if not self.selected_rows:
-            self.log("No rows selected")
-            return
-
-        def worker():
-            for row, pin, state, delay in sequence:
-                msg = f"{row};{pin}:{state}"
-                try:
-                    with self.sock_lock:
-                        if not self.sock:
-                            return
-                        send_message(msg, self.sock, timeout=0.5)
-                    self.root.after(0, lambda p=pin, s=state: self.update_motor_diagram(p, s == 1))
-                except Exception as e:
-                    self.root.after(0, lambda err=e: self.log(f"Send error: {err}"))
-                if delay > 0:
-                    time.sleep(delay)
-
-            # Reset motor diagram after sequence
-            self.root.after(300, lambda: [self.update_motor_diagram(p, False)
-                                          for p in [PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK]])
-
-        threading.Thread(target=worker, daemon=True).start()
-
-    def build_sequence_for_rows(self, base_sequence):
-        """Build sequence for all selected rows."""
-        full_sequence = []
-        for row in sorted(self.selected_rows):
-            for pin, state, delay in base_sequence:
-                full_sequence.append((row, pin, state, delay))
-        return full_sequence
-
-    def forward(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Forward -> Row(s) {rows}")
-        base = [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def left(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Left -> Row(s) {rows}")
-        base = [(PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.05), (PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def right(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Right -> Row(s) {rows}")
-        base = [(PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.05), (PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def back(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Back -> Row(s) {rows}")
-        base = [(PIN_BACK, 1, 0.10), (PIN_BACK, 0, 0.05), (PIN_BACK, 1, 0.10), (PIN_BACK, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def stop_all(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"All Stop -> Row(s) {rows}")
-        base = [
-            (PIN_LEFT, 1, 0.00), (PIN_FRONT, 1, 0.00), (PIN_RIGHT, 1, 0.00), (PIN_BACK, 1, 0.10),
-            (PIN_LEFT, 0, 0.00), (PIN_FRONT, 0, 0.00), (PIN_RIGHT, 0, 0.00), (PIN_BACK, 0, 0.05),
-            (PIN_LEFT, 1, 0.00), (PIN_FRONT, 1, 0.00), (PIN_RIGHT, 1, 0.00), (PIN_BACK, 1, 0.10),
-            (PIN_LEFT, 0, 0.00), (PIN_FRONT, 0, 0.00), (PIN_RIGHT, 0, 0.00), (PIN_BACK, 0, 0.00),
-        ]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def rotate_left(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Rotate Left -> Row(s) {rows}")
-        base = [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_LEFT, 1, 0.10), (PIN_LEFT, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def rotate_right(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Rotate Right -> Row(s) {rows}")
-        base = [(PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.05), (PIN_RIGHT, 1, 0.10), (PIN_RIGHT, 0, 0.00)]
-        self.run_sequence(self.build_sequence_for_rows(base))
-
-    def start_seq(self):
-        rows = ", ".join(map(str, sorted(self.selected_rows)))
-        self.log(f"Start March -> Row(s) {rows}")
-        base = [
-            (PIN_LEFT, 1, 0.00), (PIN_RIGHT, 1, 0.10),
-            (PIN_LEFT, 0, 0.00), (PIN_RIGHT, 0, 0.05),
-            (PIN_LEFT, 1, 0.00), (PIN_RIGHT, 1, 0.10),
-            (PIN_LEFT, 0, 0.00), (PIN_RIGHT, 0, 0.10),
-            (PIN_FRONT, 1, 0.10), (PIN_FRONT, 0, 0.00),
-        ]
-        self.run_sequence(self.build_sequence_for_rows(base))
+    def cue(self, name, policy=None):
+        """Play a built-in cue (controller.CUES) on the selected rows, after any cue already playing."""
+        self.ctl.run_cue(name, self.selected_rows, policy)
 
     def emergency_stop(self):
         """Emergency stop - immediately turn off all motors on ALL rows."""
-        self.log("EMERGENCY STOP - All rows, all motors OFF")
-
-        if not self.connected:
-            return
-
-        def worker():
-            # Send OFF to all motors on all rows
-            for row in range(1, 6):
-                for pin in [PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK]:
-                    msg = f"{row};{pin}:0"
-                    try:
-                        with self.sock_lock:
-                            if not self.sock:
-                                return
-                            send_message(msg, self.sock, timeout=0.3)
-                    except Exception:
-                        pass
-
-            self.root.after(0, lambda: [self.update_motor_diagram(p, False)
-                                        for p in [PIN_LEFT, PIN_FRONT, PIN_RIGHT, PIN_BACK]])
-
-        threading.Thread(target=worker, daemon=True).start()
+        self.ctl.emergency_stop()
 
     # ----------------------- Keyboard Handling -----------------------
     def on_key(self, event):
         """Handle keyboard shortcuts."""
         # Number keys 1-5 for quick row selection (always available)
-        if event.char in "12345":
+        if event.char and event.char in "12345":
             row = int(event.char)
             if event.state & 0x4:  # Ctrl held
-                if row in self.selected_rows:
-                    self.selected_rows.discard(row)
-                else:
-                    self.selected_rows.add(row)
-                if not self.selected_rows:
-                    self.selected_rows = {row}
+                self.set_selection(self.selected_rows ^ {row}, fallback=row)
             else:
-                self.selected_rows = {row}
-            self.update_all_grids()
+                self.set_selection({row})
             return
 
         # Control commands require connection
         if not self.connected:
             return
 
-        key = event.char.lower()
-        if key == "w":
-            self.forward()
-        elif key == "a":
-            self.left()
-        elif key == "s":
-            self.back()
-        elif key == "d":
-            self.right()
-        elif key == "z":
-            self.rotate_left()
-        elif key == "x":
-            self.rotate_right()
-        elif key == "e":
-            self.start_seq()
-        elif key == "q":
-            self.stop_all()
+        # Shift cuts off whatever is playing instead of queueing behind it
+        name = KEY_CUES.get(event.char.lower())
+        if name:
+            self.cue(name, REPLACE if event.state & 0x1 else None)
 
 
 # ======================= Main Entry Point =======================
-if __name__ == "__main__":
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HaptiBand control GUI")
+    parser.add_argument("--daemon", nargs="?", const="", metavar="ADDR",
+                        help="Attach to a running haptiband.py daemon (Unix socket path or host:port) "
+                             "instead of controlling the hubs from this process")
+    args = parser.parse_args()
+
+    controller = None
+    if args.daemon is not None:
+        from api import RemoteController
+        controller = RemoteController(args.daemon or None)
+
     root = tk.Tk()
-    app = HaptiBandApp(root)
+    HaptiBandApp(root, controller)
     root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
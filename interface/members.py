@@ -0,0 +1,267 @@
+"""
+Per-headband liveness and ack tracking.
+
+The hub answers each relayed command with "OK:<seq>", and every headband that
+acts on it answers "ACK:<row>;<col>:<seq>" through the hub. Headbands also send
+"HB:<row>;<col>:<fix>" heartbeats once a second. MembershipTable keeps
+last-seen time and ack RTT per member and works out which members missed a
+command so only they get a retransmit.
+
+With several hubs each one numbers its relays independently, so pending
+commands are keyed by (hub, seq).
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+# Liveness thresholds (seconds since last heartbeat/ack)
+HEARTBEAT_STALE = 2.5
+HEARTBEAT_LOST = 6.0
+
+# Ack handling
+ACK_TIMEOUT = 0.25      # Wait this long for acks before retransmitting
+MAX_RETRIES = 2         # Selective retransmits per command before giving up
+EARLY_ACK_SECONDS = 2.0  # Keep acks that beat the hub's OK for this long
+
+RTT_ALPHA = 0.2
+
+# Health states
+UNKNOWN = "unknown"
+OK = "ok"
+STALE = "stale"
+LOST = "lost"
+
+MemberId = Tuple[int, int]
+SeqKey = Tuple[Optional[str], int]  # (hub name, hub seq)
+
+
+class Member:
+    """Liveness state for one headband."""
+
+    def __init__(self, row: int, col: int):
+        self.row = row
+        self.col = col
+        self.last_seen = None
+        self.rtt = None          # Smoothed ack RTT (s)
+        self.fix = None          # Last reported GPS fix quality
+        self.acks = 0
+        self.misses = 0
+
+    def seen(self, now: float):
+        self.last_seen = now
+
+    def add_rtt(self, rtt: float):
+        self.rtt = rtt if self.rtt is None else self.rtt + RTT_ALPHA * (rtt - self.rtt)
+
+
+class PendingCommand:
+    """A relayed command waiting for acks from its expected members."""
+
+    def __init__(self, key: SeqKey, payload: str, expected: Set[MemberId], now: float):
+        self.key = key
+        self.payload = payload
+        self.target = command_target(payload)
+        self.expected = set(expected)
+        self.acked = set()
+        self.first_sent = now
+        self.sent_at = {m: now for m in expected}
+        self.retries = 0
+        self.deadline = now + ACK_TIMEOUT
+
+    def missing(self) -> Set[MemberId]:
+        return self.expected - self.acked
+
+
+def command_target(payload: str) -> str:
+    """What a command sets: "r;pin" for pin commands, "r;c|" for GPS targets."""
+    head = payload.split(":", 1)[0]
+    return head + "|" if "|" in payload else head
+
+
+def reply_seq(reply: Optional[str]) -> Optional[int]:
+    """Hub sequence number from an "OK:<seq>" reply (None for plain "OK" or errors)."""
+    for line in (reply or "").splitlines():
+        line = line.strip()
+        if line.startswith("OK:") and line[3:].isdigit():
+            return int(line[3:])
+    return None
+
+
+def parse_member(text: str) -> Optional[MemberId]:
+    """Parse "row;col" into (row, col)."""
+    try:
+        row, col = text.split(";")
+        return int(row), int(col)
+    except ValueError:
+        return None
+
+
+class MembershipTable:
+    """Thread-safe member table plus the set of commands awaiting acks."""
+
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.members: Dict[MemberId, Member] = {}
+        self._pending: Dict[SeqKey, PendingCommand] = {}
+        self._early = {}  # key -> [(member, t)] for acks that arrived before expect()
+        self._lock = threading.Lock()
+        self.on_ack: Optional[Callable[[str, MemberId], None]] = None  # (payload, member), under the table lock
+
+    def _member(self, mid: MemberId) -> Member:
+        m = self.members.get(mid)
+        if m is None:
+            m = self.members[mid] = Member(*mid)
+        return m
+
+    # ----------------------- Inbound frames -----------------------
+    def handle_line(self, line: str, now: Optional[float] = None, hub: Optional[str] = None):
+        """
+        Handle an "ACK:" or "HB:" line received from `hub`. Returns the ack RTT (s) for acks that
+        matched a pending command, True for other recognised lines, None otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        parts = line.split(":")
+        if len(parts) != 3:
+            return None
+        mid = parse_member(parts[1])
+        if mid is None:
+            return None
+        if parts[0] == "HB":
+            self.heartbeat(mid, int(parts[2]) if parts[2].isdigit() else None, now)
+            return True
+        if parts[0] == "ACK" and parts[2].isdigit():
+            rtt = self.ack((hub, int(parts[2])), mid, now)
+            return True if rtt is None else rtt
+        return None
+
+    def heartbeat(self, mid: MemberId, fix: Optional[int] = None, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            m = self._member(mid)
+            m.seen(now)
+            if fix is not None:
+                m.fix = fix
+
+    def ack(self, key: SeqKey, mid: MemberId, now: Optional[float] = None) -> Optional[float]:
+        """Record an ack. Returns the RTT if it matched a pending command."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            m = self._member(mid)
+            m.seen(now)
+            cmd = self._pending.get(key)
+            if cmd is None:
+                self._early.setdefault(key, []).append((mid, now))
+                return None
+            return self._apply_ack(cmd, mid, now)
+
+    def _apply_ack(self, cmd: PendingCommand, mid: MemberId, now: float) -> Optional[float]:
+        if mid in cmd.acked or mid not in cmd.expected:
+            return None
+        cmd.acked.add(mid)
+        m = self._member(mid)
+        m.acks += 1
+        rtt = max(0.0, now - cmd.sent_at[mid])
+        m.add_rtt(rtt)
+        if self.on_ack:
+            self.on_ack(cmd.payload, mid)
+        if not cmd.missing():
+            self._forget(cmd)
+        return rtt
+
+    def _forget(self, cmd: PendingCommand):
+        for key in [k for k, c in self._pending.items() if c is cmd]:
+            del self._pending[key]
+
+    # ----------------------- Outbound commands -----------------------
+    def expected_for(self, payload: str) -> Set[MemberId]:
+        """
+        Members that should ack a command. GPS targets ("r;c:lat,lon|hdg") go to
+        one member; pin commands ("r;pin:state") go to every member of the row.
+        """
+        head = payload.split(":", 1)[0]
+        parsed = parse_member(head)
+        if parsed is None:
+            return set()
+        row, second = parsed
+        if "|" in payload:
+            return {(row, second)}
+        with self._lock:
+            known = {mid for mid in self.members if mid[0] == row}
+        return known or {(row, col) for col in range(1, self.cols + 1)}
+
+    def expect(self, key: SeqKey, payload: str, expected: Set[MemberId], now: Optional[float] = None):
+        """Register a relayed command ((hub, seq) key) that should be acked by `expected`."""
+        if not expected:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            cmd = PendingCommand(key, payload, expected, now)
+            # A newer command for the same motor/target supersedes any unacked older one,
+            # so a late retransmit can never re-apply a stale state
+            for old in [c for c in set(self._pending.values()) if c.target == cmd.target]:
+                self._forget(old)
+            self._pending[key] = cmd
+            for mid, t in self._early.pop(key, []):
+                self._apply_ack(cmd, mid, t)
+            # Drop early acks nobody claimed
+            self._early = {k: acks for k, acks in self._early.items() if now - acks[0][1] < EARLY_ACK_SECONDS}
+
+    def alias(self, retransmit_key: SeqKey, cmd: PendingCommand, mid: MemberId, now: Optional[float] = None):
+        """Attach the (hub, seq) key of a unicast retransmit to the original command."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            cmd.sent_at[mid] = now
+            self._pending[retransmit_key] = cmd
+            for early_mid, t in self._early.pop(retransmit_key, []):
+                self._apply_ack(cmd, early_mid, t)
+
+    def due_retransmits(self, now: Optional[float] = None):
+        """
+        Commands whose ack window has passed. Returns (retransmit, failed):
+        retransmit is a list of (command, missing members) to resend; failed is
+        a list of (command, missing members) that ran out of retries.
+        """
+        now = time.monotonic() if now is None else now
+        retransmit, failed = [], []
+        with self._lock:
+            for cmd in set(self._pending.values()):
+                if now < cmd.deadline:
+                    continue
+                missing = cmd.missing()
+                if cmd.retries >= MAX_RETRIES:
+                    for mid in missing:
+                        self._member(mid).misses += 1
+                    failed.append((cmd, missing))
+                    self._forget(cmd)
+                else:
+                    cmd.retries += 1
+                    cmd.deadline = now + ACK_TIMEOUT
+                    retransmit.append((cmd, missing))
+        return retransmit, failed
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(set(self._pending.values()))
+
+    # ----------------------- Health -----------------------
+    def health(self, mid: MemberId, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        m = self.members.get(mid)
+        if m is None or m.last_seen is None:
+            return UNKNOWN
+        age = now - m.last_seen
+        if age < HEARTBEAT_STALE:
+            return OK
+        if age < HEARTBEAT_LOST:
+            return STALE
+        return LOST
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, int]:
+        now = time.monotonic() if now is None else now
+        counts = {OK: 0, STALE: 0, LOST: 0}
+        for mid in list(self.members):
+            state = self.health(mid, now)
+            if state in counts:
+                counts[state] += 1
+        return counts
@@ -0,0 +1,349 @@
+"""
+In-process metrics for the control app.
+
+Counters, gauges and HDR-style latency histograms, exposed as Prometheus text
+over a local HTTP endpoint and as a snapshot for the GUI stats tab. Recording
+is a few integer operations under a per-metric lock so it can sit on the send
+path.
+"""
+import collections
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# Histogram resolution: 2^SUB_BUCKET_BITS linear sub-buckets per power of two (~1.5% error)
+SUB_BUCKET_BITS = 7
+HISTOGRAM_MAX_SECONDS = 60.0
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+TRACE_HISTORY = 2000
+
+
+def _label_str(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Counter:
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = "", labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    """Value that can go up and down, or be computed on read by a callback."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str = "", labels=None, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.fn = fn
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, n: float = 1.0):
+        with self._lock:
+            self._value += n
+
+    def dec(self, n: float = 1.0):
+        self.inc(-n)
+
+    @property
+    def value(self) -> float:
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram of durations in seconds.
+
+    Values are stored as integer microseconds in buckets that are linear within
+    each power of two, so any quantile is accurate to ~1.5% over the whole range
+    from 1 us to HISTOGRAM_MAX_SECONDS with a fixed, small array.
+    """
+    kind = "summary"
+
+    def __init__(self, name: str, help: str = "", labels=None, max_seconds: float = HISTOGRAM_MAX_SECONDS):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._sub = 1 << SUB_BUCKET_BITS
+        self._half = self._sub >> 1
+        self._max_us = int(max_seconds * 1_000_000)
+        self._counts = [0] * (self._index(self._max_us) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def _index(self, v: int) -> int:
+        if v < self._sub:
+            return v
+        shift = v.bit_length() - SUB_BUCKET_BITS
+        return self._sub + (shift - 1) * self._half + ((v >> shift) - self._half)
+
+    def _value_at(self, index: int) -> int:
+        """Upper edge (us) of the bucket at `index`."""
+        if index < self._sub:
+            return index
+        shift = (index - self._sub) // self._half + 1
+        mantissa = (index - self._sub) % self._half + self._half
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        v = int(seconds * 1_000_000)
+        if v < 0:
+            v = 0
+        elif v > self._max_us:
+            v = self._max_us
+        i = self._index(v)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum_us += v
+            if v > self.max_us:
+                self.max_us = v
+
+    @contextmanager
+    def time(self):
+        """Record the duration of a `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        """Value (seconds) at quantile q (0..1)."""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = max(1, int(q * self.count + 0.5))
+            seen = 0
+            for i, n in enumerate(self._counts):
+                seen += n
+                if seen >= target:
+                    return min(self._value_at(i), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    @property
+    def mean(self) -> float:
+        return self.sum_us / self.count / 1_000_000 if self.count else 0.0
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = self.sum_us = self.max_us = 0
+
+    def samples(self):
+        for q in SUMMARY_QUANTILES:
+            yield self.name, dict(self.labels, quantile=str(q)), self.quantile(q)
+        yield self.name + "_sum", self.labels, self.sum_us / 1_000_000
+        yield self.name + "_count", self.labels, self.count
+
+
+class TimedLock:
+    """threading.Lock wrapper that records how long each acquire waited."""
+
+    def __init__(self, histogram: Histogram):
+        self._lock = threading.Lock()
+        self.histogram = histogram
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self.histogram.record(0.0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        ok = self._lock.acquire(True, timeout)
+        self.histogram.record(time.perf_counter() - start)
+        return ok
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Registry:
+    """Holds all metrics plus a bounded buffer of recent trace spans."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self.spans = collections.deque(maxlen=TRACE_HISTORY)
+
+    def _get(self, cls, name, help, labels, **kw):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = cls(name, help, labels, **kw)
+                self._metrics[key] = metric
+            return metric
+
+    def counter(self, name: str, help: str = "", labels=None) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str = "", labels=None, fn=None) -> Gauge:
+        return self._get(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name: str, help: str = "", labels=None) -> Histogram:
+        return self._get(Histogram, name, help, labels)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Trace a block: duration goes to the `<name>_seconds` histogram and the span buffer."""
+        hist = self.histogram(f"{name}_seconds", f"Duration of {name}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            hist.record(end - start)
+            self.spans.append((name, start - self._t0, end - start, threading.get_ident(), attrs))
+
+    # ----------------------- Export -----------------------
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        seen = set()
+        for metric in sorted(self.metrics(), key=lambda m: m.name):
+            if metric.name not in seen:
+                seen.add(metric.name)
+                if metric.help:
+                    lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_str(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def render_trace(self) -> str:
+        """Recent spans as Chrome trace-event JSON (load in chrome://tracing or Perfetto)."""
+        events = [
+            {"name": name, "ph": "X", "ts": start * 1e6, "dur": dur * 1e6,
+             "pid": 1, "tid": tid, "args": attrs}
+            for name, start, dur, tid, attrs in list(self.spans)
+        ]
+        return json.dumps({"traceEvents": events})
+
+    def snapshot(self):
+        """Rows of (name, labels, kind, value, p50, p99, max) for display."""
+        rows = []
+        for m in sorted(self.metrics(), key=lambda m: (m.name, sorted(m.labels.items()))):
+            labels = _label_str(m.labels)
+            if isinstance(m, Histogram):
+                rows.append((m.name, labels, m.kind, m.count, m.quantile(0.5), m.quantile(0.99), m.max_us / 1e6))
+            else:
+                rows.append((m.name, labels, m.kind, m.value, None, None, None))
+        return rows
+
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /trace (JSON) on localhost."""
+
+    def __init__(self, registry: Registry, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.registry = registry
+        # Imported here: http.server is a noticeable share of app start-up, and only the server needs it
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.startswith("/metrics"):
+                    body, ctype = registry.render_prometheus(), "text/plain; version=0.0.4"
+                elif handler.path.startswith("/trace"):
+                    body, ctype = registry.render_trace(), "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                data = body.encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", ctype)
+                handler.send_header("Content-Length", str(len(data)))
+                handler.end_headers()
+                handler.wfile.write(data)
+
+            def log_message(handler, *_args):
+                pass  # Keep scrapes out of stderr
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RateMeter:
+    """Exponentially smoothed event rate (Hz) and time since last event."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.rate = 0.0
+        self.last = None
+
+    def mark(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if self.last is not None and now > self.last:
+            inst = 1.0 / (now - self.last)
+            self.rate = inst if self.rate == 0.0 else self.rate + self.alpha * (inst - self.rate)
+        self.last = now
+
+    def age(self) -> float:
+        return float("nan") if self.last is None else time.monotonic() - self.last
+
+
+# Shared registry for the process
+REGISTRY = Registry()
@@ -0,0 +1,145 @@
+"""
+What every headband's motors are believed to be doing.
+
+MotorStateTable keeps one cell per (row, col, pin) in NumPy arrays:
+  - state:   last state sent and accepted by the hub (0/1), or UNKNOWN;
+  - acked:   whether that member acked the command that set it;
+  - changed: when the state last changed (monotonic).
+
+Pin commands ("row;pin:state") address a whole row, so a command the hub
+accepts sets the row's cells; an ack confirms one member's cell, and a member
+that never acks (or a command that gets no reply) makes its cells UNKNOWN
+again. The controller uses the table to skip writes that change nothing, to
+aim the E-stop at motors that may be on, and for the anti-entropy sweep that
+re-asserts "off" where the table is not sure.
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+UNKNOWN = -1
+
+PIN_COMMAND = re.compile(r"(\d+);(\d+):([01])(?:@\d+)?$")
+
+
+def pin_command(msg: str) -> Optional[Tuple[int, int, int]]:
+    """(row, pin, state) of a pin command, optionally stamped "@<hub_us>"; None for anything else."""
+    m = PIN_COMMAND.match(msg)
+    if m is None:
+        return None
+    return int(m.group(1)), int(m.group(2)), int(m.group(3))
+
+
+class MotorStateTable:
+    """Thread-safe (row, col, pin) motor state, rows and cols numbered from 1."""
+
+    def __init__(self, rows: int, cols: int, pins: Iterable[int]):
+        self.rows = rows
+        self.cols = cols
+        self.pins = tuple(pins)
+        self._pin_index = {pin: i for i, pin in enumerate(self.pins)}
+        shape = (rows, cols, len(self.pins))
+        self.state = np.full(shape, UNKNOWN, dtype=np.int8)
+        self.acked = np.zeros(shape, dtype=bool)
+        self.changed = np.zeros(shape, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def _cell(self, row: int, pin: int) -> Optional[Tuple[int, int]]:
+        p = self._pin_index.get(pin)
+        if p is None or not 1 <= row <= self.rows:
+            return None
+        return row - 1, p
+
+    # ----------------------- Updates -----------------------
+    def is_noop(self, row: int, pin: int, state: int) -> bool:
+        """Whether every member of the row is already known to be in `state`."""
+        cell = self._cell(row, pin)
+        if cell is None:
+            return False
+        with self._lock:
+            return bool(np.all(self.state[cell[0], :, cell[1]] == state))
+
+    def sent(self, row: int, pin: int, state: int, now: float):
+        """The hub accepted a command: the whole row is now in `state`, unconfirmed."""
+        cell = self._cell(row, pin)
+        if cell is None:
+            return
+        r, p = cell
+        with self._lock:
+            self.changed[r, :, p] = np.where(self.state[r, :, p] != state, now, self.changed[r, :, p])
+            self.state[r, :, p] = state
+            self.acked[r, :, p] = False
+
+    def lost(self, row: int, pin: int):
+        """A command got no reply: the row may or may not have applied it."""
+        cell = self._cell(row, pin)
+        if cell is not None:
+            with self._lock:
+                self.state[cell[0], :, cell[1]] = UNKNOWN
+                self.acked[cell[0], :, cell[1]] = False
+
+    def ack(self, row: int, col: int, pin: int, state: int):
+        """A member acked a command; it confirms the cell if that is still the latest state."""
+        cell = self._cell(row, pin)
+        if cell is None or not 1 <= col <= self.cols:
+            return
+        with self._lock:
+            if self.state[cell[0], col - 1, cell[1]] == state:
+                self.acked[cell[0], col - 1, cell[1]] = True
+
+    def missed(self, row: int, col: int, pin: int):
+        """A member never acked the latest command for this motor."""
+        cell = self._cell(row, pin)
+        if cell is not None and 1 <= col <= self.cols:
+            with self._lock:
+                self.state[cell[0], col - 1, cell[1]] = UNKNOWN
+                self.acked[cell[0], col - 1, cell[1]] = False
+
+    def reset(self):
+        """Forget everything (new connection: the headbands may have been power-cycled)."""
+        with self._lock:
+            self.state.fill(UNKNOWN)
+            self.acked.fill(False)
+            self.changed.fill(0.0)
+
+    # ----------------------- Queries -----------------------
+    def _rows_pins(self, mask: np.ndarray) -> List[Tuple[int, int]]:
+        """(row, pin) for every row/pin with a True cell in a (rows, cols, pins) mask."""
+        rows, pins = np.nonzero(mask.any(axis=1))
+        return [(int(r) + 1, self.pins[p]) for r, p in zip(rows, pins)]
+
+    def maybe_on(self) -> List[Tuple[int, int]]:
+        """(row, pin) of motors that are on, or might be, on any member."""
+        with self._lock:
+            return self._rows_pins(self.state != 0)
+
+    def stuck_on(self, now: float, max_on: float) -> List[Tuple[int, int]]:
+        """(row, pin) of motors that have been on for longer than `max_on` seconds."""
+        with self._lock:
+            return self._rows_pins((self.state == 1) & (now - self.changed > max_on))
+
+    def unconfirmed_off(self, present: Optional[Dict[int, Set[int]]] = None) -> List[Tuple[int, int]]:
+        """
+        (row, pin) of motors not known to be off: UNKNOWN, on, or off but not
+        acked. `present` (row -> cols) limits a row to the members known to
+        exist, since an empty seat never acks.
+        """
+        with self._lock:
+            mask = (self.state != 0) | ~self.acked
+            if present:
+                seats = np.zeros((self.rows, self.cols, 1), dtype=bool)
+                for row, cols in present.items():
+                    if 1 <= row <= self.rows:
+                        seats[row - 1, [c - 1 for c in cols if 1 <= c <= self.cols], 0] = True
+                # Rows with no known members keep every seat
+                seats[~seats.any(axis=1)[:, 0]] = True
+                mask &= seats
+            return self._rows_pins(mask)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {"on": int(np.count_nonzero(self.state == 1)),
+                    "off": int(np.count_nonzero(self.state == 0)),
+                    "unknown": int(np.count_nonzero(self.state == UNKNOWN))}
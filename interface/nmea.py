@@ -0,0 +1,197 @@
+"""
+NMEA GGA/RMC parsing: the reference for the headband firmware's tokenizer.
+
+current/gps/nmea_parse.h parses sentences on the headband in one pass with a
+checksum check; parse() here follows exactly the same rules (same field
+grammar, same range checks, same arithmetic), and other+testing/nmea_diff_test.py
+checks the two agree on a shared corpus of recorded sentences. frames() splits
+a raw byte stream into sentences the way readGPS() does, so the laptop reads
+raw GPS logs the way a headband would have seen them.
+
+Usage: python nmea.py gps.log [--csv out.csv]
+"""
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+MAX_FIELDS = 24         # NMEA_MAX_FIELDS
+BUF_SIZE = 256          # NMEA_BUF_SIZE in headband.ino
+
+# parse() results, as in nmea_parse.h
+OK = 0                  # GGA or RMC
+IGNORED = 1             # Valid checksum, a sentence type we don't decode
+ERR_FRAME = -1          # No '$', no "*hh", or junk after the checksum
+ERR_CHECKSUM = -2       # "*hh" does not match the sentence
+
+GGA = "GGA"
+RMC = "RMC"
+
+_DIGITS = frozenset("0123456789")
+_HEX = frozenset("0123456789ABCDEFabcdef")
+
+
+class Fix(NamedTuple):
+    type: str                   # GGA or RMC
+    lat: Optional[float]        # Decimal degrees, negative south; None without a position
+    lon: Optional[float]
+    quality: Optional[int]      # GGA fix quality (0 none, 1 GPS, 2 DGPS, 4 RTK fixed, 5 RTK float)
+    course: Optional[float]     # RMC course over ground (degrees), only while moving
+
+
+def checksum(body: str) -> int:
+    """XOR of every character between '$' and '*'."""
+    value = 0
+    for ch in body:
+        value ^= ord(ch)
+    return value
+
+
+def _is_decimal(field: str) -> bool:
+    """Digits with at most one '.', at least one digit before it."""
+    if not field or field[0] == "." or field.count(".") > 1:
+        return False
+    return all(ch in _DIGITS or ch == "." for ch in field)
+
+
+def _coord(field: str, direction: str, pos: str, neg: str, max_deg: int) -> Optional[float]:
+    """"DDMM.MMMM" / "DDDMM.MMMM" to decimal degrees; None if malformed or out of range."""
+    if not _is_decimal(field) or direction not in (pos, neg) or "." not in field:
+        return None
+    deg_len = field.index(".") - 2
+    if not 1 <= deg_len <= 3:
+        return None
+    degrees = int(field[:deg_len])
+    minutes = float(field[deg_len:])
+    if degrees > max_deg or minutes >= 60.0:
+        return None
+    decimal = degrees + minutes / 60.0
+    if decimal > max_deg:
+        return None
+    return -decimal if direction == neg else decimal
+
+
+def parse(sentence: str) -> Tuple[int, Optional[Fix]]:
+    """(result, fix) for one sentence without its CR/LF; fix is set only for OK."""
+    sentence = sentence.split("\0", 1)[0]      # The firmware sees a C string
+    if not sentence.startswith("$"):
+        return ERR_FRAME, None
+    body, star, tail = sentence[1:].partition("*")
+    if not star or len(tail) != 2 or not set(tail) <= _HEX:
+        return ERR_FRAME, None
+    if int(tail, 16) != checksum(body):
+        return ERR_CHECKSUM, None
+
+    fields = body.split(",")
+    if len(fields) > MAX_FIELDS or len(fields[0]) != 5:
+        return IGNORED, None
+    kind = fields[0][2:]
+
+    if kind == GGA and len(fields) >= 7:
+        q = fields[6]
+        quality = int(q) if 1 <= len(q) <= 2 and _is_decimal(q) and "." not in q else 0
+        lat = lon = None
+        if quality > 0:
+            lat = _coord(fields[2], fields[3], "N", "S", 90)
+            lon = _coord(fields[4], fields[5], "E", "W", 180) if lat is not None else None
+        if lon is None:
+            lat = None
+        return OK, Fix(GGA, lat, lon, quality, None)
+
+    if kind == RMC and len(fields) >= 9:
+        if fields[2] != "A":
+            return OK, Fix(RMC, None, None, None, None)
+        lat = _coord(fields[3], fields[4], "N", "S", 90)
+        lon = _coord(fields[5], fields[6], "E", "W", 180) if lat is not None else None
+        if lon is None:
+            lat = None
+        course = float(fields[8]) if _is_decimal(fields[8]) else None
+        if course is not None and course > 360.0:
+            course = None
+        return OK, Fix(RMC, lat, lon, None, course)
+
+    return IGNORED, None
+
+
+def frames(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Lines of a raw UART byte stream, framed like readGPS(): '$' restarts the
+    buffer, CR or LF ends a line, anything past BUF_SIZE - 1 bytes is dropped
+    (so an overlong sentence fails its checksum), and lines of five bytes or
+    fewer are skipped. Bytes are decoded as Latin-1 so the checksum sees
+    exactly the bytes the headband would.
+    """
+    buf = bytearray()
+    for chunk in chunks:
+        for byte in chunk:
+            if byte == 0x24:                    # '$'
+                buf = bytearray(b"$")
+            elif byte in (0x0A, 0x0D):
+                if len(buf) > 5:
+                    yield buf.decode("latin-1")
+                buf = bytearray()
+            elif len(buf) < BUF_SIZE - 1:
+                buf.append(byte)
+
+
+def read_chunks(path: str, size: int = 1 << 16) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class LogSummary(NamedTuple):
+    sentences: int
+    ok: int
+    ignored: int
+    bad_frame: int
+    bad_checksum: int
+
+
+def read_log(path: str) -> Tuple[List[Tuple[int, Fix]], LogSummary]:
+    """Every GGA/RMC fix in a raw GPS log as (sentence index, fix), and what was skipped."""
+    fixes = []
+    counts = {OK: 0, IGNORED: 0, ERR_FRAME: 0, ERR_CHECKSUM: 0}
+    index = -1
+    for index, sentence in enumerate(frames(read_chunks(path))):
+        result, fix = parse(sentence)
+        counts[result] += 1
+        if fix is not None:
+            fixes.append((index, fix))
+    return fixes, LogSummary(index + 1, counts[OK], counts[IGNORED], counts[ERR_FRAME], counts[ERR_CHECKSUM])
+
+
+def main():
+    """Summarize a raw GPS log, optionally writing its fixes as CSV."""
+    import argparse
+    import csv
+
+    parser = argparse.ArgumentParser(description="Parse a raw NMEA GPS log")
+    parser.add_argument("path", help="Raw GPS log (bytes as read from the receiver)")
+    parser.add_argument("--csv", help="Write every fix to this CSV file")
+    args = parser.parse_args()
+
+    fixes, summary = read_log(args.path)
+    print(f"{summary.sentences} sentences: {summary.ok} GGA/RMC, {summary.ignored} other, "
+          f"{summary.bad_frame} malformed, {summary.bad_checksum} bad checksum")
+    positions = [fix for _i, fix in fixes if fix.lat is not None]
+    qualities = {}
+    for _i, fix in fixes:
+        if fix.quality is not None:
+            qualities[fix.quality] = qualities.get(fix.quality, 0) + 1
+    print(f"{len(positions)} positions; GGA fix quality counts: {dict(sorted(qualities.items()))}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["sentence", "type", "lat", "lon", "quality", "course"])
+            for index, fix in fixes:
+                writer.writerow([index, fix.type, "" if fix.lat is None else repr(fix.lat),
+                                 "" if fix.lon is None else repr(fix.lon),
+                                 "" if fix.quality is None else fix.quality,
+                                 "" if fix.course is None else fix.course])
+        print(f"Wrote {len(fixes)} fixes to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
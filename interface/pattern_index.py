@@ -0,0 +1,254 @@
+"""
+Search and similarity index over a PatternStore.
+
+- Tags: patterns may carry a "tags" list; the index maps tag -> names.
+- Prefix search: every word of every name sits in one sorted list, so a
+  prefix is a bisect away.
+- Similarity: each pattern is rendered to its pulse train, i.e. which motors
+  are on in each BIN_MS slot. The trains are kept as rows of a preallocated
+  feature matrix. Similarity is the Jaccard overlap of two trains: 1.0 for
+  patterns that feel identical, 0.0 for patterns that never fire the same
+  motor at the same time. One matrix-vector product compares a pattern with
+  the whole library.
+
+The index subscribes to the store and updates itself one pattern at a time.
+"""
+import bisect
+import itertools
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from patterns import RELOADED, REMOVED, TWO_BUZZ_GAP, PatternStore, pattern_tags
+
+MOTOR_PINS = (5, 18, 19, 23)        # Left, front, right, back
+BIN_MS = 10
+MAX_BUZZ_MS = 500
+TRAIN_BINS = (2 * MAX_BUZZ_MS + round(TWO_BUZZ_GAP * 1000)) // BIN_MS
+FEATURES = len(MOTOR_PINS) * TRAIN_BINS
+
+NEAR_DUPLICATE = 0.85               # Similarity at which two patterns are hard to tell apart
+SUGGEST_LENGTHS_MS = range(50, MAX_BUZZ_MS + 1, 50)
+
+
+def name_words(name: str) -> List[str]:
+    words = name.lower().replace("-", " ").replace("_", " ").split()
+    return sorted(set(words + [name.lower()]))
+
+
+def pulse_train(pattern: dict) -> np.ndarray:
+    """Flattened (motor, BIN_MS slot) on/off matrix of a pattern."""
+    train = np.zeros((len(MOTOR_PINS), TRAIN_BINS), dtype=np.float32)
+    rows = [MOTOR_PINS.index(m) for m in pattern["motors"] if m in MOTOR_PINS]
+    length = min(int(pattern["buzz_length_ms"]), MAX_BUZZ_MS) // BIN_MS
+    starts = [0]
+    if pattern["two_buzz"]:
+        starts.append(length + round(TWO_BUZZ_GAP * 1000) // BIN_MS)
+    for start in starts:
+        train[rows, start:start + length] = 1.0
+    return train.ravel()
+
+
+def jaccard(features: np.ndarray, sizes: np.ndarray, train: np.ndarray) -> np.ndarray:
+    """Similarity of `train` to every row of `features`."""
+    overlap = features @ train
+    union = sizes + train.sum() - overlap
+    return np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+
+def suggestion_candidates() -> List[dict]:
+    """Every pattern the builder can express on the suggestion grid."""
+    candidates = []
+    for n in range(1, len(MOTOR_PINS) + 1):
+        for motors in itertools.combinations(MOTOR_PINS, n):
+            for length in SUGGEST_LENGTHS_MS:
+                for two_buzz in (False, True):
+                    candidates.append({"name": "", "motors": list(motors),
+                                       "buzz_length_ms": length, "two_buzz": two_buzz})
+    return candidates
+
+
+class PatternIndex:
+    """Tag, prefix and similarity index kept in step with a PatternStore."""
+
+    def __init__(self, store: PatternStore, capacity: int = 256):
+        self.store = store
+        self._lock = threading.Lock()
+        self._clear(capacity)
+        self._candidates = suggestion_candidates()
+        self._candidate_features = np.stack([pulse_train(p) for p in self._candidates])
+        self._candidate_sizes = self._candidate_features.sum(axis=1)
+        store.subscribe(self._on_change, first=True)
+        self.rebuild()
+
+    def _clear(self, capacity: int):
+        self._tags: Dict[str, Set[str]] = {}
+        self._words: List[Tuple[str, str]] = []   # sorted (word, name)
+        self._features = np.zeros((capacity, FEATURES), dtype=np.float32)
+        self._sizes = np.zeros(capacity, dtype=np.float32)
+        self._slot_names: List[Optional[str]] = [None] * capacity
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._indexed: Dict[str, dict] = {}
+
+    # ----------------------- Maintenance -----------------------
+    def _on_change(self, event: str, name: Optional[str]):
+        if event == RELOADED:
+            self.rebuild()
+            return
+        with self._lock:
+            self._remove(name)
+            if event != REMOVED:
+                self._add(self.store.get(name))
+
+    def rebuild(self):
+        with self._lock:
+            self._clear(max(256, len(self.store)))
+            for name in self.store.names():
+                self._add(self.store.get(name))
+
+    def _add(self, pattern: dict):
+        name = pattern["name"]
+        for tag in pattern_tags(pattern):
+            self._tags.setdefault(tag, set()).add(name)
+        for word in name_words(name):
+            bisect.insort(self._words, (word, name))
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        train = pulse_train(pattern)
+        self._features[slot] = train
+        self._sizes[slot] = train.sum()
+        self._slot_names[slot] = name
+        self._slots[name] = slot
+        self._indexed[name] = pattern
+
+    def _remove(self, name: str):
+        pattern = self._indexed.pop(name, None)
+        if pattern is None:
+            return
+        for tag in pattern_tags(pattern):
+            names = self._tags.get(tag)
+            if names:
+                names.discard(name)
+                if not names:
+                    del self._tags[tag]
+        for word in name_words(name):
+            i = bisect.bisect_left(self._words, (word, name))
+            if i < len(self._words) and self._words[i] == (word, name):
+                del self._words[i]
+        slot = self._slots.pop(name)
+        self._features[slot] = 0.0
+        self._sizes[slot] = 0.0
+        self._slot_names[slot] = None
+        self._free.append(slot)
+
+    def _grow(self):
+        old = len(self._sizes)
+        self._features = np.concatenate([self._features, np.zeros_like(self._features)])
+        self._sizes = np.concatenate([self._sizes, np.zeros_like(self._sizes)])
+        self._slot_names.extend([None] * old)
+        self._free.extend(range(2 * old - 1, old - 1, -1))
+
+    # ----------------------- Search -----------------------
+    def tags(self) -> Dict[str, int]:
+        """Tag -> number of patterns."""
+        with self._lock:
+            return {tag: len(names) for tag, names in sorted(self._tags.items())}
+
+    def with_tag(self, tag: str) -> Set[str]:
+        with self._lock:
+            return set(self._tags.get(tag.lower(), ()))
+
+    def with_prefix(self, prefix: str) -> Set[str]:
+        """Names with a word (or the whole name) starting with `prefix`, case-insensitive."""
+        prefix = prefix.lower()
+        with self._lock:
+            i = bisect.bisect_left(self._words, (prefix, ""))
+            names = set()
+            while i < len(self._words) and self._words[i][0].startswith(prefix):
+                names.add(self._words[i][1])
+                i += 1
+            return names
+
+    def search(self, query: str) -> List[str]:
+        """
+        Names matching every term of `query`, sorted: "#tag" (or "tag:x")
+        terms match tags exactly, other terms are name prefixes.
+        """
+        result = None
+        for term in query.split():
+            if term.startswith("#"):
+                matches = self.with_tag(term[1:])
+            elif term.lower().startswith("tag:"):
+                matches = self.with_tag(term[4:])
+            else:
+                matches = self.with_prefix(term)
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        return self.store.names() if result is None else sorted(result)
+
+    # ----------------------- Similarity -----------------------
+    def _ranked(self, pattern: dict, exclude: Optional[str], k: Optional[int] = None,
+                threshold: float = 0.0) -> List[Tuple[str, float]]:
+        """Most similar first; only the top `k` and/or those at `threshold` or above."""
+        train = pulse_train(pattern)
+        with self._lock:
+            sim = jaccard(self._features, self._sizes, train)
+            if exclude in self._slots:
+                sim[self._slots[exclude]] = -1.0
+            # Free slots are all zeros and score 0: keep them out
+            candidates = np.flatnonzero((sim >= threshold) & (self._sizes > 0))
+            if k is not None and len(candidates) > k:
+                candidates = candidates[np.argpartition(-sim[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-sim[candidates], kind="stable")]
+            return [(self._slot_names[i], float(sim[i])) for i in candidates]
+
+    def similarities(self, pattern: dict, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """(name, similarity) to every indexed pattern, most similar first."""
+        return self._ranked(pattern, exclude)
+
+    def nearest(self, pattern: dict, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        return self._ranked(pattern, exclude, k=k)
+
+    def near_duplicates(self, pattern: dict, threshold: float = NEAR_DUPLICATE,
+                        exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Patterns a wearer would struggle to tell apart from `pattern`."""
+        return self._ranked(pattern, exclude, threshold=threshold)
+
+    def duplicate_pairs(self, threshold: float = NEAR_DUPLICATE, block: int = 512) -> List[Tuple[str, str, float]]:
+        """All pairs of library patterns at or above `threshold`, most similar first."""
+        pairs = []
+        with self._lock:
+            live = np.array(sorted(self._slots.values()), dtype=np.intp)
+            features, sizes = self._features[live], self._sizes[live]
+            for start in range(0, len(live), block):
+                overlap = features[start:start + block] @ features.T
+                union = sizes[start:start + block, None] + sizes[None, :] - overlap
+                sim = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+                for i, j in zip(*np.nonzero(sim >= threshold)):
+                    if start + i < j:
+                        pairs.append((self._slot_names[live[start + i]], self._slot_names[live[j]],
+                                      float(sim[i, j])))
+        pairs.sort(key=lambda p: -p[2])
+        return pairs
+
+    def suggest_distinct(self) -> Tuple[dict, float, Optional[str]]:
+        """
+        The candidate pattern least similar to anything in the library:
+        returns (pattern, its highest similarity, the pattern it is closest to).
+        """
+        with self._lock:
+            live = np.array(sorted(self._slots.values()), dtype=np.intp)
+            if not len(live):
+                return dict(self._candidates[0]), 0.0, None
+            overlap = self._candidate_features @ self._features[live].T
+            union = self._candidate_sizes[:, None] + self._sizes[live][None, :] - overlap
+            sim = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+            closest = sim.argmax(axis=1)
+            worst = sim[np.arange(len(sim)), closest]
+            best = int(np.argmin(worst))
+            return (dict(self._candidates[best]), float(worst[best]),
+                    self._slot_names[live[closest[best]]])
@@ -0,0 +1,224 @@
+"""
+Haptic pattern store for the language builder.
+
+Patterns live in haptic_patterns.json next to this module, as one JSON object
+keyed by pattern name (the format language.py has always written). The store
+keeps:
+  - the serialized JSON of every pattern, so a save only re-serializes the
+    pattern that changed and writes the file by joining cached fragments;
+  - a sorted name index, so callers can find where a name sits in a sorted
+    list without re-sorting;
+  - subscribers, called with (event, name) after every change.
+
+Saves write a temporary file and rename it over the old one, so a crash never
+leaves a truncated library behind.
+"""
+import bisect
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+PATTERNS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "haptic_patterns.json")
+
+# Change events
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+RELOADED = "reloaded"
+
+TWO_BUZZ_GAP = 0.05  # Fixed 50ms gap for two-buzz patterns
+
+Listener = Callable[[str, Optional[str]], None]
+
+
+def entry_json(name: str, pattern: dict) -> str:
+    """`"name": {...}` exactly as json.dump(library, indent=2) lays it out."""
+    body = json.dumps(pattern, indent=2).replace("\n", "\n  ")
+    return f"  {json.dumps(name)}: {body}"
+
+
+def join_entries(entries: List[str]) -> str:
+    """The whole library as JSON, from entry_json() fragments in name order."""
+    if not entries:
+        return "{}"
+    return "{\n" + ",\n".join(entries) + "\n}"
+
+
+def pattern_tags(pattern: dict) -> List[str]:
+    return [t for t in (str(t).strip().lower() for t in pattern.get("tags", ())) if t]
+
+
+def parse_tags(text: str) -> List[str]:
+    """Comma/space separated tags as typed in the builder."""
+    return sorted({t for t in text.replace(",", " ").lower().split() if t})
+
+
+def function_name(name: str) -> str:
+    return name.lower().replace(" ", "_").replace("-", "_")
+
+
+def pattern_sequence(pattern: dict) -> list:
+    """(msg, delay_after_sec) commands that play a pattern on row 1."""
+    motors = pattern["motors"]
+    buzz_len = pattern["buzz_length_ms"] / 1000.0
+    sequence = []
+    for buzz in range(2 if pattern["two_buzz"] else 1):
+        for i, motor in enumerate(motors):
+            sequence.append((f"1;{motor}:1", buzz_len if i == len(motors) - 1 else 0.00))
+        for i, motor in enumerate(motors):
+            gap = TWO_BUZZ_GAP if pattern["two_buzz"] and buzz == 0 and i == len(motors) - 1 else 0.00
+            sequence.append((f"1;{motor}:0", gap))
+    return sequence
+
+
+def pattern_code(pattern: dict) -> str:
+    """Python function that plays one pattern."""
+    code = f"def {function_name(pattern['name'])}():\n"
+    code += f"    \"\"\"Pattern: {pattern['name']} - Motors: {pattern['motors']}, "
+    code += f"Buzz: {pattern['buzz_length_ms']}ms, Two-buzz: {pattern['two_buzz']}\"\"\"\n"
+    code += "    run_sequence([\n"
+    for msg, delay in pattern_sequence(pattern):
+        code += f"        (\"{msg}\", {delay:.2f}),\n"
+    code += "    ])\n\n"
+    return code
+
+
+CODE_HEADER = (
+    "# Haptic Pattern Functions\n\n"
+    "def run_sequence(sequence):\n"
+    "    \"\"\"sequence = list of (msg, delay_after_sec)\"\"\"\n"
+    "    # Implementation depends on your setup\n"
+    "    pass\n\n"
+)
+JSON_HEADER = "\n# JSON Format\n# " + "=" * 60 + "\n"
+
+
+class PatternStore:
+    """Name -> pattern dict, persisted to a JSON file. Thread-safe."""
+
+    def __init__(self, path: str = PATTERNS_FILE):
+        self.path = path
+        self._patterns: Dict[str, dict] = {}
+        self._entries: Dict[str, str] = {}   # name -> entry_json()
+        self._names: List[str] = []          # sorted
+        self._listeners: List[Listener] = []
+        self._lock = threading.RLock()
+        self.saves = 0
+
+    # ----------------------- Queries -----------------------
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._patterns
+
+    def get(self, name: str) -> Optional[dict]:
+        return self._patterns.get(name)
+
+    def names(self) -> List[str]:
+        """All names, sorted."""
+        with self._lock:
+            return list(self._names)
+
+    def position(self, name: str) -> int:
+        """Index of `name` in names() (where it would go if absent)."""
+        with self._lock:
+            return bisect.bisect_left(self._names, name)
+
+    def entry(self, name: str) -> Optional[str]:
+        """Cached entry_json() of a pattern."""
+        return self._entries.get(name)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return join_entries([self._entries[n] for n in self._names])
+
+    # ----------------------- Changes -----------------------
+    def subscribe(self, listener: Listener, first: bool = False):
+        """
+        Call listener(event, name) after each change; name is None for RELOADED.
+        Indexes subscribe `first`, so they are up to date when other listeners run.
+        """
+        if first:
+            self._listeners.insert(0, listener)
+        else:
+            self._listeners.append(listener)
+
+    def put(self, pattern: dict, save: bool = True) -> str:
+        """Add or replace a pattern (keyed by pattern["name"]). Returns ADDED or CHANGED."""
+        name = pattern["name"]
+        with self._lock:
+            event = CHANGED if name in self._patterns else ADDED
+            old = (self._patterns.get(name), self._entries.get(name))
+            self._patterns[name] = pattern
+            self._entries[name] = entry_json(name, pattern)
+            if event == ADDED:
+                bisect.insort(self._names, name)
+            if save:
+                try:
+                    self.save()
+                except OSError:
+                    # Keep memory in step with the file.
+                    if event == ADDED:
+                        self._drop(name)
+                    else:
+                        self._patterns[name], self._entries[name] = old
+                    raise
+        self._notify(event, name)
+        return event
+
+    def delete(self, name: str, save: bool = True) -> bool:
+        with self._lock:
+            if name not in self._patterns:
+                return False
+            old = (self._patterns[name], self._entries[name])
+            self._drop(name)
+            if save:
+                try:
+                    self.save()
+                except OSError:
+                    self._patterns[name], self._entries[name] = old
+                    bisect.insort(self._names, name)
+                    raise
+        self._notify(REMOVED, name)
+        return True
+
+    def _drop(self, name: str):
+        del self._patterns[name]
+        del self._entries[name]
+        del self._names[bisect.bisect_left(self._names, name)]
+
+    def _notify(self, event: str, name: Optional[str]):
+        for listener in list(self._listeners):
+            listener(event, name)
+
+    # ----------------------- Persistence -----------------------
+    def load(self) -> int:
+        """Read the file (missing or empty = no patterns). Returns the pattern count."""
+        patterns = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                text = f.read()
+            if text.strip():
+                patterns = json.loads(text)
+                if not isinstance(patterns, dict):
+                    raise ValueError(f"{self.path}: expected an object of patterns")
+        with self._lock:
+            self._patterns = patterns
+            self._entries = {name: entry_json(name, p) for name, p in patterns.items()}
+            self._names = sorted(patterns)
+        self._notify(RELOADED, None)
+        return len(patterns)
+
+    def save(self):
+        """Write the library atomically (temp file + rename). Raises OSError."""
+        with self._lock:
+            text = self.to_json()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.saves += 1
@@ -0,0 +1,266 @@
+"""
+Hub pose estimator.
+
+Fuses the hub's GPS position, fix quality and IMU heading into a smoothed pose
+with velocity, using a constant-velocity Kalman filter in a local east/north
+frame (metres, degrees). Position noise follows the reported fix quality, so an
+RTK-fixed sample is trusted far more than a plain GPS one, and outliers are
+gated out. `predict()` extrapolates the pose to a future time so relayed
+targets can lead by the link latency; `extrapolate()` does the same along a
+constant turn rate (CTRV) so targets follow the block through a turn.
+"""
+import math
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from nmea import checksum
+
+# 1-sigma horizontal position noise (m) by NMEA fix quality
+FIX_SIGMA_M = {1: 2.5, 2: 0.8, 4: 0.02, 5: 0.3}
+DEFAULT_FIX = 1
+HEADING_SIGMA_DEG = 1.5       # IMU noise + 1 degree quantization
+
+# Process noise: white acceleration / heading acceleration spectral densities
+ACCEL_NOISE = 0.1             # (m/s^2)^2 per Hz
+HEADING_ACCEL_NOISE = 200.0   # (deg/s^2)^2 per Hz
+
+GATE_CHI2 = 13.8              # 2 dof, 99.9%: position innovations beyond this are dropped
+RESET_GAP = 5.0               # Restart the filter after this long without data (s)
+MAX_REJECTS = 10              # ...or after this many gated positions in a row (filter lost)
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def wrap_deg(angle: float) -> float:
+    """Wrap to [-180, 180)."""
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+class Pose(NamedTuple):
+    lat: float
+    lon: float
+    heading: float          # degrees, [0, 360)
+    speed: float            # m/s over ground
+    course: float           # direction of travel, degrees
+    heading_rate: float     # deg/s
+    sigma: float            # 1-sigma position uncertainty (m)
+    t: float                # time of validity (monotonic s)
+
+
+class PoseFilter:
+    """
+    State x = [east, north, v_east, v_north, heading, heading_rate].
+    Thread-safe: update() runs on the listener thread, predict() on senders.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ref = None        # (lat, lon) of the local frame origin
+        self.x = np.zeros(6)
+        self.P = np.eye(6)
+        self.t = None
+        self.updates = 0
+        self.rejected = 0
+        self._rejected_run = 0
+
+        self._H = np.zeros((3, 6))
+        self._H[0, 0] = self._H[1, 1] = self._H[2, 4] = 1.0
+
+    # ----------------------- Frames -----------------------
+    def _to_local(self, lat: float, lon: float):
+        lat0, lon0 = self.ref
+        north = math.radians(lat - lat0) * EARTH_RADIUS_M
+        east = math.radians(lon - lon0) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+        return east, north
+
+    def _to_geo(self, east: float, north: float):
+        lat0, lon0 = self.ref
+        lat = lat0 + math.degrees(north / EARTH_RADIUS_M)
+        lon = lon0 + math.degrees(east / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+        return lat, lon
+
+    # ----------------------- Model -----------------------
+    @staticmethod
+    def _transition(dt: float):
+        F = np.eye(6)
+        F[0, 2] = F[1, 3] = F[4, 5] = dt
+        # Discrete white-noise acceleration model for each (value, rate) pair
+        q = np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        Q = np.zeros((6, 6))
+        for pos, vel, noise in ((0, 2, ACCEL_NOISE), (1, 3, ACCEL_NOISE), (4, 5, HEADING_ACCEL_NOISE)):
+            Q[np.ix_((pos, vel), (pos, vel))] = q * noise
+        return F, Q
+
+    def _reset(self, lat: float, lon: float, heading: Optional[float], sigma: float, t: float):
+        self.ref = (lat, lon)
+        self.x = np.array([0.0, 0.0, 0.0, 0.0, (heading or 0.0) % 360.0, 0.0])
+        heading_var = 180.0 ** 2 if heading is None else HEADING_SIGMA_DEG ** 2
+        self.P = np.diag([sigma ** 2, sigma ** 2, 4.0, 4.0, heading_var, 100.0])
+        self.t = t
+
+    def update(self, lat: Optional[float], lon: Optional[float], heading: Optional[float],
+               fix: Optional[int] = None, t: Optional[float] = None) -> bool:
+        """
+        Fuse one sample taken at time `t` (monotonic s). A position of None
+        makes it a heading-only sample, a heading of None a position-only one.
+        Returns False if the position was missing or rejected (no fix or failed
+        the innovation gate).
+        """
+        t = time.monotonic() if t is None else t
+        fix = DEFAULT_FIX if fix is None else fix
+        position = lat is not None
+        sigma = FIX_SIGMA_M.get(fix) if position else None
+        with self._lock:
+            lost = self._rejected_run >= MAX_REJECTS
+            if self.t is None or t - self.t > RESET_GAP or (lost and sigma is not None):
+                if sigma is None:
+                    return False
+                self._reset(lat, lon, heading, sigma, t)
+                self._rejected_run = 0
+                self.updates += 1
+                return True
+
+            dt = max(0.0, t - self.t)
+            F, Q = self._transition(dt)
+            x = F @ self.x
+            P = F @ self.P @ F.T + Q
+            self.t = t
+
+            east, north = self._to_local(lat, lon) if position else (x[0], x[1])
+            y = np.array([east - x[0], north - x[1], 0.0 if heading is None else wrap_deg(heading - x[4])])
+            H = self._H
+            R = np.diag([(sigma or 1e3) ** 2, (sigma or 1e3) ** 2, HEADING_SIGMA_DEG ** 2])
+            S = H @ P @ H.T + R
+
+            accepted = sigma is not None and float(y[:2] @ np.linalg.solve(S[:2, :2], y[:2])) <= GATE_CHI2
+            if position and not accepted:
+                # Position missing (no fix) or an outlier
+                self.rejected += 1
+                self._rejected_run += sigma is not None
+            rows = [0, 1] * accepted + [2] * (heading is not None)
+            if not rows:
+                self.x, self.P = x, P
+                return False
+            H, y, S = H[rows], y[rows], S[np.ix_(rows, rows)]
+
+            K = P @ H.T @ np.linalg.inv(S)
+            x = x + K @ y
+            P = (np.eye(6) - K @ H) @ P
+            if accepted:
+                self._rejected_run = 0
+            x[4] %= 360.0
+            self.x, self.P = x, (P + P.T) / 2
+            self.updates += 1
+            return accepted
+
+    # ----------------------- Output -----------------------
+    @property
+    def ready(self) -> bool:
+        return self.t is not None
+
+    def predict(self, t: Optional[float] = None) -> Optional[Pose]:
+        """Pose extrapolated to time `t` (default now); the filter itself is unchanged."""
+        t = time.monotonic() if t is None else t
+        with self._lock:
+            if self.t is None:
+                return None
+            F, Q = self._transition(max(0.0, t - self.t))
+            x = F @ self.x
+            P = F @ self.P @ F.T + Q
+        lat, lon = self._to_geo(x[0], x[1])
+        speed = math.hypot(x[2], x[3])
+        course = math.degrees(math.atan2(x[2], x[3])) % 360.0
+        sigma = math.sqrt(max(0.0, (P[0, 0] + P[1, 1]) / 2))
+        return Pose(lat, lon, x[4] % 360.0, speed, course, x[5], sigma, t)
+
+
+def extrapolate(pose: Pose, t: float) -> Pose:
+    """
+    Move `pose` to time `t` assuming constant speed and turn rate (CTRV): the
+    course and heading both turn at `heading_rate`, so the track is an arc.
+    """
+    dt = t - pose.t
+    if dt == 0:
+        return pose
+    w = math.radians(pose.heading_rate)
+    c0 = math.radians(pose.course)
+    if abs(w) < 1e-4:
+        east = pose.speed * math.sin(c0) * dt
+        north = pose.speed * math.cos(c0) * dt
+    else:
+        c1 = c0 + w * dt
+        east = pose.speed / w * (math.cos(c0) - math.cos(c1))
+        north = pose.speed / w * (math.sin(c1) - math.sin(c0))
+    lat = pose.lat + math.degrees(north / EARTH_RADIUS_M)
+    lon = pose.lon + math.degrees(east / (EARTH_RADIUS_M * math.cos(math.radians(pose.lat))))
+    turn = pose.heading_rate * dt
+    return pose._replace(lat=lat, lon=lon, heading=(pose.heading + turn) % 360.0,
+                         course=(pose.course + turn) % 360.0, t=t)
+
+
+# ----------------------- Hub telemetry -----------------------
+# The hub streams its pose as "$HBP,seq,hub_us,lat,lon,heading,fix,fix_us*hh":
+# an NMEA-style frame (XOR of everything between '$' and '*') with a sequence
+# number, so the laptop can tell lost, repeated and late frames apart, the hub
+# clock at the frame (when the heading was read) and at the position's fix.
+# Frames outpace the receiver, so consecutive frames can carry the same fix.
+# Frames without fix_us stamp the fix time as hub_us. Older hubs send
+# "GPS:lat,lon|IMU:heading[|FIX:q][|T:hub_us]".
+POSE_FRAME = "$HBP,"
+
+
+class Telemetry(NamedTuple):
+    lat: float
+    lon: float
+    heading: float
+    fix: Optional[int]      # NMEA fix quality, if the hub sent it
+    hub_us: Optional[int]   # Hub clock at the sample, if the hub sent it
+    seq: Optional[int] = None   # Frame sequence number (pose frames only)
+    fix_us: Optional[int] = None    # Hub clock at the position's fix (pose frames only)
+
+
+def is_telemetry(line: str) -> bool:
+    return line.startswith(POSE_FRAME) or ("GPS:" in line and "|IMU:" in line)
+
+
+def format_pose_frame(seq: int, hub_us: int, lat: float, lon: float, heading: float, fix: int,
+                      fix_us: Optional[int] = None) -> str:
+    """A pose frame as hub.ino sends it (fix_us defaults to hub_us: a fresh fix)."""
+    body = f"HBP,{seq},{hub_us},{lat:.7f},{lon:.7f},{heading:.1f},{fix},{hub_us if fix_us is None else fix_us}"
+    return f"${body}*{checksum(body):02X}"
+
+
+def parse_telemetry(line: str) -> Telemetry:
+    """
+    Parse a pose frame or a legacy "GPS:...|IMU:..." line.
+    Raises ValueError on malformed lines and bad checksums.
+    """
+    line = line.strip()
+    if line.startswith(POSE_FRAME):
+        body, star, tail = line[1:].partition("*")
+        if not star or len(tail) != 2:
+            raise ValueError(f"unframed pose frame: {line!r}")
+        if int(tail, 16) != checksum(body):
+            raise ValueError(f"pose frame checksum mismatch: {line!r}")
+        fields = body.split(",")
+        if len(fields) not in (7, 8):
+            raise ValueError(f"pose frame has {len(fields)} fields: {line!r}")
+        _, seq, hub_us, lat, lon, heading, fix = fields[:7]
+        fix_us = fields[7] if len(fields) == 8 else hub_us
+        return Telemetry(float(lat), float(lon), float(heading), int(fix), int(hub_us), int(seq), int(fix_us))
+
+    fields = {}
+    for part in line.strip().split("|"):
+        key, sep, value = part.partition(":")
+        if sep:
+            fields[key.strip()] = value.strip()
+    if "GPS" not in fields or "IMU" not in fields:
+        raise ValueError(f"not a telemetry line: {line!r}")
+    lat, lon = (float(v) for v in fields["GPS"].split(","))
+    heading = float(fields["IMU"])
+    fix = int(fields["FIX"]) if "FIX" in fields else None
+    hub_us = int(fields["T"]) if "T" in fields else None
+    return Telemetry(lat, lon, heading, fix, hub_us)
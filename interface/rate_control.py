@@ -0,0 +1,131 @@
+"""
+Adaptive GPS relay rate.
+
+Demand comes from motion: targets only need refreshing as fast as they move,
+so the rate is what keeps each update under POSITION_STEP_M of travel and
+HEADING_STEP_DEG of turn (slow when stationary, fast in turns). Supply comes
+from the link: an AIMD ceiling halves when ack latency, loss or the backlog of
+unacked commands rise, and grows additively while the link is healthy. The
+relay runs at min(demand, ceiling).
+"""
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+MIN_RATE_HZ = 0.5
+MAX_RATE_HZ = 10.0
+
+# Demand: refresh before the target moves/turns more than this
+POSITION_STEP_M = 0.3
+HEADING_STEP_DEG = 5.0
+
+# AIMD on the ceiling, evaluated every CONTROL_INTERVAL
+CONTROL_INTERVAL = 1.0
+ADDITIVE_STEP_HZ = 0.5
+DECREASE_FACTOR = 0.5
+RTT_LIMIT = 0.15          # p90 ack RTT above this means congestion (s)
+LOSS_LIMIT = 0.05         # fraction of relays needing a retransmit or failing
+BACKLOG_LIMIT = 50        # commands still awaiting acks
+
+
+class RateController:
+    """Thread-safe: feedback arrives from the listener/ack threads, the relay loop reads the rate."""
+
+    def __init__(self, min_hz: float = MIN_RATE_HZ, max_hz: float = MAX_RATE_HZ):
+        self.min_hz = min_hz
+        self.max_hz = max_hz
+        self.ceiling = max_hz
+        self.demand = min_hz
+        self.backlog = 0
+        self.sent = 0
+        self.dropped = 0
+        self.decreases = 0
+        self._lock = threading.Lock()
+        self._rtts = deque(maxlen=256)
+        self._window_sent = 0
+        self._window_lost = 0
+        self._next_control = None
+        self._next_due = None
+        self._achieved = deque(maxlen=32)  # send times, for the achieved rate
+
+    # ----------------------- Inputs -----------------------
+    def observe_motion(self, speed: float, turn_rate: float):
+        """Speed (m/s) and turn rate (deg/s) of the block."""
+        hz = max(speed / POSITION_STEP_M, abs(turn_rate) / HEADING_STEP_DEG)
+        self.demand = min(self.max_hz, max(self.min_hz, hz))
+
+    def on_sent(self, commands: int):
+        with self._lock:
+            self._window_sent += commands
+
+    def on_ack(self, rtt: float):
+        with self._lock:
+            self._rtts.append(rtt)
+
+    def on_loss(self, commands: int = 1):
+        """A command needed a retransmit, failed, or got no hub reply."""
+        with self._lock:
+            self._window_lost += commands
+
+    def set_backlog(self, pending: int):
+        self.backlog = pending
+
+    # ----------------------- Control -----------------------
+    @property
+    def rate(self) -> float:
+        return min(self.demand, self.ceiling)
+
+    def congested(self) -> bool:
+        with self._lock:
+            rtts = sorted(self._rtts)
+            sent, lost = self._window_sent, self._window_lost
+        p90 = rtts[int(len(rtts) * 0.9)] if rtts else 0.0
+        loss = lost / sent if sent else 0.0
+        return p90 > RTT_LIMIT or loss > LOSS_LIMIT or self.backlog > BACKLOG_LIMIT
+
+    def control(self, now: Optional[float] = None) -> float:
+        """Run the AIMD step if one is due. Returns the current rate (Hz)."""
+        now = time.monotonic() if now is None else now
+        if self._next_control is None:
+            self._next_control = now + CONTROL_INTERVAL
+        elif now >= self._next_control:
+            self._next_control = now + CONTROL_INTERVAL
+            if self.congested():
+                self.ceiling = max(self.min_hz, self.ceiling * DECREASE_FACTOR)
+                self.decreases += 1
+            else:
+                self.ceiling = min(self.max_hz, self.ceiling + ADDITIVE_STEP_HZ)
+            with self._lock:
+                self._rtts.clear()
+                self._window_sent = self._window_lost = 0
+        return self.rate
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """True when the next relay should go out (and schedules the one after)."""
+        now = time.monotonic() if now is None else now
+        if self._next_due is not None and now < self._next_due:
+            return False
+        interval = 1.0 / self.rate
+        # Keep the cadence, but don't try to catch up after a stall: missed slots are dropped
+        if self._next_due is None or now - self._next_due > interval:
+            if self._next_due is not None:
+                self.dropped += int((now - self._next_due) / interval)
+            self._next_due = now + interval
+        else:
+            self._next_due += interval
+        return True
+
+    def mark_sent(self, now: Optional[float] = None):
+        self.sent += 1
+        self._achieved.append(time.monotonic() if now is None else now)
+
+    def mark_dropped(self):
+        """A relay was due but the previous one was still going out."""
+        self.dropped += 1
+
+    def achieved_rate(self) -> float:
+        times = list(self._achieved)
+        if len(times) < 2 or time.monotonic() - times[-1] > 2.0 / self.min_hz:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
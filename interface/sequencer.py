@@ -0,0 +1,205 @@
+"""
+Run queue for motor sequences: one sequence plays at a time.
+
+Every sequence used to get its own thread, so pressing W three times played
+three sequences interleaved on the same motors. SequenceExecutor owns a
+single worker thread and a short queue, and each submitted sequence says what
+should happen if another one is already playing:
+
+  - REPLACE: cancel the playing one and everything queued, play this now;
+  - ENQUEUE: play it after the ones ahead of it (at most MAX_QUEUED wait);
+  - DROP:    play it only if nothing is playing or queued.
+
+A cancelled sequence stops between steps and turns off every motor it left
+on. Only the worker sends sequence steps, so sequences never queue up on a
+hub's link lock behind each other.
+"""
+import collections
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from metrics import REGISTRY
+
+REPLACE = "replace"
+ENQUEUE = "enqueue"
+DROP = "drop"
+POLICIES = (REPLACE, ENQUEUE, DROP)
+
+MAX_QUEUED = 4
+
+# Outcomes of a run
+FINISHED = "finished"
+CANCELLED = "cancelled"
+ABORTED = "aborted"         # The link went away mid-sequence
+REJECTED = "rejected"       # Dropped on submit (DROP while busy, or the queue was full)
+
+Command = Tuple[int, int, int]          # (row, pin, state)
+Batch = Tuple[List[Command], float]     # Commands sent together, then the delay after them
+
+
+def batches(sequence: Sequence[Tuple[int, int, int, float]]) -> List[Batch]:
+    """Group a (row, pin, state, delay) sequence: consecutive zero-delay steps fire together."""
+    grouped = []
+    batch = []
+    for row, pin, state, delay in sequence:
+        batch.append((int(row), int(pin), int(state)))
+        if delay > 0:
+            grouped.append((batch, float(delay)))
+            batch = []
+    if batch:
+        grouped.append((batch, 0.0))
+    return grouped
+
+
+class Run:
+    """One submitted sequence."""
+
+    def __init__(self, steps: List[Batch], label: str = "", lead: float = 0.0):
+        self.batches = steps
+        self.label = label
+        self.lead = lead                # Steps are sent this early, stamped with their due time
+        self.outcome: Optional[str] = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class SequenceExecutor:
+    """
+    Plays runs one at a time on a single worker thread.
+
+    send_batch(commands, due) sends one batch and returns False if the hubs are
+    gone, which aborts the run. `due` is the perf_counter time the batch should
+    take effect for runs with a lead (to stamp it with), None for runs that
+    play on arrival. on_idle() is called on the worker when the last queued
+    run is over.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Command], Optional[float]], bool],
+                 on_idle: Optional[Callable[[], None]] = None, max_queued: int = MAX_QUEUED,
+                 registry=REGISTRY):
+        self.send_batch = send_batch
+        self.on_idle = on_idle
+        self.max_queued = max_queued
+        self.current: Optional[Run] = None
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self.m_jitter = registry.histogram("sequence_jitter_seconds", "Lateness of sequence steps vs. schedule")
+        self.m_runs = {outcome: registry.counter("sequence_runs_total", "Sequences by outcome", {"outcome": outcome})
+                       for outcome in (FINISHED, CANCELLED, ABORTED, REJECTED)}
+        registry.gauge("sequence_queue_depth", "Sequences waiting to play", fn=lambda: len(self._queue))
+
+    # ----------------------- Submitting -----------------------
+    def submit(self, steps: List[Batch], policy: str = ENQUEUE, label: str = "", lead: float = 0.0) -> Run:
+        """Queue a run by `policy`. A rejected run comes back with outcome REJECTED."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown sequence policy '{policy}'")
+        run = Run(steps, label, lead)
+        with self._cond:
+            if self._closed:
+                return self._reject(run)
+            busy = self.current is not None or bool(self._queue)
+            if policy == DROP and busy:
+                return self._reject(run)
+            if policy == REPLACE:
+                self._cancel_locked()
+            elif len(self._queue) >= self.max_queued:
+                return self._reject(run)
+            self._queue.append(run)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="sequence-executor", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return run
+
+    def _reject(self, run: Run) -> Run:
+        run.outcome = REJECTED
+        run.done.set()
+        self.m_runs[REJECTED].inc()
+        return run
+
+    def cancel_all(self):
+        """Cancel the playing run and drop everything queued."""
+        with self._cond:
+            self._cancel_locked()
+            self._cond.notify_all()
+
+    def _cancel_locked(self):
+        while self._queue:
+            run = self._queue.popleft()
+            run.outcome = CANCELLED
+            run.done.set()
+            self.m_runs[CANCELLED].inc()
+        if self.current is not None:
+            self.current.cancel()
+
+    @property
+    def busy(self) -> bool:
+        return self.current is not None or bool(self._queue)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until nothing is playing or queued."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.busy, timeout)
+
+    def close(self, timeout: float = 1.0):
+        with self._cond:
+            self._closed = True
+            self._cancel_locked()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # ----------------------- Worker -----------------------
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                run = self.current = self._queue.popleft()
+            try:
+                run.outcome = self._play(run)
+            except Exception:
+                run.outcome = ABORTED
+            self.m_runs[run.outcome].inc()
+            with self._cond:
+                self.current = None
+                idle = not self._queue
+                run.done.set()
+                self._cond.notify_all()
+            if idle and self.on_idle:
+                self.on_idle()
+
+    def _play(self, run: Run) -> str:
+        on = set()                      # (row, pin) this run has switched on and not off yet
+        due = time.perf_counter() + run.lead
+        for commands, delay in run.batches:
+            if run.cancelled.is_set():
+                break
+            self.m_jitter.record(max(0.0, time.perf_counter() - (due - run.lead)))
+            if not self.send_batch(commands, due if run.lead else None):
+                return ABORTED
+            for row, pin, state in commands:
+                if state:
+                    on.add((row, pin))
+                else:
+                    on.discard((row, pin))
+            due += delay
+            if run.cancelled.wait(max(0.0, due - run.lead - time.perf_counter())):
+                break
+        else:
+            return FINISHED
+
+        if on:
+            self.send_batch([(row, pin, 0) for row, pin in sorted(on)],
+                            time.perf_counter() + run.lead if run.lead else None)
+        return CANCELLED
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Session recorder and replay for hub traffic.
+
+File layout (all little-endian):
+    header:  MAGIC (8 bytes) + start wall-clock time (float64)
+    records: t_us (uint64, monotonic since session start), kind (uint8),
+             length (uint16), payload (UTF-8 line, no newline)
+
+A sidecar index file (<session>.idx) holds (t_us, offset) pairs written about
+once per second so a reader can seek by time without scanning the whole log.
+"""
+import bisect
+import os
+import struct
+import threading
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+MAGIC = b"HBSESS1\n"
+HEADER = struct.Struct("<8sd")
+RECORD = struct.Struct("<QBH")
+INDEX_ENTRY = struct.Struct("<QQ")
+
+# Record kinds
+RX = 1      # Line received from the hub (telemetry, acks, ...)
+TX = 2      # Command sent to the hub
+REPLY = 3   # Hub reply to a command
+MARK = 4    # Operator/application note
+
+KIND_NAMES = {RX: "RX", TX: "TX", REPLY: "REPLY", MARK: "MARK"}
+
+INDEX_INTERVAL_US = 1_000_000  # One index entry per second of session time
+FLUSH_INTERVAL = 1.0           # Seconds between forced flushes to disk
+WRITE_BUFFER = 64 * 1024
+
+
+class SessionRecorder:
+    """Append-only binary recorder. record() is thread-safe and never blocks on the network."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "wb", buffering=WRITE_BUFFER)
+        self._index = open(path + ".idx", "wb")
+        self._t0 = time.monotonic()
+        self._file.write(HEADER.pack(MAGIC, time.time()))
+        self._offset = HEADER.size
+        self._next_index_us = 0
+        self._last_flush = self._t0
+        self.records = 0
+
+    def record(self, kind: int, text: str, t: Optional[float] = None):
+        """Append one record. `t` is a time.monotonic() value (defaults to now)."""
+        now = time.monotonic() if t is None else t
+        payload = text.encode("utf-8", errors="replace")[:0xFFFF]
+        t_us = max(0, int((now - self._t0) * 1_000_000))
+
+        with self._lock:
+            if self._file is None:
+                return
+            if t_us >= self._next_index_us:
+                self._index.write(INDEX_ENTRY.pack(t_us, self._offset))
+                self._next_index_us = t_us + INDEX_INTERVAL_US
+
+            self._file.write(RECORD.pack(t_us, kind, len(payload)))
+            self._file.write(payload)
+            self._offset += RECORD.size + len(payload)
+            self.records += 1
+
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._index.flush()
+                self._last_flush = now
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+
+class SessionReader:
+    """Reads a recorded session. Times are returned in seconds since session start."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, self.start_time = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a HaptiBand session log")
+
+        self._index_t = []
+        self._index_offset = []
+        if os.path.exists(path + ".idx"):
+            with open(path + ".idx", "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for t_us, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+                self._index_t.append(t_us)
+                self._index_offset.append(offset)
+
+    def records(self, start: float = 0.0, end: Optional[float] = None) -> Iterator[Tuple[float, int, str]]:
+        """Yield (t, kind, text) for records with start <= t < end."""
+        start_us = int(start * 1_000_000)
+        end_us = None if end is None else int(end * 1_000_000)
+
+        # Jump to the last index entry at or before `start`
+        i = bisect.bisect_right(self._index_t, start_us) - 1
+        offset = self._index_offset[i] if i >= 0 else HEADER.size
+
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return  # End of file (or a record cut short by a crash)
+                t_us, kind, length = RECORD.unpack(head)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                if end_us is not None and t_us >= end_us:
+                    return
+                if t_us >= start_us:
+                    yield t_us / 1_000_000, kind, payload.decode("utf-8", errors="replace")
+
+    def __iter__(self):
+        return self.records()
+
+    def duration(self) -> float:
+        """Session length in seconds."""
+        last = 0.0
+        start = self._index_t[-1] / 1_000_000 if self._index_t else 0.0
+        for t, _, _ in self.records(start):
+            last = t
+        return last
+
+
+class Replayer:
+    """
+    Replays a session into a callback at 1x or accelerated speed.
+
+    `on_record(kind, text)` is called from the replay thread in recorded order,
+    with recorded spacing divided by `speed`. `kinds` limits which records are
+    replayed (default: inbound traffic only).
+    """
+
+    def __init__(self, reader: SessionReader, on_record: Callable[[int, str], None],
+                 speed: float = 1.0, start: float = 0.0, kinds=(RX,)):
+        self.reader = reader
+        self.on_record = on_record
+        self.speed = speed
+        self.start_at = start
+        self.kinds = set(kinds)
+        self.replayed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+
+    def done(self) -> bool:
+        return self._thread is not None and not self._thread.is_alive()
+
+    def run(self):
+        t0 = time.monotonic()
+        for t, kind, text in self.reader.records(self.start_at):
+            if kind not in self.kinds:
+                continue
+            due = t0 + (t - self.start_at) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                return
+            if self._stop.is_set():
+                return
+            self.on_record(kind, text)
+            self.replayed += 1
+
+
+def main():
+    """Print or summarize a recorded session."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect a HaptiBand session log")
+    parser.add_argument("path", help="Session file (.hbs)")
+    parser.add_argument("--start", type=float, default=0.0, help="Start time (s)")
+    parser.add_argument("--end", type=float, default=None, help="End time (s)")
+    parser.add_argument("--summary", action="store_true", help="Only print record counts")
+    args = parser.parse_args()
+
+    reader = SessionReader(args.path)
+    counts = {}
+    for t, kind, text in reader.records(args.start, args.end):
+        counts[kind] = counts.get(kind, 0) + 1
+        if not args.summary:
+            print(f"{t:10.3f}  {KIND_NAMES.get(kind, kind):<5} {text}")
+
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.start_time))
+    print(f"Session started {started}, {reader.duration():.1f}s")
+    for kind, n in sorted(counts.items()):
+        print(f"  {KIND_NAMES.get(kind, kind):<5} {n}")
+
+
+if __name__ == "__main__":
+    main()
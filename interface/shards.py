@@ -0,0 +1,537 @@
+"""
+Client-side sharding across multiple hubs.
+
+One hub (one AP on one Wi-Fi channel) can only push so many ESP-NOW frames
+with acceptable latency. A ShardMap assigns formation rows to hubs on
+different channels, and HubPool holds one HubLink (socket, lock, reader and
+send worker) per hub so relays to different shards go out concurrently.
+"""
+import collections
+import json
+import os
+import select
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import REGISTRY, TimedLock
+
+HUB_PORT_DEFAULT = 80
+
+
+# ----------------------- Networking -----------------------
+def send_message(msg: str, sock_obj: socket.socket, timeout=1.0) -> str:
+    """Send message and return reply."""
+    full = f"{msg}\n".encode()
+    try:
+        sock_obj.sendall(full)
+        sock_obj.settimeout(timeout)
+        try:
+            reply = sock_obj.recv(256).decode(errors="ignore").strip()
+            return reply
+        except socket.timeout:
+            return None
+    except OSError as e:
+        raise e
+
+
+def connect(ip: str, port: int, retries=3) -> socket.socket:
+    """Connect to hub with retries."""
+    last = None
+    for _ in range(1, retries + 1):
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            s.settimeout(3.0)
+            s.connect((ip, port))
+            s.settimeout(None)
+            return s
+        except OSError as e:
+            last = e
+            time.sleep(0.5)
+    raise RuntimeError(f"Unable to reach hub at {ip}:{port} ({last})")
+
+
+# ----------------------- Shard Map -----------------------
+def message_row(msg: str) -> Optional[int]:
+    """Row addressed by a command ("r;x:..." or "TO:r;c|...")."""
+    if msg.startswith("TO:"):
+        msg = msg[3:]
+    head = msg.split(";", 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+class HubShard:
+    """One hub: where it is, which channel it serves and which rows it owns."""
+
+    def __init__(self, name: str, host: str, port: int = HUB_PORT_DEFAULT,
+                 channel: Optional[int] = None, rows: Iterable[int] = ()):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.channel = channel
+        self.rows = set(rows)
+
+    def __repr__(self):
+        return f"HubShard({self.name!r}, {self.host}:{self.port}, ch={self.channel}, rows={sorted(self.rows)})"
+
+
+class ShardMap:
+    """Maps formation rows to hubs."""
+
+    def __init__(self, shards: List[HubShard]):
+        if not shards:
+            raise ValueError("At least one hub is required")
+        self.shards = shards
+        self._by_row = {row: s for s in shards for row in s.rows}
+
+    @classmethod
+    def from_spec(cls, spec: str, default_port: int, rows: Iterable[int]) -> "ShardMap":
+        """
+        Build from "host[:port][/channel], ..." and split rows evenly, in order.
+        A single host gives the usual one-hub setup.
+        """
+        entries = [e.strip() for e in spec.split(",") if e.strip()]
+        rows = sorted(rows)
+        shards = []
+        for i, entry in enumerate(entries):
+            channel = None
+            if "/" in entry:
+                entry, ch = entry.split("/", 1)
+                channel = int(ch)
+            host, _, port = entry.partition(":")
+            # Contiguous block of rows for this hub
+            lo = i * len(rows) // len(entries)
+            hi = (i + 1) * len(rows) // len(entries)
+            shards.append(HubShard(f"hub{i + 1}", host, int(port) if port else default_port,
+                                   channel, rows[lo:hi]))
+        return cls(shards)
+
+    @classmethod
+    def load(cls, path: str) -> "ShardMap":
+        """
+        Load from JSON:
+        {"hubs": [{"name": "A", "host": "192.168.4.1", "port": 80, "channel": 1, "rows": [1, 2]}, ...]}
+        """
+        with open(path) as f:
+            config = json.load(f)
+        return cls([HubShard(h.get("name", f"hub{i + 1}"), h["host"], h.get("port", HUB_PORT_DEFAULT),
+                             h.get("channel"), h.get("rows", []))
+                    for i, h in enumerate(config["hubs"])])
+
+    def shard_for_row(self, row: Optional[int]) -> HubShard:
+        """Hub serving `row` (unassigned rows go to the first hub)."""
+        return self._by_row.get(row, self.shards[0])
+
+
+def load_shard_map(config_path: str, spec: str, default_port: int, rows: Iterable[int]) -> ShardMap:
+    """The hubs.json layout if there is one, else `spec` ("host[:port][/channel], ...") over `rows`."""
+    if config_path and os.path.exists(config_path):
+        return ShardMap.load(config_path)
+    return ShardMap.from_spec(spec, default_port, rows)
+
+
+def is_reply(line: str) -> bool:
+    """Whether a hub line answers a command (the rest is telemetry, acks, heartbeats)."""
+    return line.startswith(("OK", "ERR", "TIME:"))
+
+
+# A request may end in "#<id>": the hub strips the tag and echoes it on its
+# reply, so a reply that never comes cannot shift the others onto the wrong requests
+REQUEST_TAG = "#"
+
+
+def split_tag(line: str) -> Tuple[str, Optional[int]]:
+    """A request or reply without its "#<id>" tag, and the id (None if untagged)."""
+    text, sep, tag = line.rpartition(REQUEST_TAG)
+    if sep and tag.isdigit():
+        return text, int(tag)
+    return line, None
+
+
+# ----------------------- Hub Connections -----------------------
+class HubLink:
+    """
+    Connection to one hub. Sends are serialized by the link lock. Once the
+    reader runs it is the only one reading: requests are tagged with an id
+    the hub echoes, each reply goes to the request with its id (an untagged
+    one to the oldest), and everything else to the reader callback.
+    """
+
+    def __init__(self, shard: HubShard, registry=REGISTRY):
+        self.shard = shard
+        labels = {"shard": shard.name}
+        self.lock = TimedLock(registry.histogram("sock_lock_wait_seconds", "Time spent waiting for a hub socket lock", labels))
+        self.m_latency = registry.histogram("hub_send_latency_seconds", "Send + reply time per hub command", labels)
+        self.m_errors = registry.counter("hub_send_errors_total", "Commands that failed to send", labels)
+        self.m_late = registry.counter("hub_late_replies_total", "Replies that came after their request timed out",
+                                       labels)
+        self.sock = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"hub-{shard.name}")
+        self._reader = None
+        self._reading = False
+        self._next_id = 0
+        # Request id -> (Future, send time) of requests sent while the reader runs, oldest
+        # first. Own lock, never held over I/O: the reader must not wait behind a blocked send
+        self._waiting: Dict[int, Tuple[Future, float]] = collections.OrderedDict()
+        self._waiting_lock = threading.Lock()
+
+    def connect(self, retries=3):
+        s = connect(self.shard.host, self.shard.port, retries)
+        with self.lock:
+            if self.sock:
+                try:
+                    self.sock.close()
+                except OSError:
+                    pass
+            self.sock = s
+
+    def close(self):
+        with self.lock:
+            if self.sock:
+                try:
+                    self.sock.close()
+                except OSError:
+                    pass
+                self.sock = None
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def request(self, msg: str, timeout=0.5) -> Optional[str]:
+        """Send one line and wait for the reply (None on timeout)."""
+        return self.request_many([msg], timeout)[0][0]
+
+    def request_many(self, msgs: List[str], timeout=0.5) -> List[Tuple[Optional[str], float]]:
+        """
+        Send lines in one write (one at a time until the reader runs) and wait
+        for their replies. Returns (reply or None on timeout, seconds) per line.
+        A reply that comes after the timeout is counted and dropped.
+        """
+        with self.lock:
+            if not self.sock:
+                raise ConnectionError(f"Not connected to {self.shard.name}")
+            start = time.perf_counter()
+            if not self._reading:
+                results = []
+                for msg in msgs:
+                    try:
+                        reply = send_message(msg, self.sock, timeout=timeout)
+                    except OSError:
+                        self.m_errors.inc()
+                        raise
+                    results.append((reply, time.perf_counter() - start))
+                    self.m_latency.record(results[-1][1])
+                return results
+
+            ids, futures = [], []
+            with self._waiting_lock:
+                for _ in msgs:
+                    self._next_id += 1
+                    ids.append(self._next_id)
+                    futures.append(Future())
+                    self._waiting[self._next_id] = (futures[-1], start)
+            try:
+                self.sock.sendall("".join(f"{msg}{REQUEST_TAG}{i}\n" for msg, i in zip(msgs, ids)).encode())
+            except OSError:
+                self._forget(ids)
+                self.m_errors.inc(len(msgs))
+                raise
+
+        results = []
+        deadline = start + timeout
+        for i, future in zip(ids, futures):
+            try:
+                results.append(future.result(max(0.0, deadline - time.perf_counter())))
+                self.m_latency.record(results[-1][1])
+            except FutureTimeout:
+                self._forget([i])
+                results.append((None, time.perf_counter() - start))
+        return results
+
+    def _forget(self, ids: List[int]):
+        with self._waiting_lock:
+            for i in ids:
+                self._waiting.pop(i, None)
+
+    def _match(self, text: str, rid: Optional[int]) -> bool:
+        """Hand a reply to its request (an untagged one to the oldest). False if none is waiting for it."""
+        with self._waiting_lock:
+            if rid is None and self._waiting:
+                rid = next(iter(self._waiting))
+            entry = self._waiting.pop(rid, None)
+        if entry is None:
+            return False
+        future, sent = entry
+        future.set_result((text, time.perf_counter() - sent))
+        return True
+
+    def submit(self, fn, *args):
+        """Run `fn(*args)` on this hub's send worker (keeps per-hub ordering)."""
+        return self._executor.submit(fn, *args)
+
+    def start_reader(self, stop: threading.Event, on_line: Callable[["HubLink", str], None]):
+        """Read unsolicited lines (telemetry, acks) until `stop` is set or the link closes."""
+        def reader():
+            pending = ""
+            try:
+                while not stop.is_set():
+                    local_sock = self.sock
+                    if not local_sock:
+                        break
+                    try:
+                        # Only this thread reads; sends from request() don't need to wait for it
+                        if not select.select([local_sock], [], [], 0.2)[0]:
+                            continue
+                        data = local_sock.recv(4096).decode(errors="ignore")
+                    except (OSError, ValueError):
+                        data = ""
+                    if not data:
+                        time.sleep(0.05)  # Closed under us; the link owner notices and reconnects
+                        continue
+
+                    # Split into lines; keep any partial line for the next read
+                    pending += data
+                    *lines, pending = pending.split("\n")
+                    for line in lines:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        if is_reply(line):
+                            text, rid = split_tag(line)
+                            if self._match(text, rid):
+                                continue
+                            if rid is not None:
+                                self.m_late.inc()  # Its request timed out
+                                continue
+                        try:
+                            on_line(self, line)
+                        except Exception:
+                            pass
+            finally:
+                with self.lock, self._waiting_lock:
+                    self._reading = False
+                    for future, sent in self._waiting.values():
+                        future.set_result((None, time.perf_counter() - sent))
+                    self._waiting.clear()
+
+        self._reading = True
+        self._reader = threading.Thread(target=reader, daemon=True)
+        self._reader.start()
+        return self._reader
+
+    def join_reader(self, timeout=1.0):
+        if self._reader:
+            self._reader.join(timeout=timeout)
+
+
+class PipelinedLink:
+    """
+    Connection to one hub that never waits on a reply before the next send.
+    The hub answers every line in order, so a reader thread hands each reply
+    to the oldest outstanding send; other lines go to `on_line`.
+    """
+
+    def __init__(self, shard: HubShard, on_line: Optional[Callable[["PipelinedLink", str], None]] = None,
+                 registry=REGISTRY):
+        self.shard = shard
+        self.on_line = on_line
+        labels = {"shard": shard.name}
+        self.m_latency = registry.histogram("hub_reply_latency_seconds", "Send to reply time of pipelined commands",
+                                            labels)
+        self.m_errors = registry.counter("hub_send_errors_total", "Commands that failed to send", labels)
+        self.sock = None
+        self._pending = collections.deque()  # (Future, send time), oldest first
+        self._lock = threading.Lock()        # Keeps sends and their queue entries in the same order
+        self._reader = None
+
+    def connect(self, retries=3):
+        self.sock = connect(self.shard.host, self.shard.port, retries)
+        self._reader = threading.Thread(target=self._read, args=(self.sock,), daemon=True)
+        self._reader.start()
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if self._reader:
+            self._reader.join(timeout=1.0)
+        self._fail_pending()
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._pending)
+
+    def send(self, payload: bytes, count: int = 1) -> List[Future]:
+        """
+        Write `payload` (`count` newline-terminated commands) in one send.
+        Returns one Future per command, resolved with (reply, round trip seconds).
+        """
+        futures = [Future() for _ in range(count)]
+        with self._lock:
+            if not self.sock:
+                raise ConnectionError(f"Not connected to {self.shard.name}")
+            now = time.perf_counter()
+            self._pending.extend((f, now) for f in futures)
+            try:
+                self.sock.sendall(payload)
+            except OSError:
+                self.m_errors.inc(count)
+                raise
+        return futures
+
+    def request(self, msg: str, timeout=0.5) -> Optional[str]:
+        """Send one line and wait for its reply (None on timeout); usable as SyncMaster's request."""
+        future = self.send(f"{msg}\n".encode())[0]
+        try:
+            return future.result(timeout)[0]
+        except FutureTimeout:
+            return None
+
+    def _read(self, sock: socket.socket):
+        pending = ""
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            pending += data.decode(errors="ignore")
+            *lines, pending = pending.split("\n")
+            now = time.perf_counter()
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if is_reply(line) and self._pending:
+                    future, sent = self._pending.popleft()
+                    self.m_latency.record(now - sent)
+                    future.set_result((line, now - sent))
+                elif self.on_line:
+                    self.on_line(self, line)
+        self._fail_pending()
+
+    def _fail_pending(self):
+        while self._pending:
+            future, _sent = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"Connection to {self.shard.name} closed"))
+
+
+class HubPool:
+    """One HubLink per shard, with routing and concurrent fan-out."""
+
+    def __init__(self, shard_map: ShardMap, registry=REGISTRY):
+        self.shard_map = shard_map
+        self.links: Dict[str, HubLink] = {s.name: HubLink(s, registry) for s in shard_map.shards}
+        self.m_fanout = registry.histogram("shard_fanout_seconds", "Time for a fan-out batch to finish on all shards")
+
+    def __len__(self):
+        return len(self.links)
+
+    def connect_all(self, retries=3):
+        """Connect to every hub concurrently. Raises RuntimeError if any hub is unreachable."""
+        errors = {}
+
+        def attempt(link):
+            try:
+                link.connect(retries)
+            except Exception as e:
+                errors[link.shard.name] = e
+
+        threads = [threading.Thread(target=attempt, args=(link,)) for link in self.links.values()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            self.close_all()
+            detail = "; ".join(f"{name}: {e}" for name, e in errors.items())
+            raise RuntimeError(detail)
+
+    def close_all(self):
+        for link in self.links.values():
+            link.close()
+
+    def start_readers(self, stop: threading.Event, on_line):
+        for link in self.links.values():
+            link.start_reader(stop, on_line)
+
+    def join_readers(self, timeout=1.0):
+        for link in self.links.values():
+            link.join_reader(timeout)
+
+    def link_for(self, msg: str) -> HubLink:
+        """Hub link that owns the row a command is addressed to."""
+        return self.links[self.shard_map.shard_for_row(message_row(msg)).name]
+
+    def fan_out(self, messages: List[str], send: Callable[[str], object]):
+        """
+        Send `messages` with `send(msg)`, sequentially per shard and concurrently
+        across shards. Returns a list of results (or raised exceptions) in input order.
+        """
+        groups = {}
+        for i, msg in enumerate(messages):
+            groups.setdefault(self.link_for(msg).shard.name, []).append((i, msg))
+
+        results = [None] * len(messages)
+
+        def run(batch):
+            for i, msg in batch:
+                try:
+                    results[i] = send(msg)
+                except Exception as e:
+                    results[i] = e
+
+        start = time.perf_counter()
+        if len(groups) == 1:
+            run(next(iter(groups.values())))  # No hand-off needed for a single shard
+        else:
+            futures = [self.links[name].submit(run, batch) for name, batch in groups.items()]
+            for f in futures:
+                f.result()
+        self.m_fanout.record(time.perf_counter() - start)
+        return results
+
+    def fan_out_frame(self, messages: List[str], send: Callable[[HubLink, List[str]], list]):
+        """
+        Send `messages` with `send(link, msgs)`, one call per shard with all of
+        its messages (so they can go out in one write), concurrently across
+        shards. Returns a list of results (or raised exceptions) in input order.
+        """
+        groups = {}
+        for i, msg in enumerate(messages):
+            groups.setdefault(self.link_for(msg).shard.name, []).append((i, msg))
+
+        results = [None] * len(messages)
+
+        def run(name, batch):
+            indexes, msgs = zip(*batch)
+            try:
+                replies = send(self.links[name], list(msgs))
+            except Exception as e:
+                replies = [e] * len(msgs)
+            for i, reply in zip(indexes, replies):
+                results[i] = reply
+
+        start = time.perf_counter()
+        if len(groups) == 1:
+            run(*next(iter(groups.items())))
+        else:
+            futures = [self.links[name].submit(run, name, batch) for name, batch in groups.items()]
+            for f in futures:
+                f.result()
+        self.m_fanout.record(time.perf_counter() - start)
+        return results
@@ -0,0 +1,98 @@
+"""
+Hub pose stream bookkeeping.
+
+The hub streams its RTK/IMU pose as sequence-numbered, hub-clock-stamped
+frames (pose_filter.POSE_FRAME) at MIN_STREAM_HZ..MAX_STREAM_HZ. Wi-Fi does
+not deliver them evenly: a stall holds frames in the hub's TCP buffer and then
+hands them over in one burst. TelemetryStream follows one hub's stream: frames
+at or behind the newest sequence number are dropped, gaps are counted as lost,
+and each sample's time is recovered from its hub stamp, so a burst is fused
+with its original spacing instead of piling up at its arrival time. How old a
+sample is when it arrives is the telemetry age. Frames come faster than the
+receiver's fixes, so new_fix() tells which frames carry a position not yet
+fused; the others only bring a newer heading.
+"""
+import math
+from collections import deque
+from typing import Optional
+
+# Hub pose stream rate (must match STREAM_MIN_HZ/STREAM_MAX_HZ in hub.ino)
+MIN_STREAM_HZ = 5.0
+MAX_STREAM_HZ = 20.0
+DEFAULT_STREAM_HZ = 10.0
+
+# Without a synced clock, the smallest arrival delay over this many frames is
+# taken as the link's base delay; anything above it is queueing
+DELAY_WINDOW = 200
+# A frame arriving sooner than this fraction of its hub-time spacing after the
+# previous one was held up with it: part of a burst
+BUNCHED = 0.25
+# Sequence and hub clock both going back by more than this means the hub restarted
+RESTART_US = 1_000_000
+
+
+class TelemetryStream:
+    """One hub's pose stream. Fed from that hub's reader thread; counters are read anywhere."""
+
+    def __init__(self):
+        self.last_seq = None
+        self.last_hub_us = None
+        self.last_arrival = None
+        self.received = 0
+        self.lost = 0           # Frames missing from the sequence
+        self.stale = 0          # Frames at or behind the newest (repeats, stragglers)
+        self.bursts = 0         # Runs of frames that arrived bunched together
+        self.restarts = 0
+        self.repeated_fixes = 0  # Frames carrying the same fix as the one before
+        self.last_fix_us = None
+        self.age = math.nan     # Age of the newest sample when it arrived (s)
+        self.max_age = 0.0
+        self._bunched = False
+        self._delays = deque(maxlen=DELAY_WINDOW)
+
+    def accept(self, seq: Optional[int], hub_us: Optional[int], now: float) -> bool:
+        """Whether a frame received at `now` (monotonic s) is new. Legacy lines have no seq."""
+        if seq is not None and self.last_seq is not None and seq <= self.last_seq:
+            restarted = hub_us is not None and self.last_hub_us is not None and hub_us < self.last_hub_us - RESTART_US
+            if not restarted:
+                self.stale += 1
+                return False
+            self.restarts += 1
+            self.last_seq = self.last_hub_us = self.last_arrival = self.last_fix_us = None
+            self._delays.clear()
+        if seq is not None and self.last_seq is not None:
+            self.lost += seq - self.last_seq - 1
+
+        if hub_us is not None and self.last_hub_us is not None and self.last_arrival is not None:
+            spacing = (hub_us - self.last_hub_us) / 1e6
+            bunched = spacing > 0 and now - self.last_arrival < BUNCHED * spacing
+            if bunched and not self._bunched:
+                self.bursts += 1
+            self._bunched = bunched
+        self.last_seq = seq if seq is not None else self.last_seq
+        self.last_hub_us = hub_us
+        self.last_arrival = now
+        self.received += 1
+        return True
+
+    def new_fix(self, fix_us: Optional[int]) -> bool:
+        """Whether an accepted frame's position is a fix not seen before (lines without stamps always are)."""
+        if fix_us is not None and fix_us == self.last_fix_us:
+            self.repeated_fixes += 1
+            return False
+        self.last_fix_us = fix_us
+        return True
+
+    def sample_time(self, hub_us: int, now: float) -> float:
+        """
+        Local time of a sample from its hub stamp alone: the hub clock plus the
+        smallest arrival delay seen recently. For hubs whose clock is not synced.
+        """
+        self._delays.append(now - hub_us / 1e6)
+        t = hub_us / 1e6 + min(self._delays)
+        self.observe_age(now - t)
+        return t
+
+    def observe_age(self, age: float):
+        self.age = age
+        self.max_age = max(self.max_age, age)
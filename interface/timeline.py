@@ -0,0 +1,79 @@
+"""
+Merging per-row motor timelines into one time-ordered command stream.
+
+A cue or pattern is a list of (pin, state, delay_after) steps, the format of
+controller.CUES. Played on several rows (or several cues at once), each row
+is its own timeline starting at its own time. merge_timelines() puts them all
+on one clock: every step gets its absolute time, the timelines are merged in
+time order, and commands that fall due at the same moment share a frame, so
+five rows play a 250 ms pattern together in 250 ms instead of one after
+another.
+"""
+import heapq
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+# Times are compared at this resolution (s), so float sums of delays still coalesce
+TIME_RESOLUTION = 1e-6
+
+Step = Tuple[int, int, float]        # (pin, state, delay after)
+Command = Tuple[int, int, int]       # (row, pin, state)
+
+
+class Frame(NamedTuple):
+    at: float                        # Seconds from the start of the merged timeline
+    commands: List[Command]
+    sources: List[int]               # Per command: index of its timeline
+
+
+def step_times(steps: Sequence[Step], start: float = 0.0) -> List[Tuple[float, int, int]]:
+    """(time, pin, state) of every step, with time from `start`."""
+    times = []
+    t = start
+    for pin, state, delay in steps:
+        times.append((round(t / TIME_RESOLUTION) * TIME_RESOLUTION, int(pin), int(state)))
+        t += float(delay)
+    return times
+
+
+def length(steps: Sequence[Step]) -> float:
+    """Time from the first step to the last one."""
+    return sum(float(delay) for _pin, _state, delay in steps[:-1])
+
+
+def merge_timelines(timelines: Iterable[Tuple[int, float, Sequence[Step]]]) -> List[Frame]:
+    """
+    Merge (row, start, steps) timelines into frames sorted by time. Within a
+    frame, commands keep the order of their timelines and steps.
+    """
+    streams = []
+    for order, (row, start, steps) in enumerate(timelines):
+        # (time, timeline order, step index) keeps ties in a stable order
+        streams.append([(t, order, i, (int(row), pin, state))
+                        for i, (t, pin, state) in enumerate(step_times(steps, start))])
+
+    frames: List[Frame] = []
+    for t, order, _i, command in heapq.merge(*streams):
+        if not frames or frames[-1].at != t:
+            frames.append(Frame(t, [], []))
+        frames[-1].commands.append(command)
+        frames[-1].sources.append(order)
+    return frames
+
+
+def rows_timelines(steps: Sequence[Step], rows: Iterable[int], start: float = 0.0):
+    """The same steps on every row in `rows`, all starting together."""
+    return [(row, start, steps) for row in sorted(rows)]
+
+
+def to_sequence(frames: List[Frame]) -> List[Tuple[int, int, int, float]]:
+    """
+    Frames as a (row, pin, state, delay_after) sequence, the format of
+    Controller.run_sequence: within a frame every delay is 0, and the last
+    command of a frame waits until the next frame.
+    """
+    sequence = []
+    for k, frame in enumerate(frames):
+        gap = frames[k + 1].at - frame.at if k + 1 < len(frames) else 0.0
+        for i, (row, pin, state) in enumerate(frame.commands):
+            sequence.append((row, pin, state, round(gap, 6) if i == len(frame.commands) - 1 else 0.0))
+    return sequence
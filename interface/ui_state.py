@@ -0,0 +1,131 @@
+import threading
+
+# Default UI refresh rate (frames per second)
+UI_FPS = 30
+
+_UNSET = object()
+
+
+class UIStateStore:
+    """
+    Collects UI state changes from any thread and applies them on the Tk thread
+    at a fixed frame rate.
+
+    Each key is bound to an apply function. Setting a key only records the new
+    value; on the next frame the apply function runs once, and only if the value
+    differs from what was last drawn. Scheduled callbacks are coalesced by key so
+    a burst of packets results in a single call with the latest arguments.
+    Values set for keys nobody has bound yet (widgets of a tab that is built
+    on first view) are kept and drawn as soon as the key is bound.
+    """
+
+    def __init__(self, root, fps: int = UI_FPS):
+        self.root = root
+        self.interval_ms = max(1, int(1000 / fps))
+
+        self._lock = threading.Lock()
+        self._pending = {}      # key -> latest value not yet drawn
+        self._applied = {}      # key -> value currently on screen
+        self._appliers = {}     # key -> apply(value)
+        self._unbound = {}      # key -> latest value set before the key was bound
+        self._calls = {}        # key -> (fn, args), latest wins
+        self._frame_hooks = []  # run on the Tk thread before each flush
+
+        self._after_id = None
+        self.frames = 0
+        self.redraws = 0
+
+    # ----------------------- Bindings -----------------------
+    def bind(self, key, apply, initial=_UNSET):
+        """Bind a key to an apply function. `initial` is the value already drawn."""
+        with self._lock:
+            self._appliers[key] = apply
+            self._pending.pop(key, None)
+            if initial is _UNSET:
+                self._applied.pop(key, None)
+            else:
+                self._applied[key] = initial
+            if key in self._unbound:
+                self._pending[key] = self._unbound.pop(key)
+
+    def bind_widget(self, key, widget, option="text", initial=_UNSET):
+        """Bind a key to a widget option (e.g. a label's text)."""
+        self.bind(key, lambda v: widget.config(**{option: v}), initial)
+
+    def bind_item(self, key, canvas, item, option="fill", initial=_UNSET):
+        """Bind a key to a canvas item option (e.g. a rectangle's fill)."""
+        self.bind(key, lambda v: canvas.itemconfig(item, **{option: v}), initial)
+
+    def unbind_prefix(self, prefix):
+        """Drop all tuple keys starting with `prefix` (used when a canvas is redrawn)."""
+        n = len(prefix)
+        with self._lock:
+            for table in (self._appliers, self._pending, self._applied):
+                for key in [k for k in table if isinstance(k, tuple) and k[:n] == prefix]:
+                    del table[key]
+
+    def add_frame_hook(self, fn):
+        """Run `fn()` on the Tk thread at the start of every frame."""
+        self._frame_hooks.append(fn)
+
+    # ----------------------- Updates (thread-safe) -----------------------
+    def set(self, key, value):
+        """Record a new value for `key`; drawn on the next frame if it changed."""
+        with self._lock:
+            self._pending[key] = value
+
+    def call(self, key, fn, *args):
+        """Run `fn(*args)` on the next frame. Later calls with the same key replace earlier ones."""
+        with self._lock:
+            self._calls[key] = (fn, args)
+
+    # ----------------------- Frame loop -----------------------
+    def start(self):
+        """Start the frame loop."""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """Stop the frame loop."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def flush(self):
+        """Apply all pending changes now. Must be called on the Tk thread."""
+        for hook in self._frame_hooks:
+            hook()
+
+        with self._lock:
+            calls, self._calls = self._calls, {}
+            pending, self._pending = self._pending, {}
+
+        for fn, args in calls.values():
+            fn(*args)
+
+        # Callbacks may have set new values; pick those up in the same frame
+        if calls:
+            with self._lock:
+                pending.update(self._pending)
+                self._pending.clear()
+
+        for key, value in pending.items():
+            apply = self._appliers.get(key)
+            if apply is None:
+                with self._lock:
+                    if key not in self._appliers:
+                        self._unbound[key] = value
+                continue
+            if self._applied.get(key, _UNSET) == value:
+                continue
+            apply(value)
+            self._applied[key] = value
+            self.redraws += 1
+
+        self.frames += 1
+
+    def _tick(self):
+        try:
+            self.flush()
+        finally:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Throughput check for the formation analytics (interface/analytics.py).
+
+Writes a synthetic archive straight to disk: hub telemetry at 10 Hz, a
+position report from every member at --hz, a relayed target per member at
+5 Hz and a new set every 5 minutes, with members drifting around their slots.
+Then it times the chunked, memory-mapped analysis over it, and a time-range
+and a single-member query against the archive index.
+
+A small .hbs session is also recorded and ingested, to exercise the text path.
+
+Usage: python analytics_bench.py [--hours 1] [--rows 20] [--cols 5] [--hz 20] [--out /tmp/bench.hba]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from analytics import HEADER, analyze, format_row, ingest  # noqa: E402
+from archive import COLUMNS, HUB, POS, SET, TARGET, Archive, ArchiveWriter, member_id  # noqa: E402
+from formation import FEET_PER_DEGREE_LAT, column_targets  # noqa: E402
+from session_log import MARK, RX, TX, SessionRecorder  # noqa: E402
+
+LAT0, LON0 = 35.303276, -120.664299
+CIRCLE_M = 30.0
+CIRCLE_PERIOD = 120.0
+HUB_HZ = 10.0
+TARGET_HZ = 5.0
+SET_SECONDS = 300.0
+BLOCK_SECONDS = 60.0
+SPACING = 3.0
+
+RECORD_DTYPE = np.dtype([(name, dtype) for name, dtype in COLUMNS])
+
+
+def hub_pose(t):
+    """Hub marching around a circle; heading along the track."""
+    a = 2 * math.pi * t / CIRCLE_PERIOD
+    lat = LAT0 + np.degrees(CIRCLE_M * np.cos(a) / 6371008.8)
+    lon = LON0 + np.degrees(CIRCLE_M * np.sin(a) / (6371008.8 * math.cos(math.radians(LAT0))))
+    heading = (np.degrees(a) + 90.0) % 360.0
+    return lat, lon, heading
+
+
+def block_records(t0, members, hz, rng, phases):
+    """All records of one BLOCK_SECONDS slice, in time order."""
+    parts = []
+
+    t = t0 + np.arange(0, BLOCK_SECONDS, 1 / HUB_HZ)
+    lat, lon, heading = hub_pose(t)
+    hub = np.zeros(len(t), dtype=RECORD_DTYPE)
+    hub["t"], hub["lat"], hub["lon"], hub["heading"], hub["kind"], hub["fix"] = t, lat, lon, heading, HUB, 4
+    parts.append(hub)
+
+    ids = np.array([member_id(r, c) for r, c in members])
+    cols = np.array([c for _, c in members])
+    for rate, kind in ((hz, POS), (TARGET_HZ, TARGET)):
+        t = t0 + np.arange(0, BLOCK_SECONDS, 1 / rate)
+        tt = np.repeat(t, len(ids)) + rng.uniform(0, 1 / rate, len(t) * len(ids))
+        mm = np.tile(ids, len(t))
+        cc = np.tile(cols, len(t))
+        lat, lon, heading = hub_pose(tt)
+        slot_lat, slot_lon = column_targets(lat, lon, np.round(heading) % 360, cc, SPACING)
+        rec = np.zeros(len(tt), dtype=RECORD_DTYPE)
+        rec["t"], rec["member"], rec["kind"] = tt, mm, kind
+        if kind == POS:
+            # Each member wanders around its slot (a few feet) and off heading now and then
+            ph = np.tile(phases, len(t))
+            drift = 2.5 * np.sin(2 * math.pi * tt / 40.0 + ph) ** 3
+            north = drift + rng.normal(0, 0.2, len(tt))
+            east = 0.5 * drift + rng.normal(0, 0.2, len(tt))
+            rec["lat"] = slot_lat + north / FEET_PER_DEGREE_LAT
+            rec["lon"] = slot_lon + east / (FEET_PER_DEGREE_LAT * np.cos(np.radians(slot_lat)))
+            rec["heading"] = (np.round(heading) + 12 * np.sin(2 * math.pi * tt / 25.0 + ph)) % 360
+            rec["fix"] = 4
+        else:
+            rec["lat"], rec["lon"], rec["heading"] = slot_lat, slot_lon, np.round(heading) % 360
+        parts.append(rec)
+
+    if t0 % SET_SECONDS < BLOCK_SECONDS:
+        mark = np.zeros(1, dtype=RECORD_DTYPE)
+        mark["t"], mark["kind"], mark["member"], mark["heading"] = t0, SET, int(t0 // SET_SECONDS), SPACING
+        parts.insert(0, mark)
+
+    rec = np.concatenate(parts)
+    return rec[np.argsort(rec["t"], kind="stable")]
+
+
+def write_synthetic(path, hours, rows, cols, hz, seed=1):
+    rng = np.random.default_rng(seed)
+    members = [(r, c) for r in range(1, rows + 1) for c in range(1, cols + 1)]
+    phases = rng.uniform(0, 2 * math.pi, len(members))
+    writer = ArchiveWriter(path, flush_interval=float("inf"))
+    for k in range(int(hours * 3600 / BLOCK_SECONDS)):
+        rec = block_records(k * BLOCK_SECONDS, members, hz, rng, phases)
+        writer.append_columns(**{name: rec[name] for name, _ in COLUMNS})
+    writer.close()
+    return writer.rows
+
+
+def text_roundtrip(directory):
+    """Record a short .hbs session the way the app does and run it through ingest()."""
+    path = os.path.join(directory, "roundtrip.hbs")
+    rec = SessionRecorder(path)
+    base = time.monotonic()
+    rec.record(MARK, f"SET:1|SPACING:{SPACING:g}", t=base)
+    for k in range(200):
+        t = k * 0.05
+        lat, lon, heading = (float(v) for v in hub_pose(np.array(t)))
+        rec.record(RX, f"GPS:{lat:.7f},{lon:.7f}|IMU:{round(heading)}|FIX:4", t=base + t)
+        for col in range(1, 6):
+            slot_lat, slot_lon = column_targets(lat, lon, round(heading) % 360, col, SPACING)
+            rec.record(TX, f"1;{col}:{slot_lat},{slot_lon}|{round(heading) % 360}@123", t=base + t)
+            rec.record(RX, f"POS:1;{col}:{slot_lat:.7f},{slot_lon:.7f}|{round(heading) % 360}|4", t=base + t + 0.01)
+    rec.close()
+    analysis = analyze(path)
+    return os.path.exists(ingest(path)), analysis.totals()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--hz", type=float, default=20.0)
+    parser.add_argument("--out", help="Record file to write (default: a temp file, removed afterwards)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok, totals = text_roundtrip(tmp)
+        print(f"text ingest round trip: {'ok' if ok else 'FAILED'}, "
+              f"{totals['samples']} samples, {totals['on_target'] * 100:.0f}% on target")
+
+        path = args.out or os.path.join(tmp, "bench.hba")
+        start = time.perf_counter()
+        count = write_synthetic(path, args.hours, args.rows, args.cols, args.hz)
+        size = os.path.getsize(path)
+        print(f"wrote {count:,} records ({size / 1e6:.0f} MB) for {args.hours:g} h x "
+              f"{args.rows * args.cols} members at {args.hz:g} Hz in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        analysis = analyze(path)
+        elapsed = time.perf_counter() - start
+        print(f"analyzed in {elapsed:.2f} s ({count / elapsed / 1e6:.1f} M records/s), "
+              f"{len(analysis.members)} members, {len(analysis.sets)} sets")
+        print(f"  {HEADER}")
+        print(f"  {format_row(analysis.totals())}")
+
+        archive = Archive(path)
+        for label, kwargs in (("10 s window", {"start": 600.0, "end": 610.0}),
+                              ("one member", {"members": [member_id(3, 2)]}),
+                              ("one member, 10 s", {"start": 600.0, "end": 610.0, "members": [member_id(3, 2)]})):
+            archive.chunks_read = 0
+            start = time.perf_counter()
+            rows = sum(len(c) for c in archive.query(**kwargs))
+            print(f"query {label:<17} {rows:>9,} rows from {archive.chunks_read:>4}/{len(archive.index)} chunks "
+                  f"in {(time.perf_counter() - start) * 1e3:6.1f} ms")
+        if args.out:
+            return
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark and cross-check of the whole-block evaluation (interface/block_eval.py).
+
+Fills a block with noisy position reports, then times evaluate() plus
+correction_order() per frame and checks every member's tier against a
+scalar, member-at-a-time port of headband.ino's on-target logic.
+
+Passes if the results agree and one frame fits comfortably in the 20 Hz budget.
+
+Usage: python block_eval_bench.py [--rows 20] [--cols 10] [--hz 20] [--frames 2000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from block_eval import (BlockEvaluator, CONFIRM_INTERVAL, FEET_PER_DEGREE_LAT, GPS_TOLERANCE, HARD,  # noqa: E402
+                        IMU_DEADZONE, IMU_SOFT_LIMIT, OFF_POSITION, ON_TARGET, SOFT)
+
+BUDGET_SHARE = 0.1   # A frame may use at most this share of one core at the target rate
+
+
+def scalar_tier(lat, lon, heading, t_lat, t_lon, t_heading):
+    """One member, the way headband.ino does it."""
+    diff = heading - t_heading
+    while diff > 180:
+        diff -= 360
+    while diff < -180:
+        diff += 360
+    if abs(diff) <= IMU_DEADZONE:
+        on_spot = abs(lat - t_lat) < GPS_TOLERANCE and abs(lon - t_lon) < GPS_TOLERANCE
+        return ON_TARGET if on_spot else OFF_POSITION
+    return SOFT if abs(diff) <= IMU_SOFT_LIMIT else HARD
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--cols", type=int, default=10)
+    parser.add_argument("--hz", type=float, default=20.0)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    block = BlockEvaluator(args.rows, args.cols)
+    n = args.rows * args.cols
+    lat0, lon0 = 35.303276, -120.664299
+    t_lat = lat0 + np.array([rng.uniform(-1e-4, 1e-4) for _ in range(n)])
+    t_lon = lon0 + np.array([rng.uniform(-1e-4, 1e-4) for _ in range(n)])
+    t_heading = np.array([float(rng.randrange(360)) for _ in range(n)])
+
+    now = time.monotonic()
+    for row in range(1, args.rows + 1):
+        for col in range(1, args.cols + 1):
+            i = block.slot(row, col)
+            feet = abs(rng.gauss(0, 1.5))
+            bearing = rng.uniform(0, 2 * math.pi)
+            lat = t_lat[i] + feet * math.cos(bearing) / FEET_PER_DEGREE_LAT
+            lon = t_lon[i] + feet * math.sin(bearing) / (FEET_PER_DEGREE_LAT * math.cos(math.radians(t_lat[i])))
+            heading = (t_heading[i] + rng.gauss(0, 10)) % 360
+            block.handle_line(f"POS:{row};{col}:{lat:.7f},{lon:.7f}|{int(heading)}|4", now=now)
+
+    members = [(r, c) for r in range(1, args.rows + 1) for c in range(1, args.cols + 1)]
+    evaluation = block.evaluate(t_lat, t_lon, t_heading, now=now)
+    mismatches = 0
+    for i in range(n):
+        expected = scalar_tier(block.lat[i], block.lon[i], block.heading[i], t_lat[i], t_lon[i], t_heading[i])
+        mismatches += int(evaluation.tier[i]) != expected
+
+    # On-target members are relayed once per CONFIRM_INTERVAL, after everyone needing a correction
+    on_target = {m for m in members if evaluation.tier[block.slot(*m)] == ON_TARGET}
+    first = block.correction_order(evaluation, members)
+    again = block.correction_order(evaluation, members)
+    later = block.correction_order(evaluation._replace(t=now + CONFIRM_INTERVAL), members)
+    confirm_ok = (bool(on_target) and set(first[len(first) - len(on_target):]) == on_target
+                  and not on_target & set(again) and on_target <= set(later))
+
+    times = []
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        evaluation = block.evaluate(t_lat, t_lon, t_heading, now=now)
+        block.correction_order(evaluation, members)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    p50 = times[len(times) // 2]
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    budget = BUDGET_SHARE / args.hz
+
+    print(f"{n} members, tiers {block.counts(evaluation)}")
+    print(f"frame: p50 {p50 * 1e6:.0f} us, p99 {p99 * 1e6:.0f} us "
+          f"({p99 * args.hz * 100:.2f}% of one core at {args.hz:g} Hz)")
+    print(f"scalar cross-check: {mismatches} mismatches")
+    print(f"confirmation relays: {len(on_target)} on-target members {'ok' if confirm_ok else 'WRONG'}")
+
+    if mismatches:
+        print("FAIL: vectorized tiers differ from the scalar port")
+        sys.exit(1)
+    if not confirm_ok:
+        print(f"FAIL: on-target members not relayed once per {CONFIRM_INTERVAL:g} s")
+        sys.exit(1)
+    if p99 > budget:
+        print(f"FAIL: p99 above {budget * 1e3:.1f} ms")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Simulated check of time-synchronized execution (interface/clock_sync.py).
+
+1. Laptop <-> hub: a SyncMaster syncs over TCP to a HubSimulator whose clock has
+   an offset and a crystal skew; we compare its estimate with the true hub clock.
+2. Hub -> headbands: every member fits its own skewed clock to "TS:" beacons that
+   reach all members with a shared air/stack delay plus per-receiver jitter, then
+   fires stamped commands ("@<hub_us>") polled from a 1 ms loop.
+
+Passes if the spread of fire times across members stays under 5 ms.
+
+Usage: python clock_sync_test.py [--members 25] [--commands 200] [--seed 1]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from clock_sync import SkewEstimator, SyncMaster  # noqa: E402
+from hub_sim import HubSimulator  # noqa: E402
+from shards import HubLink, HubShard  # noqa: E402
+
+SKEW_LIMIT = 0.005
+BEACON_INTERVAL = 0.25    # hub.ino SYNC_BEACON_INTERVAL
+CRYSTAL_PPM = 40          # ESP32 crystal tolerance
+LOOP_PERIOD = 0.001       # headband loop() delay(1)
+
+
+class SimMember:
+    """A headband: local clock = t * (1 + skew) + offset, plus its beacon fit."""
+
+    def __init__(self, rng):
+        self.skew = rng.uniform(-CRYSTAL_PPM, CRYSTAL_PPM) * 1e-6
+        self.offset = rng.uniform(0, 100)
+        self.estimator = SkewEstimator()
+
+    def local(self, t):
+        return t * (1 + self.skew) + self.offset
+
+    def true_time(self, local):
+        return (local - self.offset) / (1 + self.skew)
+
+
+def sync_laptop(hub, seconds):
+    """Run a SyncMaster against the simulated hub; returns it and its error (s)."""
+    link = HubLink(HubShard("sim", hub.host, hub.port))
+    link.connect()
+    master = SyncMaster(lambda msg: link.request(msg, timeout=0.2), interval=0.1).start()
+    time.sleep(seconds)
+    master.stop()
+    now = time.perf_counter()
+    error = (master.hub_time_us(now) - hub.hub_time_us(now)) / 1e6
+    link.close()
+    return master, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--members", type=int, default=25)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--sync-seconds", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    hub = HubSimulator(port=0, clock_offset=rng.uniform(-50, 50), clock_skew_ppm=rng.uniform(-30, 30)).start()
+    master, laptop_error = sync_laptop(hub, args.sync_seconds)
+    hub.stop()
+    print(f"laptop->hub: {master.probes} probes ({master.rejected} rejected), best RTT "
+          f"{master.rtt * 1e3:.3f} ms, skew {master.estimator.skew_ppm:+.1f} ppm "
+          f"(true {hub.clock_skew_ppm:+.1f}), error {laptop_error * 1e3:+.3f} ms")
+
+    members = [SimMember(rng) for _ in range(args.members)]
+    t0 = time.perf_counter()
+    beacons = [t0 - 10 + k * BEACON_INTERVAL for k in range(int(70 / BEACON_INTERVAL))]
+    commands = sorted(t0 + rng.uniform(1, 60) for _ in range(args.commands))
+
+    spreads = []
+    biases = []
+    b = 0
+    for due in commands:
+        # Beacons delivered before this command (shared delay + per-member jitter)
+        while b < len(beacons) and beacons[b] < due - 0.1:
+            sent = beacons[b]
+            stamp = hub.hub_time_us(sent) / 1e6
+            air = sent + rng.uniform(0.0003, 0.002)
+            for m in members:
+                rx = air + rng.uniform(0, 0.0003)
+                if rng.random() < 0.02:
+                    rx += rng.uniform(0.001, 0.003)  # callback held off by the Wi-Fi task
+                m.estimator.add(m.local(rx), stamp)
+            b += 1
+
+        target = master.hub_time_us(due) / 1e6
+        fired = []
+        for m in members:
+            fire_local = m.estimator.to_local(target)
+            # loop() polls every LOOP_PERIOD with a random phase, plus GPS parsing time
+            fired.append(m.true_time(fire_local) + rng.uniform(0, LOOP_PERIOD) + rng.uniform(0, 0.0005))
+        spreads.append(max(fired) - min(fired))
+        biases.append(sum(fired) / len(fired) - due)
+
+    spreads.sort()
+    p50 = spreads[len(spreads) // 2]
+    p99 = spreads[min(len(spreads) - 1, int(len(spreads) * 0.99))]
+    print(f"{args.members} members, {args.commands} commands: cross-member skew "
+          f"p50 {p50 * 1e3:.2f} ms, p99 {p99 * 1e3:.2f} ms, max {spreads[-1] * 1e3:.2f} ms")
+    print(f"mean fire time vs. schedule: {sum(biases) / len(biases) * 1e3:+.2f} ms")
+
+    if spreads[-1] >= SKEW_LIMIT:
+        print(f"FAIL: skew above {SKEW_LIMIT * 1e3:.0f} ms")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
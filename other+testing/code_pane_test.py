@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Check the language builder's generated-code pane (interface/language.py).
+
+A library of --patterns patterns is loaded into the builder (from a temporary
+file, so the real haptic_patterns.json is not touched) and the pane is fully
+generated, then patterns are added, changed and removed at the front, middle
+and end so on_patterns_changed() patches it incrementally. After every step
+the pane must read CODE_HEADER + pattern_code() of every pattern +
+JSON_HEADER + store.to_json(), and the listbox must list store.names().
+Needs a display.
+
+Usage: python code_pane_test.py [--patterns 5] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from patterns import CODE_HEADER, JSON_HEADER, pattern_code  # noqa: E402
+
+MOTORS = [5, 18, 19, 23]
+
+
+def random_pattern(rng, name):
+    return {
+        "name": name,
+        "motors": rng.sample(MOTORS, rng.randint(1, 4)),
+        "buzz_length_ms": rng.randrange(50, 500),
+        "two_buzz": rng.random() < 0.5,
+    }
+
+
+def expected_pane(store):
+    names = store.names()
+    if not names:
+        return "# No patterns saved yet"
+    return CODE_HEADER + "".join(pattern_code(store.get(n)) for n in names) + JSON_HEADER + store.to_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patterns", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import tkinter as tk
+    try:
+        import language
+    except tk.TclError as e:
+        raise SystemExit(f"Needs a display: {e}")
+
+    rng = random.Random(args.seed)
+    store = language.store
+    failures = []
+
+    def check(what):
+        pane = language.code_output.get("1.0", "end-1c")
+        listed = list(language.pattern_listbox.get(0, "end"))
+        ok = pane == expected_pane(store) and listed == store.names()
+        print(f"{'ok  ' if ok else 'FAIL'} {what} ({len(store)} patterns)")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.path = os.path.join(tmp, "haptic_patterns.json")
+        library = {f"p{i:02d}": random_pattern(rng, f"p{i:02d}") for i in range(0, 2 * args.patterns, 2)}
+        with open(store.path, "w", encoding="utf-8") as f:
+            json.dump(library, f, indent=2)
+        language.load_patterns_from_file()
+        language.generate_code_output()     # What opening the code tab does
+        check("full generation after load")
+
+        last = max(library)
+        steps = [
+            ("add at the front", lambda: store.put(random_pattern(rng, "a"), save=False)),
+            ("add in the middle", lambda: store.put(random_pattern(rng, "p03"), save=False)),
+            ("add at the end", lambda: store.put(random_pattern(rng, "z"), save=False)),
+            ("change in the middle", lambda: store.put(random_pattern(rng, "p03"), save=False)),
+            ("change the last", lambda: store.put(random_pattern(rng, "z"), save=False)),
+            ("remove the front", lambda: store.delete("a", save=False)),
+            ("remove the last", lambda: store.delete("z", save=False)),
+            ("remove the new last", lambda: store.delete(last, save=False)),
+            ("remove the middle", lambda: store.delete("p03", save=False)),
+        ]
+        for what, step in steps:
+            step()
+            check(what)
+
+        for name in store.names():
+            store.delete(name, save=False)
+        check("remove everything")
+        store.put(random_pattern(rng, "m"), save=False)
+        check("first pattern")
+        store.put(random_pattern(rng, "b"), save=False)
+        check("second pattern, in front")
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Check and time the bulk GPS capture ingest (interface/gps_ingest.py).
+
+1. Agreement: a capture built from nmea_corpus.txt, seeded mutations of it,
+   receiver-like epochs (some mutated) and UBX NAV-PVT frames (some corrupted)
+   mixed into the byte stream is ingested with a small block size, so
+   sentences and frames land on block cuts, and as one block, so the epochs
+   share layouts and take the fixed-column path. Every
+   GGA/RMC fix must equal what nmea.read_log() finds, the '$' sentence counts
+   must match nmea.parse(), and every good NAV-PVT frame must decode to the
+   values it was built from. The small-block ingest runs in a process pool
+   and in-process; both must give the same fixes and counts.
+2. Throughput: a synthetic 10 Hz u-blox capture of --mb megabytes is ingested
+   in full with 1, 2, 4, ... up to --workers processes, reporting MB/s and the
+   speed-up over one process; nmea.read_log() is timed on its first few MB for
+   comparison.
+
+Usage: python gps_ingest_bench.py [--mb 512] [--workers 8] [--mutations 20] [--seed 1] [--out /tmp/capture.log]
+"""
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "interface"))
+
+import gps_ingest  # noqa: E402
+import nmea  # noqa: E402
+from archive import Archive  # noqa: E402
+from nmea_diff_test import load_corpus, mutate  # noqa: E402
+
+
+def ubx_pvt(lat: float, lon: float, fix_type: int, flags: int, head: float, utc: float) -> bytes:
+    """A NAV-PVT frame with the fields gps_ingest reads."""
+    payload = bytearray(gps_ingest.NAV_PVT_LEN)
+    hour, rest = divmod(utc, 3600)
+    minute, sec = divmod(rest, 60)
+    struct.pack_into("<BBBB", payload, 8, int(hour), int(minute), int(sec), 0x07)
+    struct.pack_into("<i", payload, 16, int(round((sec - int(sec)) * 1e9)))
+    struct.pack_into("<BB", payload, 20, fix_type, flags)
+    struct.pack_into("<ii", payload, 24, round(lon * 1e7), round(lat * 1e7))
+    struct.pack_into("<i", payload, 64, round(head * 1e5))
+    body = bytes([*gps_ingest.NAV_PVT, gps_ingest.NAV_PVT_LEN, 0]) + bytes(payload)
+    ck_a = ck_b = 0
+    for b in body:
+        ck_a = (ck_a + b) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return bytes(gps_ingest.UBX_SYNC) + body + bytes([ck_a, ck_b])
+
+
+def same(a: float, b) -> bool:
+    return (b is None and math.isnan(a)) or (b is not None and a == b)
+
+
+def epoch(i: int, rng: random.Random) -> list:
+    """The NMEA sentences (without '$' and "*hh") of epoch i of a 10 Hz u-blox F9P capture."""
+    t = 50000.0 + i * 0.1
+    hh, rest = divmod(int(t), 3600)
+    ts = f"{hh:02d}{rest // 60:02d}{rest % 60:02d}.{int(round(t * 10)) % 10}0"
+    lat, lon = 35.3075 + i * 1e-6, -80.7335 + i * 1e-6
+    la = f"{int(lat):02d}{(lat - int(lat)) * 60:010.7f}"
+    lo = f"{int(-lon):03d}{(-lon - int(-lon)) * 60:010.7f}"
+    q = 4 if i % 50 else 5
+    return [
+        f"GNGGA,{ts},{la},N,{lo},W,{q},{rng.randint(20, 30)},0.50,231.{rng.randint(100, 999)},M,-33.1,M,0.8,0000",
+        f"GNRMC,{ts},A,{la},N,{lo},W,1.{rng.randint(100, 999)},{rng.uniform(0, 360):.2f},181026,,,R,V",
+        "GNGSA,A,3,05,13,15,18,20,23,24,29,,,,,1.12,0.62,0.93,1",
+        "GPGSV,3,1,11,05,34,296,43,13,44,231,45,15,65,064,47,18,26,155,41,1",
+        "GPGSV,3,2,11,20,12,318,35,23,71,012,48,24,39,098,46,29,18,048,40,1",
+        "GPGSV,3,3,11,30,05,200,,36,33,144,42,49,41,182,44,1",
+        f"GNVTG,{rng.uniform(0, 360):.2f},T,,M,2.1,N,3.9,K,R",
+    ]
+
+
+def compare(fixes, reference) -> list:
+    """Problems between ingested GGA/RMC fixes and nmea.read_log()'s."""
+    problems = []
+    bulk = fixes[fixes["source"] != gps_ingest.PVT]
+    if len(bulk) != len(reference):
+        problems.append(f"{len(bulk)} GGA/RMC fixes, nmea.read_log() found {len(reference)}")
+    for row, (_index, fix) in zip(bulk, reference):
+        source = gps_ingest.GGA if fix.type == nmea.GGA else gps_ingest.RMC
+        if (row["source"] != source or not same(row["lat"], fix.lat) or not same(row["lon"], fix.lon)
+                or not same(row["course"], fix.course)
+                or row["quality"] != (-1 if fix.quality is None else fix.quality)):
+            problems.append(f"offset {row['offset']}: {row} vs {fix}")
+            if len(problems) > 10:
+                break
+    return problems
+
+
+def check_agreement(mutations: int, seed: int) -> list:
+    rng = random.Random(seed)
+    corpus = load_corpus()
+    lines = corpus + [mutate(s, rng) for s in corpus if s.startswith("$") for _ in range(mutations)]
+    for i in range(2000):
+        for s in epoch(i, rng):
+            line = f"${s}*{nmea.checksum(s):02X}"
+            lines.append(mutate(line, rng) if rng.random() < 0.1 else line)
+    rng.shuffle(lines)
+    expected_pvt = []
+    stream = bytearray()
+    for i, line in enumerate(lines):
+        stream += line.encode("latin-1") + rng.choice([b"\r\n", b"\n", b"\r"])
+        if i % 7 == 0:
+            lat, lon = rng.uniform(-89, 89), rng.uniform(-179, 179)
+            flags = rng.choice([0x01, 0x03, 0x43, 0x83, 0x00])
+            frame = bytearray(ubx_pvt(lat, lon, rng.choice([0, 2, 3, 5]), flags, rng.uniform(0, 359), 52330.25))
+            if i % 5 == 0:
+                frame[50] ^= 0x10                       # Corrupt the payload: checksum must fail
+            else:
+                expected_pvt.append((len(stream), frame[26], frame[27], lat, lon))
+            stream += frame
+
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "capture.log")
+        with open(path, "wb") as f:
+            f.write(stream)
+        fixes, summary = gps_ingest.ingest(path, block_size=4096, workers=1)
+        pooled, pooled_summary = gps_ingest.ingest(path, block_size=4096, workers=2)
+        whole, _ = gps_ingest.ingest(path, workers=1)
+        reference, _ = nmea.read_log(path)
+        counts = {}
+        for sentence in nmea.frames([bytes(stream)]):
+            if sentence.startswith("$"):
+                result = nmea.parse(sentence)[0]
+                counts[result] = counts.get(result, 0) + 1
+
+    problems += compare(fixes, reference)
+    if pooled.tobytes() != fixes.tobytes() or pooled_summary[:-1] != summary[:-1]:
+        problems.append("2 workers and in-process give different fixes or counts")
+    problems += [f"one block: {p}" for p in compare(whole, reference)]
+    bulk = fixes[fixes["source"] != gps_ingest.PVT]
+    got = {nmea.OK: summary.ok, nmea.IGNORED: summary.ignored, nmea.ERR_FRAME: summary.bad_frame,
+           nmea.ERR_CHECKSUM: summary.bad_checksum}
+    if any(got[k] != counts.get(k, 0) for k in got):
+        problems.append(f"sentence counts {got}, nmea.parse() gives {counts}")
+
+    pvt = fixes[fixes["source"] == gps_ingest.PVT]
+    if len(pvt) != len(expected_pvt) or summary.ubx_bad_checksum != len(lines[::7]) - len(expected_pvt):
+        problems.append(f"{len(pvt)} NAV-PVT fixes ({summary.ubx_bad_checksum} bad), "
+                        f"expected {len(expected_pvt)} ({len(lines[::7]) - len(expected_pvt)} bad)")
+    for row, (offset, fix_type, flags, lat, lon) in zip(pvt, expected_pvt):
+        fix_ok = flags & 1 and fix_type in (2, 3, 4)
+        quality = 0 if not fix_ok else {2: 4, 1: 5}.get(flags >> 6, 2 if flags & 2 else 1)
+        if (row["offset"] != offset or row["quality"] != quality or row["utc"] != 52330.25
+                or (fix_ok and (abs(row["lat"] - lat) > 1e-7 or abs(row["lon"] - lon) > 1e-7))
+                or (not fix_ok and not math.isnan(row["lat"]))):
+            problems.append(f"NAV-PVT at {offset}: {row}")
+            break
+
+    print(f"agreement: {len(lines)} lines, {len(stream) / 1e3:.0f} kB, {len(bulk)} GGA/RMC and "
+          f"{len(pvt)} NAV-PVT fixes, {summary.bad_checksum} bad NMEA checksums, "
+          f"{summary.ubx_bad_checksum} bad UBX checksums")
+    return problems
+
+
+def write_capture(path: str, mb: int, seed: int):
+    """About `mb` MB of 10 Hz u-blox output: GGA, RMC, GSA, 3 GSV, VTG, and a NAV-PVT per second."""
+    rng = random.Random(seed)
+    epochs = []
+    for i in range(6000):
+        text = "".join(f"${s}*{nmea.checksum(s):02X}\r\n" for s in epoch(i, rng)).encode()
+        if i % 10 == 0:
+            t = 50000.0 + i * 0.1
+            text += ubx_pvt(35.3075 + i * 1e-6, -80.7335 + i * 1e-6, 3, 0x83, 90.0, t)
+        epochs.append(text)
+    block = b"".join(epochs)
+    with open(path, "wb") as f:
+        for _ in range(max(1, (mb << 20) // len(block))):
+            f.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mb", type=int, default=512, help="Size of the throughput capture (MB)")
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1),
+                        help="Most processes in the throughput scaling run")
+    parser.add_argument("--mutations", type=int, default=20, help="Mutations per corpus sentence")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="Keep the throughput capture here")
+    args = parser.parse_args()
+
+    problems = check_agreement(args.mutations, args.seed)
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    tmp = tempfile.mkdtemp()
+    path = args.out or os.path.join(tmp, "capture.log")
+    write_capture(path, args.mb, args.seed)
+    counts = sorted({min(2 ** k, args.workers) for k in range(args.workers.bit_length() + 1)})
+    single = None
+    for workers in counts:
+        fixes, s = gps_ingest.ingest(path, workers=workers)
+        single = single or s.seconds
+        print(f"bulk, {workers:>2} proc: {s.bytes / 1e6:8.1f} MB in {s.seconds:6.2f} s = "
+              f"{s.bytes / 1e6 / s.seconds:7.1f} MB/s ({single / s.seconds:.2f}x), "
+              f"{len(fixes)} fixes, {s.bad_checksum} bad checksums")
+    print(f"({os.cpu_count()} CPUs here)")
+
+    sample = os.path.join(tmp, "sample.log")
+    with open(path, "rb") as src, open(sample, "wb") as dst:
+        dst.write(src.read(4 << 20))
+    start = time.perf_counter()
+    reference, _ = nmea.read_log(sample)
+    scalar = time.perf_counter() - start
+    problems += [f"sample: {p}" for p in compare(gps_ingest.ingest(sample)[0], reference)]
+    print(f"read_log:  {4 * 1.048576:8.1f} MB in {scalar:6.2f} s = {4 * 1.048576 / scalar:7.1f} MB/s")
+
+    archive_path = os.path.join(tmp, "capture.hba")
+    rows = gps_ingest.to_archive(fixes, archive_path)
+    archive = Archive(archive_path)
+    if len(archive) != rows or rows != np.count_nonzero(~np.isnan(fixes["lat"])):
+        problems.append(f"archive holds {len(archive)} rows, wrote {rows}")
+    print(f"archive:   {rows} rows, {archive.duration:.1f} s of telemetry")
+    if not args.out:
+        os.remove(path)
+
+    if problems:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Check request/reply matching on a hub link (interface/shards.py HubLink).
+
+1. Lost reply: the hub never answers one command. That request times out,
+   and every later request must still get its own reply (replies used to be
+   matched by arrival order, so one lost reply shifted all the rest).
+2. Late reply: a reply that comes after its request timed out is counted
+   and dropped, not handed to the next request.
+3. Frames: with the hub answering each line --rtt late, a Controller playing
+   a cue on all rows must get each frame's commands to the hub within
+   FRAME_SKEW of each other (one write per hub), not one round trip apart.
+
+Usage: python hub_link_test.py [--rows 5] [--rtt 0.05]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from controller import CUES, PIN_FRONT, Controller  # noqa: E402
+from hub_sim import HubSimulator  # noqa: E402
+from metrics import Registry  # noqa: E402
+from shards import HubLink, HubShard  # noqa: E402
+
+FRAME_SKEW = 0.01   # s between the first and last command of one frame at the hub
+
+
+class SlowHub(HubSimulator):
+    """A hub that answers `rtt` late and never answers the lines in `drop`."""
+
+    def __init__(self, rtt: float = 0.0, **kw):
+        super().__init__(port=0, **kw)
+        self.rtt = rtt
+        self.drop = set()
+
+    def reply(self, client, line, tag=""):
+        if line in self.drop:
+            return
+        if self.rtt <= 0:
+            super().reply(client, line, tag)
+            return
+        timer = threading.Timer(self.rtt, self._late_reply, args=(client, line, tag))
+        timer.daemon = True
+        timer.start()
+
+    def _late_reply(self, client, line, tag):
+        try:
+            with self._lock:
+                super().reply(client, line, tag)
+        except OSError:
+            pass
+
+
+def open_link(hub: HubSimulator):
+    link = HubLink(HubShard("sim", hub.host, hub.port), Registry())
+    link.connect()
+    stop = threading.Event()
+    link.start_reader(stop, lambda _link, _line: None)
+    return link, stop
+
+
+def check_lost_reply(check):
+    hub = SlowHub().start()
+    hub.drop.add("1;18:1")
+    link, stop = open_link(hub)
+    try:
+        check(link.request("1;18:1", timeout=0.2) is None, "lost reply: its request times out")
+        time_reply = link.request("TIME", timeout=0.5)
+        ok_reply = link.request("2;18:1", timeout=0.5)
+        check((time_reply or "").startswith("TIME:") and (ok_reply or "").startswith("OK:"),
+              f"lost reply: later requests get their own replies ({time_reply!r}, {ok_reply!r})")
+    finally:
+        stop.set()
+        link.close()
+        hub.stop()
+
+
+def check_late_reply(check):
+    hub = SlowHub(rtt=0.3).start()
+    link, stop = open_link(hub)
+    try:
+        check(link.request("1;18:1", timeout=0.1) is None, "late reply: its request times out")
+        time.sleep(0.4)
+        hub.rtt = 0.0
+        reply = link.request("TIME", timeout=0.5)
+        late = link.m_late.value
+        check((reply or "").startswith("TIME:") and late == 1,
+              f"late reply: counted and dropped ({late} late, next reply {reply!r})")
+    finally:
+        stop.set()
+        link.close()
+        hub.stop()
+
+
+def check_frames(check, rows: int, rtt: float):
+    hub = SlowHub(rtt=rtt).start()
+    ctl = Controller(rows=rows, session_dir=tempfile.mkdtemp(), hubs_config="")
+    ctl.start()
+    ctl.connect("127.0.0.1", hub.port)
+    give_up = time.monotonic() + 5
+    while not ctl.connected and time.monotonic() < give_up:
+        time.sleep(0.05)
+    if not ctl.connected:
+        ctl.close()
+        hub.stop()
+        raise SystemExit("Could not connect to the hub simulator")
+    try:
+        hub.received.clear()
+        ctl.run_cue("forward", range(1, rows + 1))
+        time.sleep(sum(delay for *_, delay in CUES["forward"][1]) + 4 * rtt + 0.5)
+        first = [t for t, line in hub.received if re.fullmatch(rf"\d+;{PIN_FRONT}:1", line)][:rows]
+    finally:
+        ctl.close()
+        hub.stop()
+    skew = first[-1] - first[0] if len(first) == rows else float("inf")
+    check(skew <= FRAME_SKEW, f"frame: {rows} rows reached the hub within {skew * 1e3:.1f} ms "
+                              f"at {rtt * 1e3:.0f} ms RTT (limit {FRAME_SKEW * 1e3:.0f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--rtt", type=float, default=0.05)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    check_lost_reply(check)
+    check_late_reply(check)
+    check_frames(check, args.rows, args.rtt)
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Check and time the IMU fusion reference model and gain sweep (interface/imu_fusion.py).
+
+Raw logs are simulated: a wearer facing a random heading nods and sways and
+turns 90 degrees every few seconds, the gyro has a bias and every sensor has
+noise, and each sample is written as a LOG_RAW line with its true getYaw()
+heading as the reference.
+
+1. Agreement: the vectorized Mahony and Madgwick (float64) must match a plain
+   one-setting port of Adafruit_AHRS's C code on every sample, including
+   samples without an accelerometer or magnetometer reading; float32 (the
+   firmware's precision) must stay within 0.1 deg of float64.
+2. Physics: a stiff Mahony (Kp 5) and Madgwick (beta 1) must settle on every
+   simulated log and then hold the true heading.
+3. Sweep: the grid is swept over --logs logs through the process pool (with
+   --workers) and in-process; both must give the same scores, and the best
+   setting must settle on every log. The time is compared with replaying the
+   settings one at a time. The firmware's default (Mahony Kp 0.5) is reported
+   with its rank: it pulls a large initial heading error in at only about a
+   degree per second.
+
+Usage: python imu_fusion_bench.py [--logs 3] [--seconds 60] [--workers 2] [--seed 1]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+import imu_fusion  # noqa: E402
+from imu_fusion import MADGWICK, MAHONY, Setting  # noqa: E402
+
+GRAVITY = 9.81
+FIELD_UT = 47.0             # Earth's field, dipping 60 deg below north
+DIP = math.radians(60)
+GYRO_BIAS = (0.004, -0.006, 0.012)  # rad/s
+HOLD_ERROR_DEG = 3.0        # RMS heading error once settled
+STIFF = (Setting(MAHONY, 5.0), Setting(MADGWICK, 1.0))
+
+
+# ----------------------- Simulated logs -----------------------
+def attitude(t, start, turns):
+    """(yaw, pitch, roll) in rad at times t: start heading, 90 deg turns at `turns`, nodding and swaying."""
+    yaw = np.full_like(t, start)
+    for when, sign in turns:
+        x = np.clip((t - when) / 2.0, 0, 1)
+        yaw = yaw + sign * math.pi / 2 * x * x * (3 - 2 * x)
+    pitch = math.radians(4) * np.sin(2 * math.pi * 0.3 * t)
+    roll = math.radians(3) * np.sin(2 * math.pi * 0.5 * t + 1)
+    return yaw, pitch, roll
+
+
+def simulate(path: str, seconds: float, rng: random.Random):
+    """Write a LOG_RAW capture (with serial chatter) and return its sample count."""
+    n = int(seconds * imu_fusion.FILTER_HZ)
+    t = np.arange(n) / imu_fusion.FILTER_HZ
+    start = rng.uniform(-math.pi, math.pi)
+    turns = [(when, rng.choice((-1, 1))) for when in np.arange(8.0, seconds - 3, rng.uniform(6, 10))]
+    yaw, pitch, roll = attitude(t, start, turns)
+    h = 1e-4
+    rates = [(a - b) / (2 * h) for a, b in zip(attitude(t + h, start, turns), attitude(t - h, start, turns))]
+    dyaw, dpitch, droll = rates
+
+    cy, sy, cp, sp, cr, sr = np.cos(yaw), np.sin(yaw), np.cos(pitch), np.sin(pitch), np.cos(roll), np.sin(roll)
+    # Body-to-earth R = Rz(yaw) Ry(pitch) Rx(roll); earth x north, z up
+    R = np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], -1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], -1),
+        np.stack([-sp, cp * sr, cp * cr], -1),
+    ], -2)
+    accel = R[:, 2, :] * GRAVITY                               # R^T (0, 0, g)
+    field = np.array([math.cos(DIP), 0.0, -math.sin(DIP)]) * FIELD_UT
+    mag = np.einsum("nij,i->nj", R, field)
+    gyro = np.stack([droll - dyaw * sp,
+                     dpitch * cr + dyaw * cp * sr,
+                     -dpitch * sr + dyaw * cp * cr], -1) + GYRO_BIAS
+
+    noise = np.random.default_rng(rng.randrange(1 << 30))
+    accel = accel + noise.normal(0, 0.05, accel.shape)
+    gyro = gyro + noise.normal(0, 0.002, gyro.shape)
+    mag = mag + noise.normal(0, 0.4, mag.shape)
+    reference = (np.degrees(yaw) + 180.0) % 360.0
+    with open(path, "w") as f:
+        f.write("ICM20948 Found!\n")
+        for i in range(n):
+            f.write(imu_fusion.format_raw(1000 + i * 10, accel[i], gyro[i], mag[i], reference[i]) + "\n")
+            if i % 100 == 0:
+                f.write("Yaw 123.45 Pitch 1.00 Roll 2.00\n")
+    return n
+
+
+# ----------------------- Adafruit_AHRS, one setting -----------------------
+def mahony_port(log, kp, ki, rate):
+    twoKp, twoKi, inv = 2 * kp, 2 * ki, 1.0 / rate
+    q0, q1, q2, q3 = 1.0, 0.0, 0.0, 0.0
+    ifx = ify = ifz = 0.0
+    out = []
+    for (gx, gy, gz), (ax, ay, az), (mx, my, mz) in zip(log.gyro * imu_fusion.RAD_TO_DEG, log.accel, log.mag):
+        gx *= 0.0174533
+        gy *= 0.0174533
+        gz *= 0.0174533
+        if not (ax == 0.0 and ay == 0.0 and az == 0.0):
+            n = 1 / math.sqrt(ax * ax + ay * ay + az * az)
+            ax *= n
+            ay *= n
+            az *= n
+            halfvx = q1 * q3 - q0 * q2
+            halfvy = q0 * q1 + q2 * q3
+            halfvz = q0 * q0 - 0.5 + q3 * q3
+            halfex = (ay * halfvz - az * halfvy)
+            halfey = (az * halfvx - ax * halfvz)
+            halfez = (ax * halfvy - ay * halfvx)
+            if not (mx == 0.0 and my == 0.0 and mz == 0.0):
+                n = 1 / math.sqrt(mx * mx + my * my + mz * mz)
+                mx *= n
+                my *= n
+                mz *= n
+                hx = 2.0 * (mx * (0.5 - q2 * q2 - q3 * q3) + my * (q1 * q2 - q0 * q3) + mz * (q1 * q3 + q0 * q2))
+                hy = 2.0 * (mx * (q1 * q2 + q0 * q3) + my * (0.5 - q1 * q1 - q3 * q3) + mz * (q2 * q3 - q0 * q1))
+                bx = math.sqrt(hx * hx + hy * hy)
+                bz = 2.0 * (mx * (q1 * q3 - q0 * q2) + my * (q2 * q3 + q0 * q1) + mz * (0.5 - q1 * q1 - q2 * q2))
+                halfwx = bx * (0.5 - q2 * q2 - q3 * q3) + bz * (q1 * q3 - q0 * q2)
+                halfwy = bx * (q1 * q2 - q0 * q3) + bz * (q0 * q1 + q2 * q3)
+                halfwz = bx * (q0 * q2 + q1 * q3) + bz * (0.5 - q1 * q1 - q2 * q2)
+                halfex += (my * halfwz - mz * halfwy)
+                halfey += (mz * halfwx - mx * halfwz)
+                halfez += (mx * halfwy - my * halfwx)
+            if twoKi > 0.0:
+                ifx += twoKi * halfex * inv
+                ify += twoKi * halfey * inv
+                ifz += twoKi * halfez * inv
+                gx += ifx
+                gy += ify
+                gz += ifz
+            else:
+                ifx = ify = ifz = 0.0
+            gx += twoKp * halfex
+            gy += twoKp * halfey
+            gz += twoKp * halfez
+        gx *= 0.5 * inv
+        gy *= 0.5 * inv
+        gz *= 0.5 * inv
+        qa, qb, qc = q0, q1, q2
+        q0 += (-qb * gx - qc * gy - q3 * gz)
+        q1 += (qa * gx + qc * gz - q3 * gy)
+        q2 += (qa * gy - qb * gz + q3 * gx)
+        q3 += (qa * gz + qb * gy - qc * gx)
+        n = 1 / math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0, q1, q2, q3 = q0 * n, q1 * n, q2 * n, q3 * n
+        out.append(math.atan2(q1 * q2 + q0 * q3, 0.5 - q2 * q2 - q3 * q3) * 57.29578 + 180.0)
+    return np.array(out)
+
+
+def madgwick_port(log, beta, rate):
+    inv = 1.0 / rate
+    q0, q1, q2, q3 = 1.0, 0.0, 0.0, 0.0
+    out = []
+    for (gx, gy, gz), (ax, ay, az), (mx, my, mz) in zip(log.gyro * imu_fusion.RAD_TO_DEG, log.accel, log.mag):
+        gx *= 0.0174533
+        gy *= 0.0174533
+        gz *= 0.0174533
+        qDot1 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qDot2 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qDot3 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qDot4 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+        if not (ax == 0.0 and ay == 0.0 and az == 0.0):
+            n = 1 / math.sqrt(ax * ax + ay * ay + az * az)
+            ax *= n
+            ay *= n
+            az *= n
+            if not (mx == 0.0 and my == 0.0 and mz == 0.0):
+                n = 1 / math.sqrt(mx * mx + my * my + mz * mz)
+                mx *= n
+                my *= n
+                mz *= n
+                _2q0mx = 2.0 * q0 * mx
+                _2q0my = 2.0 * q0 * my
+                _2q0mz = 2.0 * q0 * mz
+                _2q1mx = 2.0 * q1 * mx
+                _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+                _2q0q2 = 2.0 * q0 * q2
+                _2q2q3 = 2.0 * q2 * q3
+                q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+                q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+                q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+                hx = (mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3
+                      - mx * q2q2 - mx * q3q3)
+                hy = (_2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2
+                      + _2q2 * mz * q3 - my * q3q3)
+                _2bx = math.sqrt(hx * hx + hy * hy)
+                _2bz = (-_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3
+                        - mz * q2q2 + mz * q3q3)
+                _4bx = 2.0 * _2bx
+                _4bz = 2.0 * _2bz
+                s0 = (-_2q2 * (2.0 * q1q3 - _2q0q2 - ax) + _2q1 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - _2bz * q2 * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (-_2bx * q3 + _2bz * q1) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + _2bx * q2 * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s1 = (_2q3 * (2.0 * q1q3 - _2q0q2 - ax) + _2q0 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - 4.0 * q1 * (1 - 2.0 * q1q1 - 2.0 * q2q2 - az)
+                      + _2bz * q3 * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (_2bx * q2 + _2bz * q0) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + (_2bx * q3 - _4bz * q1) * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s2 = (-_2q0 * (2.0 * q1q3 - _2q0q2 - ax) + _2q3 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - 4.0 * q2 * (1 - 2.0 * q1q1 - 2.0 * q2q2 - az)
+                      + (-_4bx * q2 - _2bz * q0) * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (_2bx * q1 + _2bz * q3) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + (_2bx * q0 - _4bz * q2) * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s3 = (_2q1 * (2.0 * q1q3 - _2q0q2 - ax) + _2q2 * (2.0 * q0q1 + _2q2q3 - ay)
+                      + (-_4bx * q3 + _2bz * q1) * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (-_2bx * q0 + _2bz * q2) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + _2bx * q1 * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+            else:
+                _2q0, _2q1, _2q2, _2q3 = 2.0 * q0, 2.0 * q1, 2.0 * q2, 2.0 * q3
+                _4q0, _4q1, _4q2 = 4.0 * q0, 4.0 * q1, 4.0 * q2
+                _8q1, _8q2 = 8.0 * q1, 8.0 * q2
+                q0q0, q1q1, q2q2, q3q3 = q0 * q0, q1 * q1, q2 * q2, q3 * q3
+                s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+                s1 = (_4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1
+                      + _8q1 * q2q2 + _4q1 * az)
+                s2 = (4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1
+                      + _8q2 * q2q2 + _4q2 * az)
+                s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+            n = 1 / math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            qDot1 -= beta * s0 * n
+            qDot2 -= beta * s1 * n
+            qDot3 -= beta * s2 * n
+            qDot4 -= beta * s3 * n
+        q0 += qDot1 * inv
+        q1 += qDot2 * inv
+        q2 += qDot3 * inv
+        q3 += qDot4 * inv
+        n = 1 / math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0, q1, q2, q3 = q0 * n, q1 * n, q2 * n, q3 * n
+        out.append(math.atan2(q1 * q2 + q0 * q3, 0.5 - q2 * q2 - q3 * q3) * 57.29578 + 180.0)
+    return np.array(out)
+
+
+def angle_diff(a, b):
+    return np.abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+def check_agreement(check, path):
+    full = imu_fusion.load_log(path)
+    n = 1500
+    log = full._replace(t=full.t[:n], accel=full.accel[:n].copy(), gyro=full.gyro[:n], mag=full.mag[:n].copy())
+    log.mag[200:210] = 0            # No magnetometer reading: updateIMU()
+    log.accel[300] = 0              # No accelerometer reading: gyro only
+    rate = imu_fusion.FILTER_HZ
+
+    mahony = [Setting(MAHONY, 0.5), Setting(MAHONY, 2.0, 0.05), Setting(MAHONY, 0.1, 0.2)]
+    madgwick = [Setting(MADGWICK, 0.1), Setting(MADGWICK, 0.5)]
+    for settings, port in ((mahony, lambda s: mahony_port(log, s.gain, s.ki, rate)),
+                           (madgwick, lambda s: madgwick_port(log, s.gain, rate))):
+        wide = imu_fusion.replay(log, settings, rate, np.float64)
+        narrow = imu_fusion.replay(log, settings, rate, np.float32)
+        for j, s in enumerate(settings):
+            worst = angle_diff(wide[:, j], port(s)).max()
+            check(worst < 1e-6, f"{s}: vectorized matches the Adafruit_AHRS port (max {worst:.1e} deg)")
+        worst = angle_diff(narrow, wide).max()
+        check(worst < 0.1, f"{settings[0].filter}: float32 within 0.1 deg of float64 (max {worst:.4f} deg)")
+
+
+def check_physics(check, paths):
+    for path in paths:
+        log = imu_fusion.load_log(path)
+        for s in STIFF:
+            rms, _p95, settle = (x[0] for x in imu_fusion.evaluate(imu_fusion.replay(log, [s]), log.reference, log.t))
+            check(math.isfinite(settle) and rms < HOLD_ERROR_DEG,
+                  f"{os.path.basename(path)}: {s} settles in {settle:.2f} s, then {rms:.2f} deg RMS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--logs", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    tmp = tempfile.mkdtemp()
+    paths = [os.path.join(tmp, f"imu{i}.log") for i in range(args.logs)]
+    samples = sum(simulate(p, args.seconds, rng) for p in paths)
+
+    check_agreement(check, paths[0])
+    check_physics(check, paths)
+
+    settings = imu_fusion.grid([0.1, 0.25, 0.5, 1.0, 2.0, 5.0], [0.0, 0.01, 0.05], [0.01, 0.033, 0.1, 0.3, 1.0])
+    start = time.perf_counter()
+    pooled = imu_fusion.sweep(paths, settings, workers=args.workers)
+    pooled_s = time.perf_counter() - start
+    start = time.perf_counter()
+    inline = imu_fusion.sweep(paths, settings, workers=1)
+    inline_s = time.perf_counter() - start
+    check(pooled == inline, f"sweep: {args.workers} workers and in-process give the same scores")
+    check(pooled[0].settled == args.logs, f"sweep: best setting ({pooled[0].setting}) settles on every log")
+
+    log = imu_fusion.load_log(paths[0])
+    start = time.perf_counter()
+    for s in settings[:3]:
+        imu_fusion.replay(log, [s])
+    single = (time.perf_counter() - start) / 3 * len(settings) * args.logs
+
+    for sc in pooled[:5]:
+        print(f"     {str(sc.setting):28} {sc.rms_deg:5.2f} deg RMS, settles in {sc.settle_s:5.2f} s")
+    default = next(sc for sc in pooled if sc.setting == imu_fusion.FIRMWARE)
+    print(f"     {str(default.setting):28} {default.rms_deg:5.2f} deg RMS, settles in {default.settle_s:5.2f} s"
+          f" (firmware default, rank {pooled.index(default) + 1})")
+    print(f"sweep: {len(settings)} settings x {args.logs} logs ({samples} samples): "
+          f"{pooled_s:.1f} s with {args.workers} workers, {inline_s:.1f} s in-process, "
+          f"~{single:.1f} s one setting at a time ({os.cpu_count()} CPUs)")
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Check the motor state table (interface/motor_state.py) against a HubSimulator.
+
+1. No-op writes: an E-stop with every motor known off sends nothing, and a
+   repeated "off" is skipped.
+2. Targeted E-stop: stopping mid-cue sends OFF only to motors that may be on.
+3. Acks: members that ack confirm their cells; a member that stops acking
+   falls back to UNKNOWN, and the full sweep re-sends "off" to its row.
+4. Stuck on: a motor left on past MAX_ON_SECONDS is turned off by the sweep.
+
+Sweep timings are shortened for the run.
+
+Usage: python motor_state_test.py
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+import controller  # noqa: E402
+from controller import PIN_FRONT, PIN_LEFT, Controller  # noqa: E402
+from hub_sim import SIM_COLS, HubSimulator  # noqa: E402
+from motor_state import UNKNOWN  # noqa: E402
+
+ROWS = 3
+SILENT_SEAT = (2, 3)    # Acks at first, then goes quiet
+COMMAND = re.compile(r"(\d+);(\d+):([01])")
+
+
+def pin_commands(hub):
+    return [line for _t, line in hub.received if COMMAND.match(line)]
+
+
+def main():
+    controller.MAX_ON_SECONDS = 1.0
+    controller.FULL_SWEEP_INTERVAL = 2.0
+    controller.SWEEP_TICK = 0.2
+
+    members = [(r, c) for r in range(1, ROWS + 1) for c in range(1, SIM_COLS + 1)]
+    hub = HubSimulator(port=0, members=members).start()
+    ctl = Controller(rows=ROWS, session_dir=tempfile.mkdtemp(), hubs_config="")
+    ctl.start()
+    ctl.connect("127.0.0.1", hub.port)
+    give_up = time.monotonic() + 5
+    while not ctl.connected and time.monotonic() < give_up:
+        time.sleep(0.05)
+    if not ctl.connected:
+        raise SystemExit("Could not connect to the hub simulator")
+    table = ctl.motor_state
+    rows = range(1, ROWS + 1)
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    try:
+        # Nothing is known after connecting: the first E-stop turns everything off
+        ctl.emergency_stop()
+        time.sleep(0.5)
+        check(table.counts()["unknown"] == 0 and table.counts()["on"] == 0, "estop from unknown: all known off")
+
+        # 1. No-op writes
+        hub.received.clear()
+        ctl.emergency_stop()
+        reply = ctl.send_command(f"1;{PIN_LEFT}:0")
+        time.sleep(0.3)
+        check(not pin_commands(hub), f"no-op: nothing sent (reply {reply!r})")
+
+        # 2. Targeted E-stop mid-cue (forward only uses the front motor)
+        ctl.run_cue("forward", rows).wait(0)
+        time.sleep(0.02)
+        hub.received.clear()
+        ctl.emergency_stop()
+        time.sleep(0.8)
+        sent = pin_commands(hub)
+        check(bool(sent) and all(f";{PIN_FRONT}:0" in line for line in sent),
+              f"estop mid-cue: only front motors stopped ({len(sent)} commands)")
+        check(table.counts()["on"] == 0, "estop mid-cue: table shows every motor off")
+
+        # 3. Acks
+        hub.members.discard(SILENT_SEAT)
+        ctl.send_command(f"1;{PIN_LEFT}:1")
+        ctl.send_command(f"1;{PIN_LEFT}:0")
+        ctl.send_command(f"2;{PIN_LEFT}:1")
+        ctl.send_command(f"2;{PIN_LEFT}:0")
+        time.sleep(1.2)     # Ack timeout and retries for the silent seat
+        p = table.pins.index(PIN_LEFT)
+        check(bool(table.acked[0, :, p].all()), "acks: row 1 confirmed off")
+        r, c = SILENT_SEAT
+        check(table.state[r - 1, c - 1, p] == UNKNOWN, "acks: member that went quiet is UNKNOWN")
+        hub.received.clear()
+        time.sleep(controller.FULL_SWEEP_INTERVAL + 0.5)
+        swept = pin_commands(hub)
+        check(f"{r};{PIN_LEFT}:0" in swept, f"sweep: re-sent off to row {r}")
+        check(not any(line.startswith("1;") for line in swept), "sweep: left confirmed rows alone")
+
+        # 4. Stuck on
+        ctl.send_command(f"3;{PIN_FRONT}:1")
+        hub.received.clear()
+        time.sleep(controller.MAX_ON_SECONDS + 2 * controller.SWEEP_TICK + 0.3)
+        check(f"3;{PIN_FRONT}:0" in pin_commands(hub), "stuck on: sweep turned it off")
+        check(table.counts()["on"] == 0, "stuck on: nothing on")
+    finally:
+        ctl.close()
+        hub.stop()
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
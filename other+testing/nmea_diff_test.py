@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Differential test of the firmware NMEA tokenizer against interface/nmea.py.
+
+1. Compiles current/gps/nmea_parse.h into a small host program and feeds it
+   every sentence of nmea_corpus.txt plus seeded mutations of them (flipped
+   characters with and without a fixed-up checksum, dropped characters,
+   truncations). Both parsers must return the same result code, and the same
+   fix down to the last bit of every double.
+2. Spot checks of the Python parser on known sentences, and that frames()
+   recovers the corpus from a CRLF byte stream, so this part still runs where
+   there is no C compiler.
+
+Usage: python nmea_diff_test.py [--mutations 20] [--seed 1] [--cc gcc]
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "interface"))
+
+import nmea  # noqa: E402
+
+CORPUS = os.path.join(HERE, "nmea_corpus.txt")
+HEADER_DIR = os.path.join(HERE, "..", "current", "gps")
+
+HARNESS = r"""
+#include <stdio.h>
+#include "nmea_parse.h"
+
+int main(void) {
+  char line[1024];
+  while (fgets(line, sizeof line, stdin)) {
+    line[strcspn(line, "\r\n")] = '\0';
+    NmeaFix fix;
+    int rc = nmeaParse(line, &fix);
+    if (rc != NMEA_OK) { printf("%d\n", rc); continue; }
+    printf("%d %s", rc, fix.type == NMEA_GGA ? "GGA" : "RMC");
+    if (fix.hasPosition) printf(" %.17g %.17g", fix.lat, fix.lon); else printf(" - -");
+    if (fix.hasQuality) printf(" %d", fix.quality); else printf(" -");
+    if (fix.hasCourse) printf(" %.17g\n", fix.course); else printf(" -\n");
+  }
+  return 0;
+}
+"""
+
+MUTATION_CHARS = ",.*$0123456789ABCDEFNSEWAV-x "
+
+
+def describe(sentence: str) -> str:
+    """parse() formatted like the C harness prints nmeaParse()."""
+    rc, fix = nmea.parse(sentence)
+    if rc != nmea.OK:
+        return str(rc)
+    position = "- -" if fix.lat is None else f"{fix.lat:.17g} {fix.lon:.17g}"
+    quality = "-" if fix.quality is None else str(fix.quality)
+    course = "-" if fix.course is None else f"{fix.course:.17g}"
+    return f"{rc} {fix.type} {position} {quality} {course}"
+
+
+def load_corpus() -> list:
+    with open(CORPUS, "rb") as f:
+        lines = [line.rstrip(b"\r\n").decode("latin-1") for line in f]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def mutate(sentence: str, rng: random.Random) -> str:
+    body = sentence[1:].partition("*")[0]
+    kind = rng.randrange(4)
+    if kind == 3 or not body:
+        return sentence[:rng.randrange(len(sentence) + 1)]
+    i = rng.randrange(len(body))
+    if kind == 2:
+        body = body[:i] + body[i + 1:]
+    else:
+        body = body[:i] + rng.choice(MUTATION_CHARS) + body[i + 1:]
+    if kind == 0 or "*" in body or "$" in body:
+        return "$" + body + sentence[len(sentence) - 3:]       # Keep the original "*hh"
+    return f"${body}*{nmea.checksum(body):02X}"
+
+
+def run_harness(cc: str, sentences: list) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "harness.c")
+        binary = os.path.join(tmp, "harness")
+        with open(source, "w") as f:
+            f.write(HARNESS)
+        subprocess.run([cc, "-std=c99", "-O2", "-Wall", "-Wextra", "-Werror", "-I", HEADER_DIR,
+                        source, "-o", binary], check=True)
+        out = subprocess.run([binary], input="\n".join(sentences) + "\n", capture_output=True,
+                             text=True, encoding="latin-1", check=True).stdout
+    return out.splitlines()
+
+
+def spot_checks() -> list:
+    problems = []
+
+    def expect(sentence, rc, **fields):
+        got_rc, fix = nmea.parse(sentence)
+        if got_rc != rc or any(getattr(fix, k) != v for k, v in fields.items()):
+            problems.append(f"{sentence!r}: got {got_rc} {fix}, expected {rc} {fields}")
+
+    expect("$GPGGA,120000.00,3351.5212,S,15112.6745,E,1,08,1.10,42.1,M,21.3,M,,*7B",
+           nmea.OK, type=nmea.GGA, lat=-(33 + 51.5212 / 60), lon=151 + 12.6745 / 60, quality=1)
+    expect("$GNRMC,143210.00,A,3518.4530780,N,08044.0127660,W,2.721,361.0,181026,,,R,V*3E",
+           nmea.OK, type=nmea.RMC, lat=35 + 18.453078 / 60, lon=-(80 + 44.012766 / 60), course=None)
+    expect("$GNGGA,143210.00,,,,,0,00,99.99,,,,,,*7D", nmea.OK, lat=None, quality=0)
+    expect("$GNRMC,143210.00,V,,,,,,,181026,,,N,V*10", nmea.OK, type=nmea.RMC, lat=None)
+    expect("$GNGLL,3518.4530780,N,08044.0127660,W,143210.00,A,R*7D", nmea.IGNORED)
+    expect("$GNGGA,143210.00,,,,,0,00,99.99,,,,,,*7E", nmea.ERR_CHECKSUM)
+    expect("$GNGGA,143210.00,,,,,0,00,99.99,,,,,,", nmea.ERR_FRAME)
+
+    corpus = load_corpus()
+    # A UBX fragment before the first '$' is dropped; a '$' mid-line restarts the buffer
+    stream = b"\xb5\x62\x01\x07junk" + b"".join(line.encode("latin-1") + b"\r\n" for line in corpus)
+    framed = list(nmea.frames([stream[i:i + 37] for i in range(0, len(stream), 37)]))
+    expected = [line[max(line.rfind("$"), 0):][:nmea.BUF_SIZE - 1] for line in corpus]
+    expected = [line for line in expected if len(line) > 5]
+    if framed != expected:
+        problems.append(f"frames(): {len(framed)} lines from the byte stream, expected {len(expected)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--mutations", type=int, default=20, help="Mutations per corpus sentence")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cc", default=os.environ.get("CC", "cc"), help="Host C compiler")
+    args = parser.parse_args()
+
+    failed = False
+    problems = spot_checks()
+    for problem in problems:
+        print(f"FAIL {problem}")
+    print(f"python: {len(problems)} spot-check problems")
+    failed |= bool(problems)
+
+    corpus = load_corpus()
+    rng = random.Random(args.seed)
+    sentences = corpus + [mutate(s, rng) for s in corpus if s.startswith("$") for _ in range(args.mutations)]
+    sentences = [s for s in sentences if "\0" not in s]
+
+    if shutil.which(args.cc) is None:
+        print(f"c: no compiler '{args.cc}', differential run skipped")
+    else:
+        c_out = run_harness(args.cc, sentences)
+        mismatches = [(s, c, describe(s)) for s, c in zip(sentences, c_out) if c != describe(s)]
+        if len(c_out) != len(sentences):
+            mismatches.append(("<harness>", f"{len(c_out)} lines", f"{len(sentences)} lines"))
+        for sentence, c, py in mismatches[:20]:
+            print(f"FAIL {sentence!r}\n     c:  {c}\n     py: {py}")
+        results = {}
+        for line in c_out:
+            results[line.split()[0]] = results.get(line.split()[0], 0) + 1
+        print(f"c vs python: {len(sentences)} sentences ({len(corpus)} corpus, "
+              f"{len(sentences) - len(corpus)} mutated), results {results}, {len(mismatches)} mismatches")
+        failed |= bool(mismatches)
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Edit and lookup latency of the pattern store and index (interface/patterns.py,
+interface/pattern_index.py) on a large library.
+
+Builds a library of --patterns random patterns, then times single-pattern
+edits through PatternStore (cached JSON fragments + atomic rename) against the
+old approach of json.dump()-ing the whole library on every save. Also checks
+that the file PatternStore writes is byte-for-byte what json.dump(indent=2)
+writes, and that it reloads to the same library. Then it times the lookups
+the builder makes: near-duplicate check on save, tag+prefix search, and the
+most distinct unused pattern. Finally it checks that an add, change and delete
+whose save fails (OSError) leave the store as it was.
+
+Usage: python pattern_store_bench.py [--patterns 5000] [--edits 200]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from patterns import PatternStore, pattern_code  # noqa: E402
+from pattern_index import PatternIndex  # noqa: E402
+
+MOTORS = [5, 18, 19, 23]
+WORDS = ["turn", "halt", "mark time", "slide", "pinwheel", "flank"]
+TAGS = ["drill", "warmup", "left", "right", "stop"]
+
+
+def random_pattern(rng, name):
+    return {
+        "name": name,
+        "motors": rng.sample(MOTORS, rng.randint(1, 4)),
+        "buzz_length_ms": rng.randrange(50, 500),
+        "two_buzz": rng.random() < 0.5,
+        "tags": rng.sample(TAGS, rng.randint(0, 2)),
+    }
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def failed_saves_roll_back(rng, tmp) -> bool:
+    """put/delete on a store whose file can't be written must raise and change nothing."""
+    store = PatternStore(os.path.join(tmp, "missing", "haptic_patterns.json"))
+    store.put(random_pattern(rng, "kept"), save=False)
+    before = (store.to_json(), store.names())
+    rolled_back = True
+    for change in (lambda: store.put(random_pattern(rng, "added")),
+                   lambda: store.put(random_pattern(rng, "kept")),
+                   lambda: store.delete("kept")):
+        try:
+            change()
+            rolled_back = False
+        except OSError:
+            pass
+        rolled_back = rolled_back and (store.to_json(), store.names()) == before
+    return rolled_back
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patterns", type=int, default=5000)
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PatternStore(os.path.join(tmp, "haptic_patterns.json"))
+        index = PatternIndex(store)
+        names = [f"{rng.choice(WORDS)} {k:05d}" for k in range(args.patterns)]
+        for name in names:
+            store.put(random_pattern(rng, name), save=False)
+        store.save()
+
+        edits = [random_pattern(rng, rng.choice(names)) for _ in range(args.edits)]
+
+        start = time.perf_counter()
+        for pattern in edits:
+            store.put(pattern)
+            pattern_code(pattern)
+        incremental = (time.perf_counter() - start) / len(edits)
+
+        library = {name: store.get(name) for name in store.names()}
+        start = time.perf_counter()
+        for pattern in edits:
+            library[pattern["name"]] = pattern
+            with open(os.path.join(tmp, "full.json"), "w") as f:
+                json.dump(library, f, indent=2)
+            "".join(pattern_code(p) for _, p in sorted(library.items()))
+        full = (time.perf_counter() - start) / len(edits)
+
+        with open(store.path) as f:
+            same_bytes = f.read() == json.dumps(library, indent=2)
+        reloaded = PatternStore(store.path)
+        reloaded.load()
+        same_library = {name: reloaded.get(name) for name in reloaded.names()} == library
+
+        duplicates, t_duplicates = timed(lambda: index.near_duplicates(edits[0], exclude=edits[0]["name"]))
+        found, t_search = timed(lambda: index.search("#drill mark"))
+        (suggestion, similarity, closest), t_suggest = timed(index.suggest_distinct, repeat=5)
+        rolled_back = failed_saves_roll_back(rng, tmp)
+
+    print(f"{args.patterns} patterns, {args.edits} edits")
+    print(f"  store save + codegen of the edited pattern: {incremental * 1e3:7.2f} ms/edit")
+    print(f"  full rewrite + full codegen:               {full * 1e3:7.2f} ms/edit")
+    print(f"  file matches json.dump: {same_bytes}, reload matches: {same_library}")
+    print(f"  failed saves leave the store unchanged: {rolled_back}")
+    print(f"  near-duplicate check: {t_duplicates * 1e3:7.2f} ms ({len(duplicates)} found)")
+    print(f"  search '#drill mark': {t_search * 1e3:7.2f} ms ({len(found)} found)")
+    print(f"  suggest distinct:     {t_suggest * 1e3:7.2f} ms (motors {suggestion['motors']}, "
+          f"{suggestion['buzz_length_ms']} ms, {similarity:.0%} like '{closest}')")
+    if not (same_bytes and same_library and rolled_back):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
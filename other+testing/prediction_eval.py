@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation of latency-compensated GPS targets.
+
+Replays the hub telemetry of recorded sessions (interface/sessions/*.hbs)
+through the pose filter. At every sample it compares where each method says
+the hub will be `latency` seconds later with where the hub actually was then
+(raw GPS, interpolated):
+
+    raw        the sample as-is (the old relay behaviour)
+    filtered   Kalman-filtered pose, no extrapolation
+    cv         filtered + constant-velocity prediction
+    ctrv       filtered + constant turn rate and velocity prediction
+
+Usage:
+    python prediction_eval.py SESSION.hbs [...] [--latency 0.1,0.25,0.5]
+    python prediction_eval.py --synthetic demo.hbs    # write a marching demo session first
+"""
+import argparse
+import bisect
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from pose_filter import EARTH_RADIUS_M, PoseFilter, extrapolate, is_telemetry, parse_telemetry  # noqa: E402
+from session_log import RX, SessionReader, SessionRecorder  # noqa: E402
+
+FEET_PER_METER = 3.28084
+WARMUP_SAMPLES = 20
+METHODS = ("raw", "filtered", "cv", "ctrv")
+
+
+def load_track(path):
+    """[(t, lat, lon, heading, fix)] for every telemetry line in a session."""
+    track = []
+    for t, kind, text in SessionReader(path).records():
+        if kind != RX or not is_telemetry(text):
+            continue
+        try:
+            s = parse_telemetry(text)
+        except ValueError:
+            continue
+        track.append((t, s.lat, s.lon, s.heading, s.fix))
+    return track
+
+
+def distance_ft(lat1, lon1, lat2, lon2):
+    north = math.radians(lat2 - lat1) * EARTH_RADIUS_M
+    east = math.radians(lon2 - lon1) * EARTH_RADIUS_M * math.cos(math.radians(lat1))
+    return math.hypot(east, north) * FEET_PER_METER
+
+
+def truth_at(track, times, t):
+    """Raw position linearly interpolated at time t (None past the end)."""
+    i = bisect.bisect_left(times, t)
+    if i == 0 or i >= len(track):
+        return None
+    t0, lat0, lon0 = track[i - 1][:3]
+    t1, lat1, lon1 = track[i][:3]
+    a = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+    return lat0 + a * (lat1 - lat0), lon0 + a * (lon1 - lon0)
+
+
+def evaluate(track, latency):
+    """Errors (ft) per method for one lead time."""
+    times = [s[0] for s in track]
+    f = PoseFilter()
+    errors = {m: [] for m in METHODS}
+    for k, (t, lat, lon, heading, fix) in enumerate(track):
+        f.update(lat, lon, heading, fix, t=t)
+        if k < WARMUP_SAMPLES:
+            continue
+        truth = truth_at(track, times, t + latency)
+        if truth is None:
+            break
+        now = f.predict(t)
+        cv = f.predict(t + latency)
+        ctrv = extrapolate(now, t + latency)
+        for method, (plat, plon) in (("raw", (lat, lon)), ("filtered", now[:2]),
+                                     ("cv", cv[:2]), ("ctrv", ctrv[:2])):
+            errors[method].append(distance_ft(truth[0], truth[1], plat, plon))
+    return errors
+
+
+def write_synthetic(path, seconds=120.0, rate=10.0, seed=1):
+    """A block marching at 1.4 m/s with 90 degree turns every 15 s, RTK-float noise."""
+    rng = random.Random(seed)
+    lat0, lon0 = 35.303276, -120.664299
+    rec = SessionRecorder(path)
+    base = time.monotonic()
+    east = north = 0.0
+    course = 0.0
+    dt = 1.0 / rate
+    for k in range(int(seconds * rate)):
+        t = k * dt
+        phase = t % 15.0
+        turn_rate = 90.0 / 4.0 if phase < 4.0 else 0.0     # 4 s turns
+        speed = 0.0 if 10.0 <= phase < 11.0 else 1.4       # brief halt each leg
+        course = (course + turn_rate * dt) % 360.0
+        east += speed * math.sin(math.radians(course)) * dt
+        north += speed * math.cos(math.radians(course)) * dt
+        lat = lat0 + math.degrees((north + rng.gauss(0, 0.3)) / EARTH_RADIUS_M)
+        lon = lon0 + math.degrees((east + rng.gauss(0, 0.3)) / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+        heading = int(course + rng.gauss(0, 1.0)) % 360
+        rec.record(RX, f"GPS:{lat:.7f},{lon:.7f}|IMU:{heading}|FIX:5", t=base + t)
+    rec.close()
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate target prediction against recorded sessions")
+    parser.add_argument("sessions", nargs="*")
+    parser.add_argument("--latency", default="0.1,0.25,0.5", help="Comma-separated lead times (s)")
+    parser.add_argument("--synthetic", help="Write a synthetic marching session to this path and evaluate it")
+    args = parser.parse_args()
+
+    sessions = list(args.sessions)
+    if args.synthetic:
+        write_synthetic(args.synthetic)
+        sessions.append(args.synthetic)
+    if not sessions:
+        parser.error("no sessions given")
+
+    latencies = [float(x) for x in args.latency.split(",")]
+    for path in sessions:
+        track = load_track(path)
+        print(f"\n{os.path.basename(path)}: {len(track)} telemetry samples")
+        if len(track) <= WARMUP_SAMPLES:
+            print("  not enough telemetry")
+            continue
+        print(f"  {'lead':>6}  " + "  ".join(f"{m:>17}" for m in METHODS))
+        for latency in latencies:
+            errors = evaluate(track, latency)
+            cells = [f"{sum(e) / len(e):6.2f} / {pct(e, 0.95):6.2f}" if e else f"{'-':>17}"
+                     for e in (errors[m] for m in METHODS)]
+            print(f"  {latency:5.2f}s  " + "  ".join(cells))
+    print("\n  (mean / p95 position error in feet)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Check the sequence run queue (interface/sequencer.py) against a HubSimulator.
+
+1. Enqueue: three quick presses of the same cue play as three clean cues, one
+   after the other, never interleaved.
+2. Replace: a cue pressed mid-sequence cuts the first one off, and every motor
+   the first one had switched on is turned off.
+3. Drop: a cue pressed while another plays is refused.
+4. Burst: 50 presses in a row start no more than one worker thread.
+5. E-stop mid-sequence: nothing switches a motor on after the all-off.
+
+Usage: python sequencer_test.py [--rows 5]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from controller import CUES, Controller  # noqa: E402
+from hub_sim import SIM_COLS, HubSimulator  # noqa: E402
+from sequencer import CANCELLED, DROP, ENQUEUE, FINISHED, REJECTED, REPLACE  # noqa: E402
+from timeline import length  # noqa: E402
+
+COMMAND = re.compile(r"(\d+);(\d+):([01])")
+TOLERANCE = 0.05
+
+
+def commands(hub):
+    """(time, row, pin, state) of every pin command the hub has received."""
+    out = []
+    for t, line in hub.received:
+        m = COMMAND.match(line)
+        if m:
+            out.append((t, int(m.group(1)), int(m.group(2)), int(m.group(3))))
+    return out
+
+
+def motors_left_on(received):
+    on = set()
+    for _t, row, pin, state in received:
+        (on.add if state else on.discard)((row, pin))
+    return on
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5)
+    args = parser.parse_args()
+    rows = range(1, args.rows + 1)
+
+    hub = HubSimulator(port=0, members=[(r, c) for r in rows for c in range(1, SIM_COLS + 1)]).start()
+    ctl = Controller(rows=args.rows, session_dir=tempfile.mkdtemp(), hubs_config="")
+    ctl.start()
+    ctl.connect("127.0.0.1", hub.port)
+    give_up = time.monotonic() + 5
+    while not ctl.connected and time.monotonic() < give_up:
+        time.sleep(0.05)
+    if not ctl.connected:
+        raise SystemExit("Could not connect to the hub simulator")
+
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    forward = CUES["forward"][1]
+    try:
+        # 1. Enqueue
+        hub.received.clear()
+        runs = [ctl.run_cue("forward", rows, ENQUEUE) for _ in range(3)]
+        for run in runs:
+            run.wait(5)
+        received = commands(hub)
+        per_row = {row: [(pin, state) for _t, r, pin, state in received if r == row] for row in rows}
+        expected = [(pin, state) for pin, state, _delay in forward] * 3
+        check(all(played == expected for played in per_row.values()), "enqueue: every row plays 3 clean cues in order")
+        span = received[-1][0] - received[0][0]
+        check(abs(span - 3 * length(forward)) < 3 * TOLERANCE,
+              f"enqueue: back to back, {span * 1e3:.0f} ms for 3 x {length(forward) * 1e3:.0f} ms")
+        check([r.outcome for r in runs] == [FINISHED] * 3, "enqueue: all three finished")
+
+        # 2. Replace
+        hub.received.clear()
+        first = ctl.run_cue("start_march", rows, ENQUEUE)
+        time.sleep(0.03)                                    # Left and right are on now
+        second = ctl.run_cue("back", rows, REPLACE)
+        first.wait(5)
+        second.wait(5)
+        check(first.outcome == CANCELLED and second.outcome == FINISHED, "replace: first cancelled, second finished")
+        check(not motors_left_on(commands(hub)), "replace: no motor left on")
+
+        # 3. Drop
+        playing = ctl.run_cue("forward", rows, ENQUEUE)
+        dropped = ctl.run_cue("left", rows, DROP)
+        playing.wait(5)
+        check(dropped.outcome == REJECTED and playing.outcome == FINISHED, "drop: refused while busy")
+
+        # 4. Burst
+        ctl.sequencer.wait_idle(5)
+        baseline = threading.active_count()
+        peak = baseline
+        burst = []
+        for _ in range(50):
+            burst.append(ctl.run_cue("forward", rows, REPLACE))
+            peak = max(peak, threading.active_count())
+        burst[-1].wait(5)
+        check(peak <= baseline + 1, f"burst: threads {baseline} -> peak {peak}")
+        check(burst[-1].outcome == FINISHED, "burst: the last press plays")
+
+        # 5. E-stop
+        hub.received.clear()
+        ctl.run_cue("start_march", rows, ENQUEUE)
+        ctl.run_cue("forward", rows, ENQUEUE)
+        time.sleep(0.12)
+        ctl.emergency_stop()
+        time.sleep(0.8)
+        received = commands(hub)
+        last_on = max((t for t, _r, _p, state in received if state), default=0.0)
+        offs = [t for t, _r, _p, state in received if not state]
+        check(bool(offs) and last_on < offs[-1], "estop: no motor switched on after the all-off")
+        check(not motors_left_on(received), "estop: every motor off")
+    finally:
+        ctl.close()
+        hub.stop()
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Start-up time of the two operator apps (interface/main.py, interface/language.py).
+
+For each app, two numbers are measured in fresh interpreters:
+  - import cost, from `python -X importtime`: the total and the top-level
+    modules that cost the most, and whether NumPy is among them (only the
+    controller needs it, and main.py builds one only when it is not attached
+    to the haptiband daemon);
+  - cold start to interactive: the time from spawning the process to the
+    moment the app enters its Tk main loop with the first frame drawn.
+    Work the app defers to after that point (library load, hidden tabs,
+    code generation) is not included. This needs a display; without one only
+    import cost is reported.
+
+The first run of each app is reported on its own, because it is the one that
+pays for a cold disk cache on the field laptop. Later runs are reported as a
+median.
+
+Usage: python startup_bench.py [--runs 5] [--top 8] [--app main|language]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+INTERFACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface")
+APPS = {"main": "main.py", "language": "language.py"}
+
+# Runs an app with Tk's main loop replaced by "draw the first frame, report, exit"
+DRIVER = r"""
+import os, runpy, sys, time, tkinter as tk
+
+def probe(self, n=0):
+    self.update()
+    print(f"INTERACTIVE {time.monotonic()!r}", flush=True)
+    os._exit(0)
+
+tk.Misc.mainloop = probe
+sys.argv = [sys.argv[1]]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def import_times(script: str, top: int):
+    """(total seconds, [(seconds, module), ...], loads NumPy) of the imports a script makes."""
+    # Run the script itself: it fails at tk.Tk() without a display, after its imports
+    proc = subprocess.run([sys.executable, "-X", "importtime", script], cwd=INTERFACE,
+                          capture_output=True, text=True, timeout=120,
+                          env={**os.environ, "DISPLAY": os.environ.get("DISPLAY", "")})
+    total = 0
+    roots = []
+    numpy = False
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        numpy = numpy or name.strip() == "numpy"
+        if not name[1:].startswith(" "):  # Imported by the script itself
+            roots.append((int(cumulative_us) / 1e6, name.strip()))
+    roots.sort(reverse=True)
+    return total / 1e6, roots[:top], numpy
+
+
+def time_to_interactive(script: str):
+    """Seconds from spawn to the first frame in the main loop, or None without a display."""
+    start = time.monotonic()
+    proc = subprocess.run([sys.executable, "-c", DRIVER, script], cwd=INTERFACE,
+                          capture_output=True, text=True, timeout=120)
+    for line in proc.stdout.splitlines():
+        if line.startswith("INTERACTIVE "):
+            return float(line.split()[1]) - start
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--app", choices=sorted(APPS), action="append")
+    args = parser.parse_args()
+
+    for app in args.app or sorted(APPS):
+        script = APPS[app]
+        print(f"{script}")
+
+        runs = [import_times(script, args.top) for _ in range(args.runs)]
+        total, roots, numpy = runs[0]
+        print(f"  imports, first run: {total * 1e3:7.1f} ms")
+        print(f"  imports, median:    {statistics.median(t for t, _, _ in runs) * 1e3:7.1f} ms")
+        print(f"  loads NumPy: {'yes' if numpy else 'no'}")
+        for seconds, name in roots:
+            print(f"    {seconds * 1e3:7.1f} ms  {name}")
+
+        starts = [time_to_interactive(script) for _ in range(args.runs)]
+        if starts[0] is None:
+            print("  start to interactive: no display, skipped")
+            continue
+        print(f"  start to interactive, first run: {starts[0] * 1e3:7.1f} ms")
+        print(f"  start to interactive, median:    {statistics.median(starts) * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Check the hub pose stream (hub.ino / hub_sim.py) and its ingest (interface/telemetry.py).
+
+1. Frames: format_pose_frame() and parse_telemetry() round-trip, a corrupted
+   frame fails its checksum, and frames without fix_us and legacy
+   "GPS:...|IMU:..." lines still parse.
+   A fix repeated over several frames (the stream outpacing the receiver) is
+   fused once: the controller's pose sigma must not shrink on the repeats.
+2. TelemetryStream on a synthetic stream: lost, repeated and restarted
+   sequences are counted, and after a stall the burst's sample times are
+   recovered from the hub stamps (to within the link's base delay).
+3. Live: a Controller connects to a HubSimulator whose clock is offset and
+   skewed, streaming at 20 Hz with a stall every --stall-every seconds. No frame
+   may be lost or dropped, the bursts must be seen, the telemetry age must be
+   measured, and the filtered pose must stay on the simulated walk.
+
+Usage: python telemetry_stream_test.py [--seconds 8] [--stall-every 2] [--stall 0.5] [--seed 1]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from controller import Controller  # noqa: E402
+from hub_sim import HubSimulator, sim_pose  # noqa: E402
+from nmea import checksum  # noqa: E402
+from pose_filter import EARTH_RADIUS_M, format_pose_frame, parse_telemetry  # noqa: E402
+from telemetry import TelemetryStream  # noqa: E402
+
+POSE_ERROR_LIMIT = 1.0     # m, filtered pose vs. the simulated walk
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    north = math.radians(lat2 - lat1) * EARTH_RADIUS_M
+    east = math.radians(lon2 - lon1) * EARTH_RADIUS_M * math.cos(math.radians(lat1))
+    return math.hypot(east, north)
+
+
+def check_frames(check):
+    frame = format_pose_frame(4711, 123456789012, 35.3032761, -120.6642993, 194.25, 4, 123456700000)
+    s = parse_telemetry(frame)
+    check((s.seq, s.hub_us, s.lat, s.lon, s.fix, s.fix_us)
+          == (4711, 123456789012, 35.3032761, -120.6642993, 4, 123456700000)
+          and abs(s.heading - 194.2) < 0.051, f"frame round trip: {frame}")
+    body = "HBP,7,1000,35.3032761,-120.6642993,194.2,4"
+    old = parse_telemetry(f"${body}*{checksum(body):02X}")
+    check(old.seq == 7 and old.fix_us == old.hub_us == 1000, "frame without fix_us")
+    corrupt = frame.replace("35.30", "35.31")
+    try:
+        parse_telemetry(corrupt)
+        check(False, "corrupted frame rejected")
+    except ValueError:
+        check(True, "corrupted frame rejected")
+    legacy = parse_telemetry("GPS:35.303276,-120.664299|IMU:194|FIX:4|T:1000")
+    check(legacy.seq is None and legacy.hub_us == 1000 and legacy.fix == 4, "legacy telemetry line")
+
+
+def check_repeated_fixes(check):
+    ctl = Controller(rows=1, session_dir=tempfile.mkdtemp(), hubs_config="")
+    lat, lon = 35.3032761, -120.6642993
+    hub_us = 5_000_000
+    sigmas = []
+    try:
+        for seq in range(1, 12):               # One fix, then ten frames repeating it at 20 Hz
+            ctl.handle_hub_line(format_pose_frame(seq, hub_us + (seq - 1) * 50_000, lat, lon, 90.0, 1, hub_us))
+            sigmas.append(ctl.pose_filter.predict(ctl.pose_filter.t).sigma)
+    finally:
+        ctl.close()
+    repeated = sum(s.repeated_fixes for s in ctl.telemetry.values())
+    check(repeated == 10 and min(sigmas[1:]) >= sigmas[0],
+          f"repeated fix fused once ({repeated} repeats, sigma {sigmas[0]:.2f} -> {sigmas[-1]:.2f} m)")
+
+
+def check_stream(check, rng):
+    period, base = 0.05, 0.004
+    stream = TelemetryStream()
+    errors = []
+    seq, hub_us = 0, 5_000_000
+    held = []
+    for i in range(200):
+        seq += 1
+        hub_us += int(period * 1e6)
+        true_t = 100.0 + i * period
+        if 60 <= i < 70:            # Stall: held, then released together
+            held.append((seq, hub_us, true_t))
+            continue
+        if i == 120:
+            seq += 3                # Three frames lost
+        for s, h, t in held + [(seq, hub_us, true_t)]:
+            now = true_t + base + rng.uniform(0, 0.003)
+            if stream.accept(s, h, now):
+                errors.append(abs(stream.sample_time(h, now) - (t + base)))
+        held = []
+    check(stream.lost == 3, f"lost frames counted ({stream.lost})")
+    check(stream.bursts == 1, f"one burst seen ({stream.bursts})")
+    check(max(errors) < 0.004, f"sample times recovered within {max(errors) * 1000:.1f} ms")
+    check(not stream.accept(seq, hub_us, 200.0) and stream.stale == 1, "repeated frame dropped")
+    check(stream.accept(1, 10_000, 200.1) and stream.restarts == 1, "hub restart accepted")
+
+
+def check_live(check, seconds, stall_every, stall, rng):
+    hub = HubSimulator(port=0, clock_offset=rng.uniform(-50, 50), clock_skew_ppm=rng.uniform(-30, 30)).start()
+    hub.stream_pose(20.0, stall_every, stall)
+    ctl = Controller(rows=1, session_dir=tempfile.mkdtemp(), hubs_config="")
+    ctl.start()
+    ctl.connect("127.0.0.1", hub.port)
+    give_up = time.monotonic() + 5
+    while not ctl.connected and time.monotonic() < give_up:
+        time.sleep(0.05)
+    if not ctl.connected:
+        raise SystemExit("Could not connect to the hub simulator")
+    errors = []
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            time.sleep(0.1)
+            pose = ctl.pose_filter.predict()
+            if pose is None:
+                continue
+            lat, lon, _heading = sim_pose(time.perf_counter() - hub.walk_start)
+            errors.append(distance_m(pose.lat, pose.lon, lat, lon))
+    finally:
+        ctl.close()
+        hub.stop()
+
+    streams = list(ctl.telemetry.values())
+    received = sum(s.received for s in streams)
+    lost = sum(s.lost for s in streams)
+    stale = sum(s.stale for s in streams)
+    bursts = sum(s.bursts for s in streams)
+    age = ctl.telemetry_age()
+    print(f"live: {received} frames at {hub.stream_hz:g} Hz (after RATE), {bursts} bursts, "
+          f"max sample age {max(s.max_age for s in streams) * 1000:.0f} ms, last {age * 1000:.1f} ms")
+    check(received > 0 and lost == 0 and stale == 0, f"live: no frames lost or dropped ({lost} lost, {stale} stale)")
+    check(bursts >= int(seconds / stall_every) - 1, f"live: stalls seen as bursts ({bursts})")
+    check(not math.isnan(age), "live: telemetry age measured")
+    late = errors[len(errors) // 4:]
+    check(bool(late) and max(late) < POSE_ERROR_LIMIT,
+          f"live: pose within {POSE_ERROR_LIMIT} m of the walk (max {max(late, default=math.nan):.2f} m)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--stall-every", type=float, default=2.0)
+    parser.add_argument("--stall", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    check_frames(check)
+    check_repeated_fixes(check)
+    check_stream(check, rng)
+    check_live(check, args.seconds, args.stall_every, args.stall, rng)
+
+    if failures:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
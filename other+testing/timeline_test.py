@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Check that multi-row cues play concurrently (interface/timeline.py).
+
+1. Plan: for every built-in cue on 1-5 rows, the merged timeline must last
+   exactly one pattern length, every frame must hold one command per row, and
+   each row must get the cue's own steps in order.
+2. Wall clock: a Controller plays every cue on all rows against a
+   HubSimulator; the span from the first to the last command the hub receives
+   must stay within TOLERANCE of one pattern length (it used to grow by one
+   pattern length per row).
+
+Usage: python timeline_test.py [--rows 5] [--repeats 3]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interface"))
+
+from controller import CUES, Controller  # noqa: E402
+from hub_sim import SIM_COLS, HubSimulator  # noqa: E402
+from timeline import length, merge_timelines, rows_timelines, to_sequence  # noqa: E402
+
+TOLERANCE = 0.03    # Send time of each frame's commands plus scheduler jitter (s)
+
+
+def check_plan(rows: int) -> list:
+    """Problems found in the merged timelines of every cue on 1..rows rows."""
+    problems = []
+    for name, (_label, steps) in CUES.items():
+        for n in range(1, rows + 1):
+            frames = merge_timelines(rows_timelines(steps, range(1, n + 1)))
+            span = frames[-1].at - frames[0].at
+            if abs(span - length(steps)) > 1e-9:
+                problems.append(f"{name} x{n}: lasts {span:.3f} s, pattern is {length(steps):.3f} s")
+            for frame in frames:
+                counts = {row: 0 for row in range(1, n + 1)}
+                for row, _pin, _state in frame.commands:
+                    counts[row] += 1
+                if len(set(counts.values())) != 1:
+                    problems.append(f"{name} x{n}: frame at {frame.at:.3f} s is uneven across rows")
+            sequence = to_sequence(frames)
+            for row in range(1, n + 1):
+                played = [(pin, state) for r, pin, state, _delay in sequence if r == row]
+                if played != [(pin, state) for pin, state, _delay in steps]:
+                    problems.append(f"{name} x{n}: row {row} plays its steps out of order")
+            if abs(sum(delay for *_, delay in sequence) - length(steps)) > 1e-9:
+                problems.append(f"{name} x{n}: sequence delays do not add up to the pattern length")
+    return problems
+
+
+def wall_clock(rows: int, repeats: int) -> list:
+    """(cue, pattern length, worst received span) for every cue on all rows."""
+    # Every headband acks, so no retransmits share the link with the cue
+    hub = HubSimulator(port=0, members=[(r, c) for r in range(1, rows + 1) for c in range(1, SIM_COLS + 1)]).start()
+    ctl = Controller(rows=rows, session_dir=tempfile.mkdtemp(), hubs_config="")
+    ctl.start()
+    ctl.connect("127.0.0.1", hub.port)
+    give_up = time.monotonic() + 5
+    while not ctl.connected and time.monotonic() < give_up:
+        time.sleep(0.05)
+    if not ctl.connected:
+        hub.stop()
+        ctl.close()
+        raise SystemExit("Could not connect to the hub simulator")
+
+    results = []
+    try:
+        for name, (_label, steps) in CUES.items():
+            worst = 0.0
+            for _ in range(repeats):
+                hub.received.clear()
+                ctl.run_cue(name, range(1, rows + 1))
+                time.sleep(length(steps) + 0.5)
+                times = [t for t, line in hub.received if re.match(r"\d+;\d+:[01]", line)]
+                worst = max(worst, times[-1] - times[0])
+            results.append((name, length(steps), worst))
+    finally:
+        ctl.close()
+        hub.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    problems = check_plan(args.rows)
+    for problem in problems:
+        print(f"plan: {problem}")
+    print(f"plan: {len(CUES)} cues x 1-{args.rows} rows, {len(problems)} problems")
+
+    failed = bool(problems)
+    for name, pattern, span in wall_clock(args.rows, args.repeats):
+        ok = abs(span - pattern) <= TOLERANCE
+        failed |= not ok
+        print(f"{name:<14} {args.rows} rows: pattern {pattern * 1e3:6.1f} ms, played over "
+              f"{span * 1e3:6.1f} ms  {'ok' if ok else 'TOO LONG'}")
+
+    if failed:
+        print("FAIL")
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()